@@ -0,0 +1,106 @@
+"""
+鉴权开销微基准测试
+
+对比每个请求的鉴权路径在优化前后的耗时：
+- get_current_user: 关闭缓存（每次解码 JWT 并查询 User）与启用登录主体缓存
+- is_public_path: 逐条正则匹配与合并后的预编译正则
+
+用法:
+    python scripts/benchmark_auth_overhead.py --iterations 5000
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from server.utils import auth_middleware  # noqa: E402
+from server.utils.auth_middleware import PUBLIC_PATHS, PrincipalCache, get_current_user, is_public_path  # noqa: E402
+from server.utils.auth_utils import AuthUtils  # noqa: E402
+from src.storage.db.engine import create_sqlite_engine  # noqa: E402
+from src.storage.db.models import Base, User  # noqa: E402
+
+SAMPLE_PATHS = [
+    "/api/chat/agent/chatbot",
+    "/api/knowledge/databases",
+    "/api/auth/token",
+    "/api/system/health",
+    "/api/dashboard/stats/calls/timeseries",
+    "/assets/index.js",
+]
+
+
+def legacy_is_public_path(path: str) -> bool:
+    path = path.rstrip("/")
+    for pattern in PUBLIC_PATHS:
+        if re.match(pattern, path):
+            return True
+    return False
+
+
+async def time_get_current_user(Session, token: str, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        db = Session()
+        try:
+            user = await get_current_user(token=token, db=db)
+            _ = user.role
+        finally:
+            db.close()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def time_public_path(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for path in SAMPLE_PATHS:
+            fn(path)
+    return (time.perf_counter() - start) / (iterations * len(SAMPLE_PATHS)) * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-request authentication overhead benchmark")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_sqlite_engine(os.path.join(tmp_dir, "bench.db"))
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+
+        with Session() as db:
+            user = User(username="bench", user_id="bench", password_hash="x", role="user")
+            db.add(user)
+            db.commit()
+            token = AuthUtils.create_access_token({"sub": str(user.id)})
+
+        auth_middleware.principal_cache = PrincipalCache(ttl=0)
+        uncached = await time_get_current_user(Session, token, args.iterations)
+
+        auth_middleware.principal_cache = PrincipalCache(ttl=60)
+        cached = await time_get_current_user(Session, token, args.iterations)
+
+        engine.dispose()
+
+    legacy_paths = time_public_path(legacy_is_public_path, args.iterations)
+    combined_paths = time_public_path(is_public_path, args.iterations)
+
+    print(f"{'step':<28} {'before(us)':>11} {'after(us)':>10} {'speedup':>8}")
+    for name, before, after in (
+        ("get_current_user", uncached, cached),
+        ("is_public_path", legacy_paths, combined_paths),
+    ):
+        print(f"{name:<28} {before:>11.2f} {after:>10.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""
+分块器吞吐与 chunk 大小基准测试
+
+生成模拟 OCR 输出的大型 Markdown（多级标题、中文长段落、Markdown / HTML 表格、列表），对比：
+- langchain: 原来的 MarkdownTextSplitter，chunk_size 按字符计
+- structured: MarkdownChunker，chunk_size 按 token 计
+--ocr 时改用没有空行、按行宽硬换行的 OCR 风格文本
+
+输出每种分块器的耗时、吞吐（MB/s）、chunk 数量，以及 chunk token 数的均值 / P5 / P95 / 变异系数。
+
+用法:
+    python scripts/benchmark_chunker.py --size-mb 5 --chunk-size 1000 [--ocr]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_text_splitters import MarkdownTextSplitter  # noqa: E402
+
+from src.knowledge.utils.markdown_chunker import chunk_markdown  # noqa: E402
+from src.utils.tokens import estimate_tokens  # noqa: E402
+
+SENTENCES = [
+    "水库大坝安全管理应当坚持安全第一、预防为主、综合治理的方针。",
+    "大坝管理单位负责日常巡查、观测、维修养护与险情报告，并按规定开展定期安全鉴定。",
+    "汛期调度规则：汛限水位以下按来水下泄，超过汛限水位时按防洪标准控制泄量。",
+    "近年监测发现坝基渗流异常，扬压力偏高，需加密观测并复核渗透稳定性。",
+    "The spillway gate was inspected on schedule and no abnormal vibration was recorded.",
+]
+
+
+def build_markdown(size_bytes: int, seed: int) -> str:
+    rng = random.Random(seed)
+    parts, size, chapter = [], 0, 0
+    while size < size_bytes:
+        chapter += 1
+        block = [f"# 第{chapter}章 水库运行管理"]
+        for section in range(1, 4):
+            block.append(f"## 第{section}节 巡查与观测")
+            for _ in range(rng.randint(2, 6)):
+                block.append("".join(rng.choice(SENTENCES) for _ in range(rng.randint(3, 30))))
+            if rng.random() < 0.5:
+                rows = [f"| 测点{i} | {rng.uniform(100, 200):.2f} | {rng.uniform(0, 1):.3f} |" for i in range(40)]
+                block.append("\n".join(["| 测点 | 水位(m) | 渗流量(L/s) |", "| --- | --- | --- |", *rows]))
+            if rng.random() < 0.3:
+                cells = "".join(f"<tr><td>断面{i}</td><td>{rng.randint(1, 99)}</td></tr>" for i in range(30))
+                block.append(f"<table>{cells}</table>")
+            if rng.random() < 0.5:
+                block.append("\n".join(f"{i}、{rng.choice(SENTENCES)}" for i in range(1, rng.randint(3, 12))))
+        text = "\n\n".join(block)
+        parts.append(text)
+        size += len(text.encode())
+    return "\n\n".join(parts)
+
+
+def build_ocr_text(size_bytes: int, seed: int) -> str:
+    """模拟未排版的 OCR 输出：按版面宽度硬换行、没有空行与标题"""
+    rng = random.Random(seed)
+    text = "".join(rng.choice(SENTENCES) for _ in range(size_bytes // 60))
+    return "\n".join(text[i : i + 38] for i in range(0, len(text), 38))
+
+
+def describe(chunks: list[str]) -> dict:
+    tokens = sorted(estimate_tokens(chunk) for chunk in chunks)
+    mean = statistics.fmean(tokens)
+    return {
+        "chunks": len(tokens),
+        "mean": mean,
+        "p5": tokens[int(len(tokens) * 0.05)],
+        "p95": tokens[int(len(tokens) * 0.95)],
+        "cv": statistics.pstdev(tokens) / mean if mean else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown chunker throughput benchmark")
+    parser.add_argument("--size-mb", type=float, default=5, help="生成的 Markdown 大小（MB）")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--ocr", action="store_true", help="使用无空行、按行宽硬换行的 OCR 风格文本")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    build = build_ocr_text if args.ocr else build_markdown
+    text = build(int(args.size_mb * 1024 * 1024), args.seed)
+    size_mb = len(text.encode()) / 1024 / 1024
+
+    def run_langchain():
+        splitter = MarkdownTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+        return splitter.split_text(text)
+
+    def run_structured():
+        return [chunk.content for chunk in chunk_markdown(text, args.chunk_size, args.chunk_overlap)]
+
+    print(f"markdown={size_mb:.1f}MB chunk_size={args.chunk_size} chunk_overlap={args.chunk_overlap}")
+    print(f"{'splitter':<12} {'seconds':>8} {'MB/s':>7} {'chunks':>7} {'mean_tok':>9} {'p5':>6} {'p95':>6} {'cv':>6}")
+    for name, run in [("langchain", run_langchain), ("structured", run_structured)]:
+        started = time.perf_counter()
+        chunks = run()
+        elapsed = time.perf_counter() - started
+        stats = describe(chunks)
+        print(
+            f"{name:<12} {elapsed:>8.2f} {size_mb / elapsed:>7.2f} {stats['chunks']:>7} {stats['mean']:>9.0f} "
+            f"{stats['p5']:>6} {stats['p95']:>6} {stats['cv']:>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+SQLite 写入竞争基准测试
+
+模拟多个 uvicorn worker 同时写入对话消息、同时读取会话列表，对比旧配置（rollback journal）
+与 WAL 配置下的吞吐、延迟和 "database is locked" 错误数。
+
+用法:
+    python scripts/benchmark_db_contention.py --workers 4 --turns 200
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from src.storage.conversation import ConversationManager, ConversationTurn  # noqa: E402
+from src.storage.db.engine import SQLiteSettings, create_sqlite_engine  # noqa: E402
+from src.storage.db.models import Base  # noqa: E402
+
+PROFILES = {
+    "legacy": SQLiteSettings(
+        journal_mode="DELETE", synchronous="FULL", busy_timeout_ms=5000, cache_size=-2000, mmap_size=0
+    ),
+    "wal": SQLiteSettings(),
+}
+
+
+def _worker(db_path: str, settings: SQLiteSettings, worker_id: int, turns: int, queue: mp.Queue) -> None:
+    engine = create_sqlite_engine(db_path, settings)
+    Session = sessionmaker(bind=engine)
+    latencies, errors = [], 0
+
+    with Session() as db:
+        conv_mgr = ConversationManager(db)
+        thread_id = f"bench-{worker_id}"
+        conv_mgr.create_conversation(user_id=str(worker_id), agent_id="bench", title="bench", thread_id=thread_id)
+
+        for i in range(turns):
+            start = time.perf_counter()
+            try:
+                turn = ConversationTurn(thread_id=thread_id)
+                turn.add_message("user", f"question {i}")
+                turn.add_message("assistant", f"answer {i} " * 20)
+                conv_mgr.save_turn(turn)
+                # 每次写入后读取一次会话列表，模拟前端刷新
+                conv_mgr.list_conversations(user_id=str(worker_id), agent_id="bench")
+            except OperationalError:
+                db.rollback()
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    engine.dispose()
+    queue.put((latencies, errors))
+
+
+def run_profile(name: str, settings: SQLiteSettings, workers: int, turns: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        engine = create_sqlite_engine(db_path, settings)
+        Base.metadata.create_all(engine)
+        engine.dispose()
+
+        queue = mp.Queue()
+        procs = [mp.Process(target=_worker, args=(db_path, settings, i, turns, queue)) for i in range(workers)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        results = [queue.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(lat for lats, _ in results for lat in lats)
+    errors = sum(err for _, err in results)
+    return {
+        "profile": name,
+        "turns": len(latencies),
+        "errors": errors,
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite write contention benchmark")
+    parser.add_argument("--workers", type=int, default=4, help="并发写入进程数")
+    parser.add_argument("--turns", type=int, default=200, help="每个进程写入的对话轮次")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'turns':>6} {'errors':>6} {'turns/s':>9} {'p50(ms)':>9} {'p99(ms)':>9}")
+    for name in args.profiles:
+        r = run_profile(name, PROFILES[name], args.workers, args.turns)
+        print(
+            f"{r['profile']:<8} {r['turns']:>6} {r['errors']:>6} {r['throughput']:>9.1f} "
+            f"{r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+对话历史加载基准测试
+
+在临时数据库中构造一个包含大量消息（含工具调用与较大 extra_metadata）的会话，对比：
+- lazy: 逐条消息访问 tool_calls 触发的 N+1 查询
+- full: selectinload 一次加载完整历史
+- page: 按 (created_at, id) 游标分页读取最近一页
+- page-compact: 分页且不加载 extra_metadata
+
+用法:
+    python scripts/benchmark_history_loading.py --messages 2000 --page-size 50
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from src.storage.conversation import ConversationManager, ConversationTurn  # noqa: E402
+from src.storage.db.engine import create_sqlite_engine  # noqa: E402
+from src.storage.db.models import Base, Message  # noqa: E402
+
+
+def build_conversation(conv_mgr: ConversationManager, messages: int) -> int:
+    conversation = conv_mgr.create_conversation(user_id="bench", agent_id="bench", title="bench")
+    citations = [{"source": f"doc_{i}.pdf", "content": "x" * 400} for i in range(5)]
+
+    batch = ConversationTurn(thread_id=conversation.thread_id)
+    for i in range(messages // 2):
+        batch.add_message("user", f"question {i}")
+        batch.add_message(
+            "assistant",
+            f"answer {i} " * 40,
+            extra_metadata={"citations": citations, "response_metadata": {"model": "bench"}},
+            tool_calls=[{"id": f"call_{i}", "name": "search", "args": {"query": f"q{i}"}}] if i % 3 == 0 else None,
+        )
+        if len(batch) >= 200:
+            conv_mgr.save_turn(batch)
+            batch = ConversationTurn(thread_id=conversation.thread_id)
+    if len(batch):
+        conv_mgr.save_turn(batch)
+    return conversation.id
+
+
+def timeit(fn, repeat: int) -> tuple[float, int]:
+    samples, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversation history loading benchmark")
+    parser.add_argument("--messages", type=int, default=2000, help="会话中的消息数量")
+    parser.add_argument("--page-size", type=int, default=50, help="分页大小")
+    parser.add_argument("--repeat", type=int, default=5, help="每种方式重复次数，取中位数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_sqlite_engine(os.path.join(tmp_dir, "bench.db"))
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+
+        with Session() as db:
+            conversation_id = build_conversation(ConversationManager(db), args.messages)
+
+        def lazy():
+            with Session() as db:
+                rows = db.scalars(select(Message).where(Message.conversation_id == conversation_id)).all()
+                for message in rows:
+                    _ = message.tool_calls  # 每条消息触发一次查询
+                return len(rows)
+
+        def full():
+            with Session() as db:
+                return len(ConversationManager(db).get_messages(conversation_id))
+
+        def page(include_metadata: bool):
+            with Session() as db:
+                return len(
+                    ConversationManager(db)
+                    .get_messages_page(conversation_id, limit=args.page_size, include_metadata=include_metadata)
+                    .messages
+                )
+
+        def walk_pages():
+            # 从最新一页一直翻到最早，验证游标翻页的总成本
+            with Session() as db:
+                conv_mgr = ConversationManager(db)
+                cursor, total = None, 0
+                while True:
+                    result = conv_mgr.get_messages_page(
+                        conversation_id, limit=args.page_size, before=cursor, include_metadata=False
+                    )
+                    total += len(result.messages)
+                    if not result.has_more:
+                        return total
+                    cursor = result.next_cursor
+
+        cases = [
+            ("lazy (N+1)", lazy),
+            ("full", full),
+            ("page", lambda: page(True)),
+            ("page-compact", lambda: page(False)),
+            ("walk-all-pages", walk_pages),
+        ]
+
+        print(f"messages={args.messages} page_size={args.page_size}")
+        print(f"{'mode':<16} {'rows':>6} {'median(ms)':>11}")
+        for name, fn in cases:
+            elapsed, rows = timeit(fn, args.repeat)
+            print(f"{name:<16} {rows:>6} {elapsed:>11.2f}")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
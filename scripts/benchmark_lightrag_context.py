@@ -0,0 +1,164 @@
+"""
+LightRAG 检索上下文大小基准测试
+
+用 ainsert_custom_kg 写入一份合成的水库知识图谱（实体、关系与原文块），使用模拟的关键词抽取 LLM
+与确定性的哈希 embedding，逐个问题对比送入对话模型的上下文 token 数：
+- context: 旧格式，LightRAG 拼接好的整段上下文（only_need_context）
+- structured: LightRagKB 结构化结果（实体 / 关系 / 文本块分条、带分数），按 max_tokens 截断
+
+用法:
+    python scripts/benchmark_lightrag_context.py --max-tokens 3000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+from lightrag import LightRAG, QueryParam  # noqa: E402
+from lightrag.kg.shared_storage import initialize_pipeline_status  # noqa: E402
+from lightrag.utils import EmbeddingFunc, Tokenizer  # noqa: E402
+
+from src.knowledge.implementations.lightrag import LightRagKB  # noqa: E402
+from src.utils.tokens import estimate_tokens  # noqa: E402
+
+EMBEDDING_DIM = 128
+RIVERS = ["长江", "黄河", "珠江", "淮河", "海河"]
+QUESTIONS = {
+    "水库3的坝型和库容是多少？": ["水库3", "坝型", "库容"],
+    "长江流域有哪些水库出现过渗流异常？": ["长江", "渗流异常"],
+    "水库12与哪些河流相连，汛期调度规则是什么？": ["水库12", "汛期调度"],
+    "黄河上游水库的防洪标准有什么区别？": ["黄河", "防洪标准"],
+}
+
+
+class CharTokenizer:
+    """按字符计数的分词器，避免基准测试下载 tiktoken 词表"""
+
+    def encode(self, content: str) -> list[int]:
+        return [ord(c) for c in content]
+
+    def decode(self, tokens: list[int]) -> str:
+        return "".join(chr(t) for t in tokens)
+
+
+def build_custom_kg(count: int) -> dict:
+    chunks, entities, relationships = [], [], []
+    for i in range(count):
+        river = RIVERS[i % len(RIVERS)]
+        source_id = f"chunk-reservoir-{i}"
+        file_path = f"/data/reservoirs/水库{i}.md"
+        chunks.append(
+            {
+                "content": (
+                    f"水库{i}位于{river}流域，坝型为{'混凝土重力坝' if i % 2 else '黏土心墙坝'}，"
+                    f"总库容{(i + 1) * 1.7:.1f}亿立方米。汛期调度规则：汛限水位以下按来水下泄，"
+                    f"超过汛限水位时按防洪标准{50 + i * 10}年一遇控制泄量。"
+                    + ("近年监测发现坝基渗流异常，扬压力偏高。" if i % 3 == 0 else "")
+                )
+                * 3,
+                "source_id": source_id,
+                "file_path": file_path,
+                "chunk_order_index": 0,
+            }
+        )
+        entities.append(
+            {
+                "entity_name": f"水库{i}",
+                "entity_type": "水库",
+                "description": f"水库{i}是{river}流域的大型水库，承担防洪、灌溉与发电任务。" * 2,
+                "source_id": source_id,
+                "file_path": file_path,
+            }
+        )
+        relationships.append(
+            {
+                "src_id": f"水库{i}",
+                "tgt_id": river,
+                "description": f"水库{i}位于{river}干流或支流上，汛期按流域统一调度。",
+                "keywords": "位于 流域",
+                "weight": 1.0,
+                "source_id": source_id,
+                "file_path": file_path,
+            }
+        )
+    for river in RIVERS:
+        entities.append(
+            {
+                "entity_name": river,
+                "entity_type": "河流",
+                "description": f"{river}是我国主要河流之一，流域内分布多座大型水库。",
+                "source_id": "chunk-reservoir-0",
+                "file_path": "/data/reservoirs/流域概况.md",
+            }
+        )
+    return {"chunks": chunks, "entities": entities, "relationships": relationships}
+
+
+async def llm_model_func(prompt, system_prompt=None, history_messages=[], **kwargs):
+    """只模拟关键词抽取：按问题返回固定关键词"""
+    text = f"{system_prompt or ''}\n{prompt}"
+    for question, keywords in QUESTIONS.items():
+        if question in text:
+            return json.dumps({"high_level_keywords": keywords[1:], "low_level_keywords": keywords[:1]})
+    return json.dumps({"high_level_keywords": [], "low_level_keywords": []})
+
+
+async def embed(texts: list[str]) -> np.ndarray:
+    """字符二元组哈希向量，相同词语的文本余弦相似度更高"""
+    vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for a, b in zip(text, text[1:]):
+            vectors[row, int(hashlib.md5((a + b).encode()).hexdigest(), 16) % EMBEDDING_DIM] += 1
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-6)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="LightRAG retrieval context size benchmark")
+    parser.add_argument("--reservoirs", type=int, default=60, help="合成水库数量")
+    parser.add_argument("--max-tokens", type=int, default=3000, help="结构化结果的 token 上限")
+    parser.add_argument("--mode", default="hybrid", help="LightRAG 检索模式")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="lightrag_ctx_bench_")
+    try:
+        rag = LightRAG(
+            working_dir=work_dir,
+            workspace="bench",
+            llm_model_func=llm_model_func,
+            embedding_func=EmbeddingFunc(embedding_dim=EMBEDDING_DIM, max_token_size=4096, func=embed),
+            tokenizer=Tokenizer("char", CharTokenizer()),
+            enable_llm_cache=False,
+        )
+        await rag.initialize_storages()
+        await initialize_pipeline_status()
+        await rag.ainsert_custom_kg(build_custom_kg(args.reservoirs))
+
+        print(f"{'question':<28} {'context_tokens':>15} {'structured_tokens':>18} {'items':>6} {'reduction':>10}")
+        for question in QUESTIONS:
+            param = QueryParam(mode=args.mode, only_need_context=True, top_k=10)
+            context = await rag.aquery(question, param) or ""
+            data = await rag.aquery_data(question, QueryParam(mode=args.mode, only_need_context=True, top_k=10))
+            items = LightRagKB._structure_query_data(data.get("data") or {}, "bench", args.mode)
+            items = LightRagKB._truncate_to_budget(items, args.max_tokens)
+
+            context_tokens = estimate_tokens(context)
+            structured_tokens = sum(estimate_tokens(item["content"]) for item in items)
+            reduction = 1 - structured_tokens / context_tokens if context_tokens else 0
+            print(f"{question:<28} {context_tokens:>15} {structured_tokens:>18} {len(items):>6} {reduction:>10.0%}")
+        await rag.finalize_storages()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""
+对话流编码基准测试
+
+模拟一次包含推理内容、工具调用与长文本回答的智能体流，对比每个 token 的编码耗时与输出字节数：
+- legacy: 旧实现（model_dump + 标准库 json）
+- verbose: AgentStreamEncoder 默认格式（与旧格式兼容，orjson 序列化）
+- compact: 增量帧 + 文本合并（X-Stream-Format: compact）
+
+compact 输出会按前端的还原逻辑解码，并校验每条消息拼接后的内容与原始流一致。
+
+用法:
+    python scripts/benchmark_stream_encoding.py --tokens 2000
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.messages import AIMessageChunk, ToolMessage  # noqa: E402
+
+from server.utils.stream_encoder import STREAM_FORMAT_COMPACT, AgentStreamEncoder  # noqa: E402
+
+METADATA = {"langgraph_step": 1, "langgraph_node": "model", "ls_provider": "openai", "ls_model_name": "deepseek-chat"}
+
+
+def build_stream(tokens: int) -> list[tuple]:
+    response_metadata = {"model_provider": "openai"}
+    stream = []
+    for i in range(tokens // 4):
+        stream.append(
+            (
+                AIMessageChunk(
+                    content="",
+                    id="run-1",
+                    additional_kwargs={"reasoning_content": f"思考{i} "},
+                    response_metadata=response_metadata,
+                ),
+                METADATA,
+            )
+        )
+    for i, fragment in enumerate(['{"query', '": "大坝', '渗流"}']):
+        stream.append(
+            (
+                AIMessageChunk(
+                    content="",
+                    id="run-1",
+                    tool_call_chunks=[
+                        {"name": "search" if i == 0 else None, "args": fragment, "id": "call_1", "index": 0}
+                    ],
+                    response_metadata=response_metadata,
+                ),
+                METADATA,
+            )
+        )
+    tool_result = ToolMessage(content="检索结果" * 50, tool_call_id="call_1", id="tool-1")
+    stream.append((tool_result, METADATA | {"langgraph_step": 2}))
+    for i in range(tokens - len(stream)):
+        stream.append(
+            (
+                AIMessageChunk(content=f"答案{i}", id="run-2", response_metadata=response_metadata),
+                METADATA | {"langgraph_step": 3},
+            )
+        )
+    return stream
+
+
+def legacy_chunk(msg, metadata) -> bytes:
+    payload = {"request_id": "bench", "msg": msg.model_dump(), "metadata": metadata, "status": "loading"}
+    if isinstance(msg, AIMessageChunk):
+        payload = {"request_id": "bench", "response": msg.content, **payload}
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def encode(stream, mode: str) -> list[bytes]:
+    if mode == "legacy":
+        return [legacy_chunk(msg, metadata) for msg, metadata in stream]
+    encoder = AgentStreamEncoder("bench", STREAM_FORMAT_COMPACT if mode == "compact" else "verbose")
+    frames = [encoder.message(msg, metadata) for msg, metadata in stream]
+    frames.append(encoder.flush())
+    return [frame for frame in frames if frame]
+
+
+def merged_text(chunks: list[dict]) -> dict[str, tuple[str, str, str]]:
+    """按前端 mergeMessageChunk 的拼接方式，得到每条消息的 content / reasoning / 工具参数"""
+    result = {}
+    for msg in chunks:
+        content, reasoning, args = result.get(msg["id"], ("", "", ""))
+        content += msg.get("content") or ""
+        reasoning += (msg.get("additional_kwargs") or {}).get("reasoning_content") or ""
+        args += "".join(tc.get("args") or "" for tc in msg.get("tool_call_chunks") or [])
+        result[msg["id"]] = (content, reasoning, args)
+    return result
+
+
+def expand(frames: list[bytes]) -> list[dict]:
+    """MessageProcessor.expandStreamChunk 的 Python 版本"""
+    fields_by_id, messages = {}, []
+    for line in b"".join(frames).splitlines():
+        data = json.loads(line)
+        fields = fields_by_id.get(data["id"], {}) | data.get("f", {})
+        fields_by_id[data["id"]] = fields
+        msg = fields | {"content": data.get("d", "")}
+        if data.get("r"):
+            msg["additional_kwargs"] = (msg.get("additional_kwargs") or {}) | {"reasoning_content": data["r"]}
+        messages.append(msg)
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent stream encoding benchmark")
+    parser.add_argument("--tokens", type=int, default=2000, help="流中的消息块数量")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最快一次")
+    args = parser.parse_args()
+
+    stream = build_stream(args.tokens)
+
+    print(f"tokens={len(stream)}")
+    print(f"{'mode':<8} {'frames':>7} {'bytes':>10} {'per_token(us)':>14}")
+    outputs = {}
+    for mode in ("legacy", "verbose", "compact"):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            frames = encode(stream, mode)
+            best = min(best, time.perf_counter() - start)
+        outputs[mode] = frames
+        total = sum(len(frame) for frame in frames)
+        print(f"{mode:<8} {len(frames):>7} {total:>10} {best / len(stream) * 1e6:>14.2f}")
+
+    expected = merged_text([msg.model_dump() for msg, _ in stream])
+    assert merged_text(expand(outputs["compact"])) == expected, "compact stream does not round-trip"
+    assert [json.loads(line) for line in outputs["verbose"]] == [json.loads(line) for line in outputs["legacy"]]
+    print("round-trip check: ok")
+
+
+if __name__ == "__main__":
+    main()
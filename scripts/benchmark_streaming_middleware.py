@@ -0,0 +1,115 @@
+"""
+流式响应中间件开销基准测试
+
+构造一个逐块输出 NDJSON 的 StreamingResponse（模拟 /api/chat/agent 对话流），对比：
+- legacy: 基于 BaseHTTPMiddleware 的请求日志 + 登录限流（旧实现的等价副本）
+- asgi: server.utils.asgi_middleware 中的纯 ASGI 中间件
+- none: 不挂载中间件的基线
+
+用法:
+    python scripts/benchmark_streaming_middleware.py --chunks 2000 --requests 20
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from server.utils.asgi_middleware import (  # noqa: E402
+    RATE_LIMIT_ENDPOINTS,
+    InMemoryRateLimitStore,
+    LoginRateLimitMiddleware,
+    RequestLoggingMiddleware,
+)
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    """旧实现：call_next 之后才能拿到响应，耗时只覆盖到响应头"""
+
+    async def dispatch(self, request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        process_time = (time.perf_counter() - start) * 1000
+        response.headers["X-Request-ID"] = f"{int(time.time() * 1000)}"
+        response.headers["X-Process-Time"] = f"{process_time:.2f}ms"
+        return response
+
+
+class LegacyLoginRateLimitMiddleware(BaseHTTPMiddleware):
+    """旧实现：非登录请求也要经过一层 BaseHTTPMiddleware 的流包装"""
+
+    async def dispatch(self, request: Request, call_next):
+        if ((request.url.path.rstrip("/") or "/"), request.method.upper()) in RATE_LIMIT_ENDPOINTS:
+            raise NotImplementedError("benchmark only streams non-login requests")
+        return await call_next(request)
+
+
+def build_app(mode: str, chunks: int, chunk_size: int) -> FastAPI:
+    app = FastAPI()
+    line = (json.dumps({"status": "loading", "response": "x" * chunk_size}, ensure_ascii=False) + "\n").encode()
+
+    @app.get("/api/chat/stream")
+    async def stream():
+        async def gen():
+            for _ in range(chunks):
+                yield line
+
+        return StreamingResponse(gen(), media_type="application/json")
+
+    if mode == "legacy":
+        app.add_middleware(LegacyLoginRateLimitMiddleware)
+        app.add_middleware(LegacyRequestLoggingMiddleware)
+    elif mode == "asgi":
+        app.add_middleware(LoginRateLimitMiddleware, store=InMemoryRateLimitStore())
+        app.add_middleware(RequestLoggingMiddleware)
+    return app
+
+
+async def run(mode: str, args) -> tuple[float, float, int]:
+    app = build_app(mode, args.chunks, args.chunk_size)
+    transport = httpx.ASGITransport(app=app)
+    ttfbs, total_bytes = [], 0
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            request_start = time.perf_counter()
+            first = None
+            async with client.stream("GET", "/api/chat/stream") as response:
+                async for chunk in response.aiter_raw():
+                    if first is None:
+                        first = time.perf_counter() - request_start
+                    total_bytes += len(chunk)
+            ttfbs.append(first or 0.0)
+        elapsed = time.perf_counter() - start
+
+    per_chunk_us = elapsed / (args.requests * args.chunks) * 1e6
+    return per_chunk_us, sum(ttfbs) / len(ttfbs) * 1000, int(total_bytes / elapsed)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Streaming middleware overhead benchmark")
+    parser.add_argument("--chunks", type=int, default=2000, help="每个响应的 NDJSON 分块数")
+    parser.add_argument("--chunk-size", type=int, default=64, help="每个分块的文本长度")
+    parser.add_argument("--requests", type=int, default=20, help="请求次数")
+    args = parser.parse_args()
+
+    print(f"chunks={args.chunks} chunk_size={args.chunk_size} requests={args.requests}")
+    print(f"{'mode':<8} {'per_chunk(us)':>14} {'ttfb(ms)':>9} {'throughput(B/s)':>16}")
+    for mode in ("none", "legacy", "asgi"):
+        per_chunk, ttfb, throughput = await run(mode, args)
+        print(f"{mode:<8} {per_chunk:>14.2f} {ttfb:>9.2f} {throughput:>16}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+检索策略分类器训练与评估
+
+基于 rag_eval 测试集（question_generator 生成的 JSONL）训练本地检索策略分类器，标签来源：
+- 样本中的 policy 字段（llm / inject / enforce）优先
+- 否则按问题类型映射：factual -> enforce，inferential -> inject
+- 内置与 --smalltalk 指定的闲聊 / 通用任务问题标注为 llm
+
+输出测试集上的准确率、各类别精确率 / 召回率、给定阈值下的覆盖率（无需回退 LLM 的比例）与本地推理延迟；
+指定 --compare-llm 时同时统计 LLM 分类器的准确率与延迟。最终模型使用全部样本重新训练后保存。
+
+使用示例:
+    uv run python scripts/rag_eval/train_retrieval_classifier.py \
+        --testset ./eval_results/testset.jsonl \
+        --compare-llm siliconflow/Qwen/Qwen3-8B
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../.."))
+
+from src.agents.chatbot.retrieval_classifier import (  # noqa: E402
+    RETRIEVAL_CLASSIFIER_THRESHOLD,
+    RETRIEVAL_POLICY_LABELS,
+    RETRIEVAL_POLICY_PROMPT,
+    RetrievalClassifier,
+    get_classifier_path,
+)
+
+TYPE_TO_POLICY = {"factual": "enforce", "inferential": "inject"}
+
+SMALLTALK_SEEDS = [
+    "你好",
+    "您好，请问你是谁？",
+    "你能做什么？",
+    "谢谢你的回答",
+    "好的，明白了",
+    "再见",
+    "早上好",
+    "在吗",
+    "hello",
+    "帮我把这段话翻译成英文",
+    "帮我润色一下这段文字",
+    "写一首关于春天的诗",
+    "讲个笑话吧",
+    "用 python 写一个快速排序",
+    "这个正则表达式是什么意思",
+    "帮我写一封请假邮件",
+    "把上面的内容改写得更简洁一些",
+    "今天心情不太好",
+    "你是用什么模型实现的",
+    "总结一下我们刚才聊的内容",
+]
+
+
+def load_samples(testset_paths: list[str], smalltalk_path: str | None) -> list[tuple[str, str]]:
+    samples = []
+    for path in testset_paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if "_metadata" in data or not data.get("question"):
+                    continue
+                policy = data.get("policy") or TYPE_TO_POLICY.get(data.get("type", "factual"), "inject")
+                samples.append((data["question"], policy))
+
+    smalltalk = list(SMALLTALK_SEEDS)
+    if smalltalk_path:
+        with open(smalltalk_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    smalltalk.append(json.loads(line)["question"] if line.startswith("{") else line)
+    samples.extend((question, "llm") for question in smalltalk)
+    return samples
+
+
+async def embed_texts(embed_model: str, texts: list[str], batch_size: int = 32) -> list[list[float]]:
+    from src.models.embed import select_embedding_model
+
+    model = select_embedding_model(embed_model)
+    embeddings = []
+    for i in range(0, len(texts), batch_size):
+        embeddings.extend(await model.aencode(texts[i : i + batch_size]))
+    return embeddings
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+def evaluate(classifier: RetrievalClassifier, samples, embeddings, threshold: float) -> dict:
+    predictions, latencies = [], []
+    for i, (question, _) in enumerate(samples):
+        started = time.perf_counter()
+        predictions.append(classifier.predict(question, embeddings[i] if embeddings else None))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    gold = [label for _, label in samples]
+    per_label = {}
+    for label in RETRIEVAL_POLICY_LABELS:
+        tp = sum(1 for (pred, _), g in zip(predictions, gold) if pred == label and g == label)
+        predicted = sum(1 for pred, _ in predictions if pred == label)
+        actual = gold.count(label)
+        per_label[label] = {
+            "precision": tp / predicted if predicted else 0.0,
+            "recall": tp / actual if actual else 0.0,
+            "support": actual,
+        }
+    confident = [(pred, g) for (pred, conf), g in zip(predictions, gold) if conf >= threshold]
+    return {
+        "accuracy": sum(pred == g for (pred, _), g in zip(predictions, gold)) / len(gold),
+        "coverage": len(confident) / len(gold),
+        "confident_accuracy": sum(pred == g for pred, g in confident) / len(confident) if confident else 0.0,
+        "per_label": per_label,
+        "latency_p50_ms": statistics.median(latencies),
+        "latency_p95_ms": percentile(latencies, 0.95),
+    }
+
+
+async def evaluate_llm(model_name: str, samples) -> dict:
+    """LLM 分类器只区分 inject / enforce，只在这两类样本上统计"""
+    from src.agents.common.models import load_chat_model
+
+    model = load_chat_model(model_name)
+    correct, latencies = 0, []
+    samples = [(question, label) for question, label in samples if label != "llm"]
+    for question, label in samples:
+        started = time.perf_counter()
+        response = await model.ainvoke(
+            [{"role": "system", "content": RETRIEVAL_POLICY_PROMPT}, {"role": "user", "content": question}]
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+        content = str(getattr(response, "content", "") or "").lower()
+        correct += ("enforce" if "enforce" in content else "inject") == label
+    return {
+        "accuracy": correct / len(samples) if samples else 0.0,
+        "latency_p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "latency_p95_ms": percentile(latencies, 0.95),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="训练并评估本地检索策略分类器")
+    parser.add_argument("--testset", nargs="+", required=True, help="rag_eval 测试集文件 (.jsonl)，可指定多个")
+    parser.add_argument("--smalltalk", help="额外的 llm 类问题，每行一个问题或含 question 字段的 JSON")
+    parser.add_argument(
+        "--embed-model", default="", help="拼接嵌入向量特征使用的嵌入模型（provider/model），默认不使用"
+    )
+    parser.add_argument("--test-ratio", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=RETRIEVAL_CLASSIFIER_THRESHOLD)
+    parser.add_argument("--compare-llm", default="", help="对比的 LLM 分类器模型（provider/model）")
+    parser.add_argument("--output", default="", help="模型保存路径，默认为智能体工作目录下的 retrieval_classifier.json")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    samples = load_samples(args.testset, args.smalltalk)
+    random.Random(args.seed).shuffle(samples)
+    embeddings = await embed_texts(args.embed_model, [q for q, _ in samples]) if args.embed_model else None
+
+    split = max(1, int(len(samples) * args.test_ratio))
+    train, test = samples[split:], samples[:split]
+    train_embeddings = embeddings[split:] if embeddings else None
+    test_embeddings = embeddings[:split] if embeddings else None
+    counts = {label: sum(1 for _, g in samples if g == label) for label in RETRIEVAL_POLICY_LABELS}
+    print(f"samples={len(samples)} train={len(train)} test={len(test)} labels={counts}")
+
+    started = time.perf_counter()
+    classifier = RetrievalClassifier.fit(
+        [q for q, _ in train], [g for _, g in train], train_embeddings, embed_model=args.embed_model
+    )
+    print(f"train: {time.perf_counter() - started:.2f}s")
+
+    report = evaluate(classifier, test, test_embeddings, args.threshold)
+    print(
+        f"local: accuracy={report['accuracy']:.3f} coverage@{args.threshold}={report['coverage']:.3f} "
+        f"confident_accuracy={report['confident_accuracy']:.3f} "
+        f"latency p50={report['latency_p50_ms']:.2f}ms p95={report['latency_p95_ms']:.2f}ms"
+    )
+    for label, stats in report["per_label"].items():
+        print(f"  {label:<8} precision={stats['precision']:.3f} recall={stats['recall']:.3f} n={stats['support']}")
+
+    if args.compare_llm:
+        llm_report = await evaluate_llm(args.compare_llm, test)
+        print(
+            f"llm:   accuracy={llm_report['accuracy']:.3f} (inject/enforce only) "
+            f"latency p50={llm_report['latency_p50_ms']:.0f}ms p95={llm_report['latency_p95_ms']:.0f}ms"
+        )
+
+    # 使用全部样本重新训练后保存
+    final = RetrievalClassifier.fit(
+        [q for q, _ in samples], [g for _, g in samples], embeddings, embed_model=args.embed_model
+    )
+    final.metadata.update({"threshold": args.threshold, "test_report": report})
+    output = args.output or get_classifier_path()
+    final.save(output)
+    print(f"saved: {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+"""
+重建仪表盘统计预聚合表（stats_rollups）
+
+从对话历史重新计算小时/日粒度的按智能体、用户、模型、工具统计计数。
+服务启动时若预聚合表为空会自动回填一次；计数出现偏差（如直接修改了数据库）时可手动执行本脚本。
+
+用法:
+    python scripts/rebuild_stats_rollups.py              # 全量重建
+    python scripts/rebuild_stats_rollups.py --days 7     # 仅重建最近 7 天的桶
+"""
+
+import argparse
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.storage.conversation.rollup import rebuild_rollups  # noqa: E402
+from src.storage.db.manager import db_manager  # noqa: E402
+from src.utils.datetime_utils import utc_now  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild dashboard stats rollups from conversation history")
+    parser.add_argument("--days", type=int, default=None, help="只重建最近 N 天（按北京时间自然日对齐），默认全量")
+    args = parser.parse_args()
+
+    since = utc_now() - timedelta(days=args.days) if args.days else None
+
+    start = time.perf_counter()
+    db = db_manager.get_session()
+    try:
+        written = rebuild_rollups(db, since=since)
+    finally:
+        db.close()
+
+    scope = f"最近 {args.days} 天" if args.days else "全部历史"
+    print(f"已重建{scope}的统计预聚合：{written} 行，耗时 {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
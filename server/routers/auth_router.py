@@ -7,7 +7,13 @@ from sqlalchemy.orm import Session
 
 from src.storage.db.manager import db_manager
 from src.storage.db.models import User
-from server.utils.auth_middleware import get_admin_user, get_current_user, get_db, get_required_user
+from server.utils.auth_middleware import (
+    get_admin_user,
+    get_current_user,
+    get_db,
+    get_required_user,
+    principal_cache,
+)
 from server.utils.auth_utils import AuthUtils
 from server.utils.user_utils import generate_unique_user_id, validate_username
 from server.utils.common_utils import log_operation
@@ -223,6 +229,7 @@ async def sso_login(sso_data: SSOLoginRequest, db: Session = Depends(get_db)):
         user.sso_last_login = utc_now()
         user.last_login = utc_now()
         db.commit()
+        principal_cache.invalidate_user(user.id)
         
         # 记录登录操作
         log_operation(db, user.id, "SSO登录", f"外部用户ID: {sso_data.userId}")
@@ -384,6 +391,7 @@ async def update_profile(
         update_details.append(f"用户名: {profile_data.username}")
 
     db.commit()
+    principal_cache.invalidate_user(current_user.id)
 
     # 记录操作
     if update_details:
@@ -524,6 +532,7 @@ async def update_user(
         update_details.append(f"角色: {user_data.role}")
 
     db.commit()
+    principal_cache.invalidate_user(user.id)
 
     # 记录操作
     log_operation(db, current_user.id, "更新用户", f"更新用户ID {user_id}: {', '.join(update_details)}", request)
@@ -590,6 +599,7 @@ async def delete_user(
     user.avatar = None  # 清空头像
 
     db.commit()
+    principal_cache.invalidate_user(user.id)
 
     # 记录操作
     log_operation(db, current_user.id, "删除用户", deletion_detail, request)
@@ -664,6 +674,7 @@ async def upload_user_avatar(
         # 更新用户头像
         current_user.avatar = avatar_url
         db.commit()
+        principal_cache.invalidate_user(current_user.id)
 
         # 记录操作
         log_operation(db, current_user.id, "上传头像", f"更新头像: {avatar_url}")
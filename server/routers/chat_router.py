@@ -5,18 +5,26 @@ import uuid
 import yaml
 from pathlib import Path
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from langchain_core.messages import AIMessageChunk, HumanMessage
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from src.storage.db.models import User, MessageFeedback, Message, Conversation
-from src.storage.conversation import ConversationManager
+from src.storage.conversation import (
+    AsyncConversationManager,
+    ConversationManager,
+    ConversationTurn,
+    conversation_writer,
+)
 from src.storage.db.manager import db_manager
 from server.routers.auth_router import get_admin_user
-from server.utils.auth_middleware import get_db, get_required_user
+from server.utils.auth_middleware import get_async_db, get_db, get_required_user
 from server.services.dam_service import dam_exception_service
+from server.utils.stream_encoder import FLUSH, STREAM_FORMAT_HEADER, AgentStreamEncoder, negotiate_stream_format
 from src import executor
 from src import config as conf
 from src.agents import agent_manager
@@ -120,10 +128,14 @@ async def chat_agent(
     query: str = Body(...),
     config: dict = Body({}),
     meta: dict = Body({}),
+    stream_format: str | None = Header(None, alias=STREAM_FORMAT_HEADER),
     current_user: User = Depends(get_required_user),
     db: Session = Depends(get_db),
 ):
-    """使用特定智能体进行对话（需要登录）"""
+    """使用特定智能体进行对话（需要登录）
+
+    请求头 ``X-Stream-Format: compact`` 启用增量帧格式，见 server/utils/stream_encoder.py
+    """
     start_time = asyncio.get_event_loop().time()
 
     logger.info(f"agent_id: {agent_id}, query: {query}, config: {config}, meta: {meta}")
@@ -138,14 +150,9 @@ async def chat_agent(
         }
     )
 
-    # 将meta和thread_id整合到config中
-    def make_chunk(content=None, **kwargs):
-        return (
-            json.dumps(
-                {"request_id": meta.get("request_id"), "response": content, **kwargs}, ensure_ascii=False
-            ).encode("utf-8")
-            + b"\n"
-        )
+    stream_format = negotiate_stream_format(stream_format)
+    encoder = AgentStreamEncoder(meta.get("request_id"), stream_format)
+    make_chunk = encoder.event
 
     async def save_messages_from_langgraph_state(
         agent_instance,
@@ -168,13 +175,15 @@ async def chat_agent(
             messages = state.values.get("messages", [])
             logger.debug(f"Retrieved {len(messages)} messages from LangGraph state")
 
-            # 获取已保存的消息数量，避免重复保存
-            existing_messages = conv_mgr.get_messages_by_thread_id(thread_id)
-            existing_ids = {
-                msg.extra_metadata["id"]
-                for msg in existing_messages
-                if msg.extra_metadata and "id" in msg.extra_metadata
-            }
+            # 只读取已保存消息的 LangGraph id，避免重复保存
+            conversation = conv_mgr.get_conversation_by_thread_id(thread_id)
+            if not conversation:
+                logger.warning(f"Conversation not found for thread_id: {thread_id}")
+                return
+            existing_ids = conv_mgr.get_message_external_ids(conversation.id)
+
+            # 整轮对话的消息与工具调用在一个事务中写入
+            turn = ConversationTurn(thread_id=thread_id)
 
             for msg in messages:
                 msg_dict = msg.model_dump() if hasattr(msg, "model_dump") else {}
@@ -202,33 +211,19 @@ async def chat_agent(
                     if retrieval_mode:
                         msg_dict["retrieval_mode"] = retrieval_mode
 
-                    ai_msg = conv_mgr.add_message_by_thread_id(
-                        thread_id=thread_id,
+                    # tool_calls 使用 LangGraph 的 tool_call_id 保存，工具尚未执行时状态为 pending
+                    turn.add_message(
                         role="assistant",
                         content=content,
                         message_type="text",
                         extra_metadata=msg_dict,  # 保存原始 model_dump 加上 retrieval_mode
+                        tool_calls=tool_calls_data,
                     )
 
-                    # 保存 tool_calls（如果有）- 使用 LangGraph 的 tool_call_id
-                    if tool_calls_data:
-                        logger.debug(f"Saving {len(tool_calls_data)} tool calls from AI message")
-                        for tc in tool_calls_data:
-                            conv_mgr.add_tool_call(
-                                message_id=ai_msg.id,
-                                tool_name=tc.get("name", "unknown"),
-                                tool_input=tc.get("args", {}),  # 完整的参数
-                                status="pending",  # 工具还未执行
-                                langgraph_tool_call_id=tc.get("id"),  # 保存 LangGraph tool_call_id
-                            )
-
-                    logger.debug(f"Saved AI message {ai_msg.id} with {len(tool_calls_data)} tool calls")
-
                 elif msg_type == "tool":
                     # 工具执行结果消息 - 使用 tool_call_id 精确匹配
                     tool_call_id = msg_dict.get("tool_call_id")
                     content = msg_dict.get("content", "")
-                    name = msg_dict.get("name", "")
 
                     if tool_call_id:
                         # 确保tool_output是字符串类型且序列化为JSON，避免SQLite不支持列表或对象类型
@@ -237,16 +232,7 @@ async def chat_agent(
                         else:
                             tool_output = str(content)
 
-                        # 通过 LangGraph tool_call_id 精确匹配并更新
-                        updated_tc = conv_mgr.update_tool_call_output(
-                            langgraph_tool_call_id=tool_call_id,
-                            tool_output=tool_output,
-                            status="success",
-                        )
-                        if updated_tc:
-                            logger.debug(f"Updated tool_call {tool_call_id} ({name}) with output")
-                        else:
-                            logger.warning(f"Tool call {tool_call_id} not found for update")
+                        turn.set_tool_output(tool_call_id, tool_output, status="success")
 
                 else:
                     logger.warning(f"Unknown message type: {msg_type}, skipping")
@@ -254,6 +240,7 @@ async def chat_agent(
 
                 logger.debug(f"Processed message type={msg_type}")
 
+            conv_mgr.save_turn(turn)
             logger.info("Saved messages from LangGraph state")
 
         except Exception as e:
@@ -323,24 +310,33 @@ async def chat_agent(
 
         try:
             full_msg = None
-            async for msg, metadata in agent.stream_messages(messages, input_context=input_context):
+            async for item in encoder.paced(agent.stream_messages(messages, input_context=input_context)):
+                if item is FLUSH:
+                    # 紧凑格式下合并的文本增量到达刷新时间
+                    if data := encoder.flush():
+                        yield data
+                    continue
+
+                msg, metadata = item
                 if isinstance(msg, AIMessageChunk):
                     full_msg = msg if not full_msg else full_msg + msg
-                    yield make_chunk(content=msg.content, msg=msg.model_dump(), metadata=metadata, status="loading")
 
-                else:
-                    yield make_chunk(msg=msg.model_dump(), metadata=metadata, status="loading")
+                if data := encoder.message(msg, metadata):
+                    yield data
 
             meta["time_cost"] = asyncio.get_event_loop().time() - start_time
             yield make_chunk(status="finished", meta=meta)
 
             # After streaming finished, save all messages from LangGraph state
+            # 开启 write-behind 时由后台写入，不阻塞当前响应
             langgraph_config = {"configurable": input_context}
-            await save_messages_from_langgraph_state(
-                agent_instance=agent,
-                thread_id=thread_id,
-                conv_mgr=conv_manager,
-                config_dict=langgraph_config,
+            await conversation_writer.submit(
+                lambda conv_mgr: save_messages_from_langgraph_state(
+                    agent_instance=agent,
+                    thread_id=thread_id,
+                    conv_mgr=conv_mgr,
+                    config_dict=langgraph_config,
+                )
             )
 
         except (asyncio.CancelledError, ConnectionError) as e:
@@ -386,7 +382,9 @@ async def chat_agent(
                     new_db.close()
             yield make_chunk(message=f"Error streaming messages: {e}", status="error")
 
-    return StreamingResponse(stream_messages(), media_type="application/json")
+    return StreamingResponse(
+        stream_messages(), media_type="application/json", headers={STREAM_FORMAT_HEADER: stream_format}
+    )
 
 
 # =============================================================================
@@ -446,11 +444,68 @@ async def save_agent_config(agent_id: str, config: dict = Body(...), current_use
         raise HTTPException(status_code=500, detail=f"保存智能体配置出错: {str(e)}")
 
 
+# Map role to type that frontend expects
+_HISTORY_ROLE_TYPE_MAP = {"user": "human", "assistant": "ai", "tool": "tool", "system": "system"}
+
+
+def _format_history_message(msg: Message, compact: bool = False, error_type: str | None = None) -> dict:
+    """Convert a stored message to the frontend history format
+
+    compact 模式下不读取 extra_metadata（error_type 由查询单独取出），也不返回 citations。
+    """
+    extra_metadata = None if compact else msg.extra_metadata
+    msg_dict = {
+        "id": msg.id,  # Include message ID for feedback
+        "type": _HISTORY_ROLE_TYPE_MAP.get(msg.role, msg.role),  # human/ai/tool/system
+        "content": msg.content,
+        "created_at": msg.created_at.isoformat() if msg.created_at else None,
+        "error_type": error_type if compact else (extra_metadata.get("error_type") if extra_metadata else None),
+    }
+
+    # 兼容两种位置：extra_metadata.citations / extra_metadata.additional_kwargs.citations
+    raw_citations = []
+    if extra_metadata:
+        if isinstance(extra_metadata.get("citations"), list):
+            raw_citations = extra_metadata.get("citations") or []
+        else:
+            additional_kwargs = extra_metadata.get("additional_kwargs") or {}
+            if isinstance(additional_kwargs, dict) and isinstance(additional_kwargs.get("citations"), list):
+                raw_citations = additional_kwargs.get("citations") or []
+    if raw_citations:
+        msg_dict["citations"] = raw_citations
+
+    # Add tool calls if present (for AI messages)
+    if msg.tool_calls and len(msg.tool_calls) > 0:
+        msg_dict["tool_calls"] = [
+            {
+                "id": str(tc.id),
+                "name": tc.tool_name,
+                "function": {"name": tc.tool_name},  # Frontend compatibility
+                "args": tc.tool_input or {},
+                "tool_call_result": {"content": tc.tool_output} if tc.tool_output else None,
+                "status": tc.status,
+            }
+            for tc in msg.tool_calls
+        ]
+
+    return msg_dict
+
+
 @chat.get("/agent/{agent_id}/history")
 async def get_agent_history(
-    agent_id: str, thread_id: str, current_user: User = Depends(get_required_user), db: Session = Depends(get_db)
+    agent_id: str,
+    thread_id: str,
+    limit: int | None = Query(None, ge=1, le=500, description="分页大小，不传则返回完整历史"),
+    before: str | None = Query(None, description="游标，返回早于该消息的记录"),
+    after: str | None = Query(None, description="游标，返回晚于该消息的记录"),
+    compact: bool = Query(False, description="精简模式，不返回 extra_metadata 中的 citations 等内容"),
+    current_user: User = Depends(get_required_user),
+    db: Session = Depends(get_db),
 ):
-    """获取智能体历史消息（需要登录）- NEW STORAGE ONLY"""
+    """获取智能体历史消息（需要登录）- NEW STORAGE ONLY
+
+    传入 limit 时按 (created_at, id) 游标分页：默认返回最近的 limit 条，next_cursor 配合 before 继续向前翻页。
+    """
     try:
         # 获取Agent实例验证
         if not agent_manager.get_agent(agent_id):
@@ -458,53 +513,33 @@ async def get_agent_history(
 
         # Use new storage system ONLY
         conv_manager = ConversationManager(db)
-        messages = conv_manager.get_messages_by_thread_id(thread_id)
-
-        # Convert to frontend-compatible format
-        history = []
-        for msg in messages:
-            # Map role to type that frontend expects
-            role_type_map = {"user": "human", "assistant": "ai", "tool": "tool", "system": "system"}
-
-            msg_dict = {
-                "id": msg.id,  # Include message ID for feedback
-                "type": role_type_map.get(msg.role, msg.role),  # human/ai/tool/system
-                "content": msg.content,
-                "created_at": msg.created_at.isoformat() if msg.created_at else None,
-                "error_type": msg.extra_metadata.get("error_type") if msg.extra_metadata else None,
-            }
 
-            # 兼容两种位置：extra_metadata.citations / extra_metadata.additional_kwargs.citations
-            raw_citations = []
-            if msg.extra_metadata:
-                if isinstance(msg.extra_metadata.get("citations"), list):
-                    raw_citations = msg.extra_metadata.get("citations") or []
-                else:
-                    additional_kwargs = msg.extra_metadata.get("additional_kwargs") or {}
-                    if isinstance(additional_kwargs, dict) and isinstance(additional_kwargs.get("citations"), list):
-                        raw_citations = additional_kwargs.get("citations") or []
-            if raw_citations:
-                msg_dict["citations"] = raw_citations
-
-            # Add tool calls if present (for AI messages)
-            if msg.tool_calls and len(msg.tool_calls) > 0:
-                msg_dict["tool_calls"] = [
-                    {
-                        "id": str(tc.id),
-                        "name": tc.tool_name,
-                        "function": {"name": tc.tool_name},  # Frontend compatibility
-                        "args": tc.tool_input or {},
-                        "tool_call_result": {"content": tc.tool_output} if tc.tool_output else None,
-                        "status": tc.status,
-                    }
-                    for tc in msg.tool_calls
-                ]
-
-            history.append(msg_dict)
-
-        logger.info(f"Loaded {len(history)} messages from new storage for thread {thread_id}")
-        return {"history": history}
+        if limit is None and not (before or after):
+            messages = conv_manager.get_messages_by_thread_id(thread_id)
+            history = [_format_history_message(msg) for msg in messages]
+            logger.info(f"Loaded {len(history)} messages from new storage for thread {thread_id}")
+            return {"history": history}
+
+        conversation = conv_manager.get_conversation_by_thread_id(thread_id)
+        if not conversation:
+            return {"history": [], "has_more": False, "next_cursor": None}
 
+        try:
+            page = conv_manager.get_messages_page(
+                conversation.id,
+                limit=limit or 50,
+                before=before,
+                after=after,
+                include_metadata=not compact,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        history = [_format_history_message(msg, compact, page.error_types.get(msg.id)) for msg in page.messages]
+        return {"history": history, "has_more": page.has_more, "next_cursor": page.next_cursor}
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取智能体历史消息出错: {e}, {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"获取智能体历史消息出错: {str(e)}")
@@ -581,15 +616,17 @@ async def create_thread(
 
 
 @chat.get("/threads", response_model=list[ThreadResponse])
-async def list_threads(agent_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_required_user)):
+async def list_threads(
+    agent_id: str, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_required_user)
+):
     """获取用户的所有对话线程 (使用新存储系统)"""
     assert agent_id, "agent_id 不能为空"
 
     logger.debug(f"agent_id: {agent_id}")
 
     # Use new storage system
-    conv_manager = ConversationManager(db)
-    conversations = conv_manager.list_conversations(
+    conv_manager = AsyncConversationManager(db)
+    conversations = await conv_manager.list_conversations(
         user_id=str(current_user.id),
         agent_id=agent_id,
         status="active",
@@ -866,13 +903,15 @@ async def submit_message_feedback(
 @chat.get("/message/{message_id}/feedback")
 async def get_message_feedback(
     message_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_required_user),
 ):
     """Get feedback status for a specific message (for current user)"""
     try:
         # Get user's feedback for this message
-        feedback = db.query(MessageFeedback).filter_by(message_id=message_id, user_id=str(current_user.id)).first()
+        feedback = await db.scalar(
+            select(MessageFeedback).filter_by(message_id=message_id, user_id=str(current_user.id)).limit(1)
+        )
 
         if not feedback:
             return {"has_feedback": False, "feedback": None}
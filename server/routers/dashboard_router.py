@@ -5,24 +5,69 @@ Provides centralized dashboard APIs for monitoring system-wide statistics.
 """
 
 import traceback
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy import String, cast, distinct, func, or_
+from sqlalchemy import String, case, cast, func, select
 from sqlalchemy.orm import Session
 
 from server.routers.auth_router import get_admin_user
 from server.utils.auth_middleware import get_db
 from src.storage.conversation import ConversationManager
+from src.storage.conversation.rollup import (
+    AGENT_CONVERSATIONS,
+    DAY,
+    HOUR,
+    INPUT_TOKENS,
+    LOCAL_OFFSET,
+    MODEL_CALLS,
+    OUTPUT_TOKENS,
+    RETRIEVAL_CALLS,
+    TOOL_CALLS,
+    USER_MESSAGES,
+    bucket_start,
+    load_rollups,
+)
 from src.storage.db.models import User
-from src.utils.datetime_utils import UTC, ensure_shanghai, shanghai_now, utc_now
+from src.utils.datetime_utils import SHANGHAI_TZ, UTC, ensure_shanghai, shanghai_now, utc_now
 from src.utils.logging_config import logger
 
 
 dashboard = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
 
+# 时间序列类型 -> {rollup 指标: {dimension_key: 类别名}}，类别映射为 None 时直接使用 dimension_key
+_TIMESERIES_METRICS: dict[str, dict[str, dict[str, str] | None]] = {
+    "models": {MODEL_CALLS: None},
+    "agents": {AGENT_CONVERSATIONS: None},
+    "tokens": {INPUT_TOKENS: None, OUTPUT_TOKENS: None},
+    "tools": {TOOL_CALLS: None},
+    "knowledge_base": {RETRIEVAL_CALLS: {"mix": "混合检索", "local": "知识库检索"}},
+    "knowledge_graph": {RETRIEVAL_CALLS: {"mix": "混合检索", "global": "知识图谱检索"}},
+}
+
+_TIMESERIES_DEFAULT_CATEGORIES = {
+    "models": ["unknown_model"],
+    "agents": ["unknown_agent"],
+    "tokens": ["input_tokens", "output_tokens"],
+    "tools": ["unknown_tool"],
+    "knowledge_base": ["混合检索", "知识库检索"],
+    "knowledge_graph": ["混合检索", "知识图谱检索"],
+}
+
+
+def _recent_day_buckets(now: datetime, days: int) -> list[datetime]:
+    """最近 days 个北京时间自然日（含今天）的日桶起点，按时间正序"""
+    today = bucket_start(now, DAY)
+    return [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+
+
+def _local_day_label(bucket: datetime) -> str:
+    return (bucket + LOCAL_OFFSET).strftime("%Y-%m-%d")
+
+
 # =============================================================================
 # Response Models
 # =============================================================================
@@ -236,60 +281,41 @@ async def get_user_activity_stats(
 ):
     """Get user activity statistics (Admin only)"""
     try:
-        from src.storage.db.models import User, Conversation
-
         now = utc_now()
 
+        # 基础用户统计（排除已删除用户）
+        active_accounts = db.query(User.id, User.user_id).filter(User.is_deleted == 0).all()
+        total_users = len(active_accounts)
+
         # Conversations may store either the numeric user primary key or the login user_id string.
-        # Join condition accounts for both representations.
-        user_join_condition = or_(
-            Conversation.user_id == User.user_id,
-            Conversation.user_id == cast(User.id, String),
-        )
+        user_keys = {}
+        for pk, login_id in active_accounts:
+            user_keys[str(pk)] = pk
+            if login_id:
+                user_keys[login_id] = pk
 
-        # 基础用户统计（排除已删除用户）
-        total_users = db.query(func.count(User.id)).filter(User.is_deleted == 0).scalar() or 0
-
-        # 不同时间段的活跃用户数（基于对话活动，排除已删除用户）
-        active_users_24h = (
-            db.query(func.count(distinct(User.id)))
-            .select_from(Conversation)
-            .join(User, user_join_condition)
-            .filter(Conversation.updated_at >= now - timedelta(days=1), User.is_deleted == 0)
-            .scalar()
-            or 0
-        )
+        def count_active_users(rows) -> int:
+            return len({user_keys[key] for _, key, _ in rows if key in user_keys})
+
+        # 活跃用户基于预聚合的用户消息计数：每个桶内的一行即一个活跃用户
+        active_users_24h = count_active_users(load_rollups(db, USER_MESSAGES, HOUR, now - timedelta(days=1)))
+        active_users_30d = count_active_users(load_rollups(db, USER_MESSAGES, DAY, now - timedelta(days=29)))
 
-        active_users_30d = (
-            db.query(func.count(distinct(User.id)))
-            .select_from(Conversation)
-            .join(User, user_join_condition)
-            .filter(Conversation.updated_at >= now - timedelta(days=30), User.is_deleted == 0)
-            .scalar()
-            or 0
-        )
         # 最近7天每日活跃用户（排除已删除用户）
-        daily_active_users = []
-        for i in range(7):
-            day_start = now - timedelta(days=i + 1)
-            day_end = now - timedelta(days=i)
-
-            active_count = (
-                db.query(func.count(distinct(User.id)))
-                .select_from(Conversation)
-                .join(User, user_join_condition)
-                .filter(Conversation.updated_at >= day_start, Conversation.updated_at < day_end, User.is_deleted == 0)
-                .scalar()
-                or 0
-            )
+        rows_by_day = defaultdict(list)
+        for row in load_rollups(db, USER_MESSAGES, DAY, now - timedelta(days=6)):
+            rows_by_day[row[0]].append(row)
 
-            daily_active_users.append({"date": day_start.strftime("%Y-%m-%d"), "active_users": active_count})
+        daily_active_users = [
+            {"date": _local_day_label(day), "active_users": count_active_users(rows_by_day.get(day, []))}
+            for day in _recent_day_buckets(now, 7)
+        ]
 
         return UserActivityStats(
             total_users=total_users,
             active_users_24h=active_users_24h,
             active_users_30d=active_users_30d,
-            daily_active_users=list(reversed(daily_active_users)),  # 按时间正序
+            daily_active_users=daily_active_users,  # 按时间正序
         )
 
     except Exception as e:
@@ -315,8 +341,9 @@ async def get_tool_call_stats(
         now = utc_now()
 
         # 基础工具调用统计
-        total_calls = db.query(func.count(ToolCall.id)).scalar() or 0
-        successful_calls = db.query(func.count(ToolCall.id)).filter(ToolCall.status == "success").scalar() or 0
+        total_calls, successful_calls = db.query(
+            func.count(ToolCall.id), func.coalesce(func.sum(case((ToolCall.status == "success", 1), else_=0)), 0)
+        ).one()
         failed_calls = total_calls - successful_calls
         success_rate = round((successful_calls / total_calls * 100), 2) if total_calls > 0 else 0
 
@@ -340,19 +367,13 @@ async def get_tool_call_stats(
         tool_error_distribution = {name: count for name, count in tool_errors}
 
         # 最近7天每日工具调用数
-        daily_tool_calls = []
-        for i in range(7):
-            day_start = now - timedelta(days=i + 1)
-            day_end = now - timedelta(days=i)
-
-            daily_count = (
-                db.query(func.count(ToolCall.id))
-                .filter(ToolCall.created_at >= day_start, ToolCall.created_at < day_end)
-                .scalar()
-                or 0
-            )
-
-            daily_tool_calls.append({"date": day_start.strftime("%Y-%m-%d"), "call_count": daily_count})
+        calls_by_day = defaultdict(int)
+        for day, _, value in load_rollups(db, TOOL_CALLS, DAY, now - timedelta(days=6)):
+            calls_by_day[day] += value
+        daily_tool_calls = [
+            {"date": _local_day_label(day), "call_count": calls_by_day.get(day, 0)}
+            for day in _recent_day_buckets(now, 7)
+        ]
 
         return ToolCallStats(
             total_calls=total_calls,
@@ -361,7 +382,7 @@ async def get_tool_call_stats(
             success_rate=success_rate,
             most_used_tools=most_used_tools,
             tool_error_distribution=tool_error_distribution,
-            daily_tool_calls=list(reversed(daily_tool_calls)),
+            daily_tool_calls=daily_tool_calls,
         )
 
     except Exception as e:
@@ -525,27 +546,23 @@ async def get_agent_analytics(
         total_agents = len(agents)
         agent_conversation_counts = [{"agent_id": agent_id, "conversation_count": count} for agent_id, count in agents]
 
-        # 智能体满意度统计
-        agent_satisfaction = []
-        for agent_id, _ in agents:
-            total_feedbacks = (
-                db.query(func.count(MessageFeedback.id))
-                .join(Message, MessageFeedback.message_id == Message.id)
-                .join(Conversation, Message.conversation_id == Conversation.id)
-                .filter(Conversation.agent_id == agent_id)
-                .scalar()
-                or 0
-            )
-
-            positive_feedbacks = (
-                db.query(func.count(MessageFeedback.id))
-                .join(Message, MessageFeedback.message_id == Message.id)
-                .join(Conversation, Message.conversation_id == Conversation.id)
-                .filter(Conversation.agent_id == agent_id, MessageFeedback.rating == "like")
-                .scalar()
-                or 0
+        # 智能体满意度统计（按智能体分组的一次查询）
+        feedback_rows = (
+            db.query(
+                Conversation.agent_id,
+                func.count(MessageFeedback.id),
+                func.coalesce(func.sum(case((MessageFeedback.rating == "like", 1), else_=0)), 0),
             )
+            .join(Message, MessageFeedback.message_id == Message.id)
+            .join(Conversation, Message.conversation_id == Conversation.id)
+            .group_by(Conversation.agent_id)
+            .all()
+        )
+        feedback_by_agent = {agent_id: (total, likes) for agent_id, total, likes in feedback_rows}
 
+        agent_satisfaction = []
+        for agent_id, _ in agents:
+            total_feedbacks, positive_feedbacks = feedback_by_agent.get(agent_id, (0, 0))
             satisfaction_rate = round((positive_feedbacks / total_feedbacks * 100), 2) if total_feedbacks > 0 else 0
 
             agent_satisfaction.append(
@@ -553,18 +570,16 @@ async def get_agent_analytics(
             )
 
         # 智能体工具使用统计
-        agent_tool_usage = []
-        for agent_id, _ in agents:
-            tool_usage_count = (
-                db.query(func.count(ToolCall.id))
-                .join(Message, ToolCall.message_id == Message.id)
-                .join(Conversation, Message.conversation_id == Conversation.id)
-                .filter(Conversation.agent_id == agent_id)
-                .scalar()
-                or 0
-            )
-
-            agent_tool_usage.append({"agent_id": agent_id, "tool_usage_count": tool_usage_count})
+        tool_usage_by_agent = dict(
+            db.query(Conversation.agent_id, func.count(ToolCall.id))
+            .join(Message, ToolCall.message_id == Message.id)
+            .join(Conversation, Message.conversation_id == Conversation.id)
+            .group_by(Conversation.agent_id)
+            .all()
+        )
+        agent_tool_usage = [
+            {"agent_id": agent_id, "tool_usage_count": tool_usage_by_agent.get(agent_id, 0)} for agent_id, _ in agents
+        ]
 
         # 表现最佳的智能体（综合评分）
         top_performing_agents = []
@@ -617,17 +632,22 @@ async def get_dashboard_stats(
     from src.storage.db.models import Conversation, Message, MessageFeedback
 
     try:
-        # Basic counts
-        total_conversations = db.query(func.count(Conversation.id)).scalar() or 0
-        active_conversations = (
-            db.query(func.count(Conversation.id)).filter(Conversation.status == "active").scalar() or 0
-        )
-        total_messages = db.query(func.count(Message.id)).scalar() or 0
-        total_users = db.query(func.count(User.id)).filter(User.is_deleted == 0).scalar() or 0
-
-        # Feedback statistics
-        total_feedbacks = db.query(func.count(MessageFeedback.id)).scalar() or 0
-        like_count = db.query(func.count(MessageFeedback.id)).filter(MessageFeedback.rating == "like").scalar() or 0
+        # Basic counts and feedback statistics in a single round trip
+        (
+            total_conversations,
+            active_conversations,
+            total_messages,
+            total_users,
+            total_feedbacks,
+            like_count,
+        ) = db.query(
+            select(func.count(Conversation.id)).scalar_subquery(),
+            select(func.count(Conversation.id)).where(Conversation.status == "active").scalar_subquery(),
+            select(func.count(Message.id)).scalar_subquery(),
+            select(func.count(User.id)).where(User.is_deleted == 0).scalar_subquery(),
+            select(func.count(MessageFeedback.id)).scalar_subquery(),
+            select(func.count(MessageFeedback.id)).where(MessageFeedback.rating == "like").scalar_subquery(),
+        ).one()
 
         # Calculate satisfaction rate
         satisfaction_rate = round((like_count / total_feedbacks * 100), 2) if total_feedbacks > 0 else 0
@@ -748,271 +768,82 @@ async def get_call_timeseries_stats(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_admin_user),
 ):
-    """Get time series statistics for call analytics (Admin only)"""
+    """Get time series statistics for call analytics (Admin only)
+
+    数据来自 stats_rollups 预聚合表：7hours 读取小时桶，7days/7weeks 读取（北京时间）日桶。
+    """
     try:
-        from src.storage.db.models import Conversation, Message, ToolCall
+        from src.storage.db.models import ToolCall
+
+        if type not in _TIMESERIES_METRICS:
+            raise HTTPException(status_code=422, detail=f"Invalid type: {type}")
 
         # 计算时间范围（使用北京时间 UTC+8）
         now = utc_now()
         local_now = shanghai_now()
+        intervals = 7
 
         if time_range == "7hours":
-            intervals = 7
             # 包含当前小时：从6小时前开始
+            granularity = HOUR
             start_time = now - timedelta(hours=intervals - 1)
-            group_format = func.strftime("%Y-%m-%d %H:00", func.datetime(Message.created_at, "+8 hours"))
-            base_local_time = ensure_shanghai(start_time)
+            base_local_time = ensure_shanghai(start_time).replace(minute=0, second=0, microsecond=0)
+            delta = timedelta(hours=1)
+
+            def label_of(local_time: datetime) -> str:
+                return local_time.strftime("%Y-%m-%d %H:00")
+
         elif time_range == "7weeks":
-            intervals = 7
             # 包含当前周：从6周前开始，并对齐到当周周一 00:00
+            granularity = DAY
             local_start = local_now - timedelta(weeks=intervals - 1)
             local_start = local_start - timedelta(days=local_start.weekday())
             local_start = local_start.replace(hour=0, minute=0, second=0, microsecond=0)
             start_time = local_start.astimezone(UTC)
-            group_format = func.strftime("%Y-%W", func.datetime(Message.created_at, "+8 hours"))
             base_local_time = local_start
+            delta = timedelta(weeks=1)
+
+            def label_of(local_time: datetime) -> str:
+                iso_year, iso_week, _ = local_time.isocalendar()
+                return f"{iso_year}-{iso_week:02d}"
+
         else:  # 7days (default)
-            intervals = 7
             # 包含当前天：从6天前开始
+            granularity = DAY
             start_time = now - timedelta(days=intervals - 1)
-            group_format = func.strftime("%Y-%m-%d", func.datetime(Message.created_at, "+8 hours"))
             base_local_time = ensure_shanghai(start_time)
+            delta = timedelta(days=1)
 
-        # 根据类型查询数据
-        if type == "models":
-            # 模型调用统计（基于消息数量，按模型分组）
-            # 从message的extra_metadata中提取模型信息
-            query = (
-                db.query(
-                    group_format.label("date"),
-                    func.count(Message.id).label("count"),
-                    func.json_extract(Message.extra_metadata, "$.response_metadata.model_name").label("category"),
-                )
-                .filter(Message.role == "assistant", Message.created_at >= start_time)
-                .filter(Message.extra_metadata.isnot(None))
-                .group_by(group_format, func.json_extract(Message.extra_metadata, "$.response_metadata.model_name"))
-                .order_by(group_format)
-            )
-        elif type == "agents":
-            # 智能体调用统计（基于对话更新时间，按智能体分组）
-            # 为对话创建独立的时间格式化器
-            if time_range == "7hours":
-                conv_group_format = func.strftime("%Y-%m-%d %H:00", func.datetime(Conversation.updated_at, "+8 hours"))
-            elif time_range == "7weeks":
-                conv_group_format = func.strftime("%Y-%W", func.datetime(Conversation.updated_at, "+8 hours"))
-            else:  # 7days
-                conv_group_format = func.strftime("%Y-%m-%d", func.datetime(Conversation.updated_at, "+8 hours"))
-
-            query = (
-                db.query(
-                    conv_group_format.label("date"),
-                    func.count(Conversation.id).label("count"),
-                    Conversation.agent_id.label("category"),
-                )
-                .filter(Conversation.updated_at.isnot(None))
-                .filter(Conversation.updated_at >= start_time)
-                .group_by(conv_group_format, Conversation.agent_id)
-                .order_by(conv_group_format)
-            )
-        elif type == "tokens":
-            # Token消耗统计（区分input/output tokens）
-            # 先查询input tokens
-            from sqlalchemy import literal
-
-            input_query = (
-                db.query(
-                    group_format.label("date"),
-                    func.sum(
-                        func.coalesce(func.json_extract(Message.extra_metadata, "$.usage_metadata.input_tokens"), 0)
-                    ).label("count"),
-                    literal("input_tokens").label("category"),
-                )
-                .filter(
-                    Message.created_at >= start_time,
-                    Message.extra_metadata.isnot(None),
-                    func.json_extract(Message.extra_metadata, "$.usage_metadata").isnot(None),
-                )
-                .group_by(group_format)
-                .order_by(group_format)
-            )
-
-            # 查询output tokens
-            output_query = (
-                db.query(
-                    group_format.label("date"),
-                    func.sum(
-                        func.coalesce(func.json_extract(Message.extra_metadata, "$.usage_metadata.output_tokens"), 0)
-                    ).label("count"),
-                    literal("output_tokens").label("category"),
-                )
-                .filter(
-                    Message.created_at >= start_time,
-                    Message.extra_metadata.isnot(None),
-                    func.json_extract(Message.extra_metadata, "$.usage_metadata").isnot(None),
-                )
-                .group_by(group_format)
-                .order_by(group_format)
-            )
-
-            # 合并两个查询结果
-            input_results = input_query.all()
-            output_results = output_query.all()
-            results = input_results + output_results
-        elif type == "tools":
-            # 工具调用统计（按工具名称分组）
-            # 为工具调用创建独立的时间格式化器
-            if time_range == "7hours":
-                tool_group_format = func.strftime("%Y-%m-%d %H:00", func.datetime(ToolCall.created_at, "+8 hours"))
-            elif time_range == "7weeks":
-                tool_group_format = func.strftime("%Y-%W", func.datetime(ToolCall.created_at, "+8 hours"))
-            else:  # 7days
-                tool_group_format = func.strftime("%Y-%m-%d", func.datetime(ToolCall.created_at, "+8 hours"))
-
-            query = (
-                db.query(
-                    tool_group_format.label("date"),
-                    func.count(ToolCall.id).label("count"),
-                    ToolCall.tool_name.label("category"),
-                )
-                .filter(ToolCall.created_at >= start_time)
-                .group_by(tool_group_format, ToolCall.tool_name)
-                .order_by(tool_group_format)
-            )
-        elif type == "knowledge_base":
-            # 知识库调用统计 - 按检索模式分类（混合检索、知识库检索）
-            from sqlalchemy import case, literal
-
-            retrieval_mode_label = case(
-                (func.json_extract(Message.extra_metadata, "$.retrieval_mode") == "mix", literal("混合检索")),
-                (func.json_extract(Message.extra_metadata, "$.retrieval_mode") == "local", literal("知识库检索")),
-                else_=literal("其他")
-            )
-
-            query = (
-                db.query(
-                    group_format.label("date"),
-                    func.count(Message.id).label("count"),
-                    retrieval_mode_label.label("category"),
-                )
-                .filter(
-                    Message.role == "assistant",
-                    Message.created_at >= start_time,
-                    Message.extra_metadata.isnot(None),
-                    or_(
-                        func.json_extract(Message.extra_metadata, "$.retrieval_mode") == "mix",
-                        func.json_extract(Message.extra_metadata, "$.retrieval_mode") == "local"
-                    )
-                )
-                .group_by(group_format, retrieval_mode_label)
-                .order_by(group_format)
-            )
-        elif type == "knowledge_graph":
-            # 知识图谱调用统计 - 按检索模式分类（混合检索、知识图谱检索）
-            from sqlalchemy import case, literal
-
-            retrieval_mode_label = case(
-                (func.json_extract(Message.extra_metadata, "$.retrieval_mode") == "mix", literal("混合检索")),
-                (func.json_extract(Message.extra_metadata, "$.retrieval_mode") == "global", literal("知识图谱检索")),
-                else_=literal("其他")
-            )
-
-            query = (
-                db.query(
-                    group_format.label("date"),
-                    func.count(Message.id).label("count"),
-                    retrieval_mode_label.label("category"),
-                )
-                .filter(
-                    Message.role == "assistant",
-                    Message.created_at >= start_time,
-                    Message.extra_metadata.isnot(None),
-                    or_(
-                        func.json_extract(Message.extra_metadata, "$.retrieval_mode") == "mix",
-                        func.json_extract(Message.extra_metadata, "$.retrieval_mode") == "global"
-                    )
-                )
-                .group_by(group_format, retrieval_mode_label)
-                .order_by(group_format)
-            )
-        else:
-            raise HTTPException(status_code=422, detail=f"Invalid type: {type}")
-
-        if type != "tokens":
-            results = query.all()
+            def label_of(local_time: datetime) -> str:
+                return local_time.strftime("%Y-%m-%d")
 
-        # 处理堆叠数据格式
-        # 首先收集所有类别
-        categories = set()
-        for result in results:
-            if hasattr(result, "category") and result.category:
-                categories.add(result.category)
+        # 按时间点和类别汇总预聚合计数
+        time_data: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for metric, category_names in _TIMESERIES_METRICS[type].items():
+            for bucket, key, value in load_rollups(db, metric, granularity, start_time):
+                category = category_names.get(key) if category_names else (key or metric)
+                if category is None:
+                    continue
+                local_time = bucket.replace(tzinfo=UTC).astimezone(SHANGHAI_TZ)
+                time_data[label_of(local_time)][category] += value
 
+        categories = {category for day_data in time_data.values() for category in day_data}
         # 如果没有类别数据，提供默认类别
         if not categories:
-            if type == "models":
-                categories.add("unknown_model")
-            elif type == "agents":
-                categories.add("unknown_agent")
-            elif type == "tokens":
-                categories.update(["input_tokens", "output_tokens"])
-            elif type == "tools":
-                categories.add("unknown_tool")
-            elif type == "knowledge_base":
-                categories.update(["混合检索", "知识库检索"])
-            elif type == "knowledge_graph":
-                categories.update(["混合检索", "知识图谱检索"])
-
-        categories = sorted(list(categories))
-
-        # 重新组织数据：按时间点分组每个类别的数据
-        time_data = {}
-
-        def normalize_week_key(raw_key: str) -> str:
-            base_date = datetime.strptime(f"{raw_key}-1", "%Y-%W-%w")
-            iso_year, iso_week, _ = base_date.isocalendar()
-            return f"{iso_year}-{iso_week:02d}"
-
-        for result in results:
-            date_key = result.date
-            if time_range == "7weeks":
-                date_key = normalize_week_key(date_key)
-            category = getattr(result, "category", "unknown")
-            count = result.count
-
-            if date_key not in time_data:
-                time_data[date_key] = {}
-
-            time_data[date_key][category] = count
+            categories = set(_TIMESERIES_DEFAULT_CATEGORIES[type])
+        categories = sorted(categories)
 
         # 填充缺失的时间点（使用北京时间）
         data = []
-        # 从起始点开始（北京时间）
         current_time = base_local_time
-
-        if time_range == "7hours":
-            delta = timedelta(hours=1)
-        elif time_range == "7weeks":
-            delta = timedelta(weeks=1)
-        else:
-            delta = timedelta(days=1)
-
-        for i in range(intervals):
-            if time_range == "7hours":
-                date_key = current_time.strftime("%Y-%m-%d %H:00")
-            elif time_range == "7weeks":
-                iso_year, iso_week, _ = current_time.isocalendar()
-                date_key = f"{iso_year}-{iso_week:02d}"
-            else:
-                date_key = current_time.strftime("%Y-%m-%d")
-
-            # 获取该时间点的数据
-            day_data = time_data.get(date_key, {})
+        for _ in range(intervals):
+            date_key = label_of(current_time)
+            day_data = dict(time_data.get(date_key, {}))
             day_total = sum(day_data.values())
 
             # 确保所有类别都有值（缺失的补0）
             for category in categories:
-                if category not in day_data:
-                    day_data[category] = 0
+                day_data.setdefault(category, 0)
 
             data.append({"date": date_key, "data": day_data, "total": day_total})
             current_time += delta
@@ -1020,8 +851,6 @@ async def get_call_timeseries_stats(
         # 计算统计指标
         if type == "tools":
             # 对于工具调用，显示所有时间的总数（与ToolStatsComponent保持一致）
-            from src.storage.db.models import ToolCall
-
             total_count = db.query(func.count(ToolCall.id)).scalar() or 0
         else:
             # 其他类型使用时间序列数据的总和
@@ -9,8 +9,10 @@ from neo4j import GraphDatabase as Neo4jDriver
 from fastapi import APIRouter, Body, Depends, HTTPException, Query
 
 from src.storage.db.models import User
+from server.services.tasker import TaskContext, tasker
 from server.utils.auth_middleware import get_admin_user, get_required_user
 from src import graph_base, knowledge_base
+from src.knowledge.graph import EMBEDDING_BACKFILL_BATCH_SIZE
 from src.utils.logging_config import logger
 
 graph = APIRouter(prefix="/graph", tags=["graph"])
@@ -547,28 +549,83 @@ async def get_neo4j_info(current_user: User = Depends(get_required_user)):
 
 @graph.post("/neo4j/index-entities")
 async def index_neo4j_entities(data: dict = Body(default={}), current_user: User = Depends(get_admin_user)):
-    """为Neo4j图谱节点添加嵌入向量索引"""
+    """为Neo4j图谱节点添加嵌入向量索引（后台任务，可断点续传）"""
     try:
         if not graph_base.is_running():
             raise HTTPException(status_code=400, detail="图数据库未启动")
 
         # 获取参数或使用默认值
         kgdb_name = data.get("kgdb_name", "neo4j")
+        batch_size = int(data.get("batch_size", EMBEDDING_BACKFILL_BATCH_SIZE))
+
+        state = graph_base.load_embedding_backfill_state(kgdb_name)
+        if state and state.get("status") == "running" and state.get("task_id"):
+            task = await tasker.get_task(state["task_id"])
+            if task and task["status"] in {"pending", "running"}:
+                return {
+                    "success": True,
+                    "status": "running",
+                    "message": "节点向量回填任务正在运行",
+                    "task_id": state["task_id"],
+                    "progress": state,
+                }
+
+        async def run_backfill(context: TaskContext):
+            await context.set_progress(0.0, "正在统计未索引节点")
 
-        # 调用GraphDatabase的add_embedding_to_nodes方法
-        count = graph_base.add_embedding_to_nodes(kgdb_name=kgdb_name)
+            async def report(progress: dict):
+                total = progress["total"] or 1
+                eta = progress["eta_seconds"]
+                await context.set_progress(
+                    progress["processed"] / total * 100,
+                    f"已索引 {progress['processed']}/{progress['total']} 个节点，"
+                    f"{progress['throughput']} 个/秒" + (f"，预计剩余 {eta:.0f} 秒" if eta else ""),
+                )
+
+            result = await graph_base.abackfill_node_embeddings(
+                kgdb_name=kgdb_name,
+                batch_size=batch_size,
+                on_progress=report,
+                should_stop=context.is_cancel_requested,
+                task_id=context.task_id,
+            )
+            await context.set_result(result | {"failed_nodes": result["failed_nodes"][:100]})
+            if result["status"] == "stopped":
+                raise asyncio.CancelledError("Task was cancelled")
+            if result["status"] == "failed":
+                raise RuntimeError(f"嵌入服务连续失败，已处理 {result['processed']} 个节点: {result['error']}")
+            await context.set_progress(100.0, f"已为 {result['processed']} 个节点添加嵌入向量")
+            return result
+
+        task = await tasker.enqueue(
+            name=f"图谱节点向量索引({kgdb_name})",
+            task_type="graph_embedding_backfill",
+            payload={"kgdb_name": kgdb_name, "batch_size": batch_size},
+            coroutine=run_backfill,
+        )
 
         return {
             "success": True,
-            "status": "success",
-            "message": f"已成功为{count}个节点添加嵌入向量",
-            "indexed_count": count,
+            "status": "queued",
+            "message": "节点向量索引任务已提交，请在任务中心查看进度",
+            "task_id": task.id,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"索引节点失败: {e}")
         raise HTTPException(status_code=500, detail=f"索引节点失败: {str(e)}")
 
 
+@graph.get("/neo4j/index-entities/status")
+async def get_index_entities_status(kgdb_name: str = Query("neo4j"), current_user: User = Depends(get_admin_user)):
+    """获取节点向量回填任务的进度、吞吐量与预计剩余时间"""
+    state = graph_base.load_embedding_backfill_state(kgdb_name)
+    if state is None:
+        return {"status": "idle", "kgdb_name": kgdb_name}
+    return state
+
+
 @graph.post("/neo4j/add-entities")
 async def add_neo4j_entities(
     file_path: str = Body(...), kgdb_name: str | None = Body(None), current_user: User = Depends(get_admin_user)
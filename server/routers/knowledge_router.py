@@ -10,11 +10,19 @@ from starlette.responses import FileResponse as StarletteFileResponse
 from src.storage.db.models import User
 from server.utils.auth_middleware import get_admin_user, get_required_user
 from server.services.tasker import TaskContext, tasker
+from server.utils.upload_utils import (
+    UPLOAD_CHUNK_SIZE,
+    UploadTooLargeError,
+    build_upload_filename,
+    ensure_size_within_limit,
+    get_upload_dir,
+    stream_upload_to_file,
+    upload_sessions,
+)
 from src import config, knowledge_base
 from src.knowledge.indexing import SUPPORTED_FILE_EXTENSIONS, is_supported_file_extension, process_file_to_markdown
-from src.knowledge.utils import calculate_content_hash
 from src.models.embed import test_embedding_model_status, test_all_embedding_models_status
-from src.utils import hashstr, logger
+from src.utils import logger
 
 knowledge = APIRouter(prefix="/knowledge", tags=["knowledge"])
 
@@ -110,8 +118,8 @@ async def delete_database(db_id: str, current_user: User = Depends(get_admin_use
 @knowledge.get("/databases/{db_id}/export")
 async def export_database(
     db_id: str,
-    format: str = Query("csv", enum=["csv", "xlsx", "md", "txt"]),
-    include_vectors: bool = Query(False, description="是否在导出中包含向量数据"),
+    format: str = Query("zip", enum=["zip", "csv", "xlsx", "md", "txt"]),
+    include_vectors: bool = Query(True, description="是否在导出中包含向量数据"),
     current_user: User = Depends(get_admin_user),
 ):
     """导出知识库数据"""
@@ -123,12 +131,14 @@ async def export_database(
             raise HTTPException(status_code=404, detail="Exported file not found.")
 
         media_types = {
+            "zip": "application/zip",
             "csv": "text/csv",
             "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             "md": "text/markdown",
             "txt": "text/plain",
         }
-        media_type = media_types.get(format, "application/octet-stream")
+        # 实际导出格式以文件扩展名为准（LightRAG 知识库总是导出 zip 归档）
+        media_type = media_types.get(os.path.splitext(file_path)[1].lstrip("."), "application/octet-stream")
 
         return FileResponse(path=file_path, filename=os.path.basename(file_path), media_type=media_type)
     except NotImplementedError as e:
@@ -139,6 +149,47 @@ async def export_database(
         raise HTTPException(status_code=500, detail=f"导出数据库失败: {e}")
 
 
+@knowledge.post("/databases/{db_id}/import")
+async def import_database(
+    db_id: str,
+    file: UploadFile = File(..., description="export 接口导出的 zip 归档"),
+    current_user: User = Depends(get_admin_user),
+):
+    """从导出的归档恢复知识库数据，后台任务执行"""
+    if not file.filename or not file.filename.lower().endswith(".zip"):
+        raise HTTPException(status_code=400, detail="Only zip archives exported from a knowledge base are supported")
+    ensure_size_within_limit(file.size)
+
+    archive_path = os.path.join(get_upload_dir(db_id), build_upload_filename(file.filename))
+    try:
+        await stream_upload_to_file(file, archive_path)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"File too large: {e}")
+
+    async def run_import(context: TaskContext):
+        await context.set_progress(5.0, "正在导入归档")
+        try:
+            result = await knowledge_base.import_data(db_id, archive_path)
+        finally:
+            os.remove(archive_path)
+        await context.set_result(result)
+        await context.set_progress(100.0, "导入完成")
+        return result
+
+    try:
+        task = await tasker.enqueue(
+            name=f"知识库导入({db_id})",
+            task_type="knowledge_import",
+            payload={"db_id": db_id, "archive": file.filename},
+            coroutine=run_import,
+        )
+        return {"message": "任务已提交，请在任务中心查看进度", "status": "queued", "task_id": task.id}
+    except Exception as e:  # noqa: BLE001
+        logger.error(f"Failed to enqueue import for {db_id}: {e}, {traceback.format_exc()}")
+        os.remove(archive_path)
+        return {"message": f"Failed to enqueue task: {e}", "status": "failed"}
+
+
 # =============================================================================
 # === 文档管理分组 ===
 # =============================================================================
@@ -222,6 +273,46 @@ async def add_documents(
         return {"message": f"Failed to enqueue task: {e}", "status": "failed"}
 
 
+@knowledge.put("/databases/{db_id}/documents/{doc_id}")
+async def update_document(
+    db_id: str,
+    doc_id: str,
+    item: str = Body(...),
+    params: dict = Body({}),
+    current_user: User = Depends(get_admin_user),
+):
+    """使用新版本文件增量更新文档，仅对变化的 chunk 重新计算向量"""
+    logger.debug(f"Update document {doc_id} in {db_id} with {item} {params=}")
+
+    if params.get("content_type", "file") == "file":
+        from src.knowledge.utils.kb_utils import validate_file_path
+
+        try:
+            validate_file_path(item, db_id)
+        except ValueError as e:
+            raise HTTPException(status_code=403, detail=str(e))
+
+    async def run_update(context: TaskContext):
+        await context.set_progress(5.0, "正在增量更新文档")
+        result = await knowledge_base.update_content(db_id, doc_id, item, params=params)
+        message = "文档增量更新完成" if result.get("status") == "done" else "文档增量更新失败"
+        await context.set_result(result)
+        await context.set_progress(100.0, message)
+        return result
+
+    try:
+        task = await tasker.enqueue(
+            name=f"知识库文档增量更新({db_id})",
+            task_type="knowledge_update",
+            payload={"db_id": db_id, "doc_id": doc_id, "item": item, "params": params},
+            coroutine=run_update,
+        )
+        return {"message": "任务已提交，请在任务中心查看进度", "status": "queued", "task_id": task.id}
+    except Exception as e:  # noqa: BLE001
+        logger.error(f"Failed to enqueue document update: {e}, {traceback.format_exc()}")
+        return {"message": f"Failed to enqueue task: {e}", "status": "failed"}
+
+
 @knowledge.get("/databases/{db_id}/documents/{doc_id}")
 async def get_document_info(db_id: str, doc_id: str, current_user: User = Depends(get_admin_user)):
     """获取文档详细信息（包含基本信息和内容信息）"""
@@ -249,12 +340,18 @@ async def get_document_basic_info(db_id: str, doc_id: str, current_user: User =
 
 
 @knowledge.get("/databases/{db_id}/documents/{doc_id}/content")
-async def get_document_content(db_id: str, doc_id: str, current_user: User = Depends(get_admin_user)):
-    """获取文档内容信息（chunks和lines）"""
-    logger.debug(f"GET document {doc_id} content in {db_id}")
+async def get_document_content(
+    db_id: str,
+    doc_id: str,
+    offset: int = Query(0, ge=0, description="按 chunk 顺序跳过的数量"),
+    limit: int | None = Query(None, ge=1, le=1000, description="返回的 chunk 数量，不传返回全部"),
+    current_user: User = Depends(get_admin_user),
+):
+    """获取文档内容信息（chunks和lines），支持按 chunk 分页"""
+    logger.debug(f"GET document {doc_id} content in {db_id} ({offset=}, {limit=})")
 
     try:
-        info = await knowledge_base.get_file_content(db_id, doc_id)
+        info = await knowledge_base.get_file_content(db_id, doc_id, offset=offset, limit=limit)
         return info
     except Exception as e:
         logger.error(f"Failed to get file content, {e}, {db_id=}, {doc_id=}, {traceback.format_exc()}")
@@ -273,6 +370,20 @@ async def delete_document(db_id: str, doc_id: str, current_user: User = Depends(
         raise HTTPException(status_code=400, detail=f"删除文档失败: {e}")
 
 
+@knowledge.post("/databases/{db_id}/documents/delete")
+async def delete_documents(
+    db_id: str, file_ids: list[str] = Body(..., embed=True), current_user: User = Depends(get_admin_user)
+):
+    """批量删除文档"""
+    logger.debug(f"DELETE {len(file_ids)} documents in {db_id}")
+    try:
+        result = await knowledge_base.delete_files(db_id, file_ids)
+        return {"message": "删除成功", **result}
+    except Exception as e:
+        logger.error(f"批量删除文档失败 {e}, {traceback.format_exc()}")
+        raise HTTPException(status_code=400, detail=f"批量删除文档失败: {e}")
+
+
 @knowledge.get("/databases/{db_id}/documents/{doc_id}/download")
 async def download_document(db_id: str, doc_id: str, request: Request, current_user: User = Depends(get_admin_user)):
     """下载原始文件"""
@@ -561,49 +672,138 @@ async def get_knowledge_base_query_params(db_id: str, current_user: User = Depen
 # =============================================================================
 
 
+def _validate_upload_filename(filename: str | None, db_id: str | None, allow_jsonl: bool) -> None:
+    if not filename:
+        raise HTTPException(status_code=400, detail="No selected file")
+
+    ext = os.path.splitext(filename)[1].lower()
+
+    if ext == ".jsonl":
+        if allow_jsonl is not True or db_id is not None:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext}")
+    elif not is_supported_file_extension(filename):
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext}")
+
+
+def _raise_if_duplicated(db_id: str | None, content_hash: str | None) -> None:
+    if knowledge_base.file_existed_in_db(db_id, content_hash):
+        raise HTTPException(
+            status_code=409,
+            detail="数据库中已经存在了相同文件，File with the same content already exists in this database",
+        )
+
+
 @knowledge.post("/files/upload")
 async def upload_file(
     file: UploadFile = File(...),
     db_id: str | None = Query(None),
     allow_jsonl: bool = Query(False),
+    content_hash: str | None = Query(None, description="客户端预先计算的 SHA-256，用于在写入前去重"),
     current_user: User = Depends(get_admin_user),
 ):
     """上传文件"""
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No selected file")
-
+    _validate_upload_filename(file.filename, db_id, allow_jsonl)
     logger.debug(f"Received upload file with filename: {file.filename}")
 
-    ext = os.path.splitext(file.filename)[1].lower()
+    # 在读取内容前尽早拒绝超限或已存在的文件
+    ensure_size_within_limit(file.size)
+    _raise_if_duplicated(db_id, content_hash)
 
-    if ext == ".jsonl":
-        if allow_jsonl is not True or db_id is not None:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext}")
-    elif not is_supported_file_extension(file.filename):
-        raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext}")
+    upload_dir = get_upload_dir(db_id)
+    file_path = os.path.join(upload_dir, build_upload_filename(file.filename))
+    tmp_path = f"{file_path}.part"
 
-    # 根据db_id获取上传路径，如果db_id为None则使用默认路径
-    if db_id:
-        upload_dir = knowledge_base.get_db_upload_path(db_id)
-    else:
-        upload_dir = os.path.join(config.save_dir, "database", "uploads")
+    try:
+        actual_hash, _ = await stream_upload_to_file(file, tmp_path)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"File too large: {e}")
 
-    basename, ext = os.path.splitext(file.filename)
-    filename = f"{basename}_{hashstr(basename, 4, with_salt=True)}{ext}".lower()
-    file_path = os.path.join(upload_dir, filename)
-    os.makedirs(upload_dir, exist_ok=True)
+    try:
+        _raise_if_duplicated(db_id, actual_hash)
+    except HTTPException:
+        os.remove(tmp_path)
+        raise
 
-    file_bytes = await file.read()
+    os.replace(tmp_path, file_path)
 
-    content_hash = calculate_content_hash(file_bytes)
-    if knowledge_base.file_existed_in_db(db_id, content_hash):
-        raise HTTPException(
-            status_code=409,
-            detail="数据库中已经存在了相同文件，File with the same content already exists in this database",
-        )
+    return {
+        "message": "File successfully uploaded",
+        "file_path": file_path,
+        "db_id": db_id,
+        "content_hash": actual_hash,
+    }
+
+
+@knowledge.post("/files/upload/sessions")
+async def create_upload_session(
+    filename: str = Body(...),
+    total_size: int = Body(..., ge=0),
+    db_id: str | None = Body(None),
+    content_hash: str | None = Body(None),
+    allow_jsonl: bool = Body(False),
+    current_user: User = Depends(get_admin_user),
+):
+    """创建分片上传会话，用于大文件的断点续传"""
+    _validate_upload_filename(filename, db_id, allow_jsonl)
+    ensure_size_within_limit(total_size)
+    _raise_if_duplicated(db_id, content_hash)
 
-    with open(file_path, "wb") as buffer:
-        buffer.write(file_bytes)
+    session = upload_sessions.create(filename, db_id, total_size, content_hash, user_id=current_user.id)
+    return session | {"received": 0, "chunk_size": UPLOAD_CHUNK_SIZE}
+
+
+@knowledge.get("/files/upload/sessions/{upload_id}")
+async def get_upload_session(upload_id: str, current_user: User = Depends(get_admin_user)):
+    """查询分片上传会话状态，received 即续传时的 offset"""
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+@knowledge.put("/files/upload/sessions/{upload_id}")
+async def upload_session_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: User = Depends(get_admin_user),
+):
+    """以原始请求体上传一个分片，offset 必须等于已接收字节数"""
+    received = await upload_sessions.append(upload_id, offset, request.stream())
+    return {"upload_id": upload_id, "received": received}
+
+
+@knowledge.post("/files/upload/sessions/{upload_id}/complete")
+async def complete_upload_session(upload_id: str, current_user: User = Depends(get_admin_user)):
+    """完成分片上传：校验大小与哈希、去重后移动到知识库上传目录"""
+    # 持有会话锁，避免在仍有分片写入时校验或移动 .part 文件
+    async with upload_sessions.lock(upload_id):
+        session = upload_sessions.get(upload_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+
+        if session["received"] != session["total_size"]:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Upload incomplete", "expected_offset": session["received"]},
+            )
+
+        content_hash = await asyncio.to_thread(upload_sessions.finalize_hash, upload_id)
+        expected_hash = session.get("content_hash")
+        if expected_hash and expected_hash != content_hash:
+            upload_sessions.discard(upload_id)
+            raise HTTPException(status_code=422, detail="Content hash mismatch")
+
+        db_id = session.get("db_id")
+        try:
+            _raise_if_duplicated(db_id, content_hash)
+        except HTTPException:
+            upload_sessions.discard(upload_id)
+            raise
+
+        file_path = os.path.join(get_upload_dir(db_id), build_upload_filename(session["filename"]))
+        os.replace(upload_sessions.part_path(upload_id), file_path)
+        upload_sessions.discard(upload_id)
 
     return {
         "message": "File successfully uploaded",
@@ -613,6 +813,16 @@ async def upload_file(
     }
 
 
+@knowledge.delete("/files/upload/sessions/{upload_id}")
+async def abort_upload_session(upload_id: str, current_user: User = Depends(get_admin_user)):
+    """取消分片上传并清理已接收的数据"""
+    async with upload_sessions.lock(upload_id):
+        if upload_sessions.get(upload_id) is None:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        upload_sessions.discard(upload_id)
+    return {"message": "已取消"}
+
+
 @knowledge.get("/files/supported-types")
 async def get_supported_file_types(current_user: User = Depends(get_admin_user)):
     """获取当前支持的文件类型"""
@@ -30,6 +30,13 @@ async def health_check():
 # =============================================================================
 
 
+def invalidate_agent_runtime_cache():
+    """配置变更后清除智能体配置、工具与模型客户端缓存"""
+    from src.agents import agent_manager
+
+    agent_manager.clear_runtime_cache()
+
+
 @system.get("/config")
 def get_config(current_user: User = Depends(get_admin_user)):
     """获取系统配置"""
@@ -41,6 +48,7 @@ async def update_config_single(key=Body(...), value=Body(...), current_user: Use
     """更新单个配置项"""
     config[key] = value
     config.save()
+    invalidate_agent_runtime_cache()
     return config.dump_config()
 
 
@@ -49,6 +57,7 @@ async def update_config_batch(items: dict = Body(...), current_user: User = Depe
     """批量更新配置项"""
     config.update(items)
     config.save()
+    invalidate_agent_runtime_cache()
     return config.dump_config()
 
 
@@ -62,6 +71,7 @@ async def restart_system(current_user: User = Depends(get_superadmin_user)):
     config._config_items["embed_model"]["choices"] = list(config.embed_model_names.keys())
     config._config_items["reranker"]["choices"] = list(config.reranker_names.keys())
     graph_base.start()
+    invalidate_agent_runtime_cache()
     return {"message": "系统已重启"}
 
 
@@ -448,6 +458,7 @@ async def update_model_provider(
         config.model_names[provider_id] = provider_data
         config._save_models_to_file()
         config.handle_self()  # 重新处理配置以更新状态
+        invalidate_agent_runtime_cache()
         
         return {"success": True, "message": f"提供商 '{provider_id}' 更新成功", "data": provider_data}
     except Exception as e:
@@ -468,6 +479,7 @@ async def delete_model_provider(
         del config.model_names[provider_id]
         config._save_models_to_file()
         config.handle_self()
+        invalidate_agent_runtime_cache()
         
         return {"success": True, "message": f"提供商 '{provider_id}' 删除成功"}
     except HTTPException:
@@ -0,0 +1,233 @@
+"""纯 ASGI 中间件
+
+请求日志与登录限流直接包装 ASGI ``send``，不经过 ``BaseHTTPMiddleware`` 的任务与流包装，
+StreamingResponse（如 NDJSON 对话流）的每个分块都会直接写出，保留背压。
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.utils.logging_config import logger
+
+RATE_LIMIT_MAX_ATTEMPTS = 10
+RATE_LIMIT_WINDOW_SECONDS = 60
+RATE_LIMIT_ENDPOINTS = {("/api/auth/token", "POST")}
+
+# 不记录日志的路径（健康检查）
+_SILENT_PATHS = {"/api/system/health", "/api"}
+
+
+def extract_client_ip(scope: Scope) -> str:
+    forwarded_for = Headers(scope=scope).get("x-forwarded-for")
+    if forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+    client = scope.get("client")
+    if client:
+        return client[0]
+    return "unknown"
+
+
+class RequestLoggingMiddleware:
+    """记录 API 请求的状态码、首字节时间（TTFB）、总耗时与响应字节数"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_id = f"{int(time.time() * 1000)}"
+        status_code = 500
+        ttfb: float | None = None
+        bytes_sent = 0
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code, ttfb, bytes_sent
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # 响应头时间与旧版本的 X-Process-Time 语义一致
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Request-ID", request_id)
+                headers.append("X-Process-Time", f"{(time.perf_counter() - start) * 1000:.2f}ms")
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if body and ttfb is None:
+                    ttfb = time.perf_counter() - start
+                bytes_sent += len(body)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception as e:
+            logger.error(
+                f"[{request_id}] {scope['method']} {scope['path']} "
+                f"- ERROR - {(time.perf_counter() - start) * 1000:.2f}ms - {extract_client_ip(scope)}: {str(e)}"
+            )
+            raise
+
+        path = scope["path"]
+        if not path.startswith("/api") or path in _SILENT_PATHS:
+            return
+
+        total_ms = (time.perf_counter() - start) * 1000
+        ttfb_ms = f"{ttfb * 1000:.2f}ms" if ttfb is not None else "-"
+        log_msg = (
+            f"[{request_id}] {scope['method']} {path} - {status_code} "
+            f"- ttfb={ttfb_ms} total={total_ms:.2f}ms bytes={bytes_sent} - {extract_client_ip(scope)}"
+        )
+        if status_code >= 400:
+            logger.warning(log_msg)
+        else:
+            logger.info(log_msg)
+
+
+class InMemoryRateLimitStore:
+    """进程内滑动窗口计数，仅对当前 worker 生效"""
+
+    def __init__(self, max_attempts: int = RATE_LIMIT_MAX_ATTEMPTS, window: float = RATE_LIMIT_WINDOW_SECONDS):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._attempts: defaultdict[str, deque[float]] = defaultdict(deque)
+        self._lock = asyncio.Lock()
+
+    async def hit(self, key: str) -> int:
+        """记录一次尝试；超过上限时返回需要等待的秒数，否则返回 0"""
+        now = time.monotonic()
+        async with self._lock:
+            history = self._attempts[key]
+            while history and now - history[0] > self.window:
+                history.popleft()
+
+            if len(history) >= self.max_attempts:
+                return int(max(1, self.window - (now - history[0])))
+
+            history.append(now)
+            return 0
+
+    async def reset(self, key: str) -> None:
+        async with self._lock:
+            self._attempts.pop(key, None)
+
+
+class SQLiteRateLimitStore:
+    """基于本地 SQLite 文件的滑动窗口计数，同一主机上的所有 uvicorn worker 共享"""
+
+    def __init__(
+        self,
+        db_path: str,
+        max_attempts: int = RATE_LIMIT_MAX_ATTEMPTS,
+        window: float = RATE_LIMIT_WINDOW_SECONDS,
+    ):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.window = window
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS login_attempts (key TEXT NOT NULL, ts REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_login_attempts_key_ts ON login_attempts (key, ts)")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: 由下面的 BEGIN IMMEDIATE 显式控制事务
+        return sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+
+    def _hit(self, key: str) -> int:
+        # 使用墙钟时间，不同进程的 monotonic 时钟不可比较
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM login_attempts WHERE key = ? AND ts <= ?", (key, now - self.window))
+            count, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(ts) FROM login_attempts WHERE key = ?", (key,)
+            ).fetchone()
+            if count >= self.max_attempts:
+                conn.execute("COMMIT")
+                return int(max(1, self.window - (now - oldest)))
+
+            conn.execute("INSERT INTO login_attempts (key, ts) VALUES (?, ?)", (key, now))
+            conn.execute("COMMIT")
+            return 0
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _reset(self, key: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM login_attempts WHERE key = ?", (key,))
+        finally:
+            conn.close()
+
+    async def hit(self, key: str) -> int:
+        return await asyncio.to_thread(self._hit, key)
+
+    async def reset(self, key: str) -> None:
+        await asyncio.to_thread(self._reset, key)
+
+
+def create_rate_limit_store(save_dir: str):
+    """根据 RATE_LIMIT_STORE 环境变量创建限流存储：sqlite（默认，多 worker 共享）或 memory"""
+    if os.getenv("RATE_LIMIT_STORE", "sqlite").lower() == "memory":
+        return InMemoryRateLimitStore()
+    return SQLiteRateLimitStore(os.path.join(save_dir, "database", "rate_limit.db"))
+
+
+class LoginRateLimitMiddleware:
+    """限制同一客户端 IP 在时间窗口内的登录尝试次数，登录成功后清零"""
+
+    def __init__(self, app: ASGIApp, store=None, endpoints: set[tuple[str, str]] = RATE_LIMIT_ENDPOINTS):
+        self.app = app
+        self.store = store or InMemoryRateLimitStore()
+        self.endpoints = endpoints
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        normalized_path = scope["path"].rstrip("/") or "/"
+        if (normalized_path, scope["method"].upper()) not in self.endpoints:
+            await self.app(scope, receive, send)
+            return
+
+        client_ip = extract_client_ip(scope)
+        retry_after = await self.store.hit(client_ip)
+        if retry_after:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "登录尝试过于频繁，请稍后再试"},
+                headers={"Retry-After": str(retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        await self.app(scope, receive, send_with_status)
+
+        if status_code < 400:
+            await self.store.reset(client_ip)
@@ -1,9 +1,13 @@
+import os
 import re
+import time
+from collections import OrderedDict, defaultdict
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 
 from src.storage.db.manager import db_manager
 from src.storage.db.models import User
@@ -23,6 +27,92 @@ PUBLIC_PATHS = [
     r"^/api/system/info$",  # 获取系统信息配置
 ]
 
+# 所有公开路径合并为一个预编译的正则，每个请求只匹配一次
+_PUBLIC_PATH_PATTERN = re.compile("|".join(f"(?:{pattern})" for pattern in PUBLIC_PATHS))
+
+# 登录主体缓存的有效期（秒），设置为 0 关闭缓存
+PRINCIPAL_CACHE_TTL = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "30"))
+
+
+class PrincipalCache:
+    """进程内的登录主体缓存
+
+    以令牌签名段作为令牌 ID，缓存令牌对应用户的列值快照，命中时跳过 JWT 解码和 User 查询。
+    条目在 TTL 或令牌过期（取较早者）后失效；用户被修改或删除时由 auth_router 主动清除。
+    缓存仅在当前 worker 内有效，其他 worker 最多在 TTL 内读到旧数据。
+    """
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._tokens_by_user: dict[int, set[str]] = defaultdict(set)
+        self._columns = [attr.key for attr in sa_inspect(User).column_attrs]
+
+    @staticmethod
+    def token_id(token: str) -> str:
+        # JWT 的签名段对每个令牌唯一，且已与载荷绑定
+        return token.rsplit(".", 1)[-1]
+
+    def get(self, token: str) -> dict | None:
+        if self.ttl <= 0:
+            return None
+
+        key = self.token_id(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, values = entry
+        if expires_at <= time.monotonic():
+            self._discard(key, values["id"])
+            return None
+        return values
+
+    def set(self, token: str, user: User, token_exp: float | None = None) -> None:
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+
+        key = self.token_id(token)
+        values = {column: getattr(user, column) for column in self._columns}
+        self._entries[key] = (time.monotonic() + ttl, values)
+        self._entries.move_to_end(key)
+        self._tokens_by_user[user.id].add(key)
+
+        while len(self._entries) > self.max_size:
+            oldest_key, (_, oldest_values) = next(iter(self._entries.items()))
+            self._discard(oldest_key, oldest_values["id"])
+
+    def invalidate_user(self, user_id: int) -> None:
+        """清除某个用户的全部缓存条目（用户信息修改、删除后调用）"""
+        for key in self._tokens_by_user.pop(user_id, set()):
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tokens_by_user.clear()
+
+    def _discard(self, key: str, user_id: int) -> None:
+        self._entries.pop(key, None)
+        keys = self._tokens_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                self._tokens_by_user.pop(user_id, None)
+
+
+principal_cache = PrincipalCache()
+
+
+def _attach_cached_user(db: Session, values: dict) -> User:
+    """将缓存的列值还原为当前会话中的持久化 User 对象，不触发查询"""
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
 
 # 获取数据库会话
 def get_db():
@@ -33,6 +123,12 @@ def get_db():
         db.close()
 
 
+# 获取异步数据库会话（aiosqlite），供高频只读接口使用
+async def get_async_db():
+    async with db_manager.get_async_session() as db:
+        yield db
+
+
 # 获取当前用户
 async def get_current_user(token: str | None = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
@@ -45,6 +141,10 @@ async def get_current_user(token: str | None = Depends(oauth2_scheme), db: Sessi
     if token is None:
         return None
 
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return _attach_cached_user(db, cached)
+
     try:
         # 验证token
         payload = AuthUtils.verify_access_token(token)
@@ -67,6 +167,7 @@ async def get_current_user(token: str | None = Depends(oauth2_scheme), db: Sessi
     if user is None:
         raise credentials_exception
 
+    principal_cache.set(token, user, payload.get("exp"))
     return user
 
 
@@ -104,7 +205,4 @@ async def get_superadmin_user(current_user: User = Depends(get_required_user)):
 # 检查路径是否为公开路径
 def is_public_path(path: str) -> bool:
     path = path.rstrip("/")  # 去除尾部斜杠以便于匹配
-    for pattern in PUBLIC_PATHS:
-        if re.match(pattern, path):
-            return True
-    return False
+    return _PUBLIC_PATH_PATTERN.match(path) is not None
@@ -258,6 +258,18 @@ class DatabaseMigrator:
 
         migrations.append((2, "为用户表添加软删除字段", v2_commands))
 
+        # 迁移 v3: 为 messages 表添加 (conversation_id, created_at, id) 复合索引，支持历史消息游标分页
+        migrations.append(
+            (
+                3,
+                "为消息表添加历史分页索引",
+                [
+                    "CREATE INDEX IF NOT EXISTS ix_messages_conversation_created_id "
+                    "ON messages (conversation_id, created_at, id)"
+                ],
+            )
+        )
+
         # 未来的迁移可以在这里添加
         # migrations.append((
         #     2,
@@ -0,0 +1,239 @@
+"""智能体对话流的 NDJSON 编码
+
+默认（verbose）格式与旧版本一致：每个 token 输出一行包含完整 ``model_dump`` 的 JSON。
+客户端通过请求头 ``X-Stream-Format: compact`` 协商紧凑格式，流式消息改为增量帧：
+
+    {"status": "delta", "id": <消息 id>, "d": <content 增量>, "r": <reasoning_content 增量>,
+     "f": {<相对该消息上一块发生变化的字段>}, "md": <变化后的 langgraph metadata>}
+
+- 同一消息的第一块在 ``f`` 中带上除 content 以外的全部字段，之后只带变化的字段；空值键省略。
+- 仅内容变化的连续文本块会合并成一帧，按时间（STREAM_FLUSH_INTERVAL_MS）或长度（STREAM_FLUSH_CHARS）输出。
+- init / finished / error 等控制帧保持原格式。
+
+序列化优先使用 orjson，未安装时回退到标准库 json。
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections.abc import AsyncIterator
+
+from langchain_core.messages import AIMessageChunk
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 为可选依赖
+    orjson = None
+
+STREAM_FORMAT_HEADER = "X-Stream-Format"
+STREAM_FORMAT_COMPACT = "compact"
+STREAM_FORMAT_VERBOSE = "verbose"
+
+# 合并文本增量的最长等待时间（毫秒）与最大字符数
+STREAM_FLUSH_INTERVAL_MS = int(os.getenv("STREAM_FLUSH_INTERVAL_MS", "25"))
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "256"))
+
+# paced() 在到达刷新时间时产出的标记
+FLUSH = object()
+_END = object()
+_QUEUE_SIZE = 256
+
+
+def _default(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_line(payload: dict) -> bytes:
+    """序列化为一行 NDJSON"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            # 超出 orjson 支持范围的值（如超过 64 位的整数）交给标准库处理
+            pass
+    return json.dumps(payload, ensure_ascii=False, default=_default).encode("utf-8") + b"\n"
+
+
+def negotiate_stream_format(value: str | None) -> str:
+    """根据 X-Stream-Format 请求头选择输出格式，未声明或无法识别时使用 verbose"""
+    value = (value or "").strip().lower()
+    return STREAM_FORMAT_COMPACT if value == STREAM_FORMAT_COMPACT else STREAM_FORMAT_VERBOSE
+
+
+class AgentStreamEncoder:
+    """把对话流事件编码为 NDJSON 行，紧凑模式下负责增量计算与文本合并"""
+
+    def __init__(
+        self,
+        request_id: str | None,
+        stream_format: str = STREAM_FORMAT_VERBOSE,
+        flush_interval_ms: int = STREAM_FLUSH_INTERVAL_MS,
+        flush_chars: int = STREAM_FLUSH_CHARS,
+    ):
+        self.request_id = request_id
+        self.compact = stream_format == STREAM_FORMAT_COMPACT
+        self.flush_interval = max(flush_interval_ms, 0) / 1000
+        self.flush_chars = flush_chars
+
+        # 每条消息上一块的字段（不含 content 与 reasoning_content），用于计算增量
+        self._fields: dict[str | None, dict] = {}
+        self._metadata: dict | None = None
+
+        # 尚未输出的合并帧
+        self._pending: dict | None = None
+        self._pending_text: list[str] = []
+        self._pending_reasoning: list[str] = []
+        self._pending_size = 0
+        self._pending_since = 0.0
+
+    def event(self, content=None, **kwargs) -> bytes:
+        """控制帧（init / finished / error ...），两种格式相同；会先输出待合并的增量"""
+        return self.flush() + dumps_line({"request_id": self.request_id, "response": content, **kwargs})
+
+    def message(self, msg, metadata) -> bytes:
+        """流式消息块；紧凑模式下可能被合并而返回空字节"""
+        if not self.compact:
+            # 与旧版 make_chunk 相同：非 AIMessageChunk 的 response 为 None
+            content = msg.content if isinstance(msg, AIMessageChunk) else None
+            return self.event(content, msg=msg.model_dump(), metadata=metadata, status="loading")
+
+        # pydantic 模型的字段值保存在 __dict__ 中，浅拷贝比 model_dump / 迭代模型快得多
+        fields = dict(msg.__dict__)
+        if extra := getattr(msg, "__pydantic_extra__", None):
+            fields.update(extra)
+        text = fields.pop("content", "")
+        reasoning = None
+        additional_kwargs = fields.get("additional_kwargs") or {}
+        if "reasoning_content" in additional_kwargs:
+            reasoning = additional_kwargs["reasoning_content"]
+            fields["additional_kwargs"] = {k: v for k, v in additional_kwargs.items() if k != "reasoning_content"}
+
+        msg_id = fields.get("id")
+        previous = self._fields.get(msg_id)
+        if previous is None:
+            changed = {k: v for k, v in fields.items() if v not in (None, "", [], {})}
+        elif fields == previous:
+            changed = {}
+        else:
+            changed = {k: v for k, v in fields.items() if previous.get(k) != v}
+        metadata_changed = metadata is not self._metadata and metadata != self._metadata
+
+        self._fields[msg_id] = fields
+        self._metadata = metadata
+
+        mergeable = self._mergeable(fields, text, reasoning)
+        if (
+            self._pending is not None
+            and self._pending["id"] == msg_id
+            and mergeable
+            and not changed
+            and not metadata_changed
+        ):
+            self._append(text, reasoning)
+            return self.flush() if self._due() else b""
+
+        out = self.flush()
+        self._pending = {"status": "delta", "id": msg_id}
+        if changed:
+            self._pending["f"] = changed
+        if metadata_changed:
+            self._pending["md"] = metadata
+        self._pending_since = time.monotonic()
+        self._append(text, reasoning)
+
+        if not mergeable or self._due():
+            out += self.flush()
+        return out
+
+    def flush(self) -> bytes:
+        """输出待合并的增量帧"""
+        if self._pending is None:
+            return b""
+
+        frame = self._pending
+        if self._pending_text:
+            text = self._pending_text[0] if len(self._pending_text) == 1 else "".join(self._pending_text)
+            if text:
+                frame["d"] = text
+        if self._pending_reasoning:
+            frame["r"] = "".join(self._pending_reasoning)
+
+        self._pending = None
+        self._pending_text = []
+        self._pending_reasoning = []
+        self._pending_size = 0
+        return dumps_line(frame)
+
+    async def paced(self, source: AsyncIterator) -> AsyncIterator:
+        """
+        迭代 source；紧凑模式下若有待合并的增量且到达刷新时间，产出 ``FLUSH``。
+
+        source 在单独的任务中运行，等待超时不会打断其中的 await（LangGraph 依赖 contextvars，
+        不能在不同任务间交替驱动同一个生成器）。
+        """
+        if not self.compact:
+            async for item in source:
+                yield item
+            return
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+
+        async def produce():
+            try:
+                async for item in source:
+                    await queue.put((item, None))
+            except Exception as e:
+                await queue.put((_END, e))
+            else:
+                await queue.put((_END, None))
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                delay = self._flush_delay()
+                if delay is None:
+                    item, error = await queue.get()
+                else:
+                    try:
+                        item, error = await asyncio.wait_for(queue.get(), timeout=delay)
+                    except TimeoutError:
+                        yield FLUSH
+                        continue
+
+                if item is _END:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            if not producer.done():
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+
+    @staticmethod
+    def _mergeable(fields: dict, text, reasoning) -> bool:
+        # 前端按块拼接 content / reasoning_content / tool_calls，带工具调用的块不能合并
+        if not isinstance(text, str) or not (reasoning is None or isinstance(reasoning, str)):
+            return False
+        return not fields.get("tool_call_chunks") and not (fields.get("additional_kwargs") or {}).get("tool_calls")
+
+    def _append(self, text, reasoning) -> None:
+        if text:
+            self._pending_text.append(text)
+            self._pending_size += len(text) if isinstance(text, str) else self.flush_chars
+        if reasoning:
+            self._pending_reasoning.append(reasoning)
+            self._pending_size += len(reasoning)
+
+    def _due(self) -> bool:
+        return self._pending_size >= self.flush_chars or time.monotonic() - self._pending_since >= self.flush_interval
+
+    def _flush_delay(self) -> float | None:
+        if self._pending is None:
+            return None
+        return max(0.0, self.flush_interval - (time.monotonic() - self._pending_since))
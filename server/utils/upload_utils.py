@@ -0,0 +1,267 @@
+"""文件上传工具
+
+提供流式落盘、增量哈希和可断点续传的分片上传会话，避免大文件上传时整体读入内存。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+from src import config, knowledge_base
+from src.knowledge.utils import calculate_content_hash
+from src.utils import hashstr, logger
+
+# 每次从上传流读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 单文件大小上限，可通过环境变量 MAX_UPLOAD_SIZE_MB 调整
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE_MB", "1024")) * 1024 * 1024
+# 分片上传会话的过期时间（秒）
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+
+
+class UploadTooLargeError(ValueError):
+    """上传文件超过大小上限"""
+
+
+def ensure_size_within_limit(size: int | None, max_size: int = MAX_UPLOAD_SIZE) -> None:
+    """在读取文件内容之前检查声明的大小，超限时直接返回 413"""
+    if size is not None and size > max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"文件大小超过上限 {max_size // (1024 * 1024)}MB，File too large",
+        )
+
+
+async def stream_upload_to_file(
+    upload: UploadFile,
+    dest_path: str,
+    max_size: int = MAX_UPLOAD_SIZE,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> tuple[str, int]:
+    """将上传文件分块写入 dest_path，同时增量计算 SHA-256
+
+    Returns:
+        tuple[str, int]: (内容哈希, 写入字节数)
+
+    Raises:
+        UploadTooLargeError: 写入过程中超过大小上限，已写入的部分文件会被删除
+    """
+    sha256 = hashlib.sha256()
+    written = 0
+
+    try:
+        async with aiofiles.open(dest_path, "wb") as buffer:
+            while chunk := await upload.read(chunk_size):
+                written += len(chunk)
+                if written > max_size:
+                    raise UploadTooLargeError(f"Upload exceeds {max_size} bytes")
+                sha256.update(chunk)
+                await buffer.write(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            await aiofiles.os.remove(dest_path)
+        raise
+
+    return sha256.hexdigest(), written
+
+
+def build_upload_filename(filename: str) -> str:
+    """生成带随机后缀的落盘文件名"""
+    basename, ext = os.path.splitext(filename)
+    return f"{basename}_{hashstr(basename, 4, with_salt=True)}{ext}".lower()
+
+
+def get_upload_dir(db_id: str | None) -> str:
+    """根据 db_id 获取上传路径，db_id 为 None 时使用默认路径"""
+    if db_id:
+        upload_dir = knowledge_base.get_db_upload_path(db_id)
+    else:
+        upload_dir = os.path.join(config.save_dir, "database", "uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+    return upload_dir
+
+
+class UploadSessionStore:
+    """分片上传会话存储
+
+    会话元数据以 JSON 文件形式保存在 ``saves/database/uploads/.sessions`` 下，数据写入同目录的
+    ``.part`` 文件，因此同一会话的分片可以由不同 worker 接收，服务重启后也能继续上传。
+    同一进程内，同一会话的追加、完成与取消通过 ``lock(upload_id)`` 串行执行。
+    """
+
+    def __init__(self, root: str | None = None):
+        self.root = Path(root or os.path.join(config.save_dir, "database", "uploads", ".sessions"))
+        # 进程内的增量哈希状态: upload_id -> (hasher, 已哈希字节数)
+        # 分片被其他 worker 接收或服务重启后状态会失效，此时在完成时从磁盘重新计算
+        self._hashers: dict[str, tuple[object, int]] = {}
+        # 每个会话的锁及持有 / 等待者数量，没有使用者时回收
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._lock_users: dict[str, int] = {}
+
+    @asynccontextmanager
+    async def lock(self, upload_id: str):
+        """持有会话锁，保证 offset 校验与写入、完成时的移动文件不会与其他请求交错"""
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        self._lock_users[upload_id] = self._lock_users.get(upload_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[upload_id] -= 1
+            if not self._lock_users[upload_id]:
+                del self._lock_users[upload_id]
+                del self._locks[upload_id]
+
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.root / f"{upload_id}.json"
+
+    def part_path(self, upload_id: str) -> Path:
+        return self.root / f"{upload_id}.part"
+
+    def create(
+        self,
+        filename: str,
+        db_id: str | None,
+        total_size: int,
+        content_hash: str | None = None,
+        user_id: int | None = None,
+    ) -> dict:
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        session = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "db_id": db_id,
+            "total_size": total_size,
+            "content_hash": content_hash,
+            "user_id": user_id,
+            "created_at": time.time(),
+        }
+        self.part_path(upload_id).touch()
+        self._write(session)
+        return session
+
+    def get(self, upload_id: str) -> dict | None:
+        # upload_id 由服务端生成，这里限制字符防止路径穿越
+        if not upload_id.isalnum():
+            return None
+        meta_path = self._meta_path(upload_id)
+        if not meta_path.exists():
+            return None
+        with meta_path.open(encoding="utf-8") as f:
+            session = json.load(f)
+        session["received"] = self.received_bytes(upload_id)
+        return session
+
+    def received_bytes(self, upload_id: str) -> int:
+        part_path = self.part_path(upload_id)
+        return part_path.stat().st_size if part_path.exists() else 0
+
+    def _write(self, session: dict) -> None:
+        meta_path = self._meta_path(session["upload_id"])
+        tmp_path = meta_path.with_suffix(".json.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in session.items() if k != "received"}, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    async def append(self, upload_id: str, offset: int, stream, max_size: int = MAX_UPLOAD_SIZE) -> int:
+        """从 offset 开始追加一个分片，返回追加后的已接收字节数
+
+        offset 必须等于当前已接收字节数，否则返回 409，客户端应通过查询会话状态获取正确的续传位置。
+        offset 校验与写入在会话锁内完成，相同 offset 的并发请求只有一个会写入。
+        """
+        async with self.lock(upload_id):
+            return await self._append(upload_id, offset, stream, max_size)
+
+    async def _append(self, upload_id: str, offset: int, stream, max_size: int) -> int:
+        session = self.get(upload_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+
+        received = session["received"]
+        if offset != received:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Offset mismatch", "expected_offset": received},
+            )
+
+        limit = min(max_size, session["total_size"])
+        part_path = self.part_path(upload_id)
+        written = 0
+
+        hasher, hashed = self._hashers.get(upload_id, (None, -1))
+        if hashed != received:
+            hasher = hashlib.sha256() if received == 0 else None
+        async with aiofiles.open(part_path, "ab") as buffer:
+            try:
+                async for chunk in stream:
+                    if not chunk:
+                        continue
+                    if received + written + len(chunk) > limit:
+                        raise HTTPException(status_code=413, detail="Chunk exceeds declared total size")
+                    await buffer.write(chunk)
+                    written += len(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+            except BaseException:
+                # 丢弃本次不完整的分片，保证已接收部分与 offset 对齐
+                await buffer.flush()
+                os.truncate(part_path, received)
+                self._hashers.pop(upload_id, None)
+                raise
+
+        if hasher is not None:
+            self._hashers[upload_id] = (hasher, received + written)
+        return received + written
+
+    def finalize_hash(self, upload_id: str) -> str:
+        """获取已接收内容的 SHA-256，优先使用增量状态"""
+        received = self.received_bytes(upload_id)
+        hasher, hashed = self._hashers.pop(upload_id, (None, -1))
+        if hasher is not None and hashed == received:
+            return hasher.hexdigest()
+
+        return calculate_content_hash(self.part_path(upload_id))
+
+    def discard(self, upload_id: str) -> None:
+        """删除会话；由请求触发时调用方应持有会话锁"""
+        self._hashers.pop(upload_id, None)
+        for path in (self._meta_path(upload_id), self.part_path(upload_id)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def cleanup_expired(self, ttl: int = UPLOAD_SESSION_TTL) -> int:
+        """删除超过 ttl 未完成的会话"""
+        if not self.root.exists():
+            return 0
+
+        removed = 0
+        now = time.time()
+        for meta_path in self.root.glob("*.json"):
+            try:
+                with meta_path.open(encoding="utf-8") as f:
+                    created_at = json.load(f).get("created_at", 0)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Failed to read upload session {meta_path}: {e}")
+                continue
+            # 正在写入或完成中的会话由持锁的请求处理
+            if now - created_at > ttl and meta_path.stem not in self._locks:
+                self.discard(meta_path.stem)
+                removed += 1
+        return removed
+
+
+upload_sessions = UploadSessionStore()
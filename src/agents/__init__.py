@@ -1,6 +1,8 @@
 import asyncio
 
 from .chatbot.graph import ChatbotAgent
+from .common.context import clear_file_config_cache
+from .common.models import clear_chat_model_cache
 
 
 class AgentManager:
@@ -30,6 +32,13 @@ class AgentManager:
         for agent_id in self._classes.keys():
             self.get_agent(agent_id, reload=True)
 
+    def clear_runtime_cache(self):
+        """模型或系统配置变更后清除智能体配置、工具与模型客户端缓存"""
+        clear_file_config_cache()
+        clear_chat_model_cache()
+        for agent in self._instances.values():
+            agent.clear_cache()
+
     async def get_agents_info(self):
         agents = self.get_agents()
         return await asyncio.gather(*[a.get_info() for a in agents])
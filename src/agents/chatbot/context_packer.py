@@ -0,0 +1,193 @@
+"""检索上下文的 token 预算装箱
+
+把统计结果、知识库片段、图谱三元组按 token 预算组装进提示词：
+- 总预算按比例分配给各部分，某部分用不完的额度按比例让给仍有剩余内容的部分
+- 知识库与图谱条目按 MMR 排序（相关度与已选条目的字符 bigram 相似度折中），与已选条目高度相似的条目直接去除
+- 统计结果按原有行顺序保留，遇到第一行放不下时截断其后所有行并追加截断提示，避免跳行拼出错误的表格
+- 未放入的条目记录去除原因（duplicate / budget）并写入日志
+"""
+
+import os
+import re
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from src.utils import logger
+from src.utils.tokens import estimate_tokens
+
+# 统计结果、知识库、图谱三部分合计的 token 上限，0 表示不限制
+RETRIEVAL_CONTEXT_MAX_TOKENS = int(os.getenv("RETRIEVAL_CONTEXT_MAX_TOKENS") or 3000)
+# MMR 中相关度的权重，越小越强调多样性
+RETRIEVAL_CONTEXT_MMR_LAMBDA = float(os.getenv("RETRIEVAL_CONTEXT_MMR_LAMBDA") or 0.7)
+# 与已选条目的相似度达到该值时视为重复
+RETRIEVAL_CONTEXT_DUP_THRESHOLD = float(os.getenv("RETRIEVAL_CONTEXT_DUP_THRESHOLD") or 0.85)
+
+SECTION_SHARES = {"statistics": 0.3, "kb": 0.45, "graph": 0.25}
+# 按原有顺序保留、不做 MMR 重排的部分
+ORDERED_SECTIONS = {"statistics"}
+# 按顺序保留的部分被截断时追加在末尾的提示
+TRUNCATION_MARKER = "……（结果过长，其余内容已省略）"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class ContextItem:
+    section: str
+    text: str
+    score: float | None = None
+    tokens: int = 0
+    reason: str = ""
+    # 对应的原始检索结果，用于只为实际放入提示词的条目生成引用
+    source: Any = None
+
+
+@dataclass
+class PackedContext:
+    selected: dict[str, list[ContextItem]] = field(default_factory=dict)
+    dropped: list[ContextItem] = field(default_factory=list)
+    budgets: dict[str, int] = field(default_factory=dict)
+
+    def lines(self, section: str) -> list[str]:
+        return [item.text for item in self.selected.get(section, [])]
+
+    def sources(self, section: str) -> list[Any]:
+        return [item.source for item in self.selected.get(section, [])]
+
+    def tokens(self, section: str | None = None) -> int:
+        sections = [section] if section else list(self.selected)
+        return sum(item.tokens for name in sections for item in self.selected.get(name, []))
+
+
+def _bigrams(text: str) -> set[str]:
+    text = _WHITESPACE.sub("", text)
+    return {text[i : i + 2] for i in range(len(text) - 1)} or {text}
+
+
+def _similarity(left: set[str], right: set[str]) -> float:
+    return len(left & right) / len(left | right) if left and right else 0.0
+
+
+def allocate_budget(demands: dict[str, int], max_tokens: int, shares: dict[str, float] = SECTION_SHARES) -> dict:
+    """按比例分配预算，不超过各部分的需求，剩余额度继续按比例分给未满足的部分"""
+    budgets = {name: 0 for name in demands}
+    remaining = max_tokens
+    active = {name for name, demand in demands.items() if demand > 0}
+    while remaining > 0 and active:
+        total_share = sum(shares.get(name, 0) or 0.1 for name in active)
+        granted = 0
+        for name in sorted(active):
+            portion = int(remaining * (shares.get(name, 0) or 0.1) / total_share)
+            portion = min(max(portion, 1), demands[name] - budgets[name], remaining - granted)
+            budgets[name] += portion
+            granted += portion
+        remaining -= granted
+        active = {name for name in active if budgets[name] < demands[name]}
+        if granted == 0:
+            break
+    return budgets
+
+
+def _mmr_order(items: list[ContextItem], mmr_lambda: float) -> list[tuple[ContextItem, float]]:
+    """按 MMR 排序，返回 (条目, 与已排条目的最大相似度)"""
+    if not items:
+        return []
+    # 缺少分数时按检索顺序给出递减的相关度
+    scores = [item.score for item in items]
+    if all(isinstance(score, int | float) for score in scores):
+        low, high = min(scores), max(scores)
+        relevance = [(score - low) / (high - low) if high > low else 1.0 for score in scores]
+    else:
+        relevance = [1.0 - index / len(items) for index in range(len(items))]
+    grams = [_bigrams(item.text) for item in items]
+
+    ordered = []
+    max_sims = [0.0] * len(items)
+    remaining = list(range(len(items)))
+    while remaining:
+        best = max(remaining, key=lambda i: mmr_lambda * relevance[i] - (1 - mmr_lambda) * max_sims[i])
+        remaining.remove(best)
+        ordered.append((items[best], max_sims[best]))
+        for i in remaining:
+            max_sims[i] = max(max_sims[i], _similarity(grams[i], grams[best]))
+    return ordered
+
+
+def pack_context(
+    sections: dict[str, list[ContextItem]],
+    max_tokens: int = RETRIEVAL_CONTEXT_MAX_TOKENS,
+    mmr_lambda: float = RETRIEVAL_CONTEXT_MMR_LAMBDA,
+    dup_threshold: float = RETRIEVAL_CONTEXT_DUP_THRESHOLD,
+    measure: Callable[[str], int] = estimate_tokens,
+) -> PackedContext:
+    packed = PackedContext()
+    candidates: dict[str, list[ContextItem]] = {}
+    for name, items in sections.items():
+        for item in items:
+            item.tokens = measure(item.text)
+        if name in ORDERED_SECTIONS:
+            candidates[name] = list(items)
+            continue
+        candidates[name] = []
+        for item, max_sim in _mmr_order(items, mmr_lambda):
+            if max_sim >= dup_threshold:
+                item.reason = "duplicate"
+                packed.dropped.append(item)
+            else:
+                candidates[name].append(item)
+
+    demands = {name: sum(item.tokens for item in items) for name, items in candidates.items()}
+    packed.budgets = allocate_budget(demands, max_tokens) if max_tokens > 0 else demands
+    for name, items in candidates.items():
+        if name in ORDERED_SECTIONS:
+            packed.selected[name] = _take_prefix(name, items, packed.budgets[name], packed.dropped, measure)
+            continue
+        used = 0
+        packed.selected[name] = []
+        for item in items:
+            if used + item.tokens > packed.budgets[name]:
+                item.reason = "budget"
+                packed.dropped.append(item)
+                continue
+            packed.selected[name].append(item)
+            used += item.tokens
+    _log_dropped(packed)
+    return packed
+
+
+def _take_prefix(
+    section: str, items: list[ContextItem], budget: int, dropped: list[ContextItem], measure: Callable[[str], int]
+) -> list[ContextItem]:
+    """按顺序取能放下的最长前缀；发生截断时为提示预留额度，提示放不下则只保留前缀"""
+    if sum(item.tokens for item in items) <= budget:
+        return list(items)
+
+    marker = ContextItem(section, TRUNCATION_MARKER, tokens=measure(TRUNCATION_MARKER))
+    selected, used = [], 0
+    for item in items:
+        if used + item.tokens + marker.tokens > budget:
+            break
+        selected.append(item)
+        used += item.tokens
+    for item in items[len(selected) :]:
+        item.reason = "budget"
+        dropped.append(item)
+    if used + marker.tokens <= budget:
+        selected.append(marker)
+    return selected
+
+
+def _log_dropped(packed: PackedContext) -> None:
+    if not packed.dropped:
+        return
+    summary: dict[str, int] = {}
+    for item in packed.dropped:
+        key = f"{item.section}/{item.reason}"
+        summary[key] = summary.get(key, 0) + 1
+        logger.debug(f"Context item dropped ({item.section}, {item.reason}, {item.tokens} tokens): {item.text[:60]}")
+    dropped_tokens = sum(item.tokens for item in packed.dropped)
+    logger.info(
+        f"Context packer kept {packed.tokens()} tokens, dropped {len(packed.dropped)} items "
+        f"({dropped_tokens} tokens): {summary}"
+    )
@@ -1,10 +1,13 @@
+import asyncio
 import json
 import re
+import time
+from collections import deque
 from functools import lru_cache
 from pathlib import Path
 from typing import Any, cast
 
-from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage, message_chunk_to_message
 from langgraph.graph import END, START, StateGraph
 from langgraph.prebuilt import ToolNode
 from langgraph.runtime import Runtime
@@ -14,8 +17,11 @@ from src.agents.common.base import BaseAgent
 from src.agents.common.mcp import get_mcp_tools
 from src.agents.common.models import load_chat_model
 from src.utils import logger
+from src.utils.tokens import estimate_tokens
 
 from .context import Context
+from .context_packer import ContextItem, PackedContext, pack_context
+from .retrieval_classifier import RETRIEVAL_POLICY_PROMPT, classify_retrieval_policy
 from .state import State
 from .tools import get_tools
 
@@ -491,9 +497,63 @@ def _has_retrieval_results(kb_results: list[Any], graph_results: Any) -> bool:
     return False
 
 
-def _build_retrieval_context(kb_results: list[Any], graph_results: Any) -> str:
-    kb_lines = _format_kb_results(kb_results)
-    graph_lines = _format_graph_results(graph_results)
+def _kb_context_items(kb_results: list[Any], section: str = "kb") -> list[ContextItem]:
+    items: list[ContextItem] = []
+    for item in kb_results:
+        content, source = _extract_kb_text(item)
+        if not content:
+            continue
+        content = _trim_text(content)
+        score = item.get("score") if isinstance(item, dict) else None
+        # 按名次折算的分数不是相似度，交给装箱器按检索顺序排序
+        if isinstance(item, dict) and (item.get("metadata") or {}).get("score_type") == "rank":
+            score = None
+        text = f"- ({source}) {content}" if source else f"- {content}"
+        items.append(ContextItem(section, text, score if isinstance(score, int | float) else None, source=item))
+    return items
+
+
+def _graph_context_items(graph_results: Any, max_items: int = 50) -> list[ContextItem]:
+    if isinstance(graph_results, dict) and graph_results.get("triples"):
+        triples = graph_results["triples"][:max_items]
+        lines = _format_graph_results({"triples": triples}, max_items=max_items)
+        return [ContextItem("graph", line, source=triple) for line, triple in zip(lines, triples)]
+    if isinstance(graph_results, list):
+        return _kb_context_items(graph_results, section="graph")[:max_items]
+    # 整段的图谱内容只有一条
+    return [ContextItem("graph", line, source=graph_results) for line in _format_graph_results(graph_results)]
+
+
+def _selected_graph_results(graph_results: Any, packed: PackedContext) -> Any:
+    """按装箱结果裁剪图谱检索结果，保持原有结构"""
+    sources = packed.sources("graph")
+    if isinstance(graph_results, dict) and graph_results.get("triples"):
+        return {**graph_results, "triples": sources, "content": ""}
+    if isinstance(graph_results, list):
+        return sources
+    return graph_results if sources else None
+
+
+def _pack_retrieval_context(kb_results: list[Any], graph_results: Any, statistics_context: str = "") -> PackedContext:
+    """按 token 预算在统计结果、知识库与图谱之间分配上下文"""
+    return pack_context(
+        {
+            "statistics": [ContextItem("statistics", line) for line in statistics_context.splitlines() if line.strip()],
+            "kb": _kb_context_items(kb_results),
+            # 候选条目多取一些，由预算决定最终保留多少
+            "graph": _graph_context_items(graph_results, max_items=50),
+        }
+    )
+
+
+def _build_packed_citations(packed: PackedContext, graph_results: Any) -> list[dict[str, Any]]:
+    """只为实际放入提示词的知识库片段与图谱条目生成引用"""
+    return _build_retrieval_citations(packed.sources("kb"), _selected_graph_results(graph_results, packed))
+
+
+def _render_retrieval_context(packed: PackedContext) -> str:
+    kb_lines = packed.lines("kb")
+    graph_lines = packed.lines("graph")
     if not kb_lines and not graph_lines:
         return ""
     sections = ["以下是检索到的资料，仅供回答使用："]
@@ -506,6 +566,10 @@ def _build_retrieval_context(kb_results: list[Any], graph_results: Any) -> str:
     return "\n".join(sections)
 
 
+def _build_retrieval_context(kb_results: list[Any], graph_results: Any) -> str:
+    return _render_retrieval_context(_pack_retrieval_context(kb_results, graph_results))
+
+
 def _build_retrieval_citations(
     kb_results: list[Any],
     graph_results: Any,
@@ -683,7 +747,9 @@ async def _prefetch_retrieval(
             if graph_name != "neo4j":
                 graph_results = await knowledge_base.aquery(query_text, graph_name, mode="global")
             else:
-                graph_results = graph_base.query_node(
+                # 同步的 Neo4j 查询放到线程中，避免阻塞与之并行的策略判断
+                graph_results = await asyncio.to_thread(
+                    graph_base.query_node,
                     query_text,
                     hops=2,
                     kgdb_name=graph_name,
@@ -696,6 +762,18 @@ async def _prefetch_retrieval(
     return kb_results, graph_results
 
 
+# 最近若干轮的首 token 耗时（秒），按是否启用预检索并行分别统计
+_TTFT_WINDOW = 200
+_ttft_samples: dict[bool, deque[float]] = {True: deque(maxlen=_TTFT_WINDOW), False: deque(maxlen=_TTFT_WINDOW)}
+
+
+def _record_ttft(speculative: bool, ttft: float) -> float:
+    """记录首 token 耗时，返回同一模式下最近若干轮的中位数"""
+    samples = _ttft_samples[speculative]
+    samples.append(ttft)
+    return sorted(samples)[len(samples) // 2]
+
+
 class ChatbotAgent(BaseAgent):
     name = "智能体助手"
     description = "基础的对话机器人，可以回答问题，默认不使用任何工具，可在配置中启用需要的工具。"
@@ -705,10 +783,37 @@ class ChatbotAgent(BaseAgent):
         self.graph = None
         self.checkpointer = None
         self.context_schema = Context
+        # {(retrieval_mode, kb_whitelist, graph_name, 知识库列表版本): tools}
+        self._tools_cache: dict[tuple, list] = {}
+
+    def clear_cache(self) -> None:
+        self._tools_cache.clear()
 
     def get_tools(self, runtime: Runtime[Context] = None):
         input_context = _get_runtime_input_context(runtime)
-        return get_tools(input_context)
+        context = input_context or {}
+        raw_whitelist = context.get("kb_whitelist") or []
+        if isinstance(raw_whitelist, str):
+            raw_whitelist = [raw_whitelist]
+        cache_key = (
+            context.get("retrieval_mode", "mix"),
+            tuple(sorted(kb for kb in raw_whitelist if kb)),
+            context.get("graph_name") or "",
+            getattr(knowledge_base, "databases_version", 0),
+        )
+        tools = self._tools_cache.get(cache_key)
+        if tools is None:
+            try:
+                tools = get_tools(input_context, raise_errors=True)
+            except Exception as e:
+                # 知识库或图谱暂时不可用时只返回部分工具且不缓存，下次调用重新构建
+                logger.error(f"Failed to build tools, not caching: {e}")
+                return get_tools(input_context)
+            # 知识库列表变化后旧版本的条目不会再命中，整体清空避免累积
+            if len(self._tools_cache) >= 32:
+                self._tools_cache.clear()
+            self._tools_cache[cache_key] = tools
+        return list(tools)
 
     async def _get_invoke_tools(self, selected_tools: list[str], selected_mcps: list[str], runtime: Runtime[Context] = None):
         """根据配置获取工具。
@@ -739,7 +844,7 @@ class ChatbotAgent(BaseAgent):
             logger.info("LLM mode: returning empty tools")
             return []
         
-        # 每次都重新获取工具，不使用缓存，以确保根据当前 retrieval_mode 获取正确的工具
+        # 工具列表按 retrieval_mode、知识库白名单与知识库列表版本缓存
         # get_tools 内部会调用 get_buildin_tools，它会根据 retrieval_mode 过滤工具
         all_tools = self.get_tools(runtime)
         
@@ -794,15 +899,10 @@ class ChatbotAgent(BaseAgent):
             return "inject"
 
         model = load_chat_model(model_name)
-        system_prompt = (
-            "你是检索策略分类器，只能输出 enforce 或 inject。\n"
-            "enforce 表示必须先检索，没结果就直接返回资料不足。\n"
-            "inject 表示先检索并注入结果，再由模型回答。"
-        )
         try:
             response = await model.ainvoke(
                 [
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": RETRIEVAL_POLICY_PROMPT},
                     {"role": "user", "content": query_text},
                 ]
             )
@@ -830,12 +930,26 @@ class ChatbotAgent(BaseAgent):
             return policy
         if _is_statistical_query(query_text):
             return "enforce"
-        if getattr(runtime_context, "retrieval_classifier_enabled", False):
+        if not getattr(runtime_context, "retrieval_classifier_enabled", False):
+            return "inject"
+        # 本地分类器置信度足够时直接采用，避免一次 LLM 往返
+        started = time.perf_counter()
+        local_result = await classify_retrieval_policy(query_text)
+        if not local_result:
             return await self._classify_retrieval_policy(query_text, runtime_context)
-        return "inject"
+        policy, confidence = local_result
+        logger.info(
+            f"Retrieval policy by local classifier: {policy} ({confidence:.3f}), "
+            f"{(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        # llm（跳过检索）需显式允许，否则与引入分类器之前一样只在 inject / enforce 中选择
+        if policy == "llm" and not getattr(runtime_context, "retrieval_classifier_allow_llm", False):
+            return "inject"
+        return policy
 
     async def llm_call(self, state: State, runtime: Runtime[Context] = None) -> dict[str, Any]:
         """调用 llm 模型 - 异步版本以支持异步工具"""
+        turn_started = time.perf_counter()
         model = load_chat_model(runtime.context.model)
 
         input_context = _get_runtime_input_context(runtime) or {}
@@ -848,49 +962,88 @@ class ChatbotAgent(BaseAgent):
             llm_prompt = getattr(runtime.context, "llm_system_prompt", "") or ""
             system_prompt = llm_prompt or system_prompt
 
-        if _last_message_is_user(state.messages) and retrieval_mode != "llm":
-            query_text = _get_latest_user_text(state.messages)
-            if query_text:
-                has_direct_structured_stats = False
-                # 新增：对于统计性问题，直接调用统计函数（无需工具调用）
-                if _is_statistical_query(query_text):
-                    reservoir_stat_result = _direct_reservoir_count_statistics(query_text)
-                    if reservoir_stat_result and reservoir_stat_result.get("text_summary"):
-                        has_direct_structured_stats = True
-                        statistics_context = reservoir_stat_result["text_summary"]
-                        retrieval_citations.append(
-                            {
-                                "title": "结构化水库统计",
-                                "path": reservoir_stat_result.get("source_path") or "dataset://reservoirs",
-                                "snippet": statistics_context,
-                                "sourceType": "structured_data",
-                            }
-                        )
-
-                if _is_statistical_query(query_text) and not has_direct_structured_stats and retrieval_mode in {"mix", "global"}:
-                    graph_name = input_context.get("graph_name") or "neo4j"
-                    stat_result = await _direct_graph_statistics(query_text, graph_name)
-                    if stat_result and stat_result.get("text_summary"):
-                        statistics_context = stat_result["text_summary"]
-                        logger.info(f"Direct statistics injected: {stat_result.get('total_count', 0)} results")
-                        retrieval_citations.append(
-                            {
-                                "title": f"知识图谱统计({graph_name})",
-                                "path": f"graph://{graph_name}",
-                                "snippet": statistics_context,
-                                "sourceType": "knowledge_graph",
-                            }
+        # 预检索并行：检索与统计、策略判断同时开始，用不上时取消
+        speculative = bool(getattr(runtime.context, "speculative_retrieval", False))
+        speculative_task: asyncio.Task | None = None
+        speculation = "off"
+        kb_results: list[Any] = []
+        graph_results: Any = None
+        # 统计、策略判断出错或提前返回时同样取消未使用的预检索，并回收任务避免异常无人获取
+        speculative_consumed = False
+        try:
+            if _last_message_is_user(state.messages) and retrieval_mode != "llm":
+                query_text = _get_latest_user_text(state.messages)
+                if query_text:
+                    if speculative:
+                        speculative_task = asyncio.create_task(
+                            _prefetch_retrieval(query_text, input_context, retrieval_mode)
                         )
+                    has_direct_structured_stats = False
+                    # 新增：对于统计性问题，直接调用统计函数（无需工具调用）
+                    if _is_statistical_query(query_text):
+                        reservoir_stat_result = _direct_reservoir_count_statistics(query_text)
+                        if reservoir_stat_result and reservoir_stat_result.get("text_summary"):
+                            has_direct_structured_stats = True
+                            statistics_context = reservoir_stat_result["text_summary"]
+                            retrieval_citations.append(
+                                {
+                                    "title": "结构化水库统计",
+                                    "path": reservoir_stat_result.get("source_path") or "dataset://reservoirs",
+                                    "snippet": statistics_context,
+                                    "sourceType": "structured_data",
+                                }
+                            )
+
+                    if (
+                        _is_statistical_query(query_text)
+                        and not has_direct_structured_stats
+                        and retrieval_mode in {"mix", "global"}
+                    ):
+                        graph_name = input_context.get("graph_name") or "neo4j"
+                        stat_result = await _direct_graph_statistics(query_text, graph_name)
+                        if stat_result and stat_result.get("text_summary"):
+                            statistics_context = stat_result["text_summary"]
+                            logger.info(f"Direct statistics injected: {stat_result.get('total_count', 0)} results")
+                            retrieval_citations.append(
+                                {
+                                    "title": f"知识图谱统计({graph_name})",
+                                    "path": f"graph://{graph_name}",
+                                    "snippet": statistics_context,
+                                    "sourceType": "knowledge_graph",
+                                }
+                            )
                 
-                policy = await self._decide_retrieval_policy(query_text, runtime.context, retrieval_mode)
-                if policy in {"inject", "enforce"} and not has_direct_structured_stats:
-                    kb_results, graph_results = await _prefetch_retrieval(query_text, input_context, retrieval_mode)
-                    has_results = _has_retrieval_results(kb_results, graph_results) or bool(statistics_context)
-                    if policy == "enforce" and not has_results:
-                        no_result_reply = getattr(runtime.context, "retrieval_no_result_reply", "资料不足") or "资料不足"
-                        return {"messages": [AIMessage(content=no_result_reply)]}
-                    retrieval_context = _build_retrieval_context(kb_results, graph_results)
-                    retrieval_citations.extend(_build_retrieval_citations(kb_results, graph_results))
+                    policy = await self._decide_retrieval_policy(query_text, runtime.context, retrieval_mode)
+                    if policy in {"inject", "enforce"} and not has_direct_structured_stats:
+                        if speculative_task:
+                            speculation = "hit" if speculative_task.done() else "wait"
+                            speculative_consumed = True
+                            kb_results, graph_results = await speculative_task
+                        else:
+                            kb_results, graph_results = await _prefetch_retrieval(
+                                query_text, input_context, retrieval_mode
+                            )
+                        has_results = _has_retrieval_results(kb_results, graph_results) or bool(statistics_context)
+                        if policy == "enforce" and not has_results:
+                            no_result_reply = (
+                                getattr(runtime.context, "retrieval_no_result_reply", "资料不足") or "资料不足"
+                            )
+                            return {"messages": [AIMessage(content=no_result_reply)]}
+                    elif speculative_task:
+                        # 策略判断为不检索或已有结构化统计，丢弃预检索（在 finally 中取消）
+                        speculation = "discarded"
+        finally:
+            if speculative_task:
+                if not speculative_consumed:
+                    speculative_task.cancel()
+                await asyncio.gather(speculative_task, return_exceptions=True)
+        retrieval_elapsed = time.perf_counter() - turn_started
+
+        packed = _pack_retrieval_context(kb_results, graph_results, statistics_context)
+        statistics_context = "\n".join(packed.lines("statistics"))
+        retrieval_context = _render_retrieval_context(packed)
+        # 引用按装箱结果生成，去重或超出预算而未放入提示词的条目不再引用
+        retrieval_citations.extend(_build_packed_citations(packed, graph_results))
 
         # 工具调用功能已禁用，使用预取检索机制代替
 
@@ -902,10 +1055,30 @@ class ChatbotAgent(BaseAgent):
         if retrieval_context:
             messages.append({"role": "system", "content": retrieval_context})
         messages.extend(state.messages)
-        response = cast(
-            AIMessage,
-            await model.ainvoke(messages),
-        )
+
+        # 流式调用以记录首 token 耗时（从本轮开始计时），合并分块后与 ainvoke 的结果一致
+        chunk = None
+        ttft = None
+        llm_started = time.perf_counter()
+        async for part in model.astream(messages):
+            if ttft is None:
+                ttft = time.perf_counter() - turn_started
+            chunk = part if chunk is None else chunk + part
+        llm_elapsed = time.perf_counter() - llm_started
+        response = cast(AIMessage, message_chunk_to_message(chunk)) if chunk is not None else AIMessage(content="")
+        if ttft is not None:
+            ttft_p50 = _record_ttft(speculative, ttft)
+            # 优先使用模型返回的用量，不支持 stream_usage 的服务按本地估算
+            usage = getattr(response, "usage_metadata", None) or {}
+            prompt_tokens = usage.get("input_tokens") or sum(
+                estimate_tokens(_extract_message_text(message)) for message in messages
+            )
+            logger.info(
+                f"LLM turn: speculative={speculative} ({speculation}) retrieval={retrieval_elapsed * 1000:.0f}ms "
+                f"prompt_tokens={prompt_tokens} context_tokens={packed.tokens()} "
+                f"ttft={ttft * 1000:.0f}ms ttft_p50={ttft_p50 * 1000:.0f}ms llm={llm_elapsed * 1000:.0f}ms "
+                f"total={(time.perf_counter() - turn_started) * 1000:.0f}ms"
+            )
         if retrieval_citations:
             deduped: list[dict[str, Any]] = []
             seen_citation_keys: set[str] = set()
@@ -0,0 +1,240 @@
+"""本地检索策略分类器
+
+在 auto 检索策略下替代大部分 LLM 分类调用：关键词 / 规则特征 + 字符 n-gram 哈希特征（可选拼接嵌入向量），
+用 softmax 线性模型预测检索策略：
+- llm: 闲聊、通用写作等不需要检索的问题
+- inject: 先检索并注入结果，再由模型回答
+- enforce: 必须先检索，没有结果直接返回资料不足
+
+置信度低于阈值时返回 None，由调用方回退到 LLM 分类器。
+模型通过 scripts/rag_eval/train_retrieval_classifier.py 训练，保存为 JSON。
+"""
+
+import json
+import os
+import re
+import threading
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from src import config as sys_config
+from src.utils import logger
+
+RETRIEVAL_POLICY_LABELS = ("llm", "inject", "enforce")
+
+RETRIEVAL_POLICY_PROMPT = (
+    "你是检索策略分类器，只能输出 enforce 或 inject。\n"
+    "enforce 表示必须先检索，没结果就直接返回资料不足。\n"
+    "inject 表示先检索并注入结果，再由模型回答。"
+)
+
+# 为空时使用 {save_dir}/agents/chatbot/retrieval_classifier.json
+RETRIEVAL_CLASSIFIER_PATH = os.getenv("RETRIEVAL_CLASSIFIER_PATH") or ""
+# 最高类别概率低于该值时视为不确定，回退到 LLM 分类器（未启用时使用默认策略 inject）
+RETRIEVAL_CLASSIFIER_THRESHOLD = float(os.getenv("RETRIEVAL_CLASSIFIER_THRESHOLD") or 0.75)
+
+NGRAM_HASH_DIM = 512
+
+_DOMAIN_TERMS = re.compile(
+    r"(坝|水库|闸|溢洪|泄洪|渗流|渗漏|裂缝|监测|观测|防洪|汛|库容|水位|扬压力|帷幕|廊道|堤|除险加固|安全鉴定|病害|隐患|"
+    r"滑坡|沉降|变形|管涌|水电站|电站|灌区|河道)"
+)
+_DOCUMENT_HINT = re.compile(r"(规范|标准|规程|条例|办法|导则|手册|报告|文件|资料|文档|依据|根据|第.{1,4}条|章节|附录)")
+_FACT_HINT = re.compile(
+    r"(多少|几座|几个|哪些|哪个|哪里|何时|什么时候|是否|数值|数据|统计|名称|编号|日期|时间|地点|谁)"
+)
+_REASONING_HINT = re.compile(r"(为什么|原因|如何|怎么|怎样|分析|影响|建议|比较|区别|评价|意义|作用|原理)")
+_SMALLTALK = re.compile(
+    r"^\s*(你好|您好|嗨|hi|hello|hey|谢谢|多谢|感谢|再见|拜拜|早上好|晚上好|下午好|你是谁|你叫什么|你能做什么|在吗|好的|ok)",
+    re.IGNORECASE,
+)
+_GENERAL_TASK = re.compile(
+    r"(翻译|润色|改写|扩写|写一[首篇段个]|作诗|笑话|代码|python|java|sql|正则|讲个|帮我写)", re.IGNORECASE
+)
+_WHITESPACE = re.compile(r"\s+")
+
+RULE_FEATURES = ("domain", "document", "fact", "reasoning", "smalltalk", "general_task", "length", "digit", "latin")
+
+
+def rule_features(text: str) -> np.ndarray:
+    return np.array(
+        [
+            min(len(_DOMAIN_TERMS.findall(text)), 3) / 3,
+            float(bool(_DOCUMENT_HINT.search(text))),
+            float(bool(_FACT_HINT.search(text))),
+            float(bool(_REASONING_HINT.search(text))),
+            float(bool(_SMALLTALK.search(text))),
+            float(bool(_GENERAL_TASK.search(text))),
+            min(len(text), 200) / 200,
+            float(any(ch.isdigit() for ch in text)),
+            float(bool(re.search(r"[a-zA-Z]", text))),
+        ],
+        dtype=np.float32,
+    )
+
+
+def ngram_features(text: str, dim: int = NGRAM_HASH_DIM) -> np.ndarray:
+    """字符 1-2 gram 的哈希词袋，L2 归一化"""
+    text = _WHITESPACE.sub(" ", text).strip().lower()
+    vector = np.zeros(dim, dtype=np.float32)
+    grams = list(text) + [text[i : i + 2] for i in range(len(text) - 1)]
+    for gram in grams:
+        vector[zlib.crc32(gram.encode()) % dim] += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def extract_features(text: str, hash_dim: int = NGRAM_HASH_DIM, embedding=None) -> np.ndarray:
+    parts = [rule_features(text), ngram_features(text, hash_dim)]
+    if embedding is not None:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        parts.append(embedding / norm if norm else embedding)
+    return np.concatenate(parts)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+@dataclass
+class RetrievalClassifier:
+    weights: np.ndarray
+    bias: np.ndarray
+    labels: tuple[str, ...] = RETRIEVAL_POLICY_LABELS
+    hash_dim: int = NGRAM_HASH_DIM
+    # 训练时使用的嵌入模型，为空表示只使用本地特征
+    embed_model: str = ""
+    metadata: dict = field(default_factory=dict)
+
+    @classmethod
+    def fit(
+        cls,
+        texts: list[str],
+        labels: list[str],
+        embeddings: list[list[float]] | None = None,
+        embed_model: str = "",
+        epochs: int = 300,
+        learning_rate: float = 0.5,
+        l2: float = 1e-3,
+    ) -> "RetrievalClassifier":
+        """全量梯度下降训练多类别逻辑回归，类别按样本数反比加权"""
+        unknown = set(labels) - set(RETRIEVAL_POLICY_LABELS)
+        if unknown:
+            raise ValueError(f"Unknown retrieval policy labels: {unknown}, expected {RETRIEVAL_POLICY_LABELS}")
+        features = np.stack(
+            [extract_features(text, embedding=embeddings[i] if embeddings else None) for i, text in enumerate(texts)]
+        )
+        targets = np.array([RETRIEVAL_POLICY_LABELS.index(label) for label in labels])
+        one_hot = np.eye(len(RETRIEVAL_POLICY_LABELS), dtype=np.float32)[targets]
+        counts = np.bincount(targets, minlength=len(RETRIEVAL_POLICY_LABELS))
+        sample_weights = (len(targets) / (np.maximum(counts, 1) * np.count_nonzero(counts)))[targets][:, None]
+
+        weights = np.zeros((features.shape[1], len(RETRIEVAL_POLICY_LABELS)), dtype=np.float32)
+        bias = np.zeros(len(RETRIEVAL_POLICY_LABELS), dtype=np.float32)
+        for _ in range(epochs):
+            gradient = (_softmax(features @ weights + bias) - one_hot) * sample_weights / len(targets)
+            weights -= learning_rate * (features.T @ gradient + l2 * weights)
+            bias -= learning_rate * gradient.sum(axis=0)
+        return cls(weights=weights, bias=bias, embed_model=embed_model, metadata={"samples": len(texts)})
+
+    def predict_proba(self, text: str, embedding=None) -> dict[str, float]:
+        features = extract_features(text, self.hash_dim, embedding if self.embed_model else None)
+        probabilities = _softmax(features @ self.weights + self.bias)
+        return dict(zip(self.labels, probabilities.tolist()))
+
+    def predict(self, text: str, embedding=None) -> tuple[str, float]:
+        probabilities = self.predict_proba(text, embedding)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+    def save(self, path: str) -> None:
+        data = {
+            "labels": list(self.labels),
+            "hash_dim": self.hash_dim,
+            "embed_model": self.embed_model,
+            "weights": self.weights.tolist(),
+            "bias": self.bias.tolist(),
+            "metadata": self.metadata,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RetrievalClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            weights=np.asarray(data["weights"], dtype=np.float32),
+            bias=np.asarray(data["bias"], dtype=np.float32),
+            labels=tuple(data["labels"]),
+            hash_dim=int(data.get("hash_dim") or NGRAM_HASH_DIM),
+            embed_model=data.get("embed_model") or "",
+            metadata=data.get("metadata") or {},
+        )
+
+
+def get_classifier_path() -> str:
+    return RETRIEVAL_CLASSIFIER_PATH or str(
+        Path(sys_config.save_dir) / "agents" / "chatbot" / "retrieval_classifier.json"
+    )
+
+
+_classifier_lock = threading.Lock()
+_classifier_cache: dict[str, tuple[float, RetrievalClassifier | None]] = {}
+_embed_models: dict = {}
+
+
+def get_retrieval_classifier() -> RetrievalClassifier | None:
+    """按文件修改时间缓存加载的模型；模型文件不存在时返回 None"""
+    path = get_classifier_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _classifier_lock:
+        cached = _classifier_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            classifier = RetrievalClassifier.load(path)
+            logger.info(f"Loaded retrieval classifier from {path}")
+        except Exception as e:
+            logger.error(f"Failed to load retrieval classifier {path}: {e}")
+            classifier = None
+        _classifier_cache[path] = (mtime, classifier)
+        return classifier
+
+
+async def classify_retrieval_policy(query_text: str, threshold: float | None = None) -> tuple[str, float] | None:
+    """本地预测检索策略，返回 (策略, 置信度)；没有模型或置信度不足时返回 None"""
+    classifier = get_retrieval_classifier()
+    if classifier is None:
+        return None
+
+    embedding = None
+    if classifier.embed_model:
+        try:
+            if classifier.embed_model not in _embed_models:
+                from src.models.embed import select_embedding_model
+
+                _embed_models[classifier.embed_model] = select_embedding_model(classifier.embed_model)
+            embedding = (await _embed_models[classifier.embed_model].aencode([query_text]))[0]
+        except Exception as e:
+            logger.error(f"Retrieval classifier embedding failed: {e}")
+            return None
+
+    label, confidence = classifier.predict(query_text, embedding)
+    threshold = RETRIEVAL_CLASSIFIER_THRESHOLD if threshold is None else threshold
+    if confidence < threshold:
+        logger.debug(f"Retrieval classifier uncertain: {label} ({confidence:.3f} < {threshold})")
+        return None
+    return label, confidence
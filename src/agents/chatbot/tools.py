@@ -65,10 +65,10 @@ async def text_to_img_qwen(text: str) -> str:
     return image_url
 
 
-def get_tools(input_context: dict = None) -> list[Any]:
-    """获取所有可运行的工具（给大模型使用）"""
+def get_tools(input_context: dict = None, raise_errors: bool = False) -> list[Any]:
+    """获取所有可运行的工具（给大模型使用），raise_errors 见 get_buildin_tools"""
     retrieval_mode = input_context.get("retrieval_mode", "mix") if input_context else "mix"
-    tools = [] if retrieval_mode == "llm" else get_buildin_tools(input_context)
+    tools = [] if retrieval_mode == "llm" else get_buildin_tools(input_context, raise_errors=raise_errors)
     if retrieval_mode != "llm":
         tools.append(calculator)
         tools.append(text_to_img_qwen)
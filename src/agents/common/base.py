@@ -47,6 +47,9 @@ class BaseAgent:
             "has_checkpointer": await self.check_checkpointer(),
         }
 
+    def clear_cache(self) -> None:
+        """清除智能体持有的运行时缓存（工具列表等），子类按需实现"""
+
     async def get_config(self):
         return self.context_schema.from_file(module_name=self.module_name)
 
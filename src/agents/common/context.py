@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import copy
 import os
 import uuid
 from dataclasses import MISSING, dataclass, field, fields
@@ -14,6 +15,31 @@ from src import config as sys_config
 from src.utils import logger
 
 
+# 智能体配置文件的解析结果 {path: (mtime, config)}，文件修改后自动重新加载
+_file_config_cache: dict[str, tuple[float, dict]] = {}
+
+
+def _load_file_config(config_file_path: Path) -> dict:
+    path = str(config_file_path)
+    mtime = os.path.getmtime(path)
+    cached = _file_config_cache.get(path)
+    if cached and cached[0] == mtime:
+        return copy.deepcopy(cached[1])
+
+    file_config = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            file_config = yaml.safe_load(f) or {}
+        _file_config_cache[path] = (mtime, file_config)
+    except Exception as e:
+        logger.error(f"加载智能体配置文件出错: {e}")
+    return copy.deepcopy(file_config)
+
+
+def clear_file_config_cache() -> None:
+    _file_config_cache.clear()
+
+
 @dataclass(kw_only=True)
 class BaseContext:
     """
@@ -84,7 +110,15 @@ class BaseContext:
         default=False,
         metadata={
             "name": "检索策略分类器",
-            "description": "auto 模式下启用 LLM 分类器辅助判断",
+            "description": "auto 模式下由本地分类器判断，本地分类器不确定（或未训练）时再调用 LLM 分类器",
+        },
+    )
+
+    retrieval_classifier_allow_llm: bool = field(
+        default=False,
+        metadata={
+            "name": "分类器可跳过检索",
+            "description": "允许分类器判定为 llm（不检索直接回答）；关闭时按 inject 处理",
         },
     )
 
@@ -96,6 +130,14 @@ class BaseContext:
         },
     )
 
+    speculative_retrieval: bool = field(
+        default=False,
+        metadata={
+            "name": "预检索并行",
+            "description": "检索与统计、检索策略判断同时开始，策略判断为不检索时取消，用于降低首 token 耗时",
+        },
+    )
+
     retrieval_no_result_reply: str = field(
         default="资料不足",
         metadata={
@@ -192,14 +234,7 @@ class BaseContext:
         context = cls()
         config_file_path = Path(sys_config.save_dir) / "agents" / module_name / "config.yaml"
         if module_name is not None and os.path.exists(config_file_path):
-            file_config = {}
-            try:
-                with open(config_file_path, encoding="utf-8") as f:
-                    file_config = yaml.safe_load(f) or {}
-            except Exception as e:
-                logger.error(f"加载智能体配置文件出错: {e}")
-
-            context.update(file_config)
+            context.update(_load_file_config(config_file_path))
 
         if input_context:
             context.update(input_context)
@@ -222,6 +257,8 @@ class BaseContext:
             os.makedirs(os.path.dirname(config_file_path), exist_ok=True)
             with open(config_file_path, "w", encoding="utf-8") as f:
                 yaml.dump(configurable_config, f, indent=2, allow_unicode=True)
+            # 同一时间戳精度内的连续写入不会改变 mtime，主动失效
+            _file_config_cache.pop(str(config_file_path), None)
 
             return True
         except Exception as e:
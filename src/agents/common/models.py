@@ -1,12 +1,26 @@
+import json
 import os
+import threading
 import traceback
 
+import httpx
 from langchain_core.language_models import BaseChatModel
 from pydantic import SecretStr
 
 from src import config
 from src.utils import get_docker_safe_url
 
+# 同一 base_url 的模型客户端共享的连接池参数
+CHAT_MODEL_MAX_CONNECTIONS = int(os.getenv("CHAT_MODEL_MAX_CONNECTIONS") or 100)
+CHAT_MODEL_MAX_KEEPALIVE = int(os.getenv("CHAT_MODEL_MAX_KEEPALIVE") or 20)
+CHAT_MODEL_KEEPALIVE_EXPIRY = float(os.getenv("CHAT_MODEL_KEEPALIVE_EXPIRY") or 60)
+
+# {(provider, model, base_url, api_key, params): client}，模型配置变更时由 clear_chat_model_cache 失效
+_chat_models: dict[tuple, BaseChatModel] = {}
+# {base_url: (sync_client, async_client)}，异步连接池绑定在服务的事件循环上
+_http_clients: dict[str, tuple[httpx.Client, httpx.AsyncClient]] = {}
+_cache_lock = threading.Lock()
+
 
 def _resolve_api_key(env_config: str | list[str] | None) -> str:
     if env_config is None:
@@ -24,9 +38,32 @@ def _resolve_api_key(env_config: str | list[str] | None) -> str:
     return os.getenv(env_config, env_config)
 
 
+def _get_http_clients(base_url: str) -> tuple[httpx.Client, httpx.AsyncClient]:
+    clients = _http_clients.get(base_url)
+    if clients is None:
+        limits = httpx.Limits(
+            max_connections=CHAT_MODEL_MAX_CONNECTIONS,
+            max_keepalive_connections=CHAT_MODEL_MAX_KEEPALIVE,
+            keepalive_expiry=CHAT_MODEL_KEEPALIVE_EXPIRY,
+        )
+        # 与 openai SDK 默认一致的超时设置
+        timeout = httpx.Timeout(600.0, connect=5.0)
+        clients = (httpx.Client(limits=limits, timeout=timeout), httpx.AsyncClient(limits=limits, timeout=timeout))
+        _http_clients[base_url] = clients
+    return clients
+
+
+def clear_chat_model_cache() -> None:
+    """丢弃已创建的模型客户端（连接池保留复用），模型提供商配置变更后调用"""
+    with _cache_lock:
+        _chat_models.clear()
+
+
 def load_chat_model(fully_specified_name: str, **kwargs) -> BaseChatModel:
     """
     Load a chat model from a fully specified name.
+
+    相同 (provider, model, base_url, api_key, 参数) 的客户端会被复用，同一 base_url 共享 keep-alive 连接池。
     """
     if not fully_specified_name or "/" not in fully_specified_name:
         raise ValueError(f"Invalid model spec `{fully_specified_name}`. Expected `provider/model` format.")
@@ -47,6 +84,18 @@ def load_chat_model(fully_specified_name: str, **kwargs) -> BaseChatModel:
     api_key = _resolve_api_key(model_info.get("env", "NO_API_KEY"))
     base_url = get_docker_safe_url(base_url)
 
+    cache_key = (provider, model, base_url, api_key, json.dumps(kwargs, sort_keys=True, default=str))
+    with _cache_lock:
+        chat_model = _chat_models.get(cache_key)
+        if chat_model is None:
+            chat_model = _create_chat_model(provider, model, base_url, api_key, **kwargs)
+            _chat_models[cache_key] = chat_model
+    return chat_model
+
+
+def _create_chat_model(provider: str, model: str, base_url: str, api_key: str, **kwargs) -> BaseChatModel:
+    http_client, http_async_client = _get_http_clients(base_url)
+
     if provider in ["deepseek", "dashscope"]:
         from langchain_deepseek import ChatDeepSeek
 
@@ -56,6 +105,9 @@ def load_chat_model(fully_specified_name: str, **kwargs) -> BaseChatModel:
             base_url=base_url,
             api_base=base_url,
             stream_usage=True,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            **kwargs,
         )
 
     elif provider == "together":
@@ -66,6 +118,9 @@ def load_chat_model(fully_specified_name: str, **kwargs) -> BaseChatModel:
             api_key=SecretStr(api_key),
             base_url=base_url,
             stream_usage=True,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            **kwargs,
         )
 
     else:
@@ -77,6 +132,9 @@ def load_chat_model(fully_specified_name: str, **kwargs) -> BaseChatModel:
                 api_key=SecretStr(api_key),
                 base_url=base_url,
                 stream_usage=True,
+                http_client=http_client,
+                http_async_client=http_async_client,
+                **kwargs,
             )
         except Exception as e:
             raise ValueError(f"Model provider {provider} load failed, {e} \n {traceback.format_exc()}")
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from src.utils import logger
+
+from .connection import MySQLConnectionManager
+
+MYSQL_SCHEMA_CACHE_TTL = int(os.getenv("MYSQL_SCHEMA_CACHE_TTL", "300"))
+# 查询缓存中不存在的表时，距上次刷新至少间隔该秒数才重新读取表清单
+_MISS_REFRESH_INTERVAL = 5
+
+# 近似行数与注释来自 information_schema，只读元数据，不扫描表
+_TABLES_SQL = """
+SELECT TABLE_NAME AS name, TABLE_TYPE AS table_type, TABLE_ROWS AS approx_rows, TABLE_COMMENT AS comment
+FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = DATABASE()
+ORDER BY TABLE_NAME
+"""
+
+# 每张表的列定义指纹，任意列的增删改（包括 INSTANT DDL）都会改变 checksum
+_SCHEMA_VERSION_SQL = """
+SELECT TABLE_NAME AS name, COUNT(*) AS column_count,
+       SUM(CRC32(CONCAT_WS(':', ORDINAL_POSITION, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY,
+                           IFNULL(COLUMN_DEFAULT, ''), EXTRA, COLUMN_COMMENT))) AS checksum
+FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE()
+GROUP BY TABLE_NAME
+"""
+
+
+@dataclass
+class TableInfo:
+    name: str
+    table_type: str = "BASE TABLE"
+    approx_rows: int | None = None
+    comment: str = ""
+    # 列定义指纹，用于判断缓存的表结构是否失效
+    version: tuple | None = None
+
+    @property
+    def is_view(self) -> bool:
+        return self.table_type == "VIEW"
+
+
+@dataclass
+class TableSchema:
+    columns: list[dict]
+    indexes: dict[str, list[str]]
+    version: tuple | None
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+class SchemaCatalog:
+    """数据库结构目录缓存
+
+    表清单、近似行数与列指纹一起按 TTL 刷新；表结构（列与索引）按表缓存，
+    列指纹变化（DDL）或超过 TTL 时重新读取。mysql_list_tables 与 mysql_describe_table 都从这里取数据。
+    """
+
+    def __init__(self, manager: MySQLConnectionManager, ttl: float = MYSQL_SCHEMA_CACHE_TTL):
+        self.manager = manager
+        self.ttl = ttl
+        self._tables: dict[str, TableInfo] = {}
+        self._schemas: dict[str, TableSchema] = {}
+        self._loaded_at: float | None = None
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, loaded_at: float | None) -> bool:
+        return loaded_at is not None and time.monotonic() - loaded_at < self.ttl
+
+    def _refresh_tables(self) -> None:
+        versions = {
+            row["name"]: (int(row["column_count"] or 0), int(row["checksum"] or 0))
+            for row in self.manager.execute(_SCHEMA_VERSION_SQL)
+        }
+        tables = {}
+        for row in self.manager.execute(_TABLES_SQL):
+            approx_rows = row.get("approx_rows")
+            tables[row["name"]] = TableInfo(
+                name=row["name"],
+                table_type=row.get("table_type") or "BASE TABLE",
+                approx_rows=int(approx_rows) if approx_rows is not None else None,
+                comment=row.get("comment") or "",
+                version=versions.get(row["name"]),
+            )
+
+        # 丢弃已删除或列定义发生变化的表结构
+        for name, schema in list(self._schemas.items()):
+            if name not in tables or tables[name].version != schema.version:
+                self._schemas.pop(name, None)
+
+        self._tables = tables
+        self._loaded_at = time.monotonic()
+        logger.debug(f"Refreshed MySQL schema catalog: {len(tables)} tables")
+
+    def list_tables(self) -> list[TableInfo]:
+        with self._lock:
+            if not self._is_fresh(self._loaded_at):
+                self._refresh_tables()
+            return list(self._tables.values())
+
+    def get_table(self, table_name: str) -> TableInfo | None:
+        with self._lock:
+            missing = table_name not in self._tables and (
+                self._loaded_at is None or time.monotonic() - self._loaded_at >= _MISS_REFRESH_INTERVAL
+            )
+            if not self._is_fresh(self._loaded_at) or missing:
+                # 表清单中没有时也刷新一次，覆盖缓存之后新建的表
+                self._refresh_tables()
+            table = self._tables.get(table_name)
+            if table is None:
+                # 表名大小写不敏感（lower_case_table_names）时按小写匹配
+                table = next((t for name, t in self._tables.items() if name.lower() == table_name.lower()), None)
+            return table
+
+    def describe(self, table_name: str) -> TableSchema | None:
+        """返回表的列与索引信息，表不存在时返回 None"""
+        table = self.get_table(table_name)
+        if table is None:
+            return None
+
+        with self._lock:
+            schema = self._schemas.get(table.name)
+            if schema is not None and schema.version == table.version and self._is_fresh(schema.loaded_at):
+                return schema
+
+        columns = self.manager.execute(f"SHOW FULL COLUMNS FROM `{table.name}`")
+        indexes: dict[str, list[str]] = {}
+        try:
+            for idx in self.manager.execute(f"SHOW INDEX FROM `{table.name}`"):
+                indexes.setdefault(idx["Key_name"], []).append(idx["Column_name"])
+        except Exception as e:
+            logger.warning(f"Failed to get index info for table {table.name}: {e}")
+
+        schema = TableSchema(columns=columns, indexes=indexes, version=table.version)
+        with self._lock:
+            self._schemas[table.name] = schema
+        return schema
+
+    def exact_row_count(self, table_name: str, timeout: float | None = None) -> int:
+        """精确行数（全表计数，不缓存），仅在显式要求时使用"""
+        rows = self.manager.execute(f"SELECT COUNT(*) AS count FROM `{table_name}`", timeout=timeout)
+        return int(rows[0]["count"])
+
+    def invalidate(self, table_name: str | None = None) -> None:
+        with self._lock:
+            if table_name is None:
+                self._tables.clear()
+                self._schemas.clear()
+                self._loaded_at = None
+            else:
+                self._schemas.pop(table_name, None)
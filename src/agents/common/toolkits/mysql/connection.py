@@ -1,55 +1,105 @@
-import signal
+import asyncio
+import contextvars
+import functools
+import os
+import re
 import threading
 import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from dataclasses import dataclass, field
 from typing import Any
 
 import pymysql
 from pymysql import MySQLError
-from pymysql.cursors import DictCursor
+from pymysql.cursors import DictCursor, SSDictCursor
 
 from src.utils import logger
 
+from .exceptions import MySQLConnectionError, MySQLTimeoutError
+
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "5"))
+
+# MySQL 服务端的超时错误码：3024 超过 MAX_EXECUTION_TIME，1317 查询被 KILL QUERY 中断
+_TIMEOUT_ERROR_CODES = {1317, 3024}
+# 服务端 MAX_EXECUTION_TIME 未生效时（如 MariaDB 或非 SELECT 语句），看门狗在超时后额外等待的秒数
+_KILL_GRACE_SECONDS = 1.0
+_SELECT_PATTERN = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+
+
+@dataclass
+class _PooledConnection:
+    connection: Any
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class _QueryWatchdog:
+    """查询超时后在独立连接上执行 KILL QUERY，不依赖信号，可在任意线程使用"""
+
+    def __init__(self, manager: "MySQLConnectionManager", connection, timeout: float):
+        self.manager = manager
+        self.thread_id = connection.thread_id()
+        self.fired = False
+        self._done = False
+        self._lock = threading.Lock()
+        self._timer = threading.Timer(timeout + _KILL_GRACE_SECONDS, self._kill)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _kill(self) -> None:
+        # 持锁执行 KILL，查询线程在 finish() 返回前不会把连接还回连接池，避免误杀下一条查询
+        with self._lock:
+            if self._done:
+                return
+            self.fired = True
+            try:
+                connection = self.manager.connect()
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("KILL QUERY %s", (self.thread_id,))
+                finally:
+                    connection.close()
+                logger.warning(f"Killed MySQL query on connection {self.thread_id} after timeout")
+            except Exception as e:
+                logger.error(f"Failed to kill MySQL query on connection {self.thread_id}: {e}")
+
+    def finish(self) -> None:
+        self._timer.cancel()
+        with self._lock:
+            self._done = True
+
+
+def with_max_execution_time(sql: str, timeout: float | None) -> str:
+    """为 SELECT 语句加上 MAX_EXECUTION_TIME 优化器提示，由服务端终止超时查询"""
+    if not timeout or not _SELECT_PATTERN.match(sql):
+        return sql
+    return _SELECT_PATTERN.sub(f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */", sql, count=1)
+
 
 class MySQLConnectionManager:
-    """MySQL 数据库连接管理器"""
+    """MySQL 数据库连接池
 
-    def __init__(self, config: dict[str, Any]):
+    - 同时借出的连接数不超过 pool_size，空闲连接复用；借出前检查连接年龄，空闲较久的连接先 ping
+    - 查询超时在服务端执行（MAX_EXECUTION_TIME 提示 + KILL QUERY 看门狗），可在执行器线程中使用
+    """
+
+    def __init__(self, config: dict[str, Any], connect: Callable[[], Any] | None = None):
         self.config = config
-        self.connection = None
-        self._lock = threading.Lock()
-        self.last_connection_time = 0
+        self.pool_size = int(config.get("pool_size") or MYSQL_POOL_SIZE)
+        self.acquire_timeout = float(config.get("acquire_timeout", 30))
         self.max_connection_age = 3600  # 1小时后重新连接
+        self.health_check_interval = 30  # 空闲超过该秒数的连接在借出前 ping 一次
+        self._connect = connect or self._create_connection
+        self._idle: deque[_PooledConnection] = deque()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._lock = threading.Lock()
 
-    def _get_connection(self) -> pymysql.Connection:
-        """获取数据库连接"""
-        current_time = time.time()
-
-        # 检查连接是否过期或断开
-        if (
-            self.connection is None
-            or not self.connection.open
-            or current_time - self.last_connection_time > self.max_connection_age
-        ):
-            with self._lock:
-                # 双重检查
-                if (
-                    self.connection is None
-                    or not self.connection.open
-                    or current_time - self.last_connection_time > self.max_connection_age
-                ):
-                    # 关闭旧连接
-                    if self.connection and self.connection.open:
-                        try:
-                            self.connection.close()
-                        except Exception as _:
-                            pass
-
-                    # 创建新连接
-                    self.connection = self._create_connection()
-                    self.last_connection_time = current_time
-
-        return self.connection
+    def connect(self):
+        """创建一个不属于连接池的新连接"""
+        return self._connect()
 
     def _create_connection(self) -> pymysql.Connection:
         """创建新的数据库连接"""
@@ -80,67 +130,189 @@ class MySQLConnectionManager:
                     logger.error(f"Failed to connect to MySQL after {max_retries} attempts: {e}")
                     raise ConnectionError(f"MySQL connection failed: {e}")
 
-    def test_connection(self) -> bool:
-        """测试连接是否有效"""
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        now = time.monotonic()
+        if now - pooled.created_at > self.max_connection_age or not pooled.connection.open:
+            return False
+        if now - pooled.last_used > self.health_check_interval:
+            try:
+                pooled.connection.ping(reconnect=False)
+            except Exception as e:
+                logger.warning(f"Discarding stale MySQL connection: {e}")
+                return False
+        return True
+
+    @staticmethod
+    def _close_quietly(connection) -> None:
         try:
-            if self.connection and self.connection.open:
-                # 执行简单查询测试连接
-                with self.connection.cursor() as cursor:
-                    cursor.execute("SELECT 1")
-                    cursor.fetchone()
-                return True
-        except Exception as _:
+            connection.close()
+        except Exception:
             pass
-        return False
+
+    def _acquire(self) -> _PooledConnection:
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise MySQLConnectionError(
+                f"MySQL connection pool exhausted ({self.pool_size} connections in use for {self.acquire_timeout}s)"
+            )
+        try:
+            while True:
+                with self._lock:
+                    pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    return _PooledConnection(self._connect())
+                if self._is_healthy(pooled):
+                    return pooled
+                self._close_quietly(pooled.connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, pooled: _PooledConnection, discard: bool = False) -> None:
+        try:
+            if discard or not pooled.connection.open:
+                self._close_quietly(pooled.connection)
+            else:
+                pooled.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(pooled)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """从连接池借出一个连接，连接层错误时丢弃该连接而不放回"""
+        pooled = self._acquire()
+        discard = False
+        try:
+            yield pooled.connection
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            discard = e.args[0] not in _TIMEOUT_ERROR_CODES if e.args else True
+            raise
+        finally:
+            self._release(pooled, discard=discard)
 
     @contextmanager
     def get_cursor(self):
         """获取数据库游标的上下文管理器"""
-        max_retries = 2
-        for attempt in range(max_retries):
+        with self.connection() as connection:
+            cursor = connection.cursor()
             try:
-                connection = self._get_connection()
-                cursor = connection.cursor()
+                yield cursor
+            finally:
+                cursor.close()
+
+    def execute(self, sql: str, params: tuple | dict | None = None, timeout: float | None = None) -> list[dict]:
+        """执行查询并返回全部结果行；timeout 秒后由服务端终止查询并抛出 MySQLTimeoutError"""
+        with self.connection() as connection:
+            watchdog = _QueryWatchdog(self, connection, timeout) if timeout else None
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(with_max_execution_time(sql, timeout), params)
+                    return cursor.fetchall()
+            except pymysql.err.OperationalError as e:
+                if (watchdog and watchdog.fired) or (e.args and e.args[0] in _TIMEOUT_ERROR_CODES):
+                    raise MySQLTimeoutError(f"Query timeout after {timeout} seconds") from e
+                raise
+            finally:
+                if watchdog:
+                    watchdog.finish()
 
-                try:
-                    yield cursor
-                    connection.commit()
-                    break  # 成功，退出重试循环
-
-                except Exception as e:
-                    connection.rollback()
-
-                    # 如果是连接错误，尝试重新连接
-                    if "MySQL" in str(e) or "connection" in str(e).lower():
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Connection error, retrying (attempt {attempt + 1}): {e}")
-                            # 强制重新连接
-                            if self.connection:
-                                try:
-                                    self.connection.close()
-                                except Exception as _:
-                                    pass
-                            self.connection = None
-                            time.sleep(1)
-                            continue
-
-                    raise e  # 其他错误直接抛出
+    @contextmanager
+    def stream(self, sql: str, params: tuple | dict | None = None, timeout: float | None = None, drain_rows: int = 0):
+        """以服务端游标（SSDictCursor）逐行读取结果，结果集不会整体加载到内存
+
+        调用方提前停止读取时，最多再读取 drain_rows 行剩余结果：读到结尾则连接放回连接池，
+        否则直接丢弃该连接，而不是把剩余结果从服务端读完。
+        """
+        pooled = self._acquire()
+        watchdog = None
+        exhausted = False
+        discard = True
+
+        def iter_rows(cursor):
+            nonlocal exhausted
+            while (row := cursor.fetchone()) is not None:
+                yield row
+            exhausted = True
 
-                finally:
-                    if cursor:
-                        cursor.close()
+        try:
+            watchdog = _QueryWatchdog(self, pooled.connection, timeout) if timeout else None
+            cursor = pooled.connection.cursor(SSDictCursor)
+            try:
+                cursor.execute(with_max_execution_time(sql, timeout), params)
+                yield iter_rows(cursor)
+            except pymysql.err.OperationalError as e:
+                if (watchdog and watchdog.fired) or (e.args and e.args[0] in _TIMEOUT_ERROR_CODES):
+                    raise MySQLTimeoutError(f"Query timeout after {timeout} seconds") from e
+                raise
+            if not exhausted and drain_rows:
+                exhausted = self._drain(cursor, drain_rows)
+            if exhausted:
+                cursor.close()
+                discard = False
+        finally:
+            if watchdog:
+                watchdog.finish()
+            self._release(pooled, discard=discard)
+
+    @staticmethod
+    def _drain(cursor, max_rows: int) -> bool:
+        """读取最多 max_rows 行剩余结果，读到结果集结尾时返回 True"""
+        try:
+            for _ in range(max_rows + 1):
+                if cursor.fetchone() is None:
+                    return True
+        except pymysql.err.Error as e:
+            logger.debug(f"Failed to drain MySQL result set: {e}")
+        return False
 
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    raise e  # 最后一次尝试失败，抛出异常
-                time.sleep(1)
+    async def aexecute(self, sql: str, params: tuple | dict | None = None, timeout: float | None = None) -> list[dict]:
+        """execute 的异步版本，在 MySQL 专用线程池中执行"""
+        return await arun(self.execute, sql, params, timeout)
+
+    def test_connection(self) -> bool:
+        """测试连接是否有效"""
+        try:
+            with self.get_cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            return True
+        except Exception as _:
+            pass
+        return False
 
     def close(self):
-        """关闭数据库连接"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
-            logger.info("MySQL connection closed")
+        """关闭连接池中的空闲连接"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for pooled in idle:
+            self._close_quietly(pooled.connection)
+        if idle:
+            logger.info(f"Closed {len(idle)} pooled MySQL connections")
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MYSQL_POOL_SIZE, thread_name_prefix="mysql")
+    return _executor
+
+
+async def arun(func: Callable, *args, **kwargs):
+    """在 MySQL 专用线程池中执行阻塞调用（异步门面）
+
+    线程数与连接池大小一致，等待连接的调用不会占满默认执行器；并发的工具调用各自持有连接并行执行。
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_get_executor(), call)
 
 
 class QueryTimeoutError(Exception):
@@ -155,28 +327,6 @@ class QueryResultTooLargeError(Exception):
     pass
 
 
-def execute_query_with_timeout(connection: pymysql.Connection, sql: str, params: tuple = None, timeout: int = 10):
-    """带超时的查询执行"""
-
-    def timeout_handler(_signum, _frame):
-        raise QueryTimeoutError(f"Query timeout after {timeout} seconds")
-
-    # 设置信号处理
-    old_handler = signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(timeout)
-
-    try:
-        cursor = connection.cursor(DictCursor)
-        cursor.execute(sql, params or ())
-        result = cursor.fetchall()
-        cursor.close()
-        return result
-    finally:
-        # 恢复原始信号处理
-        signal.alarm(0)
-        signal.signal(signal.SIGALRM, old_handler)
-
-
 def limit_result_size(result: list, max_chars: int = 10000) -> list:
     """限制结果大小"""
     if not result:
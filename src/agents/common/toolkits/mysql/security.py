@@ -76,6 +76,40 @@ class MySQLSecurityChecker:
         # 检查表名只包含字母、数字、下划线
         return bool(re.match(r"^[a-zA-Z_][a-zA-Z0-9_]*$", table_name))
 
+    # 语句末尾的 LIMIT 子句：LIMIT n / LIMIT offset, n / LIMIT n OFFSET m
+    _TRAILING_LIMIT = re.compile(
+        r"\bLIMIT\s+(?:(?P<offset>\d+)\s*,\s*)?(?P<count>\d+)(?P<tail>\s+OFFSET\s+\d+)?\s*$", re.IGNORECASE
+    )
+
+    @classmethod
+    def enforce_row_limit(cls, sql: str, limit: int) -> tuple[str, bool]:
+        """
+        为 SELECT 语句加上（或收紧）最外层 LIMIT，使服务端最多返回 limit + 1 行
+
+        多取的一行用于判断结果是否被截断。改写后的语句会重新做安全检查。
+
+        Returns:
+            (改写后的 SQL, 是否由本方法限制了行数)；非 SELECT 语句原样返回
+        """
+        statement = sql.strip().rstrip(";").rstrip()
+        if not statement.upper().startswith("SELECT"):
+            return sql, False
+
+        cap = limit + 1
+        match = cls._TRAILING_LIMIT.search(statement)
+        if match is None:
+            rewritten = f"{statement} LIMIT {cap}"
+        elif int(match.group("count")) <= limit:
+            # 用户自带的 LIMIT 已在上限之内
+            return statement, False
+        else:
+            offset = f"{match.group('offset')}, " if match.group("offset") is not None else ""
+            rewritten = f"{statement[: match.start()]}LIMIT {offset}{cap}{match.group('tail') or ''}"
+
+        if not cls.validate_sql(rewritten):
+            raise ValueError("LIMIT 改写后的 SQL 未通过安全检查")
+        return rewritten, True
+
     @classmethod
     def validate_limit(cls, limit: int) -> bool:
         """验证limit参数"""
@@ -1,16 +1,18 @@
 from typing import Annotated, Any
 
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
 
 from src.utils import logger
 
-from .connection import MySQLConnectionManager, limit_result_size
+from .catalog import SchemaCatalog
+from .connection import MySQLConnectionManager, arun
 from .exceptions import MySQLConnectionError
 from .security import MySQLSecurityChecker
 
-# 全局连接管理器实例
+# 全局连接管理器与结构目录实例
 _connection_manager: MySQLConnectionManager | None = None
+_schema_catalog: SchemaCatalog | None = None
 
 
 def get_connection_manager() -> MySQLConnectionManager:
@@ -38,49 +40,70 @@ def get_connection_manager() -> MySQLConnectionManager:
     return _connection_manager
 
 
+def get_schema_catalog() -> SchemaCatalog:
+    """获取全局数据库结构目录缓存"""
+    global _schema_catalog
+    if _schema_catalog is None:
+        _schema_catalog = SchemaCatalog(get_connection_manager())
+    return _schema_catalog
+
+
+def mysql_tool(args_schema: type[BaseModel]):
+    """将同步实现注册为工具，并提供在 MySQL 线程池中执行的协程版本，Agent 并发的工具调用可以并行执行"""
+
+    def decorator(func):
+        async def coroutine(**kwargs):
+            return await arun(func, **kwargs)
+
+        return StructuredTool.from_function(func=func, coroutine=coroutine, args_schema=args_schema)
+
+    return decorator
+
+
 class TableListModel(BaseModel):
     """获取表名列表的参数模型"""
 
-    pass
+    exact_counts: bool = Field(
+        default=False, description="是否统计精确行数（会对每张表执行 COUNT(*)，大表较慢），默认使用近似行数"
+    )
 
 
-@tool(args_schema=TableListModel)
-def mysql_list_tables() -> str:
+@mysql_tool(args_schema=TableListModel)
+def mysql_list_tables(exact_counts: Annotated[bool, "是否统计精确行数"] = False) -> str:
     """获取数据库中的所有表名
 
     这个工具用来列出当前数据库中所有的表名，帮助你了解数据库的结构。
+    默认给出的行数是 information_schema 中的近似值；确实需要精确行数时设置 exact_counts=true。
     """
     try:
-        conn_manager = get_connection_manager()
-
-        with conn_manager.get_cursor() as cursor:
-            # 获取表名
-            cursor.execute("SHOW TABLES")
-            tables = cursor.fetchall()
-
-            if not tables:
-                return "数据库中没有找到任何表"
+        catalog = get_schema_catalog()
+        tables = catalog.list_tables()
 
-            # 提取表名
-            table_names = []
-            for table in tables:
-                table_name = list(table.values())[0]
-                table_names.append(table_name)
+        if not tables:
+            return "数据库中没有找到任何表"
 
-            # 获取每个表的行数信息
-            table_info = []
-            for table_name in table_names:
+        table_info = []
+        for table in tables:
+            if exact_counts and not table.is_view:
                 try:
-                    cursor.execute(f"SELECT COUNT(*) as count FROM `{table_name}`")
-                    count_result = cursor.fetchone()
-                    row_count = count_result["count"]
-                    table_info.append(f"- {table_name} (约 {row_count} 行)")
+                    rows = f"{catalog.exact_row_count(table.name)} 行"
                 except Exception:
-                    table_info.append(f"- {table_name} (无法获取行数)")
+                    rows = "无法获取行数"
+            elif table.is_view:
+                rows = "视图"
+            elif table.approx_rows is not None:
+                rows = f"约 {table.approx_rows} 行"
+            else:
+                rows = "无法获取行数"
+
+            line = f"- {table.name} ({rows})"
+            if table.comment:
+                line += f" - {table.comment}"
+            table_info.append(line)
 
-            result = "数据库中的表:\n" + "\n".join(table_info)
-            logger.info(f"Retrieved {len(table_names)} tables from database")
-            return result
+        result = "数据库中的表:\n" + "\n".join(table_info)
+        logger.info(f"Retrieved {len(tables)} tables from database")
+        return result
 
     except Exception as e:
         error_msg = f"获取表名失败: {str(e)}"
@@ -94,7 +117,7 @@ class TableDescribeModel(BaseModel):
     table_name: str = Field(description="要查询的表名", example="users")
 
 
-@tool(args_schema=TableDescribeModel)
+@mysql_tool(args_schema=TableDescribeModel)
 def mysql_describe_table(table_name: Annotated[str, "要查询结构的表名"]) -> str:
     """获取指定表的详细结构信息
 
@@ -106,53 +129,45 @@ def mysql_describe_table(table_name: Annotated[str, "要查询结构的表名"])
         if not MySQLSecurityChecker.validate_table_name(table_name):
             return "表名包含非法字符，请检查表名"
 
-        conn_manager = get_connection_manager()
+        catalog = get_schema_catalog()
+        table = catalog.get_table(table_name)
+        schema = catalog.describe(table_name) if table else None
+
+        if not schema or not schema.columns:
+            return f"表 {table_name} 不存在或没有字段"
+
+        # 格式化输出
+        result = f"表 `{table.name}` 的结构"
+        if table.approx_rows is not None and not table.is_view:
+            result += f"（约 {table.approx_rows} 行）"
+        result += ":\n\n"
+        if table.comment:
+            result += f"说明: {table.comment}\n\n"
+        result += "字段名\t\t类型\t\tNULL\t键\t默认值\t\t额外\t\t注释\n"
+        result += "-" * 80 + "\n"
+
+        for col in schema.columns:
+            field = col["Field"] or ""
+            type_str = col["Type"] or ""
+            null_str = col["Null"] or ""
+            key_str = col["Key"] or ""
+            default_str = col.get("Default") or ""
+            extra_str = col.get("Extra") or ""
+            comment_str = col.get("Comment") or ""
 
-        with conn_manager.get_cursor() as cursor:
-            # 获取表结构
-            cursor.execute(f"DESCRIBE `{table_name}`")
-            columns = cursor.fetchall()
+            # 格式化输出
+            result += (
+                f"{field:<16}\t{type_str:<16}\t{null_str:<8}\t{key_str:<4}\t{default_str:<16}\t"
+                f"{extra_str:<16}\t{comment_str}\n"
+            )
 
-            if not columns:
-                return f"表 {table_name} 不存在或没有字段"
+        if schema.indexes:
+            result += "\n索引信息:\n"
+            for key_name, columns in schema.indexes.items():
+                result += f"- {key_name}: {', '.join(columns)}\n"
 
-            # 格式化输出
-            result = f"表 `{table_name}` 的结构:\n\n"
-            result += "字段名\t\t类型\t\tNULL\t键\t默认值\t\t额外\n"
-            result += "-" * 80 + "\n"
-
-            for col in columns:
-                field = col["Field"] or ""
-                type_str = col["Type"] or ""
-                null_str = col["Null"] or ""
-                key_str = col["Key"] or ""
-                default_str = col.get("Default") or ""
-                extra_str = col.get("Extra") or ""
-
-                # 格式化输出
-                result += f"{field:<16}\t{type_str:<16}\t{null_str:<8}\t{key_str:<4}\t{default_str:<16}\t{extra_str}\n"
-
-            # 获取索引信息
-            try:
-                cursor.execute(f"SHOW INDEX FROM `{table_name}`")
-                indexes = cursor.fetchall()
-
-                if indexes:
-                    result += "\n索引信息:\n"
-                    index_dict = {}
-                    for idx in indexes:
-                        key_name = idx["Key_name"]
-                        if key_name not in index_dict:
-                            index_dict[key_name] = []
-                        index_dict[key_name].append(idx["Column_name"])
-
-                    for key_name, columns in index_dict.items():
-                        result += f"- {key_name}: {', '.join(columns)}\n"
-            except Exception as e:
-                logger.warning(f"Failed to get index info for table {table_name}: {e}")
-
-            logger.info(f"Retrieved structure for table {table_name}")
-            return result
+        logger.info(f"Retrieved structure for table {table.name}")
+        return result
 
     except Exception as e:
         error_msg = f"获取表 {table_name} 结构失败: {str(e)}"
@@ -160,6 +175,49 @@ def mysql_describe_table(table_name: Annotated[str, "要查询结构的表名"])
         return error_msg
 
 
+# mysql_query 返回给 Agent 的表格最大字符数
+QUERY_RESULT_MAX_CHARS = 10000
+# 单元格最大显示字符数，超出部分省略
+_CELL_MAX_CHARS = 200
+
+
+class MarkdownTableRenderer:
+    """逐行渲染 Markdown 表格，超出字符预算时拒绝新行"""
+
+    def __init__(self, max_chars: int = QUERY_RESULT_MAX_CHARS):
+        self.max_chars = max_chars
+        self.columns: list[str] | None = None
+        self.row_count = 0
+        self._lines: list[str] = []
+        self._size = 0
+
+    @staticmethod
+    def _cell(value) -> str:
+        text = "NULL" if value is None else str(value)
+        text = text.replace("|", "\\|").replace("\r", " ").replace("\n", " ")
+        return text if len(text) <= _CELL_MAX_CHARS else text[: _CELL_MAX_CHARS - 1] + "…"
+
+    def _append(self, line: str) -> None:
+        self._lines.append(line)
+        self._size += len(line) + 1
+
+    def add_row(self, row: dict) -> bool:
+        if self.columns is None:
+            self.columns = list(row.keys())
+            self._append("| " + " | ".join(self._cell(col) for col in self.columns) + " |")
+            self._append("|" + "|".join(" --- " for _ in self.columns) + "|")
+
+        line = "| " + " | ".join(self._cell(row.get(col)) for col in self.columns) + " |"
+        if self._size + len(line) + 1 > self.max_chars:
+            return False
+        self._append(line)
+        self.row_count += 1
+        return True
+
+    def render(self) -> str:
+        return "\n".join(self._lines)
+
+
 class QueryModel(BaseModel):
     """执行SQL查询的参数模型"""
 
@@ -168,7 +226,7 @@ class QueryModel(BaseModel):
     timeout: int | None = Field(default=10, description="查询超时时间（秒），默认10秒，最大60秒", ge=1, le=60)
 
 
-@tool(args_schema=QueryModel)
+@mysql_tool(args_schema=QueryModel)
 def mysql_query(
     sql: Annotated[str, "要执行的SQL查询语句（只能是SELECT语句）"],
     limit: Annotated[int | None, "限制返回的最大行数，默认100，最大1000"] = 100,
@@ -196,67 +254,50 @@ def mysql_query(
         if not MySQLSecurityChecker.validate_timeout(timeout):
             return "timeout参数必须在1-60之间"
 
-        # 如果SQL中没有LIMIT，添加LIMIT子句
-        if "LIMIT" not in sql.upper() and "limit" not in sql:
-            sql_upper = sql.strip().upper()
-            # 确保是SELECT语句才添加LIMIT
-            if sql_upper.startswith("SELECT"):
-                sql = f"{sql} LIMIT {limit}"
+        # 由安全检查器为 SELECT 加上（或收紧）LIMIT，多取一行用于判断是否截断
+        sql, row_limited = MySQLSecurityChecker.enforce_row_limit(sql, limit)
 
         conn_manager = get_connection_manager()
-
-        with conn_manager.get_cursor() as cursor:
-            # 执行查询
-            cursor.execute(sql)
-            result = cursor.fetchall()
-
-            if not result:
-                return "查询执行成功，但没有返回任何结果"
-
-            # 限制结果大小
-            limited_result = limit_result_size(result, max_chars=10000)
-
-            # 检查结果是否被截断
-            if len(limited_result) < len(result):
-                warning = f"\n\n⚠️ 警告: 查询结果过大，只显示了前 {len(limited_result)} 行（共 {len(result)} 行）。\n"
-                warning += "建议使用更精确的查询条件或使用LIMIT子句来减少返回的数据量。"
-            else:
-                warning = ""
-
-            # 格式化输出
-            if limited_result:
-                # 获取列名
-                columns = list(limited_result[0].keys())
-
-                # 计算每列的最大宽度
-                col_widths = {}
-                for col in columns:
-                    col_widths[col] = max(len(str(col)), max(len(str(row.get(col, ""))) for row in limited_result))
-                    col_widths[col] = min(col_widths[col], 50)  # 限制最大宽度
-
-                # 构建表头
-                header = "| " + " | ".join(f"{col:<{col_widths[col]}}" for col in columns) + " |"
-                separator = "|" + "|".join("-" * (col_widths[col] + 2) for col in columns) + "|"
-
-                # 构建数据行
-                rows = []
-                for row in limited_result:
-                    row_str = "| " + " | ".join(f"{str(row.get(col, '')):<{col_widths[col]}}" for col in columns) + " |"
-                    rows.append(row_str)
-
-                result_str = f"查询结果（共 {len(limited_result)} 行）:\n\n"
-                result_str += header + "\n" + separator + "\n"
-                result_str += "\n".join(rows[:50])  # 最多显示50行
-
-                if len(rows) > 50:
-                    result_str += f"\n\n... 还有 {len(rows) - 50} 行未显示 ..."
-
-                result_str += warning
-
-                logger.info(f"Query executed successfully, returned {len(limited_result)} rows")
-                return result_str
-            else:
-                return "查询执行成功，但没有返回任何结果"
+        table = MarkdownTableRenderer(max_chars=QUERY_RESULT_MAX_CHARS)
+        truncated_by = None
+
+        # 服务端游标逐行读取，达到行数或字符预算即停止，不把整个结果集拉到内存
+        # 超时由服务端终止查询（MAX_EXECUTION_TIME / KILL QUERY），可在任意线程中执行
+        # 注入 LIMIT limit+1 时结果集至多比上限多一行，停止读取后读完剩余结果，连接即可放回连接池
+        with conn_manager.stream(sql, timeout=timeout, drain_rows=1 if row_limited else 0) as rows:
+            for row in rows:
+                if table.row_count >= limit:
+                    truncated_by = "row_limit"
+                    break
+                if not table.add_row(row):
+                    truncated_by = "char_budget"
+                    break
+
+        if table.row_count == 0:
+            if truncated_by == "char_budget":
+                return f"查询结果的单行内容超过 {QUERY_RESULT_MAX_CHARS} 字符，无法显示。请只选择需要的列。"
+            return "查询执行成功，但没有返回任何结果"
+
+        result_str = f"查询结果（共 {table.row_count} 行）:\n\n" + table.render()
+
+        # 截断信息返回给 Agent，便于决定是否需要缩小范围或分页
+        if truncated_by == "row_limit":
+            result_str += (
+                f"\n\n⚠️ 警告: 结果已截断，达到行数上限 limit={limit}，实际结果多于 {limit} 行。\n"
+                "建议使用更精确的查询条件、聚合查询或 LIMIT/OFFSET 分页。"
+            )
+        elif truncated_by == "char_budget":
+            result_str += (
+                f"\n\n⚠️ 警告: 结果已截断，输出超过 {QUERY_RESULT_MAX_CHARS} 字符，只显示了前 {table.row_count} 行。\n"
+                "建议只选择需要的列或使用更精确的查询条件来减少返回的数据量。"
+            )
+        result_str += (
+            f"\n\n[截断信息] rows_returned={table.row_count}, truncated={'true' if truncated_by else 'false'}"
+            f", reason={truncated_by or 'none'}, row_limit={limit}, limit_injected={'true' if row_limited else 'false'}"
+        )
+
+        logger.info(f"Query executed successfully, returned {table.row_count} rows (truncated_by={truncated_by})")
+        return result_str
 
     except Exception as e:
         error_msg = f"SQL查询执行失败: {str(e)}"
@@ -41,6 +41,15 @@ SEMANTIC_MAPPING = {
 }
 
 
+def _join_lightrag_result(lightrag_result: Any) -> str:
+    """LightRAG 结构化结果（实体 / 关系 / 文本块各一条）合并为一段文本"""
+    if isinstance(lightrag_result, list):
+        return "\n".join(
+            (item.get("content", "") or str(item)) if isinstance(item, dict) else str(item) for item in lightrag_result
+        )
+    return str(lightrag_result) if lightrag_result else ""
+
+
 def get_static_tools(input_context: dict | None = None) -> list:
     """注册静态工具"""
     retrieval_mode = input_context.get("retrieval_mode", "mix") if input_context else "mix"
@@ -55,14 +64,7 @@ def get_static_tools(input_context: dict | None = None) -> list:
             logger.debug(f"Querying knowledge graph [{graph_name}] with: {query}")
             if graph_name != "neo4j":
                 lightrag_result = await knowledge_base.aquery(query, graph_name, mode="global")
-                if isinstance(lightrag_result, list) and lightrag_result:
-                    first_item = lightrag_result[0]
-                    if isinstance(first_item, dict):
-                        content = first_item.get("content", "") or str(first_item)
-                    else:
-                        content = str(first_item)
-                else:
-                    content = str(lightrag_result) if lightrag_result else ""
+                content = _join_lightrag_result(lightrag_result)
                 return {
                     "query_type": "search",
                     "query": query,
@@ -439,11 +441,8 @@ def get_hybrid_search_tool(input_context: dict = None) -> list:
                     lightrag_result = await knowledge_base.aquery(query_text, graph_name, mode="global")
                     if lightrag_result:
                         # 将 LightRAG 的图谱结果格式化
-                        if isinstance(lightrag_result, list) and len(lightrag_result) > 0:
-                            content = lightrag_result[0].get("content", "") if isinstance(lightrag_result[0], dict) else str(lightrag_result[0])
-                        else:
-                            content = str(lightrag_result)
-                        
+                        content = _join_lightrag_result(lightrag_result)
+
                         results["knowledge_graph_results"] = {
                             "query_type": "search",
                             "query": query_text,
@@ -503,8 +502,12 @@ def get_hybrid_search_tool(input_context: dict = None) -> list:
     return [hybrid_tool]
 
 
-def get_buildin_tools(input_context: dict = None) -> list:
-    """获取所有可运行的工具（给大模型使用）"""
+def get_buildin_tools(input_context: dict = None, raise_errors: bool = False) -> list:
+    """获取所有可运行的工具（给大模型使用）
+
+    默认在构建失败时记录日志并返回已构建的部分工具；raise_errors 为 True 时直接抛出，
+    供需要缓存工具列表的调用方区分完整结果与部分结果。
+    """
     tools = []
     retrieval_mode = input_context.get("retrieval_mode", "mix") if input_context else "mix"
 
@@ -521,6 +524,8 @@ def get_buildin_tools(input_context: dict = None) -> list:
             tools.extend(get_static_tools(input_context))
 
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(f"Failed to get knowledge base retrievers: {e}")
 
     return tools
@@ -206,6 +206,21 @@ class KnowledgeBase(ABC):
         """
         pass
 
+    async def update_content(self, db_id: str, file_id: str, item: str, params: dict | None = None) -> dict:
+        """
+        使用新版本的文件/URL 增量更新已入库的文件
+
+        Args:
+            db_id: 数据库ID
+            file_id: 被更新的文件ID
+            item: 新版本的文件路径或URL
+            params: 处理参数
+
+        Returns:
+            更新后的文件记录
+        """
+        raise NotImplementedError(f"{self.kb_type} knowledge base does not support incremental update")
+
     @abstractmethod
     async def aquery(self, query_text: str, db_id: str, mode="mix", **kwargs) -> list[dict]:
         """
@@ -225,6 +240,19 @@ class KnowledgeBase(ABC):
     async def export_data(self, db_id: str, format: str = "zip", **kwargs) -> str:
         pass
 
+    async def import_data(self, db_id: str, archive_path: str, **kwargs) -> dict:
+        """
+        从 export_data 导出的归档恢复数据
+
+        Args:
+            db_id: 目标数据库ID
+            archive_path: 归档文件路径
+
+        Returns:
+            导入统计
+        """
+        raise NotImplementedError(f"{self.kb_type} knowledge base does not support import")
+
     def query(self, query_text: str, db_id: str, **kwargs) -> list[dict]:
         """
         同步查询知识库（兼容性方法）
@@ -416,6 +444,21 @@ class KnowledgeBase(ABC):
         """
         pass
 
+    async def delete_files(self, db_id: str, file_ids: list[str]) -> dict:
+        """
+        批量删除文件，默认逐个删除，存储支持时由子类合并为一次操作
+
+        Args:
+            db_id: 数据库ID
+            file_ids: 文件ID列表
+
+        Returns:
+            删除统计
+        """
+        for file_id in file_ids:
+            await self.delete_file(db_id, file_id)
+        return {"deleted_files": len(file_ids)}
+
     @abstractmethod
     async def get_file_basic_info(self, db_id: str, file_id: str) -> dict:
         """
@@ -431,16 +474,18 @@ class KnowledgeBase(ABC):
         pass
 
     @abstractmethod
-    async def get_file_content(self, db_id: str, file_id: str) -> dict:
+    async def get_file_content(self, db_id: str, file_id: str, offset: int = 0, limit: int | None = None) -> dict:
         """
         获取文件内容信息（chunks和lines）
 
         Args:
             db_id: 数据库ID
             file_id: 文件ID
+            offset: 按 chunk 顺序跳过的数量
+            limit: 返回的 chunk 数量上限，None 表示全部
 
         Returns:
-            dict: 包含文件内容信息的字典
+            dict: 包含文件内容信息的字典（lines 为当前页，total 为 chunk 总数）
         """
         pass
 
@@ -1,11 +1,14 @@
+import asyncio
 import json
 import os
+import time
 import traceback
 import warnings
 
 from neo4j import GraphDatabase as GD
 
 from src import config
+from src.knowledge.utils.vector_compression import VectorCompression
 from src.models import select_embedding_model
 from src.utils import logger
 from src.utils.datetime_utils import utc_isoformat
@@ -14,6 +17,20 @@ warnings.filterwarnings("ignore", category=UserWarning)
 
 
 UIE_MODEL = None
+# 节点向量回填时每批计算和写入的节点数量
+EMBEDDING_BACKFILL_BATCH_SIZE = 256
+# 每批计算失败后的重试次数与指数退避的初始等待时间（秒）
+EMBEDDING_BACKFILL_MAX_RETRIES = int(os.getenv("GRAPH_BACKFILL_MAX_RETRIES") or 3)
+EMBEDDING_BACKFILL_RETRY_DELAY = float(os.getenv("GRAPH_BACKFILL_RETRY_DELAY") or 2.0)
+# 连续多少批在重试后仍无法计算（视为嵌入服务不可用）时终止任务并标记为 failed
+EMBEDDING_BACKFILL_MAX_FAILED_BATCHES = int(os.getenv("GRAPH_BACKFILL_MAX_FAILED_BATCHES") or 3)
+# 整批失败后逐个计算时，开头连续失败多少个节点即判定为服务不可用，不再标记节点
+_BACKFILL_OUTAGE_PROBE = 3
+# entityEmbeddings 向量索引压缩：Neo4j 仅支持索引内 int8 量化，截断需要 Matryoshka 模型；
+# 修改维度后需要删除旧索引并重新回填节点向量
+GRAPH_VECTOR_QUANTIZATION = os.getenv("GRAPH_VECTOR_QUANTIZATION") or "none"
+GRAPH_EMBED_TRUNCATE_DIM = int(os.getenv("GRAPH_EMBED_TRUNCATE_DIM") or 0)
+GRAPH_VECTOR_RESCORE = os.getenv("GRAPH_VECTOR_RESCORE", "false").lower() == "true"
 
 
 class GraphDatabase:
@@ -70,6 +87,26 @@ class GraphDatabase:
         self.embed_model_name = resolved_model_name
         self.embed_model = select_embedding_model(self.embed_model_name)
 
+    def _get_compression(self) -> VectorCompression:
+        """实体向量的压缩配置（按当前嵌入模型解析）"""
+        quantization = GRAPH_VECTOR_QUANTIZATION.lower()
+        if quantization == "binary":
+            logger.warning("Neo4j vector index does not support binary quantization, fallback to int8")
+            quantization = "int8"
+        params = {
+            "vector_quantization": quantization,
+            "truncate_dim": GRAPH_EMBED_TRUNCATE_DIM,
+            "vector_rescore": GRAPH_VECTOR_RESCORE,
+        }
+        return VectorCompression.from_params(params, config.embed_model_names.get(self.embed_model_name))
+
+    def _compress_embeddings(self, embeddings):
+        """按截断配置处理向量，未截断时原样返回"""
+        compression = self._get_compression()
+        if not compression.truncate_dim:
+            return embeddings
+        return compression.prepare(embeddings).tolist()
+
     def start(self):
         uri = os.environ.get("NEO4J_URI", "bolt://localhost:7687")
         username = os.environ.get("NEO4J_USERNAME", "neo4j")
@@ -278,7 +315,7 @@ class GraphDatabase:
                     r=entry["r"],
                 )
 
-        def _create_vector_index(tx, dim):
+        def _create_vector_index(tx, dim, quantized):
             """创建向量索引"""
             # NOTE 这里是否是会重复构建索引？
             index_name = "entityEmbeddings"
@@ -288,7 +325,8 @@ class GraphDatabase:
                 FOR (n: Entity) ON (n.embedding)
                 OPTIONS {{indexConfig: {{
                 `vector.dimensions`: {dim},
-                `vector.similarity_function`: 'cosine'
+                `vector.similarity_function`: 'cosine',
+                `vector.quantization.enabled`: {"true" if quantized else "false"}
                 }} }};
                 """)
 
@@ -312,18 +350,6 @@ class GraphDatabase:
 
             return [record["name"] for record in result]
 
-        def _batch_set_embeddings(tx, entity_embedding_pairs):
-            """批量设置实体的嵌入向量"""
-            for entity_name, embedding in entity_embedding_pairs:
-                tx.run(
-                    """
-                MATCH (e:Entity {name: $name})
-                CALL db.create.setNodeVectorProperty(e, 'embedding', $embedding)
-                """,
-                    name=entity_name,
-                    embedding=embedding,
-                )
-
         self._ensure_embed_model()
         cur_embed_info = config.embed_model_names.get(self.embed_model_name)
         assert cur_embed_info is not None, f"Embedding model config missing: {self.embed_model_name}"
@@ -332,8 +358,13 @@ class GraphDatabase:
         with self.driver.session() as session:
             logger.info(f"Adding entity to {kgdb_name}")
             session.execute_write(_create_graph, triples)
-            logger.info(f"Creating vector index for {kgdb_name} with {config.embed_model}")
-            session.execute_write(_create_vector_index, cur_embed_info["dimension"])
+            compression = self._get_compression()
+            logger.info(f"Creating vector index for {kgdb_name} with {config.embed_model}, {compression.to_dict()}")
+            session.execute_write(
+                _create_vector_index,
+                compression.stored_dim(cur_embed_info["dimension"]),
+                compression.quantization != "none",
+            )
 
             # 收集所有需要处理的实体名称，去重
             all_entities = []
@@ -369,7 +400,7 @@ class GraphDatabase:
                 entity_embedding_pairs = list(zip(batch_entities, batch_embeddings))
 
                 # 批量写入数据库
-                session.execute_write(_batch_set_embeddings, entity_embedding_pairs)
+                session.execute_write(self.set_embeddings_batch, entity_embedding_pairs)
 
             # 数据添加完成后保存图信息
             self.save_graph_info()
@@ -617,6 +648,23 @@ class GraphDatabase:
                 )
 
             embedding = self.get_embedding(text)
+            compression = self._get_compression()
+            if compression.rescore:
+                # 量化索引召回更多候选，再用节点上的全精度向量重新计算相似度
+                result = tx.run(
+                    """
+                CALL db.index.vector.queryNodes('entityEmbeddings', $candidates, $embedding)
+                YIELD node AS similarEntity
+                WITH similarEntity, vector.similarity.cosine(similarEntity.embedding, $embedding) AS score
+                RETURN similarEntity.name AS name, score
+                ORDER BY score DESC
+                LIMIT 10
+                """,
+                    embedding=embedding,
+                    candidates=10 * compression.rescore_factor,
+                )
+                return [r for r in result if r["score"] > threshold]
+
             result = tx.run(
                 """
             CALL db.index.vector.queryNodes('entityEmbeddings', 10, $embedding)
@@ -702,19 +750,19 @@ class GraphDatabase:
         self._ensure_embed_model()
         if isinstance(text, list):
             outputs = await self.embed_model.abatch_encode(text, batch_size=40)
-            return outputs
+            return self._compress_embeddings(outputs)
         else:
             outputs = await self.embed_model.aencode(text)
-            return outputs
+            return self._compress_embeddings(outputs)
 
     def get_embedding(self, text):
         self._ensure_embed_model()
         if isinstance(text, list):
             outputs = self.embed_model.batch_encode(text, batch_size=40)
-            return outputs
+            return self._compress_embeddings(outputs)
         else:
             outputs = self.embed_model.encode([text])[0]
-            return outputs
+            return self._compress_embeddings([outputs])[0]
 
     def set_embedding(self, tx, entity_name, embedding):
         tx.run(
@@ -726,6 +774,17 @@ class GraphDatabase:
             embedding=embedding,
         )
 
+    def set_embeddings_batch(self, tx, entity_embedding_pairs):
+        """使用 UNWIND 在一条语句中批量设置实体的嵌入向量"""
+        tx.run(
+            """
+        UNWIND $rows AS row
+        MATCH (e:Entity {name: row.name})
+        CALL db.create.setNodeVectorProperty(e, 'embedding', row.embedding)
+        """,
+            rows=[{"name": name, "embedding": embedding} for name, embedding in entity_embedding_pairs],
+        )
+
     def get_graph_info(self, graph_name="neo4j"):
         assert self.driver is not None, "Database is not connected"
         self.use_database(graph_name)
@@ -741,6 +800,9 @@ class GraphDatabase:
 
             # 获取所有标签
             labels = tx.run("CALL db.labels() YIELD label RETURN collect(label) AS labels").single()["labels"]
+            unindexed_node_count = tx.run(
+                "MATCH (n:Entity) WHERE n.embedding IS NULL RETURN count(n) AS count"
+            ).single()["count"]
 
             return {
                 "graph_name": graph_name,
@@ -750,7 +812,7 @@ class GraphDatabase:
                 "labels": labels,
                 "status": self.status,
                 "embed_model_name": self.embed_model_name,
-                "unindexed_node_count": len(self.query_nodes_without_embedding(graph_name)),
+                "unindexed_node_count": unindexed_node_count,
             }
 
         try:
@@ -791,9 +853,13 @@ class GraphDatabase:
             logger.error(f"保存图数据库信息失败：{e}")
             return False
 
-    def query_nodes_without_embedding(self, kgdb_name="neo4j"):
+    def query_nodes_without_embedding(self, kgdb_name="neo4j", limit=None, exclude=None):
         """查询没有嵌入向量的节点
 
+        Args:
+            limit (int, optional): 最多返回的节点数量，None 表示全部
+            exclude (list, optional): 需要跳过的节点名称，例如之前计算失败的节点
+
         Returns:
             list: 没有嵌入向量的节点列表
         """
@@ -801,16 +867,32 @@ class GraphDatabase:
         self.use_database(kgdb_name)
 
         def query(tx):
-            result = tx.run("""
+            result = tx.run(
+                f"""
             MATCH (n:Entity)
-            WHERE n.embedding IS NULL
+            WHERE n.embedding IS NULL AND NOT n.name IN $exclude
             RETURN n.name AS name
-            """)
+            {"LIMIT $limit" if limit else ""}
+            """,
+                exclude=list(exclude or []),
+                limit=limit,
+            )
             return [record["name"] for record in result]
 
         with self.driver.session() as session:
             return session.execute_read(query)
 
+    def count_nodes_without_embedding(self, kgdb_name="neo4j"):
+        """统计没有嵌入向量的节点数量"""
+        assert self.driver is not None, "Database is not connected"
+        self.use_database(kgdb_name)
+
+        def query(tx):
+            return tx.run("MATCH (n:Entity) WHERE n.embedding IS NULL RETURN count(n) AS count").single()["count"]
+
+        with self.driver.session() as session:
+            return session.execute_read(query)
+
     def load_graph_info(self):
         """
         从工作目录中的JSON文件加载图数据库的基本信息
@@ -838,12 +920,13 @@ class GraphDatabase:
             logger.error(f"加载图数据库信息失败：{e}")
             return False
 
-    def add_embedding_to_nodes(self, node_names=None, kgdb_name="neo4j"):
+    def add_embedding_to_nodes(self, node_names=None, kgdb_name="neo4j", batch_size=EMBEDDING_BACKFILL_BATCH_SIZE):
         """为节点添加嵌入向量
 
         Args:
             node_names (list, optional): 要添加嵌入向量的节点名称列表，None表示所有没有嵌入向量的节点
             kgdb_name (str, optional): 图数据库名称，默认为'neo4j'
+            batch_size (int, optional): 每批计算并写入的节点数量
 
         Returns:
             int: 成功添加嵌入向量的节点数量
@@ -857,16 +940,182 @@ class GraphDatabase:
 
         count = 0
         with self.driver.session() as session:
-            for node_name in node_names:
+            for i in range(0, len(node_names), batch_size):
+                batch_names = node_names[i : i + batch_size]
                 try:
-                    embedding = self.get_embedding(node_name)
-                    session.execute_write(self.set_embedding, node_name, embedding)
-                    count += 1
+                    embeddings = self.get_embedding(batch_names)
+                    session.execute_write(self.set_embeddings_batch, list(zip(batch_names, embeddings)))
+                    count += len(batch_names)
                 except Exception as e:
-                    logger.error(f"为节点 '{node_name}' 添加嵌入向量失败: {e}, {traceback.format_exc()}")
+                    logger.error(f"为 {len(batch_names)} 个节点添加嵌入向量失败: {e}, {traceback.format_exc()}")
 
         return count
 
+    def _backfill_checkpoint_path(self, kgdb_name="neo4j"):
+        return os.path.join(self.work_dir, f"embedding_backfill_{kgdb_name}.json")
+
+    def load_embedding_backfill_state(self, kgdb_name="neo4j"):
+        """读取节点向量回填任务的检查点，不存在时返回 None"""
+        checkpoint_path = self._backfill_checkpoint_path(kgdb_name)
+        if not os.path.exists(checkpoint_path):
+            return None
+        try:
+            with open(checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"读取向量回填检查点失败：{e}")
+            return None
+
+    def _save_embedding_backfill_state(self, state, kgdb_name="neo4j"):
+        checkpoint_path = self._backfill_checkpoint_path(kgdb_name)
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, checkpoint_path)
+
+    async def abackfill_node_embeddings(
+        self,
+        kgdb_name="neo4j",
+        batch_size=EMBEDDING_BACKFILL_BATCH_SIZE,
+        on_progress=None,
+        should_stop=None,
+        task_id=None,
+    ):
+        """后台批量回填没有嵌入向量的节点
+
+        每次分页读取一批未嵌入的节点，批量计算向量后用 UNWIND 写回，并把进度写入检查点文件。
+        已写入的节点不会再被查询到，因此任务中断后重新执行即可从断点继续。
+
+        整批失败时按指数退避重试；重试用尽后逐个节点计算，只有单独计算仍失败的节点才记录到检查点
+        并在后续分页中跳过。若逐个计算的开头几个节点也全部失败，视为嵌入服务不可用，不标记节点；
+        连续 EMBEDDING_BACKFILL_MAX_FAILED_BATCHES 批如此时任务以 failed 状态结束，可稍后重新执行。
+
+        Args:
+            kgdb_name (str): 图数据库名称
+            batch_size (int): 每批处理的节点数量
+            on_progress (Callable[[dict], Awaitable], optional): 每批完成后以检查点状态回调
+            should_stop (Callable[[], bool], optional): 返回 True 时在当前批次结束后停止
+            task_id (str, optional): 执行回填的后台任务ID，写入检查点便于查询
+
+        Returns:
+            dict: 最终的检查点状态
+        """
+        assert self.driver is not None, "Database is not connected"
+        self.use_database(kgdb_name)
+
+        previous = self.load_embedding_backfill_state(kgdb_name) or {}
+        resumed = previous.get("status") in {"running", "stopped", "failed"}
+        failed = previous.get("failed_nodes", []) if resumed else []
+        remaining = await asyncio.to_thread(self.count_nodes_without_embedding, kgdb_name)
+
+        state = {
+            "kgdb_name": kgdb_name,
+            "task_id": task_id,
+            "status": "running",
+            "embed_model_name": self.embed_model_name,
+            "batch_size": batch_size,
+            "processed": previous.get("processed", 0) if resumed else 0,
+            "failed_nodes": failed,
+            "total": (previous.get("processed", 0) if resumed else 0) + remaining,
+            "remaining": remaining,
+            "throughput": 0.0,
+            "eta_seconds": None,
+            "error": None,
+            "started_at": previous.get("started_at") if resumed else utc_isoformat(),
+            "updated_at": utc_isoformat(),
+        }
+        self._save_embedding_backfill_state(state, kgdb_name)
+
+        started = time.monotonic()
+        processed_this_run = 0
+        failed_batches = 0
+
+        with self.driver.session() as session:
+            while True:
+                if should_stop and should_stop():
+                    state["status"] = "stopped"
+                    break
+
+                batch_names = await asyncio.to_thread(
+                    self.query_nodes_without_embedding, kgdb_name, batch_size, state["failed_nodes"]
+                )
+                if not batch_names:
+                    state["status"] = "completed"
+                    break
+
+                try:
+                    await self._awrite_node_embeddings(session, batch_names, retries=EMBEDDING_BACKFILL_MAX_RETRIES)
+                    written, failed_names = batch_names, []
+                except Exception as e:
+                    logger.error(f"批量回填 {len(batch_names)} 个节点的向量失败，改为逐个计算: {e}")
+                    state["error"] = str(e)
+                    written, failed_names = await self._abackfill_nodes_individually(session, batch_names)
+
+                if not written and len(failed_names) < len(batch_names):
+                    failed_batches += 1
+                    logger.error(f"嵌入服务不可用，已连续 {failed_batches} 批失败")
+                    if failed_batches >= EMBEDDING_BACKFILL_MAX_FAILED_BATCHES:
+                        state["status"] = "failed"
+                        break
+                    await asyncio.sleep(EMBEDDING_BACKFILL_RETRY_DELAY * 2**EMBEDDING_BACKFILL_MAX_RETRIES)
+                else:
+                    failed_batches = 0
+                    state["processed"] += len(written)
+                    processed_this_run += len(written)
+                    state["failed_nodes"].extend(failed_names)
+
+                elapsed = max(time.monotonic() - started, 1e-6)
+                state["remaining"] = max(state["total"] - state["processed"] - len(state["failed_nodes"]), 0)
+                state["throughput"] = round(processed_this_run / elapsed, 2)
+                state["eta_seconds"] = (
+                    round(state["remaining"] / state["throughput"], 1) if state["throughput"] > 0 else None
+                )
+                state["updated_at"] = utc_isoformat()
+                self._save_embedding_backfill_state(state, kgdb_name)
+
+                if on_progress:
+                    await on_progress(state)
+
+        state["remaining"] = await asyncio.to_thread(self.count_nodes_without_embedding, kgdb_name)
+        state["eta_seconds"] = 0 if state["status"] == "completed" else state["eta_seconds"]
+        state["updated_at"] = utc_isoformat()
+        self._save_embedding_backfill_state(state, kgdb_name)
+        self.save_graph_info(kgdb_name)
+        return state
+
+    async def _awrite_node_embeddings(self, session, names, retries=0):
+        """计算并写入一组节点的向量，失败时按指数退避重试，重试用尽后抛出最后一次的异常"""
+        for attempt in range(retries + 1):
+            try:
+                embeddings = await self.aget_embedding(names)
+                pairs = list(zip(names, embeddings))
+                await asyncio.to_thread(session.execute_write, self.set_embeddings_batch, pairs)
+                return
+            except Exception as e:
+                if attempt >= retries:
+                    raise
+                delay = EMBEDDING_BACKFILL_RETRY_DELAY * 2**attempt
+                logger.warning(f"回填 {len(names)} 个节点的向量失败，{delay:.1f} 秒后第 {attempt + 1} 次重试: {e}")
+                await asyncio.sleep(delay)
+
+    async def _abackfill_nodes_individually(self, session, names):
+        """整批重试用尽后逐个节点计算，返回 (写入成功的节点, 单独计算仍失败的节点)
+
+        开头 _BACKFILL_OUTAGE_PROBE 个节点全部失败时视为服务不可用，提前返回且不包含其余节点，
+        由调用方决定是否终止任务。
+        """
+        written, failed = [], []
+        for name in names:
+            try:
+                await self._awrite_node_embeddings(session, [name])
+                written.append(name)
+            except Exception as e:
+                logger.error(f"回填节点 {name} 的向量失败: {e}, {traceback.format_exc()}")
+                failed.append(name)
+                if not written and len(failed) >= _BACKFILL_OUTAGE_PROBE:
+                    break
+        return written, failed
+
     def format_general_results(self, results):
         nodes = []
         edges = []
@@ -11,7 +11,9 @@ from src.knowledge.base import KnowledgeBase
 from src.knowledge.indexing import process_file_to_markdown, process_url_to_markdown
 from src.knowledge.utils.kb_utils import (
     get_embedding_config,
+    get_processing_params,
     prepare_item_metadata,
+    resolve_split_params,
     split_text_into_chunks,
     split_text_into_qa_chunks,
 )
@@ -136,6 +138,21 @@ class ChromaKB(KnowledgeBase):
             logger.error(f"Traceback: {traceback.format_exc()}")
             return None
 
+    def create_database(
+        self,
+        database_name: str,
+        description: str,
+        embed_info: dict | None = None,
+        llm_info: dict | None = None,
+        **kwargs,
+    ) -> dict:
+        """创建数据库，记录分块方式与单位，之后修改 TEXT_SPLITTER 不影响该知识库"""
+        processing_params = get_processing_params(kwargs.get("text_splitter"))
+        db_info = super().create_database(database_name, description, embed_info, llm_info, **kwargs)
+        self.databases_meta[db_info["db_id"]]["processing_params"] = processing_params
+        self._save_metadata()
+        return db_info | {"processing_params": processing_params}
+
     def _split_text_into_chunks(self, text: str, file_id: str, filename: str, params: dict) -> list[dict]:
         """将文本分割成块"""
         # 检查是否使用QA分割模式
@@ -156,6 +173,7 @@ class ChromaKB(KnowledgeBase):
                 "chunk_id": chunk["chunk_id"],
                 "full_doc_id": file_id,
                 "chunk_type": chunk.get("chunk_type", "normal"),  # 添加chunk类型标识
+                "heading_path": chunk.get("heading_path", ""),
             }
 
         return chunks
@@ -169,7 +187,8 @@ class ChromaKB(KnowledgeBase):
         if not collection:
             raise ValueError(f"Failed to get ChromaDB collection for {db_id}")
 
-        content_type = params.get("content_type", "file") if params else "file"
+        params = resolve_split_params(self.databases_meta[db_id], params)
+        content_type = params.get("content_type", "file")
         processed_items_info = []
 
         for item in items:
@@ -354,7 +373,7 @@ class ChromaKB(KnowledgeBase):
 
         return {"meta": self.files_meta[file_id]}
 
-    async def get_file_content(self, db_id: str, file_id: str) -> dict:
+    async def get_file_content(self, db_id: str, file_id: str, offset: int = 0, limit: int | None = None) -> dict:
         """获取文件内容信息（chunks和lines）"""
         if file_id not in self.files_meta:
             raise Exception(f"File not found: {file_id}")
@@ -383,7 +402,8 @@ class ChromaKB(KnowledgeBase):
 
                 # 按 chunk_order_index 排序
                 doc_chunks.sort(key=lambda x: x.get("chunk_order_index", 0))
-                content_info["lines"] = doc_chunks
+                content_info["total"] = len(doc_chunks)
+                content_info["lines"] = doc_chunks[offset : offset + limit if limit else None]
                 return content_info
 
             except Exception as e:
@@ -1,21 +1,42 @@
+import functools
 import os
 import traceback
 
 from lightrag import LightRAG, QueryParam
 from lightrag.kg.shared_storage import initialize_pipeline_status
 from lightrag.llm.openai import openai_complete_if_cache, openai_embed
-from lightrag.utils import EmbeddingFunc, setup_logger
+from lightrag.utils import EmbeddingFunc, generate_track_id, setup_logger
 from neo4j import GraphDatabase
 from pymilvus import connections, utility
 
 from src.knowledge.base import KnowledgeBase
 from src.knowledge.indexing import process_file_to_markdown, process_url_to_markdown
+from src.knowledge.utils.ingest_scheduler import (
+    LIGHTRAG_MAX_PARALLEL_INSERT,
+    IngestDocument,
+    LightRagIngestScheduler,
+    get_rate_budget,
+)
 from src.knowledge.utils.kb_utils import get_embedding_config, prepare_item_metadata
+from src.knowledge.utils.lightrag_archive import export_archive, import_archive, read_manifest
 from src.utils import hashstr, logger
-from src.utils.datetime_utils import shanghai_now
+from src.utils.tokens import estimate_tokens
+from src.utils.datetime_utils import shanghai_now, utc_isoformat
 
 LIGHTRAG_LLM_PROVIDER = os.getenv("LIGHTRAG_LLM_PROVIDER", "siliconflow")
 LIGHTRAG_LLM_NAME = os.getenv("LIGHTRAG_LLM_NAME", "zai-org/GLM-4.5-Air")
+# 同一模型在所有知识库之间共享的调用预算（并发数 / 每分钟请求数，0 表示不限）
+# 并发数默认沿用 LightRAG 单实例的 MAX_ASYNC / EMBEDDING_FUNC_MAX_ASYNC
+LIGHTRAG_LLM_MAX_CONCURRENCY = int(os.getenv("LIGHTRAG_LLM_MAX_CONCURRENCY") or os.getenv("MAX_ASYNC") or 4)
+LIGHTRAG_LLM_RPM = int(os.getenv("LIGHTRAG_LLM_RPM") or 0)
+LIGHTRAG_EMBED_MAX_CONCURRENCY = int(
+    os.getenv("LIGHTRAG_EMBED_MAX_CONCURRENCY") or os.getenv("EMBEDDING_FUNC_MAX_ASYNC") or 8
+)
+LIGHTRAG_EMBED_RPM = int(os.getenv("LIGHTRAG_EMBED_RPM") or 0)
+# 查询结果格式：structured（实体 / 关系 / 文本块分条返回）或 context（整段上下文）
+LIGHTRAG_QUERY_FORMAT = os.getenv("LIGHTRAG_QUERY_FORMAT") or "structured"
+# 结构化结果的 token 上限，在检索阶段截断
+LIGHTRAG_QUERY_MAX_TOKENS = int(os.getenv("LIGHTRAG_QUERY_MAX_TOKENS") or 3000)
 
 
 class LightRagKB(KnowledgeBase):
@@ -136,6 +157,7 @@ class LightRagKB(KnowledgeBase):
             doc_status_storage="JsonDocStatusStorage",
             log_file_path=os.path.join(working_dir, "lightrag.log"),
             addon_params=addon_params,
+            max_parallel_insert=LIGHTRAG_MAX_PARALLEL_INSERT,
         )
 
         return rag
@@ -187,7 +209,9 @@ class LightRagKB(KnowledgeBase):
             logger.info(f"Using default LLM from environment: {provider}/{model_name}")
 
         model = select_model(model_spec=model_spec)
+        budget = get_rate_budget(f"llm:{model_spec}", LIGHTRAG_LLM_MAX_CONCURRENCY, LIGHTRAG_LLM_RPM)
 
+        @budget.wrap
         async def llm_model_func(prompt, system_prompt=None, history_messages=[], **kwargs):
             return await openai_complete_if_cache(
                 model=model.model_name,
@@ -204,18 +228,31 @@ class LightRagKB(KnowledgeBase):
     def _get_embedding_func(self, embed_info: dict):
         """获取 embedding 函数"""
         config_dict = get_embedding_config(embed_info)
+        budget = get_rate_budget(f"embed:{config_dict['model']}", LIGHTRAG_EMBED_MAX_CONCURRENCY, LIGHTRAG_EMBED_RPM)
 
         return EmbeddingFunc(
             embedding_dim=config_dict["dimension"],
             max_token_size=4096,
-            func=lambda texts: openai_embed(
-                texts=texts,
-                model=config_dict["model"],
-                api_key=config_dict["api_key"],
-                base_url=config_dict["base_url"].replace("/embeddings", ""),
+            func=budget.wrap(
+                lambda texts: openai_embed(
+                    texts=texts,
+                    model=config_dict["model"],
+                    api_key=config_dict["api_key"],
+                    base_url=config_dict["base_url"].replace("/embeddings", ""),
+                )
             ),
         )
 
+    @staticmethod
+    async def _load_markdown(item: str, content_type: str, params: dict | None) -> str:
+        """根据内容类型将文件 / URL 转换为 markdown"""
+        if content_type == "file":
+            markdown_content = await process_file_to_markdown(item, params=params)
+            markdown_content_lines = markdown_content[:100].replace("\n", " ")
+            logger.info(f"Markdown content: {markdown_content_lines}...")
+            return markdown_content
+        return await process_url_to_markdown(item, params=params)
+
     async def add_content(self, db_id: str, items: list[str], params: dict | None = None) -> list[dict]:
         """添加内容（文件/URL）"""
         if db_id not in self.databases_meta:
@@ -227,75 +264,51 @@ class LightRagKB(KnowledgeBase):
 
         content_type = params.get("content_type", "file") if params else "file"
         processed_items_info = []
+        documents = []
 
         for item in items:
             # 准备文件元数据
             metadata = prepare_item_metadata(item, content_type, db_id)
             file_id = metadata["file_id"]
-            item_path = metadata["path"]
 
             # 添加文件记录
             file_record = metadata.copy()
             self.files_meta[file_id] = file_record
-            self._save_metadata()
-
+            processed_items_info.append(file_record)
             self._add_to_processing_queue(file_id)
-            try:
-                # 根据内容类型处理内容
-                if content_type == "file":
-                    markdown_content = await process_file_to_markdown(item, params=params)
-                    markdown_content_lines = markdown_content[:100].replace("\n", " ")
-                    logger.info(f"Markdown content: {markdown_content_lines}...")
-                else:  # URL
-                    markdown_content = await process_url_to_markdown(item, params=params)
-
-                # 使用 LightRAG 插入内容
-                track_id = await rag.ainsert(input=markdown_content, ids=file_id, file_paths=item_path)
-                if track_id:
-                    self.files_meta[file_id]["track_id"] = track_id
-                    file_record["track_id"] = track_id
-
-                logger.info(f"Inserted {content_type} {item} into LightRAG. Done.")
-
-                # LightRAG 可能在内部处理失败但不抛异常，而是记录到 doc_status；这里以 doc_status 为准同步状态
-                doc_status = None
-                try:
-                    if hasattr(rag, "doc_status") and getattr(rag, "doc_status", None) is not None:
-                        doc_status = await rag.doc_status.get_by_id(file_id)  # type: ignore[attr-defined]
-                except Exception as status_error:  # noqa: BLE001
-                    logger.warning(f"Failed to read LightRAG doc_status for {file_id}: {status_error}")
-
-                lightrag_status = doc_status.get("status") if isinstance(doc_status, dict) else None
-                if lightrag_status:
-                    self.files_meta[file_id]["lightrag_status"] = lightrag_status
-                    file_record["lightrag_status"] = lightrag_status
-
-                if lightrag_status == "failed":
-                    error_msg = (doc_status or {}).get("error_msg") or "LightRAG processing failed"
-                    self.files_meta[file_id]["status"] = "failed"
-                    self.files_meta[file_id]["error"] = error_msg
-                    file_record["status"] = "failed"
-                    file_record["error"] = error_msg
-                else:
-                    # 更新状态为完成
-                    self.files_meta[file_id]["status"] = "done"
-                    file_record["status"] = "done"
-
-                self._save_metadata()
+            documents.append(
+                IngestDocument(
+                    file_id=file_id,
+                    file_path=metadata["path"],
+                    load=functools.partial(self._load_markdown, item, content_type, params),
+                )
+            )
+        self._save_metadata()
 
-            except Exception as e:
-                error_msg = str(e)
-                logger.error(f"处理{content_type} {item} 失败: {error_msg}, {traceback.format_exc()}")
-                self.files_meta[file_id]["status"] = "failed"
-                self.files_meta[file_id]["error"] = error_msg
-                self._save_metadata()
+        # 多个文档并发解析与抽取，失败的文档单独重试
+        track_id = generate_track_id("insert")
+        scheduler = LightRagIngestScheduler(rag, track_id=track_id)
+        try:
+            results = await scheduler.run(documents)
+        finally:
+            for document in documents:
+                self._remove_from_processing_queue(document.file_id)
+
+        for file_record, result in zip(processed_items_info, results):
+            # LightRAG 可能在内部处理失败但不抛异常，而是记录到 doc_status；这里以 doc_status 为准同步状态
+            file_record["track_id"] = track_id
+            file_record["lightrag_status"] = result.status
+            file_record["ingest_timings"] = {k: round(v, 3) for k, v in result.timings.items()}
+            if result.status == "failed":
                 file_record["status"] = "failed"
-                file_record["error"] = error_msg
-            finally:
-                self._remove_from_processing_queue(file_id)
-
-            processed_items_info.append(file_record)
-
+                file_record["error"] = result.error or "LightRAG processing failed"
+                logger.error(f"处理{content_type} {file_record['path']} 失败: {file_record['error']}")
+            else:
+                # 更新状态为完成
+                file_record["status"] = "done"
+                logger.info(f"Inserted {content_type} {file_record['path']} into LightRAG. Done.")
+
+        self._save_metadata()
         return processed_items_info
 
     # 前端模式到 LightRAG 模式的映射
@@ -307,7 +320,11 @@ class LightRagKB(KnowledgeBase):
     }
 
     async def aquery(self, query_text: str, db_id: str, mode="mix", **kwargs) -> list[dict]:
-        """异步查询知识库，返回统一格式的结果"""
+        """异步查询知识库，返回统一格式的结果
+
+        默认返回结构化结果：实体、关系、文本块各为一条带分数与来源的结果，并按 max_tokens 截断；
+        structured=False 时返回 LightRAG 拼接好的整段上下文（旧格式）。
+        """
         rag = await self._get_lightrag_instance(db_id)
         if not rag:
             raise ValueError(f"Database {db_id} not found")
@@ -315,7 +332,9 @@ class LightRagKB(KnowledgeBase):
         try:
             # 映射前端模式到 LightRAG 模式
             lightrag_mode = self.MODE_MAPPING.get(mode, "hybrid")
-            
+            structured = kwargs.pop("structured", LIGHTRAG_QUERY_FORMAT == "structured")
+            max_tokens = int(kwargs.pop("max_tokens", LIGHTRAG_QUERY_MAX_TOKENS))
+
             # 设置查询参数
             params_dict = {
                 "mode": lightrag_mode,
@@ -326,32 +345,134 @@ class LightRagKB(KnowledgeBase):
             for k, v in kwargs.items():
                 if k not in ["top_k", "mode"]:
                     params_dict[k] = v
-            
+
             param = QueryParam(**params_dict)
 
+            # aquery_data 在较新的 LightRAG 版本中提供，旧版本退回整段上下文
+            if structured and hasattr(rag, "aquery_data"):
+                result = await rag.aquery_data(query_text, param)
+                if result.get("status", "success") != "success":
+                    logger.warning(f"LightRAG structured query failed: {result.get('message')}")
+                    return []
+                items = self._structure_query_data(result.get("data") or {}, db_id, lightrag_mode)
+                return self._truncate_to_budget(items, max_tokens)
+
             # 执行查询
             response = await rag.aquery(query_text, param)
-            logger.debug(f"Query response with mode {lightrag_mode} (from {mode}): {response[:200] if response else 'empty'}...")
+            logger.debug(
+                f"Query response with mode {lightrag_mode} (from {mode}): {response[:200] if response else 'empty'}..."
+            )
 
             # 统一返回格式为 list[dict]，与 Milvus 保持一致
             if not response:
                 return []
-            
+
             # LightRAG 返回的是上下文文本，需要包装成统一格式
-            return [{
-                "content": response,
+            return [
+                {
+                    "content": response,
+                    "metadata": {
+                        "source": f"LightRAG ({lightrag_mode})",
+                        "db_id": db_id,
+                        "mode": lightrag_mode,
+                        "kb_type": "lightrag",
+                    },
+                    "score": 1.0,  # LightRAG 不返回相似度分数
+                }
+            ]
+
+        except Exception as e:
+            logger.error(f"Query error with mode {mode}: {e}, {traceback.format_exc()}")
+            return []
+
+    @staticmethod
+    def _structure_query_data(data: dict, db_id: str, lightrag_mode: str) -> list[dict]:
+        """把 aquery_data 的实体、关系、文本块转换为与 Milvus 一致的结果条目
+
+        LightRAG 不返回相似度，各类结果按其排序折算分数：第一名 1.0，末位 0.5。该分数只表示同类结果内的
+        名次，metadata 中以 score_type="rank" 标注，不能与向量库返回的相似度比较或按相似度阈值过滤。
+        """
+
+        def rank_score(rank: int, total: int) -> float:
+            return round(1.0 - 0.5 * rank / max(total, 1), 4)
+
+        def make_item(item_type: str, content: str, score: float, record: dict, **extra) -> dict:
+            return {
+                "content": content,
                 "metadata": {
-                    "source": f"LightRAG ({lightrag_mode})",
+                    "source": record.get("file_path") or f"LightRAG ({lightrag_mode})",
                     "db_id": db_id,
                     "mode": lightrag_mode,
                     "kb_type": "lightrag",
+                    "item_type": item_type,
+                    "score_type": "rank",
+                    "reference_id": record.get("reference_id"),
+                    **extra,
                 },
-                "score": 1.0,  # LightRAG 不返回相似度分数
-            }]
+                "score": score,
+                "reference_id": record.get("reference_id"),
+            }
 
-        except Exception as e:
-            logger.error(f"Query error with mode {mode}: {e}, {traceback.format_exc()}")
-            return []
+        items = []
+        chunks = data.get("chunks") or []
+        for rank, chunk in enumerate(chunks):
+            items.append(
+                make_item(
+                    "chunk",
+                    chunk.get("content") or "",
+                    rank_score(rank, len(chunks)),
+                    chunk,
+                    chunk_id=chunk.get("chunk_id"),
+                )
+            )
+        relations = data.get("relationships") or []
+        for rank, relation in enumerate(relations):
+            triple = f"{relation.get('src_id')} -[{relation.get('keywords') or '相关'}]-> {relation.get('tgt_id')}"
+            content = f"{triple}：{relation.get('description') or ''}"
+            items.append(
+                make_item(
+                    "relation",
+                    content,
+                    rank_score(rank, len(relations)),
+                    relation,
+                    source_id=relation.get("source_id"),
+                    weight=relation.get("weight"),
+                )
+            )
+        entities = data.get("entities") or []
+        for rank, entity in enumerate(entities):
+            entity_type = entity.get("entity_type")
+            name = f"{entity.get('entity_name')}（{entity_type}）" if entity_type else str(entity.get("entity_name"))
+            items.append(
+                make_item(
+                    "entity",
+                    f"{name}：{entity.get('description') or ''}",
+                    rank_score(rank, len(entities)),
+                    entity,
+                    source_id=entity.get("source_id"),
+                )
+            )
+        return [item for item in items if item["content"].strip()]
+
+    @staticmethod
+    def _truncate_to_budget(items: list[dict], max_tokens: int) -> list[dict]:
+        """按分数从高到低装入 token 预算，放不下的条目跳过（更短的条目仍可装入）"""
+        # 同分时文本块优先，其次关系、实体
+        priority = {"chunk": 0, "relation": 1, "entity": 2}
+        ordered = sorted(items, key=lambda x: (-x["score"], priority.get(x["metadata"]["item_type"], 3)))
+
+        kept, used = [], 0
+        for item in ordered:
+            tokens = estimate_tokens(item["content"])
+            if max_tokens and used + tokens > max_tokens:
+                continue
+            item["metadata"]["tokens"] = tokens
+            kept.append(item)
+            used += tokens
+
+        if len(kept) < len(items):
+            logger.debug(f"LightRAG results truncated to {used} tokens: kept {len(kept)}/{len(items)} items")
+        return kept
 
     async def delete_file(self, db_id: str, file_id: str) -> None:
         """删除文件"""
@@ -375,30 +496,58 @@ class LightRagKB(KnowledgeBase):
 
         return {"meta": self.files_meta[file_id]}
 
-    async def get_file_content(self, db_id: str, file_id: str) -> dict:
-        """获取文件内容信息（chunks和lines）"""
+    async def _get_doc_chunk_ids(self, rag: LightRAG, file_id: str) -> list[str]:
+        """文档 → chunk ID 索引
+
+        LightRAG 插入文档时把 chunk ID 按顺序写入 doc_status.chunks_list，删除文档时随 doc_status 一起删除；
+        旧版本插入的文档没有该字段，扫描一次 text_chunks 后回写，之后的预览只读取该文档的 chunk。
+        """
+        doc_status = await rag.doc_status.get_by_id(file_id) or {}
+        chunk_ids = doc_status.get("chunks_list")
+        if chunk_ids:
+            return list(chunk_ids)
+
+        get_all = getattr(rag.text_chunks, "get_all", None)
+        if get_all is None:
+            return []
+        logger.info(f"Building chunk index for {file_id} from text_chunks")
+        all_chunks = await get_all()
+        doc_chunks = sorted(
+            (
+                (chunk_id, chunk_data.get("chunk_order_index", 0))
+                for chunk_id, chunk_data in all_chunks.items()
+                if isinstance(chunk_data, dict) and chunk_data.get("full_doc_id") == file_id
+            ),
+            key=lambda x: x[1],
+        )
+        chunk_ids = [chunk_id for chunk_id, _ in doc_chunks]
+        if doc_status and chunk_ids:
+            await rag.doc_status.upsert(
+                {file_id: {**doc_status, "chunks_list": chunk_ids, "chunks_count": len(chunk_ids)}}
+            )
+        return chunk_ids
+
+    async def get_file_content(self, db_id: str, file_id: str, offset: int = 0, limit: int | None = None) -> dict:
+        """获取文件内容信息（chunks和lines），按文档的 chunk 索引分页读取"""
         if file_id not in self.files_meta:
             raise Exception(f"File not found: {file_id}")
 
-        # 使用 LightRAG 获取 chunks
         content_info = {"lines": []}
         rag = await self._get_lightrag_instance(db_id)
         if rag:
             try:
-                # 获取文档的所有 chunks
-                assert hasattr(rag.text_chunks, "get_all"), "text_chunks does not have get_all method"
-                all_chunks = await rag.text_chunks.get_all()  # type: ignore
+                chunk_ids = await self._get_doc_chunk_ids(rag, file_id)
+                page_ids = chunk_ids[offset : offset + limit if limit else None]
+                chunks = await rag.text_chunks.get_by_ids(page_ids) if page_ids else []
 
-                # 筛选属于该文档的 chunks
                 doc_chunks = []
-                for chunk_id, chunk_data in all_chunks.items():
-                    if isinstance(chunk_data, dict) and chunk_data.get("full_doc_id") == file_id:
-                        chunk_data["id"] = chunk_id
-                        chunk_data["content_vector"] = []
-                        doc_chunks.append(chunk_data)
+                for chunk_id, chunk_data in zip(page_ids, chunks):
+                    if isinstance(chunk_data, dict):
+                        doc_chunks.append({**chunk_data, "id": chunk_id, "content_vector": []})
 
                 # 按 chunk_order_index 排序
                 doc_chunks.sort(key=lambda x: x.get("chunk_order_index", 0))
+                content_info["total"] = len(chunk_ids)
                 content_info["lines"] = doc_chunks
                 return content_info
 
@@ -420,39 +569,71 @@ class LightRagKB(KnowledgeBase):
 
         return {**basic_info, **content_info}
 
-    async def export_data(self, db_id: str, format: str = "csv", **kwargs) -> str:
+    async def export_data(self, db_id: str, format: str = "zip", **kwargs) -> str:
         """
-        使用 LightRAG 原生功能导出知识库数据。
-        [注意] 此功能当前已禁用。
+        导出为可重新导入的 zip 归档（文件记录、原文、文本块、实体、关系及其向量），按批流式写入。
+
+        Args:
+            db_id: 数据库ID
+            format: 只支持 zip
+            include_vectors: 是否导出向量，默认导出；不导出时导入需要重新计算 embedding
+
+        Returns:
+            归档文件路径
         """
-        # TODO: 修复 LightRAG 库与 Milvus 后端不兼容的问题
-        # 当前调用 aexport_data 会导致 "'MilvusVectorDBStorage' object has no attribute 'client_storage'" 错误。
-        # 在 lightrag 库修复此问题前，暂时禁用此功能。
-        raise NotImplementedError("由于 LightRAG 库与 Milvus 后端不兼容，原生导出功能暂不可用。等待上游库修复。")
+        if format != "zip":
+            logger.warning(f"LightRAG knowledge base only exports zip archives, ignoring format={format}")
 
-        # --- 以下为待修复后启用的代码 ---
-        # logger.info(f"Exporting data for db_id {db_id} in format {format} with options {kwargs}")
+        rag = await self._get_lightrag_instance(db_id)
+        if not rag:
+            raise ValueError(f"Failed to get LightRAG instance for {db_id}")
 
-        # rag = await self._get_lightrag_instance(db_id)
-        # if not rag:
-        #     raise ValueError(f"Failed to get LightRAG instance for {db_id}")
+        export_dir = os.path.join(self.work_dir, db_id, "exports")
+        os.makedirs(export_dir, exist_ok=True)
+        output_path = os.path.join(export_dir, f"export_{db_id}_{shanghai_now().strftime('%Y%m%d_%H%M%S')}.zip")
+
+        db_meta = self.databases_meta[db_id]
+        files = {file_id: meta for file_id, meta in self.files_meta.items() if meta.get("database_id") == db_id}
+        manifest = {
+            "kb_type": self.kb_type,
+            "db_id": db_id,
+            "name": db_meta.get("name"),
+            "embed_info": db_meta.get("embed_info"),
+            "embedding_dim": rag.embedding_func.embedding_dim,
+            "exported_at": utc_isoformat(),
+        }
+        counts = await export_archive(
+            rag,
+            output_path,
+            files,
+            manifest,
+            chunk_ids=functools.partial(self._get_doc_chunk_ids, rag),
+            include_vectors=kwargs.get("include_vectors", True),
+        )
+        logger.info(f"Exported LightRAG database {db_id} to {output_path}: {counts}")
+        return output_path
 
-        # export_dir = os.path.join(self.work_dir, db_id, "exports")
-        # os.makedirs(export_dir, exist_ok=True)
+    async def import_data(self, db_id: str, archive_path: str, **kwargs) -> dict:
+        """从 export_data 生成的归档恢复到知识库，直接写入向量与图谱，不重新抽取"""
+        if db_id not in self.databases_meta:
+            raise ValueError(f"Database {db_id} not found")
 
-        # timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        # output_filename = f"export_{db_id}_{timestamp}.{format}"
-        # output_filepath = os.path.join(export_dir, output_filename)
+        manifest = read_manifest(archive_path)
+        if manifest.get("kb_type") != self.kb_type:
+            raise ValueError(f"Archive kb_type {manifest.get('kb_type')} does not match {self.kb_type}")
 
-        # include_vectors = kwargs.get('include_vectors', False)
+        rag = await self._get_lightrag_instance(db_id)
+        if not rag:
+            raise ValueError(f"Failed to get LightRAG instance for {db_id}")
+        if manifest.get("embedding_dim") != rag.embedding_func.embedding_dim:
+            logger.warning(
+                f"Archive embedding dim {manifest.get('embedding_dim')} differs from {db_id} "
+                f"({rag.embedding_func.embedding_dim}), vectors will be re-embedded"
+            )
 
-        # # 直接调用 lightrag 的异步导出功能
-        # # 之前的测试表明 aexport_data 确实存在，并且 to_thread 会导致 loop 问题
-        # await rag.aexport_data(
-        #     output_path=output_filepath,
-        #     file_format=format,
-        #     include_vector_data=include_vectors
-        # )
+        _, files, stats = await import_archive(rag, archive_path)
+        for file_record in files:
+            self.files_meta[file_record["file_id"]] = {**file_record, "database_id": db_id}
+        self._save_metadata()
 
-        # logger.info(f"Successfully created export file: {output_filepath}")
-        # return output_filepath
+        return {"db_id": db_id, "source_db_id": manifest.get("db_id"), **stats}
@@ -1,5 +1,8 @@
 import asyncio
+import json
+import math
 import os
+import time
 import traceback
 from functools import partial
 from typing import Any
@@ -8,16 +11,33 @@ from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connec
 
 from src.knowledge.base import KnowledgeBase
 from src.knowledge.indexing import process_file_to_markdown, process_url_to_markdown
+from src.knowledge.utils.chunk_dedup import DEDUP_INDEX_FILENAME, ChunkDedupIndex, DedupConfig
 from src.knowledge.utils.kb_utils import (
+    calculate_chunk_hash,
+    diff_chunks_by_hash,
     get_embedding_config,
+    get_processing_params,
     prepare_item_metadata,
+    resolve_split_params,
     split_text_into_chunks,
     split_text_into_qa_chunks,
 )
+from src.knowledge.utils.vector_compression import VectorCompression, binarize, cosine_scores, hamming_similarity
 from src.models.embed import OtherEmbedding
 from src.utils import hashstr, logger
 
 MILVUS_AVAILABLE = True
+EMBEDDING_BATCH_SIZE = 40
+# 新建集合时以 file_id 作为 partition key，按文件过滤的删除、预览与检索只访问对应分区；
+# 也可在创建知识库时通过 additional_params.partition_by_file 单独指定
+MILVUS_PARTITION_BY_FILE = os.getenv("MILVUS_PARTITION_BY_FILE", "false").lower() == "true"
+MILVUS_NUM_PARTITIONS = int(os.getenv("MILVUS_NUM_PARTITIONS") or 64)
+# query_iterator 每批读取的行数
+MILVUS_QUERY_BATCH_SIZE = int(os.getenv("MILVUS_QUERY_BATCH_SIZE") or 1000)
+# 批量删除时单个过滤表达式包含的文件数
+MILVUS_DELETE_BATCH_SIZE = 500
+# heading_path 字段的最大长度（字节），超出时截断
+HEADING_PATH_MAX_LENGTH = 1024
 
 
 class MilvusKB(KnowledgeBase):
@@ -56,6 +76,9 @@ class MilvusKB(KnowledgeBase):
         # 元数据锁
         self._metadata_lock = asyncio.Lock()
 
+        # 近似重复 chunk 签名索引 {db_id: ChunkDedupIndex}
+        self._dedup_indexes: dict[str, ChunkDedupIndex] = {}
+
         # 初始化连接
         self._init_connection()
 
@@ -118,6 +141,15 @@ class MilvusKB(KnowledgeBase):
             # 创建新集合
             embedding_dim = embed_info.get("dimension", 1024) if embed_info else 1024
             model_name = embed_info.get("name", "default") if embed_info else "default"
+            metadata = self.databases_meta[db_id].get("metadata") or {}
+            partition_by_file = bool(metadata.get("partition_by_file", MILVUS_PARTITION_BY_FILE))
+
+            # 压缩方式在建集合时确定并保存，之后的写入与检索都按保存的配置处理
+            compression = VectorCompression.from_params(metadata, embed_info)
+            self.databases_meta[db_id]["vector_compression"] = compression.to_dict()
+            self._save_metadata()
+            stored_dim = compression.stored_dim(embedding_dim)
+            vector_type = DataType.BINARY_VECTOR if compression.quantization == "binary" else DataType.FLOAT_VECTOR
 
             # 定义集合Schema
             fields = [
@@ -125,23 +157,38 @@ class MilvusKB(KnowledgeBase):
                 FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=65535),
                 FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=500),
                 FieldSchema(name="chunk_id", dtype=DataType.VARCHAR, max_length=100),
-                FieldSchema(name="file_id", dtype=DataType.VARCHAR, max_length=100),
+                FieldSchema(name="file_id", dtype=DataType.VARCHAR, max_length=100, is_partition_key=partition_by_file),
                 FieldSchema(name="chunk_index", dtype=DataType.INT64),
-                FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=embedding_dim),
+                FieldSchema(name="embedding", dtype=vector_type, dim=stored_dim),
+                # 结构感知分块的标题路径；放在最后，旧集合没有该字段时写入按位置省略即可
+                FieldSchema(name="heading_path", dtype=DataType.VARCHAR, max_length=HEADING_PATH_MAX_LENGTH),
             ]
 
             schema = CollectionSchema(
                 fields=fields, description=f"Knowledge base collection for {db_id} using {model_name}"
             )
 
-            # 创建集合
-            collection = Collection(name=collection_name, schema=schema, using=self.connection_alias)
+            # 创建集合；partition key 模式下 file_id 按哈希分布到 num_partitions 个分区
+            partition_params = {"num_partitions": MILVUS_NUM_PARTITIONS} if partition_by_file else {}
+            collection = Collection(
+                name=collection_name, schema=schema, using=self.connection_alias, **partition_params
+            )
 
-            # 创建索引
-            index_params = {"metric_type": "COSINE", "index_type": "IVF_FLAT", "params": {"nlist": 1024}}
-            collection.create_index("embedding", index_params)
+            # 创建索引：int8 使用 IVF_SQ8 标量量化，binary 使用汉明距离的二值索引
+            if compression.quantization == "binary":
+                collection.create_index(
+                    "embedding", {"metric_type": "HAMMING", "index_type": "BIN_IVF_FLAT", "params": {"nlist": 1024}}
+                )
+            else:
+                index_type = "IVF_SQ8" if compression.quantization == "int8" else "IVF_FLAT"
+                collection.create_index(
+                    "embedding", {"metric_type": "COSINE", "index_type": index_type, "params": {"nlist": 1024}}
+                )
 
-            logger.info(f"Created new Milvus collection: {collection_name}")
+            logger.info(
+                f"Created new Milvus collection: {collection_name} "
+                f"(partition_by_file={partition_by_file}, compression={compression.to_dict()})"
+            )
 
         return collection
 
@@ -162,7 +209,7 @@ class MilvusKB(KnowledgeBase):
             api_key=config_dict.get("api_key"),
         )
 
-        return partial(embedding_model.abatch_encode, batch_size=40)
+        return partial(embedding_model.abatch_encode, batch_size=EMBEDDING_BATCH_SIZE)
 
     def _get_embedding_function(self, embed_info: dict):
         """获取 embedding 函数"""
@@ -173,7 +220,7 @@ class MilvusKB(KnowledgeBase):
             api_key=config_dict.get("api_key"),
         )
 
-        return partial(embedding_model.batch_encode, batch_size=40)
+        return partial(embedding_model.batch_encode, batch_size=EMBEDDING_BATCH_SIZE)
 
     async def _get_milvus_collection(self, db_id: str):
         """获取或创建 Milvus 集合"""
@@ -196,6 +243,64 @@ class MilvusKB(KnowledgeBase):
             logger.error(f"Traceback: {traceback.format_exc()}")
             return None
 
+    def _get_compression(self, db_id: str) -> VectorCompression:
+        """知识库的向量压缩配置，旧集合没有保存配置时为不压缩"""
+        return VectorCompression.from_dict(self.databases_meta[db_id].get("vector_compression"))
+
+    def _get_dedup_index(self, db_id: str) -> ChunkDedupIndex | None:
+        """知识库的近似重复签名索引，未启用去重时返回 None"""
+        if db_id not in self.databases_meta:
+            return None
+        dedup_config = DedupConfig.from_params(self.databases_meta[db_id].get("metadata"))
+        if not dedup_config.enabled:
+            return None
+        index = self._dedup_indexes.get(db_id)
+        if index is None or index.config != dedup_config:
+            index_path = os.path.join(self.work_dir, db_id, DEDUP_INDEX_FILENAME)
+            index = self._dedup_indexes[db_id] = ChunkDedupIndex(index_path, dedup_config)
+        return index
+
+    async def _dedup_chunks(self, db_id: str, chunks: list[dict]) -> tuple[list[dict], list[dict]]:
+        """剔除与知识库已有内容近似重复的 chunk，返回 (需要写入的 chunk, 引用记录)"""
+        index = self._get_dedup_index(db_id)
+        if index is None or not chunks:
+            return chunks, []
+
+        unique, references = await asyncio.to_thread(index.dedup, chunks)
+        await asyncio.to_thread(index.save)
+        if references:
+            logger.info(f"Skipped {len(references)}/{len(chunks)} near-duplicate chunks in {db_id}")
+        return unique, references
+
+    async def _release_dedup_chunks(
+        self, db_id: str, collection, chunk_ids: list[str] | None = None, file_ids: list[str] | None = None
+    ) -> int:
+        """从签名索引中移除 chunk / 文件；指向被移除 chunk 的引用重新去重后写入 Milvus，返回写入数量"""
+        index = self._get_dedup_index(db_id)
+        if index is None:
+            return 0
+
+        orphans = index.remove_files(file_ids) if file_ids else index.remove_chunks(chunk_ids or [])
+        promoted = 0
+        if orphans:
+            try:
+                unique, _ = await asyncio.to_thread(index.dedup, orphans)
+                if unique:
+                    embed_info = self.databases_meta[db_id].get("embed_info", {})
+                    embedding_function = self._get_async_embedding_function(embed_info)
+                    await self._embed_and_insert(collection, unique, embedding_function, self._get_compression(db_id))
+                promoted = len(unique)
+                logger.info(f"Promoted {promoted}/{len(orphans)} duplicate references to chunks in {db_id}")
+            except Exception as e:
+                logger.error(f"Failed to promote duplicate references in {db_id}: {e}, {traceback.format_exc()}")
+
+            async with self._metadata_lock:
+                for file_id in {ref["file_id"] for ref in orphans} & self.files_meta.keys():
+                    self.files_meta[file_id]["duplicate_chunks"] = len(index.file_references(file_id))
+                self._save_metadata()
+        await asyncio.to_thread(index.save)
+        return promoted
+
     def _split_text_into_chunks(self, text: str, file_id: str, filename: str, params: dict) -> list[dict]:
         """将文本分割成块"""
         # 检查是否使用QA分割模式
@@ -221,7 +326,8 @@ class MilvusKB(KnowledgeBase):
         embed_info = self.databases_meta[db_id].get("embed_info", {})
         embedding_function = self._get_async_embedding_function(embed_info)
 
-        content_type = params.get("content_type", "file") if params else "file"
+        params = resolve_split_params(self.databases_meta[db_id], params)
+        content_type = params.get("content_type", "file")
         processed_items_info = []
 
         for item in items:
@@ -249,29 +355,23 @@ class MilvusKB(KnowledgeBase):
                 chunks = self._split_text_into_chunks(markdown_content, file_id, filename, params)
                 logger.info(f"Split {filename} into {len(chunks)} chunks")
 
-                if chunks:
-                    texts = [chunk["content"] for chunk in chunks]
-                    embeddings = await embedding_function(texts)
-
-                    entities = [
-                        [chunk["id"] for chunk in chunks],
-                        [chunk["content"] for chunk in chunks],
-                        [chunk["source"] for chunk in chunks],
-                        [chunk["chunk_id"] for chunk in chunks],
-                        [chunk["file_id"] for chunk in chunks],
-                        [chunk["chunk_index"] for chunk in chunks],
-                        embeddings,
-                    ]
-
-                    def _insert_records():
-                        collection.insert(entities)
-
-                    await asyncio.to_thread(_insert_records)
+                # 近似重复的 chunk 只记录引用，不计算向量
+                unique_chunks, references = await self._dedup_chunks(db_id, chunks)
+                try:
+                    if unique_chunks:
+                        await self._embed_and_insert(
+                            collection, unique_chunks, embedding_function, self._get_compression(db_id)
+                        )
+                except Exception:
+                    await self._release_dedup_chunks(db_id, collection, chunk_ids=[chunk["id"] for chunk in chunks])
+                    raise
 
                 logger.info(f"Inserted {content_type} {item} into Milvus. Done.")
 
                 async with self._metadata_lock:
                     self.files_meta[file_id]["status"] = "done"
+                    self.files_meta[file_id]["chunk_signatures"] = self._build_chunk_signatures(chunks)
+                    self.files_meta[file_id]["duplicate_chunks"] = len(references)
                     self._save_metadata()
                 file_record["status"] = "done"
                 # 从处理队列中移除
@@ -292,6 +392,213 @@ class MilvusKB(KnowledgeBase):
 
         return processed_items_info
 
+    async def _embed_and_insert(
+        self, collection, chunks: list[dict], embedding_function, compression: VectorCompression
+    ) -> None:
+        """对 chunks 计算向量并按知识库的压缩配置写入 Milvus"""
+        texts = [chunk["content"] for chunk in chunks]
+        embeddings = await embedding_function(texts)
+        if compression.truncate_dim or compression.quantization != "none":
+            vectors = compression.prepare(embeddings)
+            embeddings = binarize(vectors) if compression.quantization == "binary" else vectors.tolist()
+
+        entities = [
+            [chunk["id"] for chunk in chunks],
+            [chunk["content"] for chunk in chunks],
+            [chunk["source"] for chunk in chunks],
+            [chunk["chunk_id"] for chunk in chunks],
+            [chunk["file_id"] for chunk in chunks],
+            [chunk["chunk_index"] for chunk in chunks],
+            embeddings,
+        ]
+        if self._has_field(collection, "heading_path"):
+            entities.append([self._truncate_heading_path(chunk.get("heading_path")) for chunk in chunks])
+
+        def _insert_records():
+            collection.insert(entities)
+
+        await asyncio.to_thread(_insert_records)
+
+    @staticmethod
+    def _has_field(collection, name: str) -> bool:
+        """集合 schema 中是否有该字段，用于兼容新增字段之前创建的集合"""
+        return any(field.name == name for field in collection.schema.fields)
+
+    @staticmethod
+    def _truncate_heading_path(heading_path: str | None) -> str:
+        encoded = (heading_path or "").encode("utf-8")[:HEADING_PATH_MAX_LENGTH]
+        return encoded.decode("utf-8", errors="ignore")
+
+    @staticmethod
+    def _build_chunk_signatures(chunks: list[dict]) -> dict[str, list]:
+        """生成 {chunk_id: [content_hash, chunk_index]}，保存在文件元数据中供增量更新使用"""
+        return {
+            chunk["id"]: [chunk.get("content_hash") or calculate_chunk_hash(chunk["content"]), chunk["chunk_index"]]
+            for chunk in chunks
+        }
+
+    @staticmethod
+    def _file_expr(file_ids: list[str]) -> str:
+        """按文件过滤的表达式；partition key 模式下 Milvus 据此只访问相关分区"""
+        if len(file_ids) == 1:
+            return f"file_id == {json.dumps(file_ids[0])}"
+        return f"file_id in {json.dumps(file_ids)}"
+
+    @staticmethod
+    def _iterate_rows(collection, expr: str, output_fields: list[str]) -> list[dict]:
+        """用 query_iterator 分批读取满足条件的全部行，不受单次 query 的 limit 上限约束"""
+        iterator = collection.query_iterator(batch_size=MILVUS_QUERY_BATCH_SIZE, expr=expr, output_fields=output_fields)
+        rows = []
+        try:
+            while batch := iterator.next():
+                rows.extend(batch)
+        finally:
+            iterator.close()
+        return rows
+
+    async def _load_chunk_signatures(self, collection, file_id: str) -> dict[str, list]:
+        """从 Milvus 中读取已入库 chunk 并计算签名，用于没有保存签名的旧文件"""
+
+        results = await asyncio.to_thread(
+            self._iterate_rows, collection, self._file_expr([file_id]), ["id", "content", "chunk_index"]
+        )
+        return {row["id"]: [calculate_chunk_hash(row.get("content", "")), row.get("chunk_index", 0)] for row in results}
+
+    async def update_content(self, db_id: str, file_id: str, item: str, params: dict | None = None) -> dict:
+        """
+        增量更新已入库的文件
+
+        重新解析并切分文件后按 chunk 内容哈希与已入库 chunk 对比：仅对新增 chunk 计算向量并插入，
+        删除已消失的 chunk，未变化的 chunk 保留原向量（顺序变化时只更新 chunk_index）。
+
+        Returns:
+            dict: 更新后的文件记录，其中 ``incremental`` 字段为本次更新的统计信息
+        """
+        if db_id not in self.databases_meta:
+            raise ValueError(f"Database {db_id} not found")
+        if file_id not in self.files_meta:
+            raise ValueError(f"File not found: {file_id}")
+
+        collection = await self._get_milvus_collection(db_id)
+        if not collection:
+            raise ValueError(f"Failed to get Milvus collection for {db_id}")
+
+        params = resolve_split_params(self.databases_meta[db_id], params)
+        content_type = params.get("content_type", "file")
+        started_at = time.monotonic()
+
+        item_meta = prepare_item_metadata(item, content_type, db_id)
+        old_record = self.files_meta[file_id]
+        filename = old_record.get("filename") or item_meta["filename"]
+
+        self._add_to_processing_queue(file_id)
+        async with self._metadata_lock:
+            self.files_meta[file_id]["status"] = "processing"
+            self._save_metadata()
+
+        try:
+            if content_type == "file":
+                markdown_content = await process_file_to_markdown(item, params=params)
+            else:
+                markdown_content = await process_url_to_markdown(item, params=params)
+
+            chunks = self._split_text_into_chunks(markdown_content, file_id, filename, params)
+            signatures = old_record.get("chunk_signatures") or await self._load_chunk_signatures(collection, file_id)
+            added, kept, removed = diff_chunks_by_hash(
+                chunks, {chunk_id: signature[0] for chunk_id, signature in signatures.items()}
+            )
+
+            # 新增 chunk 使用带内容哈希的 id，避免与保留或待删除的 chunk 冲突
+            for chunk in added:
+                new_id = f"{file_id}_{chunk['content_hash'][:16]}_{chunk['chunk_index']}"
+                if new_id in signatures:
+                    new_id = f"{new_id}_{hashstr(str(time.time()), 4)}"
+                chunk["id"] = chunk["chunk_id"] = new_id
+
+            for chunk, existing_id in kept:
+                chunk["id"] = chunk["chunk_id"] = existing_id
+
+            added_unique, references = await self._dedup_chunks(db_id, added)
+            if added_unique:
+                embed_info = self.databases_meta[db_id].get("embed_info", {})
+                embedding_function = self._get_async_embedding_function(embed_info)
+                await self._embed_and_insert(collection, added_unique, embedding_function, self._get_compression(db_id))
+
+            moved = {
+                existing_id: chunk["chunk_index"]
+                for chunk, existing_id in kept
+                if signatures[existing_id][1] != chunk["chunk_index"]
+            }
+            if moved:
+                await asyncio.to_thread(self._reindex_chunks, collection, moved)
+                if dedup_index := self._get_dedup_index(db_id):
+                    dedup_index.reindex(moved)
+                    await asyncio.to_thread(dedup_index.save)
+
+            if removed:
+                removed_expr = "id in [" + ", ".join(f'"{chunk_id}"' for chunk_id in removed) + "]"
+                await asyncio.to_thread(collection.delete, removed_expr)
+                await self._release_dedup_chunks(db_id, collection, chunk_ids=list(removed))
+
+            total = len(chunks)
+            stats = {
+                "total_chunks": total,
+                "embedded_chunks": len(added_unique),
+                "deduplicated_chunks": len(references),
+                "reused_chunks": len(kept),
+                "reindexed_chunks": len(moved),
+                "deleted_chunks": len(removed),
+                "saved_embedding_calls": math.ceil(total / EMBEDDING_BATCH_SIZE)
+                - math.ceil(len(added_unique) / EMBEDDING_BATCH_SIZE),
+                "elapsed_seconds": round(time.monotonic() - started_at, 3),
+            }
+            logger.info(f"Incrementally updated {filename} ({file_id}) in {db_id}: {stats}")
+
+            async with self._metadata_lock:
+                record = self.files_meta[file_id]
+                record["path"] = item_meta["path"]
+                record["content_hash"] = item_meta["content_hash"]
+                record["updated_at"] = item_meta["created_at"]
+                record["status"] = "done"
+                record["chunk_signatures"] = self._build_chunk_signatures(chunks)
+                dedup_index = self._get_dedup_index(db_id)
+                record["duplicate_chunks"] = len(dedup_index.file_references(file_id)) if dedup_index else 0
+                record["last_update"] = stats
+                record.pop("error", None)
+                self._save_metadata()
+
+        except Exception as e:
+            logger.error(f"增量更新文件 {file_id} 失败: {e}, {traceback.format_exc()}")
+            async with self._metadata_lock:
+                self.files_meta[file_id]["status"] = "failed"
+                self.files_meta[file_id]["error"] = str(e)
+                self._save_metadata()
+            stats = None
+        finally:
+            self._remove_from_processing_queue(file_id)
+
+        file_record = {k: v for k, v in self.files_meta[file_id].items() if k != "chunk_signatures"}
+        file_record["file_id"] = file_id
+        file_record["incremental"] = stats
+        return file_record
+
+    def _reindex_chunks(self, collection, new_indexes: dict[str, int]) -> None:
+        """更新保留 chunk 的 chunk_index，复用已有向量，不重新计算 embedding"""
+        ids = list(new_indexes)
+        expr = "id in [" + ", ".join(f'"{chunk_id}"' for chunk_id in ids) + "]"
+        # 按集合 schema 读写全部字段（包括压缩后的向量字段）
+        field_names = [field.name for field in collection.schema.fields]
+        rows = collection.query(expr=expr, output_fields=field_names, limit=len(ids))
+        if not rows:
+            return
+
+        collection.upsert(
+            [
+                [new_indexes[row["id"]] if name == "chunk_index" else row[name] for row in rows]
+                for name in field_names
+            ]
+        )
+
     async def aquery(self, query_text: str, db_id: str, mode="mix", **kwargs) -> list[dict]:
         """异步查询知识库"""
         collection = await self._get_milvus_collection(db_id)
@@ -344,21 +651,56 @@ class MilvusKB(KnowledgeBase):
             embedding_function = self._get_embedding_function(embed_info)
             query_embedding = embedding_function([query_text])
 
-            search_params = {"metric_type": metric_type, "params": {"nprobe": 10}}
+            # 查询向量按知识库的压缩配置处理，binary 集合使用汉明距离检索
+            compression = self._get_compression(db_id)
+            query_vectors = compression.prepare(query_embedding)
+            is_binary = compression.quantization == "binary"
+            if is_binary:
+                search_data, search_metric = binarize(query_vectors), "HAMMING"
+            elif compression.truncate_dim:
+                search_data, search_metric = query_vectors.tolist(), metric_type
+            else:
+                search_data, search_metric = query_embedding, metric_type
+            # 重排时先按压缩向量召回更多候选
+            candidate_limit = search_top_k * compression.rescore_factor if compression.rescore else search_top_k
+
+            # 限定在指定文件内检索
+            file_ids = kwargs.get("file_ids")
+            search_params = {"metric_type": search_metric, "params": {"nprobe": 10}}
+            output_fields = ["content", "source", "chunk_id", "file_id", "chunk_index"]
+            if self._has_field(collection, "heading_path"):
+                output_fields.append("heading_path")
             results = collection.search(
-                data=query_embedding,
+                data=search_data,
                 anns_field="embedding",
                 param=search_params,
-                limit=search_top_k,
-                output_fields=["content", "source", "chunk_id", "file_id", "chunk_index"],
+                limit=candidate_limit,
+                expr=self._file_expr(list(file_ids)) if file_ids else None,
+                output_fields=output_fields,
             )
 
             if not results or len(results) == 0 or len(results[0]) == 0:
                 return []
 
+            hits = list(results[0])
+            stored_dim = compression.stored_dim(int((embed_info or {}).get("dimension") or 1024))
+            scores = {
+                hit.id: hamming_similarity(hit.distance, stored_dim)
+                if is_binary
+                else (hit.distance if metric_type == "COSINE" else 1 / (1 + hit.distance))
+                for hit in hits
+            }
+            if compression.rescore:
+                scores.update(
+                    await asyncio.to_thread(
+                        self._rescore_hits, collection, compression, query_vectors[0], [hit.id for hit in hits]
+                    )
+                )
+                hits = sorted(hits, key=lambda hit: scores[hit.id], reverse=True)[:search_top_k]
+
             retrieved_chunks = []
-            for hit in results[0]:
-                similarity = hit.distance if metric_type == "COSINE" else 1 / (1 + hit.distance)
+            for hit in hits:
+                similarity = scores[hit.id]
 
                 if similarity < similarity_threshold:
                     continue
@@ -370,6 +712,8 @@ class MilvusKB(KnowledgeBase):
                     "file_id": entity.get("file_id"),
                     "chunk_index": entity.get("chunk_index"),
                 }
+                if heading_path := entity.get("heading_path"):
+                    metadata["heading_path"] = heading_path
 
                 retrieved_chunks.append(
                     {"content": entity.get("content", ""), "metadata": metadata, "score": similarity}
@@ -377,6 +721,17 @@ class MilvusKB(KnowledgeBase):
 
             logger.debug(f"Milvus query response: {len(retrieved_chunks)} chunks found (after similarity filtering)")
 
+            # 标注去重时合并到该 chunk 的其他来源
+            dedup_index = self._get_dedup_index(db_id)
+            if dedup_index and retrieved_chunks:
+                duplicates = dedup_index.duplicates_of(chunk["metadata"]["chunk_id"] for chunk in retrieved_chunks)
+                for chunk in retrieved_chunks:
+                    if refs := duplicates.get(chunk["metadata"]["chunk_id"]):
+                        chunk["metadata"]["duplicates"] = [
+                            {"file_id": ref["file_id"], "source": ref["source"], "chunk_id": ref["chunk_id"]}
+                            for ref in refs
+                        ]
+
             # 应用 rerank（如果启用）
             if config.enable_reranker and retrieved_chunks:
                 retrieved_chunks = rerank_chunks(query_text, retrieved_chunks, top_k=final_top_k)
@@ -398,59 +753,67 @@ class MilvusKB(KnowledgeBase):
             logger.error(f"Milvus query error: {e}, {traceback.format_exc()}")
             return []
 
+    @staticmethod
+    def _rescore_hits(collection, compression: VectorCompression, query_vector, ids: list[str]) -> dict[str, float]:
+        """读取候选的全精度向量（int8 集合 embedding 字段的原始数据），重新计算余弦相似度"""
+        rows = collection.query(expr=f"id in {json.dumps(ids)}", output_fields=["id", "embedding"], limit=len(ids))
+        if not rows:
+            return {}
+        scores = cosine_scores(query_vector, [row["embedding"] for row in rows])
+        return {row["id"]: float(score) for row, score in zip(rows, scores)}
+
     async def delete_file(self, db_id: str, file_id: str) -> None:
         """删除文件"""
+        await self.delete_files(db_id, [file_id])
+
+    async def delete_files(self, db_id: str, file_ids: list[str]) -> dict:
+        """批量删除文件：每批文件只执行一次按 file_id 过滤的删除"""
         collection = await self._get_milvus_collection(db_id)
 
-        if collection:
-            # 先查询文件是否存在，避免不必要的删除操作
-            try:
-                expr = f'file_id == "{file_id}"'
-                results = collection.query(expr=expr, output_fields=["id"], limit=1)
+        deleted_chunks = 0
+        if collection and file_ids:
+            for start in range(0, len(file_ids), MILVUS_DELETE_BATCH_SIZE):
+                batch = file_ids[start : start + MILVUS_DELETE_BATCH_SIZE]
+                try:
+                    result = await asyncio.to_thread(collection.delete, self._file_expr(batch))
+                    deleted_chunks += getattr(result, "delete_count", 0) or 0
+                except Exception as e:
+                    logger.error(f"Error deleting files {batch} from Milvus: {e}")
+            logger.info(f"Deleted {deleted_chunks} chunks of {len(file_ids)} files from Milvus collection {db_id}")
+            await self._release_dedup_chunks(db_id, collection, file_ids=file_ids)
 
-                if not results:
-                    logger.info(f"File {file_id} not found in Milvus, skipping delete operation")
-                else:
-                    # 只有在文件确实存在时才执行删除
-                    def _delete_from_milvus():
-                        try:
-                            collection.delete(expr)
-                            logger.info(f"Deleted chunks for file {file_id} from Milvus")
-                        except Exception as e:
-                            logger.error(f"Error deleting file {file_id} from Milvus: {e}")
-
-                    await asyncio.to_thread(_delete_from_milvus)
-            except Exception as e:
-                logger.error(f"Error checking file existence in Milvus: {e}")
         # 使用锁确保元数据操作的原子性
         async with self._metadata_lock:
-            if file_id in self.files_meta:
-                del self.files_meta[file_id]
+            deleted_files = [file_id for file_id in file_ids if self.files_meta.pop(file_id, None) is not None]
+            if deleted_files:
                 self._save_metadata()
+        return {"deleted_files": len(deleted_files), "deleted_chunks": deleted_chunks}
 
     async def get_file_basic_info(self, db_id: str, file_id: str) -> dict:
         """获取文件基本信息（仅元数据）"""
         if file_id not in self.files_meta:
             raise Exception(f"File not found: {file_id}")
 
-        return {"meta": self.files_meta[file_id]}
+        meta = {k: v for k, v in self.files_meta[file_id].items() if k != "chunk_signatures"}
+        return {"meta": meta}
 
-    async def get_file_content(self, db_id: str, file_id: str) -> dict:
+    async def get_file_content(self, db_id: str, file_id: str, offset: int = 0, limit: int | None = None) -> dict:
         """获取文件内容信息（chunks和lines）"""
         if file_id not in self.files_meta:
             raise Exception(f"File not found: {file_id}")
 
-        # 使用 Milvus 获取chunks
+        # 使用 Milvus 获取chunks：chunk_index 在文件内从 0 连续编号，分页直接按 chunk_index 范围过滤
         content_info = {"lines": []}
         collection = await self._get_milvus_collection(db_id)
         if collection:
             try:
-                # 查询文档的所有chunks
-                expr = f'file_id == "{file_id}"'
-                results = collection.query(
-                    expr=expr,
-                    output_fields=["content", "chunk_id", "chunk_index"],
-                    limit=10000,  # 假设单个文件不会超过10000个chunks
+                expr = self._file_expr([file_id])
+                count_rows = await asyncio.to_thread(collection.query, expr=expr, output_fields=["count(*)"])
+                page_expr = f"{expr} and chunk_index >= {offset}"
+                if limit:
+                    page_expr += f" and chunk_index < {offset + limit}"
+                results = await asyncio.to_thread(
+                    self._iterate_rows, collection, page_expr, ["content", "chunk_id", "chunk_index"]
                 )
 
                 # 构建chunks数据
@@ -463,8 +826,24 @@ class MilvusKB(KnowledgeBase):
                     }
                     doc_chunks.append(chunk_data)
 
+                # 去重时未写入 Milvus 的 chunk 从签名索引的引用记录中补齐
+                dedup_index = self._get_dedup_index(db_id)
+                references = dedup_index.file_references(file_id) if dedup_index else []
+                for ref in references:
+                    if ref["chunk_index"] >= offset and (not limit or ref["chunk_index"] < offset + limit):
+                        doc_chunks.append(
+                            {
+                                "id": ref["chunk_id"],
+                                "content": ref["content"],
+                                "chunk_order_index": ref["chunk_index"],
+                                "duplicate_of": ref["canonical_id"],
+                            }
+                        )
+
                 # 按 chunk_order_index 排序
                 doc_chunks.sort(key=lambda x: x.get("chunk_order_index", 0))
+                stored_total = count_rows[0]["count(*)"] if count_rows else len(doc_chunks)
+                content_info["total"] = stored_total + len(references)
                 content_info["lines"] = doc_chunks
                 return content_info
 
@@ -486,6 +865,21 @@ class MilvusKB(KnowledgeBase):
 
         return {**basic_info, **content_info}
 
+    def create_database(
+        self,
+        database_name: str,
+        description: str,
+        embed_info: dict | None = None,
+        llm_info: dict | None = None,
+        **kwargs,
+    ) -> dict:
+        """创建数据库，记录分块方式与单位，之后修改 TEXT_SPLITTER 不影响该知识库"""
+        processing_params = get_processing_params(kwargs.get("text_splitter"))
+        db_info = super().create_database(database_name, description, embed_info, llm_info, **kwargs)
+        self.databases_meta[db_info["db_id"]]["processing_params"] = processing_params
+        self._save_metadata()
+        return db_info | {"processing_params": processing_params}
+
     def delete_database(self, db_id: str) -> dict:
         """删除数据库，同时清除Milvus中的集合"""
         # Drop Milvus collection
@@ -498,6 +892,8 @@ class MilvusKB(KnowledgeBase):
         except Exception as e:
             logger.error(f"Failed to drop Milvus collection {db_id}: {e}")
 
+        self._dedup_indexes.pop(db_id, None)
+
         # Call base method to delete local files and metadata
         return super().delete_database(db_id)
 
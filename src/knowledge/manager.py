@@ -34,6 +34,9 @@ class KnowledgeBaseManager:
         # 元数据锁
         self._metadata_lock = asyncio.Lock()
 
+        # 知识库列表版本号，元数据变更时递增，用于失效依赖知识库列表的缓存（如智能体工具）
+        self.databases_version = 0
+
         # 加载全局元数据
         self._load_global_metadata()
         self._normalize_global_metadata()
@@ -58,6 +61,7 @@ class KnowledgeBaseManager:
     def _save_global_metadata(self):
         """保存全局元数据"""
         meta_file = os.path.join(self.work_dir, "global_metadata.json")
+        self.databases_version += 1
         data = {"databases": self.global_databases_meta, "updated_at": utc_isoformat(), "version": "2.0"}
         with open(meta_file, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
@@ -214,6 +218,11 @@ class KnowledgeBaseManager:
         kb_instance = self._get_kb_for_database(db_id)
         return await kb_instance.add_content(db_id, items, params or {})
 
+    async def update_content(self, db_id: str, file_id: str, item: str, params: dict | None = None) -> dict:
+        """增量更新已入库的文件"""
+        kb_instance = self._get_kb_for_database(db_id)
+        return await kb_instance.update_content(db_id, file_id, item, params or {})
+
     async def aquery(self, query_text: str, db_id: str, **kwargs) -> str:
         """异步查询知识库"""
         kb_instance = self._get_kb_for_database(db_id)
@@ -224,6 +233,11 @@ class KnowledgeBaseManager:
         kb_instance = self._get_kb_for_database(db_id)
         return await kb_instance.export_data(db_id, format=format, **kwargs)
 
+    async def import_data(self, db_id: str, archive_path: str, **kwargs) -> dict:
+        """从归档导入知识库数据"""
+        kb_instance = self._get_kb_for_database(db_id)
+        return await kb_instance.import_data(db_id, archive_path, **kwargs)
+
     def query(self, query_text: str, db_id: str, **kwargs) -> str:
         """同步查询知识库（兼容性方法）"""
         kb_instance = self._get_kb_for_database(db_id)
@@ -251,15 +265,20 @@ class KnowledgeBaseManager:
         kb_instance = self._get_kb_for_database(db_id)
         await kb_instance.delete_file(db_id, file_id)
 
+    async def delete_files(self, db_id: str, file_ids: list[str]) -> dict:
+        """批量删除文件"""
+        kb_instance = self._get_kb_for_database(db_id)
+        return await kb_instance.delete_files(db_id, file_ids)
+
     async def get_file_basic_info(self, db_id: str, file_id: str) -> dict:
         """获取文件基本信息（仅元数据）"""
         kb_instance = self._get_kb_for_database(db_id)
         return await kb_instance.get_file_basic_info(db_id, file_id)
 
-    async def get_file_content(self, db_id: str, file_id: str) -> dict:
-        """获取文件内容信息（chunks和lines）"""
+    async def get_file_content(self, db_id: str, file_id: str, offset: int = 0, limit: int | None = None) -> dict:
+        """获取文件内容信息（chunks和lines），支持按 chunk 分页"""
         kb_instance = self._get_kb_for_database(db_id)
-        return await kb_instance.get_file_content(db_id, file_id)
+        return await kb_instance.get_file_content(db_id, file_id, offset=offset, limit=limit)
 
     async def get_file_info(self, db_id: str, file_id: str) -> dict:
         """获取文件完整信息（基本信息+内容信息）- 保持向后兼容"""
@@ -6,7 +6,9 @@
 """
 
 from .kb_utils import (
+    calculate_chunk_hash,
     calculate_content_hash,
+    diff_chunks_by_hash,
     get_embedding_config,
     prepare_item_metadata,
     split_text_into_chunks,
@@ -15,7 +17,9 @@ from .kb_utils import (
 )
 
 __all__ = [
+    "calculate_chunk_hash",
     "calculate_content_hash",
+    "diff_chunks_by_hash",
     "get_embedding_config",
     "prepare_item_metadata",
     "split_text_into_chunks",
@@ -0,0 +1,263 @@
+"""入库阶段的近似重复 chunk 消除
+
+对切分后的 chunk 计算 MinHash（默认）或 SimHash 签名，通过 LSH 分桶在知识库已有签名中查找近似重复：
+- 相似度达到阈值的 chunk 不再计算向量、不写入向量库，只记录为指向已有 chunk（canonical）的引用
+- 签名与引用按知识库持久化在 {work_dir}/{db_id}/chunk_dedup.json
+- 删除 canonical chunk 时返回失去指向的引用，由调用方重新去重后写入向量库
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+from src.utils import logger
+
+DEDUP_METHODS = ("minhash", "simhash")
+DEDUP_INDEX_FILENAME = "chunk_dedup.json"
+
+# 未在知识库参数中指定时的默认值
+CHUNK_DEDUP = os.getenv("CHUNK_DEDUP", "false").lower() == "true"
+CHUNK_DEDUP_METHOD = os.getenv("CHUNK_DEDUP_METHOD") or "minhash"
+# MinHash 为估计的 Jaccard 相似度，SimHash 为 1 - 汉明距离 / 64
+CHUNK_DEDUP_THRESHOLD = float(os.getenv("CHUNK_DEDUP_THRESHOLD") or 0.9)
+# 字符 n-gram 长度，中文文本按字切分效果优于按词
+CHUNK_DEDUP_SHINGLE_SIZE = int(os.getenv("CHUNK_DEDUP_SHINGLE_SIZE") or 5)
+# 短于该长度的 chunk 不参与去重（如单独的标题行），避免误判
+CHUNK_DEDUP_MIN_CHARS = int(os.getenv("CHUNK_DEDUP_MIN_CHARS") or 50)
+
+MINHASH_NUM_PERM = 128
+MINHASH_BANDS = 16
+SIMHASH_BANDS = 8
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_PERMUTATIONS = np.random.default_rng(1).integers(1, (1 << 61) - 1, size=(2, MINHASH_NUM_PERM), dtype=np.uint64)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class DedupConfig:
+    enabled: bool = False
+    method: str = "minhash"
+    threshold: float = 0.9
+    shingle_size: int = 5
+    min_chars: int = 50
+
+    @classmethod
+    def from_params(cls, params: dict | None) -> "DedupConfig":
+        """根据知识库参数（缺省时使用环境变量）解析去重配置"""
+        params = params or {}
+        enabled = params.get("chunk_dedup", CHUNK_DEDUP)
+        if isinstance(enabled, str):
+            enabled = enabled.strip().lower() in {"1", "true", "yes", "on"}
+        method = str(params.get("dedup_method") or CHUNK_DEDUP_METHOD).lower()
+        if method not in DEDUP_METHODS:
+            raise ValueError(f"Unsupported dedup method: {method}, expected one of {DEDUP_METHODS}")
+        threshold = float(params.get("dedup_threshold") or CHUNK_DEDUP_THRESHOLD)
+        if not 0 < threshold <= 1:
+            raise ValueError(f"dedup_threshold must be in (0, 1], got {threshold}")
+        return cls(
+            enabled=bool(enabled),
+            method=method,
+            threshold=threshold,
+            shingle_size=int(params.get("dedup_shingle_size") or CHUNK_DEDUP_SHINGLE_SIZE),
+            min_chars=CHUNK_DEDUP_MIN_CHARS,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict | None) -> "DedupConfig":
+        return cls(**data) if data else cls()
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _shingles(text: str, size: int) -> list[str]:
+    text = _WHITESPACE.sub(" ", text).strip().lower()
+    if len(text) <= size:
+        return [text]
+    return [text[i : i + size] for i in range(len(text) - size + 1)]
+
+
+def minhash_signature(text: str, shingle_size: int) -> bytes:
+    """MinHash 签名：MINHASH_NUM_PERM 个 uint32"""
+    hashes = np.array([zlib.crc32(s.encode()) for s in set(_shingles(text, shingle_size))], dtype=np.uint64)
+    a, b = _PERMUTATIONS
+    permuted = ((hashes[:, None] * a + b) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32).tobytes()
+
+
+def simhash_signature(text: str, shingle_size: int) -> bytes:
+    """64 位 SimHash 签名，按 n-gram 出现次数加权"""
+    digests = b"".join(hashlib.blake2b(s.encode(), digest_size=8).digest() for s in _shingles(text, shingle_size))
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+    # 每一位上 1 的次数超过一半则置 1
+    return np.packbits(bits.sum(axis=0) * 2 > len(bits)).tobytes()
+
+
+def signature_similarity(method: str, left: bytes, right: bytes) -> float:
+    if method == "simhash":
+        return 1.0 - (int.from_bytes(left, "big") ^ int.from_bytes(right, "big")).bit_count() / 64
+    return float(np.mean(np.frombuffer(left, dtype=np.uint32) == np.frombuffer(right, dtype=np.uint32)))
+
+
+class ChunkDedupIndex:
+    """单个知识库的 chunk 签名索引
+
+    signatures 只保存写入了向量库的 canonical chunk；references 保存被判定为重复、未写入向量库的 chunk，
+    包含原文与位置信息，用于预览以及 canonical 被删除后重新入库。
+    """
+
+    def __init__(self, path: str, config: DedupConfig):
+        self.path = path
+        self.config = config
+        self.signatures: dict[str, dict] = {}
+        self.references: dict[str, dict] = {}
+        self._buckets: dict[tuple[int, bytes], set[str]] = defaultdict(set)
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("method") != self.config.method:
+            logger.warning(f"Dedup index {self.path} uses {data.get('method')}, expected {self.config.method}; reset")
+            return
+        for chunk_id, record in data.get("signatures", {}).items():
+            self._add_signature(chunk_id, record["file_id"], base64.b64decode(record["signature"]))
+        self.references = data.get("references", {})
+
+    def save(self) -> None:
+        with self._lock:
+            data = {
+                "method": self.config.method,
+                "signatures": {
+                    chunk_id: {
+                        "file_id": record["file_id"],
+                        "signature": base64.b64encode(record["signature"]).decode(),
+                    }
+                    for chunk_id, record in self.signatures.items()
+                },
+                "references": self.references,
+            }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _band_keys(self, signature: bytes) -> list[tuple[int, bytes]]:
+        bands = SIMHASH_BANDS if self.config.method == "simhash" else MINHASH_BANDS
+        width = len(signature) // bands
+        return [(band, signature[band * width : (band + 1) * width]) for band in range(bands)]
+
+    def _add_signature(self, chunk_id: str, file_id: str, signature: bytes) -> None:
+        self.signatures[chunk_id] = {"file_id": file_id, "signature": signature}
+        for key in self._band_keys(signature):
+            self._buckets[key].add(chunk_id)
+
+    def _remove_signature(self, chunk_id: str) -> None:
+        record = self.signatures.pop(chunk_id, None)
+        if record is None:
+            return
+        for key in self._band_keys(record["signature"]):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(chunk_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def signature(self, text: str) -> bytes:
+        if self.config.method == "simhash":
+            return simhash_signature(text, self.config.shingle_size)
+        return minhash_signature(text, self.config.shingle_size)
+
+    def find_duplicate(self, signature: bytes) -> tuple[str, float] | None:
+        """返回相似度最高且达到阈值的 canonical chunk"""
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        best = None
+        for chunk_id in candidates:
+            similarity = signature_similarity(self.config.method, signature, self.signatures[chunk_id]["signature"])
+            if similarity >= self.config.threshold and (best is None or similarity > best[1]):
+                best = (chunk_id, similarity)
+        return best
+
+    def dedup(self, chunks: list[dict]) -> tuple[list[dict], list[dict]]:
+        """拆分为需要写入向量库的 chunk 与重复 chunk 的引用记录；同一批内的重复也会被合并"""
+        unique, references = [], []
+        with self._lock:
+            for chunk in chunks:
+                if len(chunk["content"]) < self.config.min_chars:
+                    unique.append(chunk)
+                    continue
+                signature = self.signature(chunk["content"])
+                duplicate = self.find_duplicate(signature)
+                if duplicate is None:
+                    self._add_signature(chunk["id"], chunk["file_id"], signature)
+                    unique.append(chunk)
+                    continue
+                reference = {
+                    "id": chunk["id"],
+                    "chunk_id": chunk["chunk_id"],
+                    "file_id": chunk["file_id"],
+                    "chunk_index": chunk["chunk_index"],
+                    "source": chunk["source"],
+                    "content": chunk["content"],
+                    "canonical_id": duplicate[0],
+                    "similarity": round(duplicate[1], 4),
+                }
+                self.references[chunk["id"]] = reference
+                references.append(reference)
+        return unique, references
+
+    def remove_chunks(self, chunk_ids) -> list[dict]:
+        """删除签名与引用，返回 canonical 被删除而自身仍保留的引用（调用方需要重新入库）"""
+        chunk_ids = set(chunk_ids)
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove_signature(chunk_id)
+                self.references.pop(chunk_id, None)
+            orphans = [ref for ref in self.references.values() if ref["canonical_id"] in chunk_ids]
+            for ref in orphans:
+                del self.references[ref["id"]]
+        return orphans
+
+    def remove_files(self, file_ids) -> list[dict]:
+        file_ids = set(file_ids)
+        with self._lock:
+            chunk_ids = [chunk_id for chunk_id, record in self.signatures.items() if record["file_id"] in file_ids]
+            chunk_ids += [chunk_id for chunk_id, ref in self.references.items() if ref["file_id"] in file_ids]
+            return self.remove_chunks(chunk_ids)
+
+    def reindex(self, new_indexes: dict[str, int]) -> None:
+        """同步引用记录的 chunk_index（文件增量更新后顺序变化）"""
+        with self._lock:
+            for chunk_id, chunk_index in new_indexes.items():
+                if chunk_id in self.references:
+                    self.references[chunk_id]["chunk_index"] = chunk_index
+
+    def file_references(self, file_id: str) -> list[dict]:
+        with self._lock:
+            references = [ref for ref in self.references.values() if ref["file_id"] == file_id]
+        return sorted(references, key=lambda ref: ref["chunk_index"])
+
+    def duplicates_of(self, chunk_ids) -> dict[str, list[dict]]:
+        """{canonical_id: [引用记录]}，用于在检索结果中标注内容相同的其他来源"""
+        chunk_ids = set(chunk_ids)
+        result = defaultdict(list)
+        with self._lock:
+            for ref in self.references.values():
+                if ref["canonical_id"] in chunk_ids:
+                    result[ref["canonical_id"]].append(ref)
+        return dict(result)
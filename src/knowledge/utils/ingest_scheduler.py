@@ -0,0 +1,251 @@
+import asyncio
+import functools
+import os
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from src.utils import logger
+from src.utils.datetime_utils import utc_now
+
+# 同时处理的文档数，与 LightRAG 的 max_parallel_insert 保持一致
+LIGHTRAG_MAX_PARALLEL_INSERT = int(os.getenv("LIGHTRAG_MAX_PARALLEL_INSERT", "4"))
+# 单个文档抽取失败后的重试次数
+LIGHTRAG_INSERT_RETRIES = int(os.getenv("LIGHTRAG_INSERT_RETRIES", "1"))
+# 单个文档从入队到抽取结束的最长等待时间（秒），超时标记为失败且不再重试，0 表示不限制
+LIGHTRAG_INGEST_TIMEOUT = float(os.getenv("LIGHTRAG_INGEST_TIMEOUT", "1800"))
+
+# doc_status 中的终态
+_TERMINAL_STATUSES = {"processed", "failed"}
+# 文档长时间停留在 pending 时重新拉起流水线的间隔（秒），防止错过正在结束的流水线
+_PIPELINE_REKICK_SECONDS = 5.0
+
+# 文档超时后仍未结束的流水线任务，保留引用避免被回收，调度器不再等待它们
+_detached_pipeline_tasks: set[asyncio.Task] = set()
+
+
+class RateBudget:
+    """共享的模型调用预算：并发上限 + 每分钟请求数上限
+
+    同一个模型的所有调用（跨文档、跨知识库）共用一个预算，per_minute 为 0 时只限制并发。
+    """
+
+    def __init__(self, max_concurrency: int, per_minute: int = 0):
+        self.max_concurrency = max_concurrency
+        self.per_minute = per_minute
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._next_at = 0.0
+
+    async def _wait_for_rate(self) -> None:
+        if not self.per_minute:
+            return
+        now = time.monotonic()
+        wait = self._next_at - now
+        self._next_at = max(now, self._next_at) + 60 / self.per_minute
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def run(self, func: Callable[..., Awaitable], *args, **kwargs):
+        async with self._semaphore:
+            await self._wait_for_rate()
+            return await func(*args, **kwargs)
+
+    def wrap(self, func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await self.run(func, *args, **kwargs)
+
+        return wrapper
+
+
+_budgets: dict[str, RateBudget] = {}
+
+
+def get_rate_budget(key: str, max_concurrency: int, per_minute: int = 0) -> RateBudget:
+    """按模型获取共享预算，首次创建时的参数生效"""
+    if key not in _budgets:
+        _budgets[key] = RateBudget(max_concurrency, per_minute)
+    return _budgets[key]
+
+
+@dataclass
+class IngestDocument:
+    file_id: str
+    file_path: str
+    # 返回待插入的 markdown 文本（文件解析 / URL 抓取）
+    load: Callable[[], Awaitable[str]]
+
+
+@dataclass
+class IngestResult:
+    file_id: str
+    status: str
+    error: str | None = None
+    attempts: int = 0
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+class LightRagIngestScheduler:
+    """LightRAG 文档级并发插入
+
+    每个文档独立完成 解析 → 入队 → 等待抽取结束，最多 max_concurrency 个文档同时进行；
+    实体抽取由 LightRAG 流水线按 max_parallel_insert 并行执行，并发调用只会向正在运行的流水线追加请求。
+    失败的文档单独重试，各阶段耗时写入 doc_status 的 metadata.ingest_timings。
+    流水线任务异常结束时，仍在等待的文档按失败处理（可重试）；超过 timeout 仍未结束的文档标记为失败。
+    """
+
+    def __init__(
+        self,
+        rag: Any,
+        max_concurrency: int = LIGHTRAG_MAX_PARALLEL_INSERT,
+        max_retries: int = LIGHTRAG_INSERT_RETRIES,
+        poll_interval: float = 0.2,
+        track_id: str | None = None,
+        timeout: float = LIGHTRAG_INGEST_TIMEOUT,
+    ):
+        self.rag = rag
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+        self.track_id = track_id
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pipeline_tasks: set[asyncio.Task] = set()
+        # 最近一次异常结束的流水线：(结束时间, 异常)
+        self._pipeline_error: tuple[float, BaseException] | None = None
+        self._timed_out = False
+
+    async def run(self, documents: list[IngestDocument]) -> list[IngestResult]:
+        try:
+            return await asyncio.gather(*(self._ingest(doc) for doc in documents))
+        finally:
+            if self._timed_out and self._pipeline_tasks:
+                # 有文档超时说明流水线很可能卡住，不再等待，交给后台自行结束
+                logger.warning(f"Detaching {len(self._pipeline_tasks)} LightRAG pipeline task(s) after ingest timeout")
+                _detached_pipeline_tasks.update(self._pipeline_tasks)
+                for task in self._pipeline_tasks:
+                    task.add_done_callback(_detached_pipeline_tasks.discard)
+            elif self._pipeline_tasks:
+                # 所有文档都已到达终态，这里只回收仍在收尾的流水线任务
+                await asyncio.gather(*self._pipeline_tasks, return_exceptions=True)
+
+    def _start_pipeline(self) -> None:
+        """在后台拉起流水线；流水线忙时 LightRAG 只记录待处理请求并立即返回"""
+        task = asyncio.create_task(self.rag.apipeline_process_enqueue_documents())
+        self._pipeline_tasks.add(task)
+        task.add_done_callback(self._on_pipeline_done)
+
+    def _on_pipeline_done(self, task: asyncio.Task) -> None:
+        self._pipeline_tasks.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            logger.error(f"LightRAG pipeline run failed: {error!r}")
+            self._pipeline_error = (time.monotonic(), error)
+
+    async def _get_status(self, file_id: str) -> dict:
+        return await self.rag.doc_status.get_by_id(file_id) or {}
+
+    async def _wait_until_settled(
+        self, file_id: str, previous: dict, timings: dict[str, float], deadline: float | None = None
+    ) -> dict:
+        """等待文档到达终态，previous 为重试前的状态，避免把上一次的失败当作结果
+
+        流水线异常结束且没有仍在运行的流水线时，文档标记为失败并返回（可重试）；
+        超过 deadline 时文档标记为失败并抛出 TimeoutError（不再重试）。
+        """
+        waiting_since = last_kick = time.monotonic()
+        started_at = None
+        while True:
+            status = await self._get_status(file_id)
+            state = status.get("status")
+            now = time.monotonic()
+            if started_at is None and state not in (None, "pending") and status != previous:
+                started_at = now
+                timings["queue"] = timings.get("queue", 0.0) + now - waiting_since
+            if state in _TERMINAL_STATUSES and status != previous:
+                timings["extract"] = timings.get("extract", 0.0) + now - (started_at or waiting_since)
+                return status
+            if self._pipeline_error and self._pipeline_error[0] >= waiting_since and not self._pipeline_tasks:
+                timings["extract"] = timings.get("extract", 0.0) + now - (started_at or waiting_since)
+                error = self._pipeline_error[1]
+                return await self._update_status(file_id, status, "failed", f"LightRAG pipeline failed: {error!r}")
+            if deadline is not None and now >= deadline:
+                self._timed_out = True
+                timings["extract"] = timings.get("extract", 0.0) + now - (started_at or waiting_since)
+                message = f"LightRAG ingest timed out after {self.timeout:g}s (status: {state})"
+                await self._update_status(file_id, status, "failed", message)
+                raise TimeoutError(message)
+            if started_at is None and now - last_kick > _PIPELINE_REKICK_SECONDS:
+                self._start_pipeline()
+                last_kick = now
+            await asyncio.sleep(self.poll_interval)
+
+    async def _ingest(self, doc: IngestDocument) -> IngestResult:
+        result = IngestResult(file_id=doc.file_id, status="failed")
+        async with self._semaphore:
+            start = time.monotonic()
+            try:
+                content = await doc.load()
+                result.timings["parse"] = time.monotonic() - start
+
+                previous = await self._get_status(doc.file_id)
+                await self.rag.apipeline_enqueue_documents(
+                    content, ids=doc.file_id, file_paths=doc.file_path, track_id=self.track_id
+                )
+                if previous.get("status") == "processed":
+                    # 已处理过的文档（相同 ID）入队时被跳过，直接沿用已有结果
+                    result.status = "processed"
+                    return result
+
+                deadline = time.monotonic() + self.timeout if self.timeout > 0 else None
+                while True:
+                    result.attempts += 1
+                    self._start_pipeline()
+                    previous = await self._wait_until_settled(doc.file_id, previous, result.timings, deadline)
+                    # DocStatus 是 str 枚举，统一保存为字符串值
+                    result.status = str(getattr(previous.get("status"), "value", previous.get("status")))
+                    result.error = previous.get("error_msg") if result.status == "failed" else None
+                    if result.status != "failed" or result.attempts > self.max_retries:
+                        break
+                    logger.warning(f"LightRAG extraction failed for {doc.file_id}, retrying: {result.error}")
+                    previous = await self._reset_for_retry(doc.file_id, previous)
+
+            except Exception as e:
+                result.error = str(e)
+                logger.error(f"Failed to ingest {doc.file_id} into LightRAG: {e}")
+            finally:
+                result.timings["total"] = time.monotonic() - start
+
+        await self._record_timings(result)
+        return result
+
+    async def _reset_for_retry(self, file_id: str, status: dict) -> dict:
+        """把失败的文档重新标记为 pending，下一次流水线运行时只重新处理该文档"""
+        return await self._update_status(file_id, status, "pending")
+
+    async def _update_status(self, file_id: str, status: dict, state: str, error: str | None = None) -> dict:
+        status = {
+            **status,
+            "status": state,
+            "error_msg": error,
+            "updated_at": utc_now().isoformat(),
+        }
+        # 存储层可能直接持有传入的字典，这里写入副本，保留 status 作为比较基准
+        await self.rag.doc_status.upsert({file_id: dict(status)})
+        return status
+
+    async def _record_timings(self, result: IngestResult) -> None:
+        if not result.attempts:
+            return
+        try:
+            status = await self._get_status(result.file_id)
+            if not status:
+                return
+            metadata = dict(status.get("metadata") or {})
+            metadata["ingest_timings"] = {k: round(v, 3) for k, v in result.timings.items()}
+            metadata["ingest_attempts"] = result.attempts
+            await self.rag.doc_status.upsert({result.file_id: {**status, "metadata": metadata}})
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Failed to record ingest timings for {result.file_id}: {e}")
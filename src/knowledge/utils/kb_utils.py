@@ -6,9 +6,17 @@ from pathlib import Path
 from langchain_text_splitters import MarkdownTextSplitter
 
 from src import config
+from src.knowledge.utils.markdown_chunker import HEADING_PATH_SEPARATOR, chunk_markdown
 from src.utils import hashstr, logger
 from src.utils.datetime_utils import utc_isoformat
 
+# 新建知识库的分块方式：langchain 为 MarkdownTextSplitter（chunk_size / chunk_overlap 单位为字符），
+# structured 为按 token 预算的结构感知分块（单位为 token）。分块方式在建库时写入 processing_params，
+# 之后修改该变量不影响已有知识库；没有记录的旧知识库按 langchain 处理
+TEXT_SPLITTER = os.getenv("TEXT_SPLITTER") or "langchain"
+# 各分块方式下 chunk_size / chunk_overlap 的单位
+CHUNK_UNITS = {"langchain": "char", "structured": "token"}
+
 
 def validate_file_path(file_path: str, db_id: str = None) -> str:
     """
@@ -66,13 +74,47 @@ def validate_file_path(file_path: str, db_id: str = None) -> str:
         raise ValueError(f"Invalid file path: {file_path}")
 
 
+def get_processing_params(text_splitter: str | None = None) -> dict:
+    """新建知识库时记录的分块方式与 chunk_size / chunk_overlap 的单位"""
+    text_splitter = text_splitter or TEXT_SPLITTER
+    if text_splitter not in CHUNK_UNITS:
+        raise ValueError(f"Unsupported text splitter: {text_splitter}, expected one of {list(CHUNK_UNITS)}")
+    return {"text_splitter": text_splitter, "chunk_unit": CHUNK_UNITS[text_splitter]}
+
+
+def resolve_split_params(db_meta: dict, params: dict | None) -> dict:
+    """未显式指定 text_splitter 时使用知识库记录的分块方式，没有记录的旧知识库按字符分块"""
+    params = dict(params or {})
+    recorded = db_meta.get("processing_params") or {}
+    params["text_splitter"] = params.get("text_splitter") or recorded.get("text_splitter") or "langchain"
+    return params
+
+
 def split_text_into_chunks(text: str, file_id: str, filename: str, params: dict = {}) -> list[dict]:
     """
-    将文本分割成块，使用 LangChain 的 MarkdownTextSplitter 进行智能分割
+    将文本分割成块：text_splitter 为 structured 时按 token 预算进行结构感知分块（标题路径写入 heading_path），
+    为 langchain 时使用 LangChain 的 MarkdownTextSplitter 按字符分割
     """
     chunks = []
-    chunk_size = params.get("chunk_size", 1000)
-    chunk_overlap = params.get("chunk_overlap", 200)
+    chunk_size = int(params.get("chunk_size", 1000))
+    chunk_overlap = int(params.get("chunk_overlap", 200))
+
+    if (params.get("text_splitter") or TEXT_SPLITTER) == "structured":
+        for chunk_index, chunk in enumerate(chunk_markdown(text, chunk_size, chunk_overlap)):
+            chunks.append(
+                {
+                    "id": f"{file_id}_chunk_{chunk_index}",
+                    "content": chunk.content.strip(),
+                    "file_id": file_id,
+                    "filename": filename,
+                    "chunk_index": chunk_index,
+                    "source": filename,
+                    "chunk_id": f"{file_id}_chunk_{chunk_index}",
+                    "heading_path": HEADING_PATH_SEPARATOR.join(chunk.heading_path),
+                }
+            )
+        logger.debug(f"Successfully split text into {len(chunks)} chunks using MarkdownChunker")
+        return chunks
 
     # 使用 MarkdownTextSplitter 进行智能分割
     # MarkdownTextSplitter 会尝试沿着 Markdown 格式的标题进行分割
@@ -128,6 +170,43 @@ def calculate_content_hash(data: bytes | bytearray | str | os.PathLike[str] | Pa
     raise TypeError(f"Unsupported data type for hashing: {type(data)!r}")
 
 
+def calculate_chunk_hash(content: str) -> str:
+    """计算 chunk 文本的哈希值，用于增量更新时判断 chunk 是否发生变化"""
+    return hashlib.sha256(content.strip().encode("utf-8")).hexdigest()[:32]
+
+
+def diff_chunks_by_hash(
+    chunks: list[dict], existing_hashes: dict[str, str]
+) -> tuple[list[dict], list[tuple[dict, str]], list[str]]:
+    """
+    将新切分的 chunks 与已入库 chunks 的哈希做对比
+
+    Args:
+        chunks: 新切分的 chunks，每个 chunk 需要包含 content 字段
+        existing_hashes: 已入库 chunk 的 {chunk_id: content_hash}
+
+    Returns:
+        tuple: (需要新增的 chunks, [(保留的 chunk, 复用的已入库 chunk_id)], 需要删除的 chunk_id 列表)
+    """
+    # 同一文件中可能出现内容完全相同的 chunk，因此按哈希维护 id 列表逐个匹配
+    pool: dict[str, list[str]] = {}
+    for chunk_id, chunk_hash in existing_hashes.items():
+        pool.setdefault(chunk_hash, []).append(chunk_id)
+
+    added, kept = [], []
+    for chunk in chunks:
+        chunk_hash = chunk.get("content_hash") or calculate_chunk_hash(chunk["content"])
+        chunk["content_hash"] = chunk_hash
+        candidates = pool.get(chunk_hash)
+        if candidates:
+            kept.append((chunk, candidates.pop(0)))
+        else:
+            added.append(chunk)
+
+    removed = [chunk_id for ids in pool.values() for chunk_id in ids]
+    return added, kept, removed
+
+
 def prepare_item_metadata(item: str, content_type: str, db_id: str) -> dict:
     """
     准备文件或URL的元数据
@@ -0,0 +1,399 @@
+"""LightRAG 知识库归档（导出 / 导入）
+
+归档是一个 zip 文件，每类数据对应一个 JSONL 成员，导出与导入都按批读写存储、逐行写入 / 读取，
+不会把整个知识库读入内存：
+- manifest.json: 格式版本、源知识库信息与各类记录数
+- docs.jsonl: 文件记录、原文（full_docs）、doc_status 以及文档 → 实体 / 关系索引
+- chunks.jsonl: 文本块及其向量
+- entities.jsonl: 图谱节点、实体向量与实体 → 文本块索引
+- relations.jsonl: 图谱边、关系向量与关系 → 文本块索引
+
+向量以 float32 的 base64 保存。导入时直接写入向量库（维度不一致或缺失时才重新计算 embedding），
+图谱按批写入，恢复知识库不需要重新进行 LLM 抽取。
+"""
+
+import base64
+import dataclasses
+import io
+import json
+import os
+import zipfile
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Iterator
+from typing import Any
+
+import numpy as np
+from lightrag.utils import compute_mdhash_id
+
+from src.utils import logger
+
+ARCHIVE_FORMAT_VERSION = 1
+# 每批读写的记录数
+LIGHTRAG_ARCHIVE_BATCH_SIZE = int(os.getenv("LIGHTRAG_ARCHIVE_BATCH_SIZE") or 256)
+
+MANIFEST_NAME = "manifest.json"
+DOCS_NAME = "docs.jsonl"
+CHUNKS_NAME = "chunks.jsonl"
+ENTITIES_NAME = "entities.jsonl"
+RELATIONS_NAME = "relations.jsonl"
+
+# 较新的 LightRAG 版本才有的 KV 存储，缺失时跳过
+_DOC_INDEX_STORAGES = ("full_entities", "full_relations")
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _encode_vector(vector) -> str | None:
+    if vector is None:
+        return None
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(data: str | None) -> np.ndarray | None:
+    if not data:
+        return None
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+def _relation_chunk_key(src: str, tgt: str) -> str:
+    from lightrag.utils import make_relation_chunk_key
+
+    return make_relation_chunk_key(src, tgt)
+
+
+async def _read_vectors(vdb, ids: list[str], include_vectors: bool) -> dict[str, tuple[dict, str | None]]:
+    """读取向量库记录（不含向量字段）及对应向量，返回 {id: (record, encoded_vector)}"""
+    if not ids:
+        return {}
+    records = {record["id"]: record for record in await vdb.get_by_ids(ids) if record and record.get("id")}
+    get_vectors = getattr(vdb, "get_vectors_by_ids", None)
+    vectors = await get_vectors(list(records)) if include_vectors and get_vectors and records else {}
+    return {
+        vid: ({k: v for k, v in record.items() if k != "vector"}, _encode_vector(vectors.get(vid)))
+        for vid, record in records.items()
+    }
+
+
+async def _get_optional(rag, storage_name: str, ids: list[str]) -> list[dict | None]:
+    storage = getattr(rag, storage_name, None)
+    if storage is None or not ids:
+        return [None] * len(ids)
+    return await storage.get_by_ids(ids)
+
+
+async def _iter_docs(rag, files: dict[str, dict], batch_size: int) -> AsyncIterator[dict]:
+    for file_ids in _batched(files, batch_size):
+        full_docs = await rag.full_docs.get_by_ids(file_ids)
+        statuses = await rag.doc_status.get_by_ids(file_ids)
+        indexes = {name: await _get_optional(rag, name, file_ids) for name in _DOC_INDEX_STORAGES}
+        for i, file_id in enumerate(file_ids):
+            yield {
+                "id": file_id,
+                "file": files[file_id],
+                "full_doc": full_docs[i],
+                "doc_status": statuses[i],
+                **{name: values[i] for name, values in indexes.items()},
+            }
+
+
+async def _iter_chunks(
+    rag,
+    files: dict[str, dict],
+    chunk_ids: Callable[[str], Awaitable[list[str]]],
+    batch_size: int,
+    include_vectors: bool,
+) -> AsyncIterator[dict]:
+    for file_id in files:
+        for ids in _batched(await chunk_ids(file_id), batch_size):
+            chunks = await rag.text_chunks.get_by_ids(ids)
+            vectors = await _read_vectors(rag.chunks_vdb, ids, include_vectors)
+            for chunk_id, chunk in zip(ids, chunks):
+                if not chunk:
+                    continue
+                vector_record, vector = vectors.get(chunk_id, (None, None))
+                yield {"id": chunk_id, "chunk": chunk, "vector_record": vector_record, "vector": vector}
+
+
+async def _iter_entities(rag, names: list[str], batch_size: int, include_vectors: bool) -> AsyncIterator[dict]:
+    graph = rag.chunk_entity_relation_graph
+    for batch in _batched(names, batch_size):
+        nodes = await graph.get_nodes_batch(batch)
+        vector_ids = [compute_mdhash_id(name, prefix="ent-") for name in batch]
+        vectors = await _read_vectors(rag.entities_vdb, vector_ids, include_vectors)
+        entity_chunks = await _get_optional(rag, "entity_chunks", batch)
+        for name, vector_id, chunks in zip(batch, vector_ids, entity_chunks):
+            node = nodes.get(name)
+            if node is None:
+                continue
+            # labels 由存储层根据 entity_type 生成，不需要导出
+            node = {k: v for k, v in node.items() if k != "labels"}
+            vector_record, vector = vectors.get(vector_id, (None, None))
+            yield {"name": name, "node": node, "vector_record": vector_record, "vector": vector, "chunks": chunks}
+
+
+async def _iter_relations(rag, names: list[str], batch_size: int, include_vectors: bool) -> AsyncIterator[dict]:
+    graph = rag.chunk_entity_relation_graph
+    for batch in _batched(names, batch_size):
+        node_edges = await graph.get_nodes_edges_batch(batch)
+        # 每条边会出现在两个端点的边列表中，只在处理名称较小的端点时导出，无需全局去重
+        pairs = list(
+            dict.fromkeys(
+                (src, tgt) for name in batch for src, tgt in node_edges.get(name) or [] if name == min(src, tgt)
+            )
+        )
+        if not pairs:
+            continue
+        edges = await graph.get_edges_batch([{"src": src, "tgt": tgt} for src, tgt in pairs])
+        # 关系向量的 ID 与抽取时的方向有关，两个方向都尝试
+        vector_ids = {
+            pair: (
+                compute_mdhash_id(pair[0] + pair[1], prefix="rel-"),
+                compute_mdhash_id(pair[1] + pair[0], prefix="rel-"),
+            )
+            for pair in pairs
+        }
+        vectors = await _read_vectors(
+            rag.relationships_vdb, [vid for ids in vector_ids.values() for vid in ids], include_vectors
+        )
+        relation_chunks = (
+            await rag.relation_chunks.get_by_ids([_relation_chunk_key(src, tgt) for src, tgt in pairs])
+            if getattr(rag, "relation_chunks", None) is not None
+            else [None] * len(pairs)
+        )
+        for (src, tgt), chunks in zip(pairs, relation_chunks):
+            edge = edges.get((src, tgt))
+            if edge is None:
+                continue
+            forward, backward = vector_ids[(src, tgt)]
+            vector_record, vector = vectors.get(forward) or vectors.get(backward) or (None, None)
+            yield {
+                "src": src,
+                "tgt": tgt,
+                "edge": edge,
+                "vector_id": vector_record["id"] if vector_record else None,
+                "vector_record": vector_record,
+                "vector": vector,
+                "chunks": chunks,
+            }
+
+
+async def _write_section(zf: zipfile.ZipFile, name: str, records: AsyncIterator[dict]) -> int:
+    count = 0
+    with zf.open(name, "w", force_zip64=True) as raw, io.TextIOWrapper(raw, encoding="utf-8") as fp:
+        async for record in records:
+            fp.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            count += 1
+    return count
+
+
+async def export_archive(
+    rag,
+    output_path: str,
+    files: dict[str, dict],
+    manifest: dict,
+    chunk_ids: Callable[[str], Awaitable[list[str]]],
+    include_vectors: bool = True,
+    batch_size: int = LIGHTRAG_ARCHIVE_BATCH_SIZE,
+) -> dict[str, int]:
+    """把 LightRAG 实例导出为归档文件
+
+    Args:
+        rag: LightRAG 实例
+        output_path: 归档文件路径
+        files: 该知识库的文件记录 {file_id: file_meta}
+        manifest: 写入 manifest.json 的知识库信息
+        chunk_ids: 返回文档按顺序排列的 chunk ID
+        include_vectors: 是否导出向量；不导出时导入需要重新计算 embedding
+
+    Returns:
+        各类记录的数量
+    """
+    counts: dict[str, int] = {}
+    tmp_path = f"{output_path}.part"
+    try:
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            # zip 同一时间只能写入一个成员，按类别依次写入
+            counts["docs"] = await _write_section(zf, DOCS_NAME, _iter_docs(rag, files, batch_size))
+            counts["chunks"] = await _write_section(
+                zf, CHUNKS_NAME, _iter_chunks(rag, files, chunk_ids, batch_size, include_vectors)
+            )
+            names = await rag.chunk_entity_relation_graph.get_all_labels()
+            counts["entities"] = await _write_section(
+                zf, ENTITIES_NAME, _iter_entities(rag, names, batch_size, include_vectors)
+            )
+            counts["relations"] = await _write_section(
+                zf, RELATIONS_NAME, _iter_relations(rag, names, batch_size, include_vectors)
+            )
+            zf.writestr(
+                MANIFEST_NAME,
+                json.dumps(
+                    {
+                        **manifest,
+                        "format_version": ARCHIVE_FORMAT_VERSION,
+                        "include_vectors": include_vectors,
+                        "counts": counts,
+                    },
+                    ensure_ascii=False,
+                    indent=2,
+                ),
+            )
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return counts
+
+
+def read_manifest(archive_path: str) -> dict:
+    """读取并校验归档的 manifest"""
+    with zipfile.ZipFile(archive_path) as zf:
+        try:
+            manifest = json.loads(zf.read(MANIFEST_NAME))
+        except KeyError:
+            raise ValueError(f"{archive_path} is not a LightRAG archive: missing {MANIFEST_NAME}")
+    if manifest.get("format_version") != ARCHIVE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported LightRAG archive version: {manifest.get('format_version')}")
+    return manifest
+
+
+def _read_batches(zf: zipfile.ZipFile, name: str, batch_size: int) -> Iterator[list[dict]]:
+    if name not in zf.namelist():
+        return
+    with zf.open(name) as raw, io.TextIOWrapper(raw, encoding="utf-8") as fp:
+        yield from _batched((json.loads(line) for line in fp if line.strip()), batch_size)
+
+
+async def _load_vectors(vdb, rows: list[tuple[str, dict | None, str | None]]) -> int:
+    """写入向量库，使用归档中的向量代替 embedding 调用，返回重新计算 embedding 的条数"""
+    data = {}
+    vectors: dict[str, np.ndarray] = {}
+    original = vdb.embedding_func
+    for vector_id, record, encoded in rows:
+        if not record or not record.get("content"):
+            continue
+        data[vector_id] = {k: v for k, v in record.items() if k != "id"}
+        vector = _decode_vector(encoded)
+        if vector is not None and vector.shape[0] == original.embedding_dim:
+            vectors[record["content"]] = vector
+    if not data:
+        return 0
+
+    reembedded = 0
+
+    async def archived_embedding(texts: list[str], **kwargs) -> np.ndarray:
+        nonlocal reembedded
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+        if missing:
+            reembedded += len(missing)
+            vectors.update(zip(missing, await original(missing, **kwargs)))
+        return np.array([vectors[text] for text in texts])
+
+    # 向量库在 upsert（或随后的 index_done_callback）中通过 embedding_func 计算向量，
+    # 临时替换为查表函数；不在归档中的文本（包括并发查询）仍交给原函数处理
+    vdb.embedding_func = dataclasses.replace(original, func=archived_embedding)
+    try:
+        await vdb.upsert(data)
+        await vdb.index_done_callback()
+    finally:
+        vdb.embedding_func = original
+    return reembedded
+
+
+async def _upsert_optional(rag, storage_name: str, data: dict[str, Any]) -> None:
+    storage = getattr(rag, storage_name, None)
+    data = {k: v for k, v in data.items() if v}
+    if storage is not None and data:
+        await storage.upsert(data)
+
+
+async def _upsert_graph(graph, nodes: list[tuple[str, dict]], edges: list[tuple[str, str, dict]]) -> None:
+    """批量写入图谱；旧版本 LightRAG 的图存储没有批量接口，逐条写入"""
+    if nodes:
+        if hasattr(graph, "upsert_nodes_batch"):
+            await graph.upsert_nodes_batch(nodes)
+        else:
+            for node_id, node_data in nodes:
+                await graph.upsert_node(node_id, node_data=node_data)
+    if edges:
+        if hasattr(graph, "upsert_edges_batch"):
+            await graph.upsert_edges_batch(edges)
+        else:
+            for src, tgt, edge_data in edges:
+                await graph.upsert_edge(src, tgt, edge_data=edge_data)
+
+
+async def import_archive(
+    rag, archive_path: str, batch_size: int = LIGHTRAG_ARCHIVE_BATCH_SIZE
+) -> tuple[dict, list[dict], dict[str, int]]:
+    """把归档导入 LightRAG 实例（已存在的同 ID 数据会被覆盖）
+
+    Returns:
+        (manifest, 文件记录列表, 导入统计)
+    """
+    manifest = read_manifest(archive_path)
+    graph = rag.chunk_entity_relation_graph
+    files: list[dict] = []
+    stats = {"docs": 0, "chunks": 0, "entities": 0, "relations": 0, "reembedded": 0}
+
+    with zipfile.ZipFile(archive_path) as zf:
+        for batch in _read_batches(zf, DOCS_NAME, batch_size):
+            await rag.full_docs.upsert({r["id"]: r["full_doc"] for r in batch if r.get("full_doc")})
+            await rag.doc_status.upsert({r["id"]: r["doc_status"] for r in batch if r.get("doc_status")})
+            for name in _DOC_INDEX_STORAGES:
+                await _upsert_optional(rag, name, {r["id"]: r.get(name) for r in batch})
+            files.extend(r["file"] for r in batch if r.get("file"))
+            stats["docs"] += len(batch)
+
+        for batch in _read_batches(zf, CHUNKS_NAME, batch_size):
+            await rag.text_chunks.upsert({r["id"]: r["chunk"] for r in batch})
+            stats["reembedded"] += await _load_vectors(
+                rag.chunks_vdb, [(r["id"], r.get("vector_record"), r.get("vector")) for r in batch]
+            )
+            stats["chunks"] += len(batch)
+
+        for batch in _read_batches(zf, ENTITIES_NAME, batch_size):
+            await _upsert_graph(graph, [(r["name"], r["node"]) for r in batch], [])
+            stats["reembedded"] += await _load_vectors(
+                rag.entities_vdb,
+                [(compute_mdhash_id(r["name"], prefix="ent-"), r.get("vector_record"), r.get("vector")) for r in batch],
+            )
+            await _upsert_optional(rag, "entity_chunks", {r["name"]: r.get("chunks") for r in batch})
+            stats["entities"] += len(batch)
+
+        for batch in _read_batches(zf, RELATIONS_NAME, batch_size):
+            await _upsert_graph(graph, [], [(r["src"], r["tgt"], r["edge"]) for r in batch])
+            stats["reembedded"] += await _load_vectors(
+                rag.relationships_vdb,
+                [(r.get("vector_id"), r.get("vector_record"), r.get("vector")) for r in batch if r.get("vector_id")],
+            )
+            if getattr(rag, "relation_chunks", None) is not None:
+                await _upsert_optional(
+                    rag, "relation_chunks", {_relation_chunk_key(r["src"], r["tgt"]): r.get("chunks") for r in batch}
+                )
+            stats["relations"] += len(batch)
+
+    # 落盘 JSON KV 存储、提交图谱与向量库
+    for name in (
+        "full_docs",
+        "text_chunks",
+        "doc_status",
+        *_DOC_INDEX_STORAGES,
+        "entity_chunks",
+        "relation_chunks",
+        "chunk_entity_relation_graph",
+    ):
+        storage = getattr(rag, name, None)
+        if storage is not None:
+            await storage.index_done_callback()
+
+    logger.info(f"Imported LightRAG archive {archive_path}: {stats}")
+    return manifest, files, stats
@@ -0,0 +1,340 @@
+"""结构感知的 Markdown 分块
+
+单次遍历文本行，识别标题、段落、表格（Markdown / HTML）、列表与代码块，每个结构单元只估算一次 token，
+再按 token 预算贪心装箱：
+- 表格、列表、代码块作为整体放入同一 chunk，超出预算时按行 / 列表项拆分，Markdown 表格的表头在每段重复
+- 超长段落按句子拆分，单句仍超长时按字符硬切
+- chunk 不以标题结尾，标题总是与其后的正文在一起；移到下一个 chunk 的标题（至多半个预算）预先从其后结构块的
+  预算中扣除，保证 chunk 不超出预算
+- 每个 chunk 记录起始位置所在的标题路径；overlap 只在同一标题下的相邻 chunk 之间生效
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from src.utils.tokens import estimate_tokens
+
+HEADING_PATH_SEPARATOR = " > "
+UNIT_SEPARATOR = "\n\n"
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_LIST_ITEM = re.compile(r"^(\s*)([-*+]\s+|\d+[.)]\s+|\d+、)")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_HTML_TABLE_START = re.compile(r"<table", re.IGNORECASE)
+_HTML_TABLE_END = re.compile(r"</table>", re.IGNORECASE)
+_HTML_ROW_END = re.compile(r"(?<=</tr>)", re.IGNORECASE)
+# 零宽切分，片段直接拼接即可还原原文
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;\n])|(?<=\.)(?=\s)")
+
+
+@dataclass
+class _Unit:
+    text: str
+    tokens: int
+    path: tuple[str, ...]
+    is_heading: bool = False
+
+
+@dataclass
+class MarkdownChunk:
+    content: str
+    tokens: int
+    heading_path: list[str] = field(default_factory=list)
+
+
+class MarkdownChunker:
+    def __init__(self, chunk_size: int, chunk_overlap: int = 0, measure: Callable[[str], int] = estimate_tokens):
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = max(0, min(chunk_overlap, chunk_size // 2))
+        self.measure = measure
+        # chunk 内单元之间的分隔符同样计入预算
+        self._separator_tokens = measure(UNIT_SEPARATOR)
+
+    def split(self, text: str) -> list[MarkdownChunk]:
+        chunks: list[MarkdownChunk] = []
+        current: list[_Unit] = []
+        current_tokens = 0
+
+        def make_chunk(units: list[_Unit]) -> MarkdownChunk:
+            # 标题路径取第一个正文单元所在的章节
+            path = next((unit.path for unit in units if not unit.is_heading), units[0].path)
+            return MarkdownChunk(
+                content=UNIT_SEPARATOR.join(unit.text for unit in units),
+                tokens=self._cost(units),
+                heading_path=list(path),
+            )
+
+        def fits(unit: _Unit) -> bool:
+            return not current or current_tokens + self._separator_tokens + unit.tokens <= self.chunk_size
+
+        def flush():
+            nonlocal current, current_tokens
+            # 末尾的标题移到下一个 chunk，与 _units 中预留的预算一致
+            trailing = 0
+            while trailing < len(current) and current[-1 - trailing].is_heading:
+                trailing += 1
+            carried = self._carry_count([unit.tokens for unit in current[len(current) - trailing :]])
+            carry = current[len(current) - carried :] if carried else []
+            current = current[: len(current) - carried]
+            if current:
+                chunks.append(make_chunk(current))
+            overlap = [] if carry else self._overlap_tail(current)
+            current = overlap + carry
+            current_tokens = self._cost(current)
+
+        for unit in self._units(text):
+            if not fits(unit):
+                flush()
+                # overlap 只保留同一标题下的内容，且不能挤占新单元的预算
+                if current and (current[0].path != unit.path and not current[0].is_heading or not fits(unit)):
+                    current = [u for u in current if u.is_heading]
+                    current_tokens = self._cost(current)
+                    # 连续的多级标题本身放不下新单元时单独成块
+                    if not fits(unit):
+                        chunks.append(make_chunk(current))
+                        current, current_tokens = [], 0
+            current_tokens += unit.tokens + (self._separator_tokens if current else 0)
+            current.append(unit)
+
+        if current:
+            chunks.append(make_chunk(current))
+        return chunks
+
+    def _cost(self, units: list[_Unit]) -> int:
+        return sum(unit.tokens for unit in units) + self._separator_tokens * max(len(units) - 1, 0)
+
+    def _carry_count(self, heading_tokens: list[int]) -> int:
+        """末尾连续标题中移到下一个 chunk 的个数：从后往前累计（含分隔符），合计不超过半个预算"""
+        count, total = 0, 0
+        for tokens in reversed(heading_tokens):
+            if total + tokens + self._separator_tokens > self.chunk_size // 2:
+                break
+            count += 1
+            total += tokens + self._separator_tokens
+        return count
+
+    def _carry_reserve(self, heading_tokens: list[int]) -> int:
+        """下一个结构块需要为移入的标题预留的预算"""
+        carried = self._carry_count(heading_tokens)
+        return sum(heading_tokens[len(heading_tokens) - carried :]) + self._separator_tokens * carried
+
+    def _overlap_tail(self, units: list[_Unit]) -> list[_Unit]:
+        if not self.chunk_overlap:
+            return []
+        tail, total = [], 0
+        for unit in reversed(units):
+            if unit.is_heading or total + unit.tokens > self.chunk_overlap:
+                break
+            tail.insert(0, unit)
+            total += unit.tokens
+        return tail
+
+    def _units(self, text: str):
+        """单次遍历文本行，按结构块产出装箱单元"""
+        lines = text.replace("\r\n", "\n").split("\n")
+        headings: list[str] = []
+        # 上一个正文单元之后的标题 token 数，可能随下一个结构块移到新 chunk
+        pending: list[int] = []
+        block: list[str] = []
+        kind = None  # paragraph / table / html_table / list / code
+        fence = ""
+
+        def emit():
+            nonlocal block, kind
+            if block:
+                content = "\n".join(block).strip("\n")
+                if content.strip():
+                    budget = self.chunk_size - self._carry_reserve(pending)
+                    pending.clear()
+                    yield from self._block_units(kind, content, tuple(headings), budget)
+            block, kind = [], None
+
+        for line in lines:
+            if kind == "code":
+                block.append(line)
+                if line.strip().startswith(fence):
+                    yield from emit()
+                continue
+            if kind == "html_table":
+                block.append(line)
+                if _HTML_TABLE_END.search(line):
+                    yield from emit()
+                continue
+
+            stripped = line.lstrip()
+            if not stripped:
+                # 列表项之间允许空行
+                if kind != "list":
+                    yield from emit()
+                else:
+                    block.append(line)
+                continue
+
+            # 先按首字符筛选，普通正文行不必逐个匹配结构正则
+            first = stripped[0]
+            if first in "`~" and (fence_match := _FENCE.match(line)):
+                yield from emit()
+                kind, fence = "code", fence_match.group(1)
+                block.append(line)
+                continue
+            if first == "#" and (heading := _HEADING.match(line)):
+                yield from emit()
+                level = len(heading.group(1))
+                headings[:] = headings[: level - 1] + [heading.group(2)]
+                tokens = self.measure(line)
+                if tokens > self.chunk_size:
+                    # 超出预算的标题行按正文切分，标题仍记入标题路径
+                    block, kind = [line.strip()], "paragraph"
+                    yield from emit()
+                    continue
+                pending.append(tokens)
+                yield _Unit(line.strip(), tokens, tuple(headings), is_heading=True)
+                continue
+            if "<" in line and _HTML_TABLE_START.search(line):
+                yield from emit()
+                block, kind = [line], "html_table"
+                if _HTML_TABLE_END.search(line):
+                    yield from emit()
+                continue
+
+            if first == "|":
+                line_kind = "table"
+            elif (first in "-*+" or first.isdigit()) and _LIST_ITEM.match(line):
+                line_kind = "list"
+            elif kind == "list" and line[0] in " \t":
+                line_kind = "list"
+            else:
+                line_kind = "paragraph"
+            if kind != line_kind:
+                yield from emit()
+                kind = line_kind
+            block.append(line)
+
+        yield from emit()
+
+    def _block_units(self, kind: str, content: str, path: tuple[str, ...], budget: int):
+        # token 数不超过字符数，字符数超出预算的块直接按片段估算，避免对整块重复计数
+        if len(content) <= budget:
+            tokens = self.measure(content)
+            if tokens <= budget:
+                yield _Unit(content, tokens, path)
+                return
+
+        header = ""
+        if kind == "table":
+            rows = content.split("\n")
+            if len(rows) > 1 and _TABLE_SEPARATOR.match(rows[1]):
+                header, rows = "\n".join(rows[:2]), rows[2:]
+            pieces = rows
+        elif kind == "html_table":
+            pieces = [piece for piece in _HTML_ROW_END.split(content) if piece.strip()]
+        elif kind == "list":
+            pieces = self._list_items(content)
+        elif kind == "code":
+            pieces = content.split("\n")
+        else:
+            yield from self._split_paragraph(content, path, budget)
+            return
+
+        yield from self._pack(pieces, "" if kind == "html_table" else "\n", header, path, budget)
+
+    def _split_paragraph(self, content: str, path: tuple[str, ...], budget: int):
+        """按整段的 token 密度估算切分位置并对齐到句子边界，每个 chunk 只需重新计数一次"""
+        boundaries = [match.start() for match in _SENTENCE_END.finditer(content)] + [len(content)]
+        chars_per_token = len(content) / max(self.measure(content), 1)
+        start = 0
+        while start < len(content):
+            end = self._snap(boundaries, start, start + int(budget * chars_per_token))
+            text = content[start:end]
+            tokens = self.measure(text)
+            # 密度估算偏差导致超出预算时逐步回退
+            while tokens > budget and end - start > 1:
+                end = self._snap(boundaries, start, start + (end - start) * budget // (tokens + 1))
+                text = content[start:end]
+                tokens = self.measure(text)
+            yield _Unit(text, tokens, path)
+            if end >= len(content):
+                break
+            next_start = end
+            if self.chunk_overlap:
+                overlap_start = bisect_left(boundaries, end - int(self.chunk_overlap * chars_per_token))
+                next_start = max(boundaries[overlap_start], start + 1) if boundaries[overlap_start] < end else end
+            start = next_start
+
+    @staticmethod
+    def _snap(boundaries: list[int], start: int, end: int) -> int:
+        """取 (start, end] 内最后一个句子边界，没有时在 end 处硬切"""
+        end = min(end, boundaries[-1])
+        index = bisect_right(boundaries, end) - 1
+        if index >= 0 and boundaries[index] > start:
+            return boundaries[index]
+        return max(end, start + 1)
+
+    def _pack(self, pieces: list[str], joiner: str, header: str, path: tuple[str, ...], budget: int):
+        """把超长结构块的片段按预算重新组合，Markdown 表格在每段重复表头"""
+        # 表头与片段之间的换行也计入预算；表头超过半个预算时不再重复，按普通行切分
+        header_tokens = self.measure(f"{header}\n") if header else 0
+        if header_tokens > budget // 2:
+            pieces, header, header_tokens = [*header.split("\n"), *pieces], "", 0
+        joiner_tokens = self.measure(joiner) if joiner else 0
+        budget = max(budget - header_tokens, 1)
+        group: list[tuple[str, int]] = []
+        group_tokens = 0
+
+        def make_unit():
+            body = joiner.join(piece for piece, _ in group)
+            text = f"{header}\n{body}" if header else body
+            return _Unit(text, group_tokens + header_tokens, path)
+
+        for piece in pieces:
+            piece_tokens = self.measure(piece)
+            if piece_tokens > budget:
+                if group:
+                    yield make_unit()
+                for part in self._hard_split(piece, piece_tokens, budget):
+                    part_tokens = self.measure(part)
+                    group, group_tokens = [(part, part_tokens)], part_tokens
+                    yield make_unit()
+                group, group_tokens = [], 0
+                continue
+            if group and group_tokens + joiner_tokens + piece_tokens > budget:
+                yield make_unit()
+                group, group_tokens = [], 0
+            group_tokens += piece_tokens + (joiner_tokens if group else 0)
+            group.append((piece, piece_tokens))
+        if group:
+            yield make_unit()
+
+    @staticmethod
+    def _hard_split(text: str, tokens: int, budget: int) -> list[str]:
+        """按字符比例硬切超长片段"""
+        step = max(int(len(text) * budget / tokens), 1)
+        return [text[i : i + step] for i in range(0, len(text), step)]
+
+    @staticmethod
+    def _list_items(content: str) -> list[str]:
+        """按顶层列表项拆分，嵌套项与续行跟随所属的顶层项"""
+        items: list[list[str]] = []
+        top_indent = None
+        for line in content.split("\n"):
+            match = _LIST_ITEM.match(line)
+            indent = len(match.group(1)) if match else None
+            if top_indent is None and match:
+                top_indent = indent
+            if match and indent <= top_indent or not items:
+                items.append([line])
+            else:
+                items[-1].append(line)
+        return ["\n".join(item).rstrip() for item in items]
+
+
+def chunk_markdown(
+    text: str, chunk_size: int, chunk_overlap: int = 0, measure: Callable[[str], int] = estimate_tokens
+) -> list[MarkdownChunk]:
+    """按 token 预算切分 Markdown 文本"""
+    return MarkdownChunker(chunk_size, chunk_overlap, measure).split(text)
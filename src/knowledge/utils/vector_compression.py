@@ -0,0 +1,98 @@
+"""向量压缩配置与计算
+
+- truncate_dim: Matryoshka 截断，只保留前 N 维并重新归一化，仅对以 Matryoshka 方式训练的模型
+  （模型配置中 matryoshka: true）生效
+- quantization: int8（由向量库在索引中做标量量化）或 binary（按符号位打包为二值向量，汉明距离检索）
+- rescore: 先按压缩向量召回 rescore_factor 倍候选，再用全精度向量重新计算余弦相似度排序。
+  仅支持 int8，全精度向量直接读取 embedding 字段的原始数据。binary 不支持重排：全精度向量需要额外的
+  FLOAT_VECTOR 字段，Milvus 要求向量字段建索引并随集合加载，每条向量多占 dim * 4 字节内存
+  （1024 维约 4KB，是二值向量的 32 倍），比不量化还大，失去了二值量化节省内存的意义
+"""
+
+import os
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+from src.utils import logger
+
+QUANTIZATION_TYPES = ("none", "int8", "binary")
+
+# 未在知识库参数中指定时的默认值
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION") or "none"
+VECTOR_TRUNCATE_DIM = int(os.getenv("VECTOR_TRUNCATE_DIM") or 0)
+VECTOR_RESCORE = os.getenv("VECTOR_RESCORE", "false").lower() == "true"
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR") or 4)
+
+
+@dataclass(frozen=True)
+class VectorCompression:
+    quantization: str = "none"
+    truncate_dim: int = 0
+    rescore: bool = False
+    rescore_factor: int = VECTOR_RESCORE_FACTOR
+
+    @classmethod
+    def from_params(cls, params: dict | None, embed_info: dict | None) -> "VectorCompression":
+        """根据知识库参数（缺省时使用环境变量）与嵌入模型信息解析压缩配置"""
+        params = params or {}
+        embed_info = embed_info or {}
+        quantization = str(params.get("vector_quantization") or VECTOR_QUANTIZATION).lower()
+        if quantization not in QUANTIZATION_TYPES:
+            raise ValueError(f"Unsupported vector quantization: {quantization}, expected one of {QUANTIZATION_TYPES}")
+
+        native_dim = int(embed_info.get("dimension") or 1024)
+        truncate_dim = int(params.get("truncate_dim") or VECTOR_TRUNCATE_DIM)
+        if truncate_dim and not embed_info.get("matryoshka"):
+            logger.warning(f"Embedding model {embed_info.get('name')} is not marked matryoshka, ignoring truncate_dim")
+            truncate_dim = 0
+        if truncate_dim >= native_dim:
+            truncate_dim = 0
+        if quantization == "binary" and (truncate_dim or native_dim) % 8:
+            raise ValueError("Binary quantization requires a vector dimension divisible by 8")
+
+        rescore = params.get("vector_rescore", VECTOR_RESCORE)
+        if isinstance(rescore, str):
+            rescore = rescore.strip().lower() in {"1", "true", "yes", "on"}
+        rescore = bool(rescore) and quantization != "none"
+        if rescore and quantization == "binary":
+            raise ValueError(
+                "Binary quantization does not support rescore: full-precision vectors would need an extra "
+                "indexed FLOAT_VECTOR field loaded in memory; use int8 with rescore instead"
+            )
+        return cls(quantization=quantization, truncate_dim=truncate_dim, rescore=rescore)
+
+    @classmethod
+    def from_dict(cls, data: dict | None) -> "VectorCompression":
+        return cls(**data) if data else cls()
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def stored_dim(self, native_dim: int) -> int:
+        return self.truncate_dim or native_dim
+
+    def prepare(self, vectors) -> np.ndarray:
+        """转换为写入 / 检索使用的全精度向量：截断并重新归一化"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.truncate_dim:
+            vectors = vectors[:, : self.truncate_dim]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def binarize(vectors: np.ndarray) -> list[bytes]:
+    """按符号位把向量打包为二值向量，每个维度 1 bit"""
+    return [row.tobytes() for row in np.packbits(np.asarray(vectors) > 0, axis=1)]
+
+
+def hamming_similarity(distance: float, dim: int) -> float:
+    """把汉明距离换算为 [0, 1] 的相似度"""
+    return 1.0 - float(distance) / dim
+
+
+def cosine_scores(query: np.ndarray, vectors) -> np.ndarray:
+    """已归一化查询向量与候选向量的余弦相似度，用于全精度重排"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    return vectors @ np.asarray(query, dtype=np.float32) / np.maximum(norms, 1e-12)
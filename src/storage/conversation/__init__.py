@@ -1,3 +1,10 @@
-from .manager import ConversationManager
+from .manager import AsyncConversationManager, ConversationManager, ConversationTurn
+from .writer import ConversationWriter, conversation_writer
 
-__all__ = ["ConversationManager"]
+__all__ = [
+    "AsyncConversationManager",
+    "ConversationManager",
+    "ConversationTurn",
+    "ConversationWriter",
+    "conversation_writer",
+]
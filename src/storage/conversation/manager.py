@@ -4,15 +4,120 @@ Conversation Storage Manager
 Manages conversation data storage including messages, tool calls, and statistics.
 """
 
+import base64
+import json
 import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Select, and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, defer, selectinload
 
+from src.storage.conversation.rollup import TOOL_CALLS, RollupBatch
 from src.storage.db.models import Conversation, ConversationStats, Message, ToolCall
 from src.utils import logger
 from src.utils.datetime_utils import utc_now
 
 
+def build_list_conversations_stmt(
+    user_id: str | None = None, agent_id: str | None = None, status: str = "active"
+) -> Select:
+    """Build the conversation list query shared by the sync and async managers"""
+    stmt = select(Conversation).where(Conversation.status == status)
+
+    # Only filter by user_id if it's provided and not empty
+    if user_id:
+        stmt = stmt.where(Conversation.user_id == str(user_id))
+
+    if agent_id:
+        stmt = stmt.where(Conversation.agent_id == agent_id)
+
+    return stmt.order_by(Conversation.updated_at.desc())
+
+
+def encode_history_cursor(message: Message) -> str:
+    """Encode the (created_at, id) keyset position of a message as an opaque cursor"""
+    raw = json.dumps([message.created_at.isoformat(), message.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, int]:
+    """Decode a cursor produced by ``encode_history_cursor``; raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception as e:
+        raise ValueError(f"Invalid history cursor: {cursor}") from e
+
+
+@dataclass
+class MessagePage:
+    """One keyset page of conversation history, in chronological order"""
+
+    messages: list[Message]
+    has_more: bool = False
+    next_cursor: str | None = None
+    # Only filled in compact mode, where extra_metadata is not loaded
+    error_types: dict[int, str | None] = field(default_factory=dict)
+
+
+@dataclass
+class ConversationTurn:
+    """
+    Unit of work collecting every write produced by one conversation turn
+
+    Messages, their tool calls and tool outputs are buffered in memory and persisted
+    together by ``ConversationManager.save_turn`` in a single transaction.
+    """
+
+    thread_id: str
+    messages: list[dict] = field(default_factory=list)
+    tool_outputs: dict[str, dict] = field(default_factory=dict)
+
+    def add_message(
+        self,
+        role: str,
+        content: str,
+        message_type: str = "text",
+        extra_metadata: dict | None = None,
+        tool_calls: list[dict] | None = None,
+    ) -> None:
+        """
+        Buffer a message and its tool calls
+
+        Args:
+            tool_calls: LangGraph tool calls, each with ``name``, ``args`` and ``id``
+        """
+        self.messages.append(
+            {
+                "role": role,
+                "content": content,
+                "message_type": message_type,
+                "extra_metadata": extra_metadata or {},
+                "tool_calls": tool_calls or [],
+            }
+        )
+
+    def set_tool_output(
+        self,
+        langgraph_tool_call_id: str,
+        tool_output: str,
+        status: str = "success",
+        error_message: str | None = None,
+    ) -> None:
+        """Buffer the output of a tool call created in this turn or in an earlier one"""
+        self.tool_outputs[langgraph_tool_call_id] = {
+            "tool_output": tool_output,
+            "status": status,
+            "error_message": error_message,
+        }
+
+    def __len__(self) -> int:
+        return len(self.messages) + len(self.tool_outputs)
+
+
 class ConversationManager:
     """Manager for conversation storage operations"""
 
@@ -104,19 +209,17 @@ class ConversationManager:
             content=content,
             message_type=message_type,
             extra_metadata=extra_metadata or {},
+            created_at=utc_now(),
         )
 
+        conversation = self.db.get(Conversation, conversation_id)
+        if conversation is not None:
+            self._record_rollups(conversation, [message])
+
         self.db.add(message)
         # Mark the parent conversation as active for sorting/analytics
-        conversation = self.db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        if conversation:
-            conversation.updated_at = utc_now()
-
+        self._touch_conversation(conversation_id, added_messages=1)
         self.db.commit()
-        self.db.refresh(message)
-
-        # Update conversation stats
-        self._update_message_count(conversation_id)
 
         logger.debug(f"Added {role} message to conversation {conversation_id}")
         return message
@@ -180,6 +283,8 @@ class ConversationManager:
         Returns:
             Created ToolCall object
         """
+        # The rollup bucket must match created_at, which rebuild_rollups groups by
+        now = utc_now()
         tool_call = ToolCall(
             message_id=message_id,
             tool_name=tool_name,
@@ -188,8 +293,13 @@ class ConversationManager:
             status=status,
             error_message=error_message,
             langgraph_tool_call_id=langgraph_tool_call_id,
+            created_at=now,
         )
 
+        rollups = RollupBatch()
+        rollups.add(TOOL_CALLS, tool_name, now)
+        rollups.flush(self.db)
+
         self.db.add(tool_call)
         self.db.commit()
         self.db.refresh(tool_call)
@@ -197,6 +307,99 @@ class ConversationManager:
         logger.debug(f"Added tool call {tool_name} to message {message_id}")
         return tool_call
 
+    def save_turn(self, turn: ConversationTurn) -> list[Message]:
+        """
+        Persist a whole conversation turn in one transaction
+
+        New messages and their tool calls are inserted in bulk, tool outputs are applied to
+        the in-memory tool calls of this turn or to pending ones loaded with a single query,
+        and conversation stats are updated incrementally instead of recounting messages.
+
+        Args:
+            turn: Buffered writes of the turn
+
+        Returns:
+            List of created Message objects (empty if the conversation does not exist)
+        """
+        if not len(turn):
+            return []
+
+        conversation = self.get_conversation_by_thread_id(turn.thread_id)
+        if not conversation:
+            logger.warning(f"Conversation not found for thread_id: {turn.thread_id}")
+            return []
+
+        # Messages of one turn share a timestamp otherwise; keep their order stable for history reads
+        base_time = utc_now()
+        messages: list[Message] = []
+        pending_tool_calls: dict[str, ToolCall] = {}
+
+        for index, item in enumerate(turn.messages):
+            message = Message(
+                conversation_id=conversation.id,
+                role=item["role"],
+                content=item["content"],
+                message_type=item["message_type"],
+                extra_metadata=item["extra_metadata"],
+                created_at=base_time + timedelta(microseconds=index),
+            )
+            for tc in item["tool_calls"]:
+                tool_call = ToolCall(
+                    tool_name=tc.get("name", "unknown"),
+                    tool_input=tc.get("args", {}),
+                    status="pending",
+                    langgraph_tool_call_id=tc.get("id"),
+                    # Counted in the message's rollup bucket, keep rebuilds consistent
+                    created_at=message.created_at,
+                )
+                message.tool_calls.append(tool_call)
+                if tool_call.langgraph_tool_call_id:
+                    pending_tool_calls[tool_call.langgraph_tool_call_id] = tool_call
+            messages.append(message)
+
+        try:
+            # Must run before the new messages are flushed, it looks at the previous activity
+            self._record_rollups(conversation, messages)
+            self.db.add_all(messages)
+
+            missing_ids = [tc_id for tc_id in turn.tool_outputs if tc_id not in pending_tool_calls]
+            if missing_ids:
+                for tool_call in self.db.query(ToolCall).filter(ToolCall.langgraph_tool_call_id.in_(missing_ids)):
+                    pending_tool_calls[tool_call.langgraph_tool_call_id] = tool_call
+
+            for tc_id, output in turn.tool_outputs.items():
+                tool_call = pending_tool_calls.get(tc_id)
+                if tool_call is None:
+                    logger.warning(f"Tool call {tc_id} not found for update")
+                    continue
+                tool_call.tool_output = output["tool_output"]
+                tool_call.status = output["status"]
+                if output["error_message"]:
+                    tool_call.error_message = output["error_message"]
+
+            self._touch_conversation(conversation.id, added_messages=len(messages))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        logger.debug(
+            f"Saved turn for {turn.thread_id}: {len(messages)} messages, {len(turn.tool_outputs)} tool outputs"
+        )
+        return messages
+
+    def get_message_external_ids(self, conversation_id: int) -> set[str]:
+        """
+        Get the LangGraph message ids already stored for a conversation
+
+        Only the ``id`` key of ``extra_metadata`` is selected, so the full message dumps
+        and tool calls are not loaded.
+        """
+        rows = self.db.query(Message.extra_metadata["id"].as_string()).filter(
+            Message.conversation_id == conversation_id
+        )
+        return {row[0] for row in rows if row[0]}
+
     def get_messages(self, conversation_id: int, limit: int | None = None, offset: int = 0) -> list[Message]:
         """
         Get messages for a conversation
@@ -212,8 +415,8 @@ class ConversationManager:
         query = (
             self.db.query(Message)
             .filter(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at.asc())
-            .options(joinedload(Message.tool_calls))
+            .order_by(Message.created_at.asc(), Message.id.asc())
+            .options(selectinload(Message.tool_calls))
         )
 
         if limit:
@@ -221,6 +424,75 @@ class ConversationManager:
 
         return query.all()
 
+    def get_messages_page(
+        self,
+        conversation_id: int,
+        limit: int = 50,
+        before: str | None = None,
+        after: str | None = None,
+        include_metadata: bool = True,
+    ) -> MessagePage:
+        """
+        Get one page of messages using a keyset cursor on (created_at, id)
+
+        Without a cursor the most recent ``limit`` messages are returned. ``before`` pages
+        towards older messages and ``after`` towards newer ones; ``next_cursor`` continues
+        in the same direction. Tool calls are loaded with one extra IN query per page.
+
+        Args:
+            conversation_id: Conversation ID
+            limit: Page size
+            before: Cursor of a message; return messages older than it
+            after: Cursor of a message; return messages newer than it
+            include_metadata: Load extra_metadata; when False only its error_type is read
+
+        Returns:
+            MessagePage with messages in chronological order
+        """
+        stmt = (
+            select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .options(selectinload(Message.tool_calls))
+        )
+
+        if not include_metadata:
+            stmt = stmt.options(defer(Message.extra_metadata, raiseload=True)).add_columns(
+                Message.extra_metadata["error_type"].as_string()
+            )
+
+        if after:
+            created_at, message_id = decode_history_cursor(after)
+            stmt = stmt.where(
+                or_(
+                    Message.created_at > created_at,
+                    and_(Message.created_at == created_at, Message.id > message_id),
+                )
+            ).order_by(Message.created_at.asc(), Message.id.asc())
+        else:
+            if before:
+                created_at, message_id = decode_history_cursor(before)
+                stmt = stmt.where(
+                    or_(
+                        Message.created_at < created_at,
+                        and_(Message.created_at == created_at, Message.id < message_id),
+                    )
+                )
+            stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc())
+
+        # Fetch one extra row to know whether another page exists
+        rows = self.db.execute(stmt.limit(limit + 1)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        page = MessagePage(messages=[row[0] for row in rows], has_more=has_more)
+        if not include_metadata:
+            page.error_types = {row[0].id: row[1] for row in rows}
+        if has_more:
+            page.next_cursor = encode_history_cursor(page.messages[-1])
+        if not after:
+            page.messages.reverse()
+        return page
+
     def get_messages_by_thread_id(self, thread_id: str, limit: int | None = None, offset: int = 0) -> list[Message]:
         """
         Get messages for a conversation by thread ID
@@ -254,16 +526,7 @@ class ConversationManager:
         Returns:
             List of Conversation objects
         """
-        query = self.db.query(Conversation).filter(Conversation.status == status)
-
-        # Only filter by user_id if it's provided and not empty
-        if user_id:
-            query = query.filter(Conversation.user_id == str(user_id))
-
-        if agent_id:
-            query = query.filter(Conversation.agent_id == agent_id)
-
-        return query.order_by(Conversation.updated_at.desc()).all()
+        return list(self.db.scalars(build_list_conversations_stmt(user_id, agent_id, status)))
 
     def update_conversation(
         self,
@@ -503,9 +766,50 @@ class ConversationManager:
         logger.debug(f"Updated tool call {langgraph_tool_call_id} with output")
         return tool_call
 
+    def _touch_conversation(self, conversation_id: int, added_messages: int = 0) -> None:
+        """
+        Bump conversation ``updated_at`` and increment the stats message count in the current transaction
+
+        Args:
+            conversation_id: Conversation ID
+            added_messages: Number of messages added
+        """
+        now = utc_now()
+        self.db.execute(update(Conversation).where(Conversation.id == conversation_id).values(updated_at=now))
+        if added_messages:
+            self.db.execute(
+                update(ConversationStats)
+                .where(ConversationStats.conversation_id == conversation_id)
+                .values(message_count=ConversationStats.message_count + added_messages, updated_at=now)
+            )
+
+    def _record_rollups(self, conversation: Conversation, messages: list[Message]) -> None:
+        """
+        Increment dashboard rollup counters for new messages in the current transaction
+
+        Args:
+            conversation: Conversation the messages belong to
+            messages: New, not yet flushed messages with ``created_at`` set
+        """
+        if not messages:
+            return
+
+        last_message_at = self.db.scalar(
+            select(func.max(Message.created_at)).where(Message.conversation_id == conversation.id)
+        )
+        rollups = RollupBatch()
+        for message in messages:
+            # A turn may cross an hour or day boundary; count activity in every bucket it reaches
+            rollups.add_conversation_activity(conversation, message.created_at, last_message_at)
+            last_message_at = message.created_at
+            rollups.add_message(message, conversation)
+            for tool_call in message.tool_calls:
+                rollups.add(TOOL_CALLS, tool_call.tool_name, message.created_at)
+        rollups.flush(self.db)
+
     def _update_message_count(self, conversation_id: int) -> None:
         """
-        Update message count in conversation stats
+        Recount messages in conversation stats (repairs counts drifted by external writes)
 
         Args:
             conversation_id: Conversation ID
@@ -515,3 +819,20 @@ class ConversationManager:
             message_count = self.db.query(Message).filter(Message.conversation_id == conversation_id).count()
             stats.message_count = message_count
             self.db.commit()
+
+
+class AsyncConversationManager:
+    """
+    Read-only conversation queries on an ``AsyncSession``
+
+    Used by hot read endpoints so they do not block the event loop on SQLite I/O.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def list_conversations(
+        self, user_id: str | None = None, agent_id: str | None = None, status: str = "active"
+    ) -> list[Conversation]:
+        result = await self.db.scalars(build_list_conversations_stmt(user_id, agent_id, status))
+        return list(result)
@@ -0,0 +1,289 @@
+"""
+Statistics Rollups
+
+Hourly and daily pre-aggregated counters (per agent, user, model, tool) backing the dashboard.
+Counters are incremented in the same transaction as the conversation writes, so dashboard
+queries read O(buckets) rows instead of rescanning messages; ``rebuild_rollups`` recomputes
+them from history.
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+
+from sqlalchemy import Select, delete, func, literal, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from src.storage.db.models import Conversation, Message, StatsRollup, ToolCall
+from src.utils import logger
+from src.utils.datetime_utils import UTC
+
+HOUR = "hour"
+DAY = "day"
+GRANULARITIES = (HOUR, DAY)
+
+# Assistant replies per agent
+AGENT_MESSAGES = "agent_messages"
+# Conversations with at least one message in the bucket, per agent
+AGENT_CONVERSATIONS = "agent_conversations"
+# User messages per user; the number of rows in a bucket is the number of active users
+USER_MESSAGES = "user_messages"
+# Assistant replies per model (response_metadata.model_name)
+MODEL_CALLS = "model_calls"
+# Token usage (usage_metadata), dimension_key is empty
+INPUT_TOKENS = "input_tokens"
+OUTPUT_TOKENS = "output_tokens"
+# Assistant replies per retrieval mode (mix/local/global)
+RETRIEVAL_CALLS = "retrieval_calls"
+# Tool calls per tool name
+TOOL_CALLS = "tool_calls"
+
+# Day buckets follow Asia/Shanghai like the rest of the dashboard (fixed UTC+8, no DST)
+LOCAL_OFFSET = timedelta(hours=8)
+
+_UPSERT_BATCH_SIZE = 500
+
+
+def _as_naive_utc(value: datetime) -> datetime:
+    """Timestamps are persisted as naive UTC; normalize aware values to the same form"""
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    """Return the (naive UTC) start of the hour or local day containing ``value``"""
+    value = _as_naive_utc(value)
+    if granularity == HOUR:
+        return value.replace(minute=0, second=0, microsecond=0)
+    local_day = (value + LOCAL_OFFSET).replace(hour=0, minute=0, second=0, microsecond=0)
+    return local_day - LOCAL_OFFSET
+
+
+def message_metrics(role: str, extra_metadata: dict | None, agent_id: str, user_id: str) -> list[tuple[str, str, int]]:
+    """Counters contributed by one message, as (metric, dimension_key, value)"""
+    metadata = extra_metadata or {}
+    metrics: list[tuple[str, str, int]] = []
+
+    if role == "user":
+        metrics.append((USER_MESSAGES, user_id, 1))
+    elif role == "assistant":
+        metrics.append((AGENT_MESSAGES, agent_id, 1))
+        model_name = (metadata.get("response_metadata") or {}).get("model_name")
+        if model_name:
+            metrics.append((MODEL_CALLS, str(model_name), 1))
+        if retrieval_mode := metadata.get("retrieval_mode"):
+            metrics.append((RETRIEVAL_CALLS, str(retrieval_mode), 1))
+
+    usage = metadata.get("usage_metadata") or {}
+    if isinstance(usage, dict):
+        metrics.append((INPUT_TOKENS, "", int(usage.get("input_tokens") or 0)))
+        metrics.append((OUTPUT_TOKENS, "", int(usage.get("output_tokens") or 0)))
+
+    return metrics
+
+
+class RollupBatch:
+    """Accumulates counter increments in memory and writes them with one upsert"""
+
+    def __init__(self):
+        self._counts: dict[tuple[str, str, datetime, str], int] = defaultdict(int)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(
+        self,
+        metric: str,
+        key: str | None,
+        timestamp: datetime,
+        value: int = 1,
+        granularities: Iterable[str] = GRANULARITIES,
+    ) -> None:
+        if not value:
+            return
+        for granularity in granularities:
+            self._counts[(granularity, metric, bucket_start(timestamp, granularity), key or "")] += value
+
+    def add_bucket(self, granularity: str, metric: str, bucket: datetime, key: str | None, value: int) -> None:
+        """Add a value to an already computed bucket (used by rebuilds)"""
+        if value:
+            self._counts[(granularity, metric, bucket, key or "")] += value
+
+    def add_message(self, message: Message, conversation: Conversation) -> None:
+        for metric, key, value in message_metrics(
+            message.role, message.extra_metadata, conversation.agent_id, conversation.user_id
+        ):
+            self.add(metric, key, message.created_at, value)
+
+    def add_conversation_activity(
+        self, conversation: Conversation, timestamp: datetime, last_message_at: datetime | None
+    ) -> None:
+        """Count the conversation as active in every bucket it was not active in yet"""
+        for granularity in GRANULARITIES:
+            current = bucket_start(timestamp, granularity)
+            if last_message_at is None or bucket_start(last_message_at, granularity) != current:
+                self.add(AGENT_CONVERSATIONS, conversation.agent_id, timestamp, granularities=(granularity,))
+
+    def flush(self, db: Session) -> int:
+        """Upsert accumulated increments in the current transaction; returns the number of rows touched"""
+        if not self._counts:
+            return 0
+
+        rows = [
+            {"granularity": g, "metric": metric, "bucket_start": bucket, "dimension_key": key, "value": value}
+            for (g, metric, bucket, key), value in self._counts.items()
+        ]
+        stmt = sqlite_insert(StatsRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["granularity", "metric", "bucket_start", "dimension_key"],
+            set_={"value": StatsRollup.value + stmt.excluded.value},
+        )
+        for i in range(0, len(rows), _UPSERT_BATCH_SIZE):
+            db.execute(stmt, rows[i : i + _UPSERT_BATCH_SIZE])
+
+        self._counts.clear()
+        return len(rows)
+
+
+def load_rollups(
+    db: Session, metric: str, granularity: str, start: datetime, end: datetime | None = None
+) -> list[tuple[datetime, str, int]]:
+    """Read (bucket_start, dimension_key, value) rows of a metric for buckets in [start, end)"""
+    stmt = select(StatsRollup.bucket_start, StatsRollup.dimension_key, StatsRollup.value).where(
+        StatsRollup.granularity == granularity,
+        StatsRollup.metric == metric,
+        StatsRollup.bucket_start >= bucket_start(start, granularity),
+    )
+    if end is not None:
+        stmt = stmt.where(StatsRollup.bucket_start < _as_naive_utc(end))
+    return [
+        (row.bucket_start, row.dimension_key, row.value) for row in db.execute(stmt.order_by(StatsRollup.bucket_start))
+    ]
+
+
+def _bucket_expr(column, granularity: str):
+    # SQLite date functions round fractional seconds to milliseconds, which can push a timestamp just
+    # before a boundary into the next bucket; truncate to whole seconds like bucket_start() does
+    seconds = func.substr(column, 1, 19)
+    if granularity == HOUR:
+        return func.strftime("%Y-%m-%d %H:00:00", seconds)
+    return func.strftime("%Y-%m-%d 00:00:00", func.datetime(seconds, "+8 hours"))
+
+
+def _parse_bucket(raw: str, granularity: str) -> datetime:
+    value = datetime.strptime(raw, "%Y-%m-%d %H:%M:%S")
+    return value if granularity == HOUR else value - LOCAL_OFFSET
+
+
+def _rebuild_queries(granularity: str, since_bucket: datetime | None) -> list[tuple[str, Select]]:
+    """Grouped history queries returning (bucket, dimension_key, value) rows for every metric"""
+    msg_bucket = _bucket_expr(Message.created_at, granularity)
+    tool_bucket = _bucket_expr(ToolCall.created_at, granularity)
+    model_name = func.json_extract(Message.extra_metadata, "$.response_metadata.model_name")
+    retrieval_mode = func.json_extract(Message.extra_metadata, "$.retrieval_mode")
+
+    def message_stmt(key, value) -> Select:
+        stmt = select(msg_bucket, key, value).join(Conversation, Message.conversation_id == Conversation.id)
+        if since_bucket is not None:
+            stmt = stmt.where(Message.created_at >= since_bucket)
+        return stmt.group_by(msg_bucket, key)
+
+    queries = [
+        (
+            AGENT_MESSAGES,
+            message_stmt(Conversation.agent_id, func.count(Message.id)).where(Message.role == "assistant"),
+        ),
+        (
+            AGENT_CONVERSATIONS,
+            message_stmt(Conversation.agent_id, func.count(func.distinct(Message.conversation_id))),
+        ),
+        (
+            USER_MESSAGES,
+            message_stmt(Conversation.user_id, func.count(Message.id)).where(Message.role == "user"),
+        ),
+        (
+            MODEL_CALLS,
+            message_stmt(model_name, func.count(Message.id)).where(Message.role == "assistant", model_name.isnot(None)),
+        ),
+        (
+            RETRIEVAL_CALLS,
+            message_stmt(retrieval_mode, func.count(Message.id)).where(
+                Message.role == "assistant", retrieval_mode.isnot(None)
+            ),
+        ),
+    ]
+
+    for metric, path in (
+        (INPUT_TOKENS, "$.usage_metadata.input_tokens"),
+        (OUTPUT_TOKENS, "$.usage_metadata.output_tokens"),
+    ):
+        tokens = func.sum(func.coalesce(func.json_extract(Message.extra_metadata, path), 0))
+        queries.append(
+            (
+                metric,
+                message_stmt(literal(""), tokens).where(
+                    func.json_extract(Message.extra_metadata, "$.usage_metadata").isnot(None)
+                ),
+            )
+        )
+
+    tool_stmt = select(tool_bucket, ToolCall.tool_name, func.count(ToolCall.id))
+    if since_bucket is not None:
+        tool_stmt = tool_stmt.where(ToolCall.created_at >= since_bucket)
+    queries.append((TOOL_CALLS, tool_stmt.group_by(tool_bucket, ToolCall.tool_name)))
+
+    return queries
+
+
+def rebuild_rollups(db: Session, since: datetime | None = None) -> int:
+    """
+    Recompute rollups from conversation history
+
+    Buckets starting at the local day containing ``since`` (or all buckets) are deleted and
+    rebuilt with grouped queries over messages and tool calls, in a single transaction.
+
+    Args:
+        db: Database session
+        since: Only rebuild buckets from this time on; ``None`` rebuilds everything
+
+    Returns:
+        Number of rollup rows written
+    """
+    since_bucket = bucket_start(since, DAY) if since else None
+    batch = RollupBatch()
+
+    try:
+        cleanup = delete(StatsRollup)
+        if since_bucket is not None:
+            cleanup = cleanup.where(StatsRollup.bucket_start >= since_bucket)
+        db.execute(cleanup)
+
+        for granularity in GRANULARITIES:
+            queries = _rebuild_queries(granularity, since_bucket)
+            for metric, stmt in queries:
+                for raw_bucket, key, value in db.execute(stmt):
+                    if raw_bucket is None:
+                        continue
+                    batch.add_bucket(granularity, metric, _parse_bucket(raw_bucket, granularity), key, int(value or 0))
+
+        written = batch.flush(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    logger.info(f"Rebuilt {written} stats rollup rows" + (f" since {since_bucket}" if since_bucket else ""))
+    return written
+
+
+def ensure_rollups_initialized(db: Session) -> bool:
+    """Backfill rollups once when the table is empty but conversation history exists"""
+    if db.scalar(select(StatsRollup.id).limit(1)) is not None:
+        return False
+    if db.scalar(select(Message.id).limit(1)) is None:
+        return False
+
+    rebuild_rollups(db)
+    return True
@@ -0,0 +1,77 @@
+"""
+Conversation Write-Behind Writer
+
+Moves conversation persistence off the response path: jobs are queued and executed
+in order by a background worker, each with its own database session.
+"""
+
+import asyncio
+import os
+from collections.abc import Awaitable, Callable
+
+from src.storage.conversation.manager import ConversationManager
+from src.utils import logger
+
+WriteJob = Callable[[ConversationManager], Awaitable[None]]
+
+
+class ConversationWriter:
+    """Background writer executing conversation persistence jobs in FIFO order"""
+
+    def __init__(self, enabled: bool = False, max_queue_size: int = 1000):
+        self.enabled = enabled
+        self._queue: asyncio.Queue[WriteJob] | None = None
+        self._worker: asyncio.Task | None = None
+        self._max_queue_size = max_queue_size
+
+    async def submit(self, job: WriteJob) -> None:
+        """
+        Run a persistence job
+
+        In write-behind mode the job is queued and this returns immediately; otherwise
+        the job runs inline. Jobs for the same worker keep submission order, so the turns
+        of one thread are always written in sequence.
+        """
+        if not self.enabled:
+            await self._run(job)
+            return
+
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self._max_queue_size)
+            self._worker = asyncio.create_task(self._worker_loop(), name="conversation-writer")
+
+        # A full queue applies backpressure to the producer instead of dropping data
+        await self._queue.put(job)
+
+    async def drain(self) -> None:
+        """Wait for queued jobs and stop the worker"""
+        if self._queue is None or self._worker is None:
+            return
+
+        await self._queue.join()
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+
+    async def _worker_loop(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    async def _run(job: WriteJob) -> None:
+        from src.storage.db.manager import db_manager
+
+        db = db_manager.get_session()
+        try:
+            await job(ConversationManager(db))
+        except Exception as e:
+            logger.error(f"Conversation write job failed: {e}")
+        finally:
+            db.close()
+
+
+conversation_writer = ConversationWriter(enabled=os.getenv("CONVERSATION_WRITE_BEHIND", "false").lower() == "true")
@@ -0,0 +1,98 @@
+"""
+SQLite 存储引擎配置
+
+统一创建同步与异步（aiosqlite）引擎，并在每个新连接上应用 WAL、synchronous、mmap、cache 等 PRAGMA。
+所有参数均可通过环境变量覆盖，便于在多 worker 部署时调优写入并发。
+
+外键约束默认关闭（与 SQLite 默认行为及既有数据保持一致），设置 SQLITE_FOREIGN_KEYS=true 后
+每个连接执行 ``PRAGMA foreign_keys=ON``；开启前需确认已有数据不存在悬空引用，否则相关删除或写入会失败。
+"""
+
+import os
+from dataclasses import dataclass
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+
+@dataclass(frozen=True)
+class SQLiteSettings:
+    """SQLite 连接与 PRAGMA 配置"""
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    busy_timeout_ms: int = 5000
+    # 负数表示以 KiB 为单位，-20000 约为 20MB 页缓存
+    cache_size: int = -20000
+    mmap_size: int = 256 * 1024 * 1024
+    temp_store: str = "MEMORY"
+    foreign_keys: bool = False
+    pool_size: int = 5
+    max_overflow: int = 10
+
+    @classmethod
+    def from_env(cls) -> "SQLiteSettings":
+        defaults = cls()
+        return cls(
+            journal_mode=os.getenv("SQLITE_JOURNAL_MODE", defaults.journal_mode).upper(),
+            synchronous=os.getenv("SQLITE_SYNCHRONOUS", defaults.synchronous).upper(),
+            busy_timeout_ms=int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", defaults.busy_timeout_ms)),
+            cache_size=int(os.getenv("SQLITE_CACHE_SIZE", defaults.cache_size)),
+            mmap_size=int(os.getenv("SQLITE_MMAP_SIZE", defaults.mmap_size)),
+            temp_store=os.getenv("SQLITE_TEMP_STORE", defaults.temp_store).upper(),
+            foreign_keys=os.getenv("SQLITE_FOREIGN_KEYS", str(defaults.foreign_keys)).lower() == "true",
+            pool_size=int(os.getenv("SQLITE_POOL_SIZE", defaults.pool_size)),
+            max_overflow=int(os.getenv("SQLITE_MAX_OVERFLOW", defaults.max_overflow)),
+        )
+
+    def pragmas(self) -> list[str]:
+        pragmas = [
+            f"PRAGMA journal_mode={self.journal_mode}",
+            f"PRAGMA synchronous={self.synchronous}",
+            f"PRAGMA busy_timeout={self.busy_timeout_ms}",
+            f"PRAGMA cache_size={self.cache_size}",
+            f"PRAGMA mmap_size={self.mmap_size}",
+            f"PRAGMA temp_store={self.temp_store}",
+        ]
+        if self.foreign_keys:
+            pragmas.append("PRAGMA foreign_keys=ON")
+        return pragmas
+
+
+def _register_pragmas(engine: Engine, settings: SQLiteSettings) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):  # noqa: ARG001
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in settings.pragmas():
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def create_sqlite_engine(db_path: str, settings: SQLiteSettings | None = None) -> Engine:
+    """创建应用 PRAGMA 的同步 SQLite 引擎"""
+    settings = settings or SQLiteSettings.from_env()
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False, "timeout": settings.busy_timeout_ms / 1000},
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_pre_ping=False,
+    )
+    _register_pragmas(engine, settings)
+    return engine
+
+
+def create_async_sqlite_engine(db_path: str, settings: SQLiteSettings | None = None) -> AsyncEngine:
+    """创建基于 aiosqlite 的异步引擎，PRAGMA 与同步引擎保持一致"""
+    settings = settings or SQLiteSettings.from_env()
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_path}",
+        connect_args={"timeout": settings.busy_timeout_ms / 1000},
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+    )
+    _register_pragmas(engine.sync_engine, settings)
+    return engine
@@ -1,11 +1,12 @@
 import os
 import pathlib
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 
 from src import config
+from src.storage.db.engine import SQLiteSettings, create_async_sqlite_engine, create_sqlite_engine
 from src.storage.db.models import Base, User
 from src.utils import logger
 
@@ -26,11 +27,14 @@ class DBManager:
         self.db_path = os.path.join(config.save_dir, "database", "server.db")
         self.ensure_db_dir()
 
-        # 创建SQLAlchemy引擎
-        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        # 创建SQLAlchemy引擎（WAL 模式，连接级 PRAGMA 见 engine.py）
+        self.settings = SQLiteSettings.from_env()
+        self.engine = create_sqlite_engine(self.db_path, self.settings)
+        self.async_engine = create_async_sqlite_engine(self.db_path, self.settings)
 
         # 创建会话工厂
         self.Session = sessionmaker(bind=self.engine)
+        self.AsyncSession = async_sessionmaker(bind=self.async_engine, expire_on_commit=False)
 
         # 首先创建基本表结构
         self.create_tables()
@@ -93,6 +97,29 @@ class DBManager:
         finally:
             session.close()
 
+    def get_async_session(self):
+        """获取异步数据库会话"""
+        return self.AsyncSession()
+
+    @asynccontextmanager
+    async def get_async_session_context(self):
+        """获取异步数据库会话的上下文管理器"""
+        session = self.AsyncSession()
+        try:
+            yield session
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"Database operation failed: {e}")
+            raise
+        finally:
+            await session.close()
+
+    async def dispose(self):
+        """关闭连接池，在服务退出时调用"""
+        await self.async_engine.dispose()
+        self.engine.dispose()
+
     def check_first_run(self):
         """检查是否首次运行"""
         session = self.get_session()
@@ -1,6 +1,6 @@
 import datetime as dt
 
-from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -58,6 +58,8 @@ class Message(Base):
     """Message table - stores conversation messages"""
 
     __tablename__ = "messages"
+    # Keyset pagination over a conversation's history orders by (created_at, id)
+    __table_args__ = (Index("ix_messages_conversation_created_id", "conversation_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True, comment="Primary key")
     conversation_id = Column(
@@ -351,3 +353,19 @@ class MessageFeedback(Base):
             "reason": self.reason,
             "created_at": format_utc_datetime(self.created_at),
         }
+
+
+class StatsRollup(Base):
+    """Stats rollup table - pre-aggregated counters per time bucket for the dashboard"""
+
+    __tablename__ = "stats_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "metric", "bucket_start", "dimension_key", name="uq_stats_rollup_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="Primary key")
+    granularity = Column(String(8), nullable=False, comment="Bucket size: hour/day (day buckets follow Asia/Shanghai)")
+    metric = Column(String(32), nullable=False, comment="Metric name, e.g. agent_messages/tool_calls")
+    bucket_start = Column(DateTime, nullable=False, comment="Bucket start time (UTC)")
+    dimension_key = Column(String(128), nullable=False, default="", comment="Agent/user/model/tool key")
+    value = Column(Integer, nullable=False, default=0, comment="Counter value")
@@ -0,0 +1,37 @@
+"""本地 token 估算
+
+优先使用 tiktoken 的 o200k_base 编码（与 LightRAG 默认分词器一致）；词表不可用时（如离线环境）
+退化为按字符类别估算：CJK 字符约 1 token/字，其余文本约 4 字符/token。
+"""
+
+import re
+from functools import lru_cache
+
+from src.utils.logging_config import logger
+
+TOKEN_ENCODING = "o200k_base"
+
+# 按连续片段匹配，比逐字匹配少创建大量单字符串
+_CJK_PATTERN = re.compile("[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]+")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"tiktoken encoding {TOKEN_ENCODING} unavailable, falling back to heuristic estimate: {e}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = sum(map(len, _CJK_PATTERN.findall(text)))
+    return cjk + (len(text) - cjk + 3) // 4
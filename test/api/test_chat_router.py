@@ -57,3 +57,113 @@ async def test_setting_default_agent_requires_admin(test_client, admin_headers,
     )
     assert update_response.status_code == 200, update_response.text
     assert update_response.json()["default_agent_id"] == candidate_agent_id
+
+
+def _seed_history(thread_id: str, turns: int) -> bool:
+    """Write history through the storage layer; False if the API service uses another database."""
+    from src.storage.conversation.manager import ConversationManager, ConversationTurn
+    from src.storage.db.manager import db_manager
+
+    with db_manager.get_session_context() as session:
+        manager = ConversationManager(session)
+        if manager.get_conversation_by_thread_id(thread_id) is None:
+            return False
+        for index in range(turns):
+            turn = ConversationTurn(thread_id=thread_id)
+            turn.add_message("user", f"question {index}")
+            turn.add_message(
+                "assistant",
+                f"answer {index}",
+                extra_metadata={
+                    "citations": [{"title": f"doc {index}"}],
+                    "error_type": "interrupted" if index == 0 else None,
+                },
+            )
+            manager.save_turn(turn)
+    return True
+
+
+def _first_message_cursor(thread_id: str) -> str:
+    from src.storage.conversation.manager import ConversationManager, encode_history_cursor
+    from src.storage.db.manager import db_manager
+
+    with db_manager.get_session_context() as session:
+        messages = ConversationManager(session).get_messages_by_thread_id(thread_id, limit=1)
+        return encode_history_cursor(messages[0])
+
+
+async def test_agent_history_keyset_pagination(test_client, admin_headers):
+    agents_response = await test_client.get("/api/chat/agent", headers=admin_headers)
+    assert agents_response.status_code == 200, agents_response.text
+    agents = agents_response.json().get("agents", [])
+    if not agents:
+        pytest.skip("No agents are registered in the system.")
+
+    agent_id = agents[0]["id"]
+    history_url = f"/api/chat/agent/{agent_id}/history"
+    thread_response = await test_client.post(
+        "/api/chat/thread", json={"agent_id": agent_id, "title": "history paging"}, headers=admin_headers
+    )
+    assert thread_response.status_code == 200, thread_response.text
+    thread_id = thread_response.json()["id"]
+
+    async def get_page(**params):
+        response = await test_client.get(history_url, params={"thread_id": thread_id, **params}, headers=admin_headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    try:
+        payload = await get_page(limit=10, compact=True)
+        assert payload["history"] == []
+        assert payload["has_more"] is False
+        assert payload["next_cursor"] is None
+
+        bad_cursor_response = await test_client.get(
+            history_url,
+            params={"thread_id": thread_id, "limit": 10, "before": "not-a-cursor"},
+            headers=admin_headers,
+        )
+        assert bad_cursor_response.status_code == 400
+
+        if not _seed_history(thread_id, turns=12):
+            pytest.skip("The API service does not share the local database.")
+
+        full_history = (await get_page())["history"]
+        all_ids = [message["id"] for message in full_history]
+        assert len(all_ids) == 24
+
+        # Walk towards older messages: pages of 10, 10 and 4
+        pages, params = [], {}
+        while True:
+            page = await get_page(limit=10, **params)
+            pages.append(page)
+            if not page["has_more"]:
+                assert page["next_cursor"] is None
+                break
+            assert page["next_cursor"]
+            params = {"before": page["next_cursor"]}
+        assert [len(page["history"]) for page in pages] == [10, 10, 4]
+        walked = [message["id"] for page in reversed(pages) for message in page["history"]]
+        assert walked == all_ids
+
+        # Walk towards newer messages from the oldest one
+        walked, params = [], {"after": _first_message_cursor(thread_id)}
+        while True:
+            page = await get_page(limit=10, **params)
+            walked.extend(message["id"] for message in page["history"])
+            if not page["has_more"]:
+                assert page["next_cursor"] is None
+                break
+            params = {"after": page["next_cursor"]}
+        assert walked == all_ids[1:]
+
+        # Compact mode keeps error_type but omits citations and metadata
+        verbose = (await get_page(limit=24))["history"]
+        compact = (await get_page(limit=24, compact=True))["history"]
+        assert [message["id"] for message in compact] == all_ids
+        assert sum("citations" in message for message in verbose) == 12
+        assert all("citations" not in message and "extra_metadata" not in message for message in compact)
+        assert [message["error_type"] for message in compact] == [message["error_type"] for message in verbose]
+        assert compact[1]["error_type"] == "interrupted"
+    finally:
+        await test_client.delete(f"/api/chat/thread/{thread_id}", headers=admin_headers)
@@ -23,3 +23,22 @@ async def test_admin_can_fetch_conversations(test_client, admin_headers):
     response = await test_client.get("/api/dashboard/conversations", headers=admin_headers)
     assert response.status_code == 200, response.text
     assert isinstance(response.json(), list)
+
+
+async def test_admin_can_fetch_call_timeseries(test_client, admin_headers):
+    for stats_type in ("models", "agents", "tokens", "tools", "knowledge_base", "knowledge_graph"):
+        response = await test_client.get(
+            "/api/dashboard/stats/calls/timeseries",
+            params={"type": stats_type, "time_range": "7days"},
+            headers=admin_headers,
+        )
+        assert response.status_code == 200, response.text
+        payload = response.json()
+        assert len(payload["data"]) == 7
+        assert payload["categories"]
+        assert all(set(payload["categories"]) <= set(item["data"]) for item in payload["data"])
+
+    invalid_response = await test_client.get(
+        "/api/dashboard/stats/calls/timeseries", params={"type": "unknown"}, headers=admin_headers
+    )
+    assert invalid_response.status_code == 422
@@ -49,3 +49,53 @@ async def test_knowledge_routes_enforce_permissions(test_client, standard_user,
 
     forbidden_get = await test_client.get(f"/api/knowledge/databases/{db_id}", headers=standard_user["headers"])
     assert forbidden_get.status_code == 403
+
+
+async def test_resumable_upload_session(test_client, admin_headers):
+    import hashlib
+
+    payload = "智能水利 resumable upload test\n".encode() * 64
+    content_hash = hashlib.sha256(payload).hexdigest()
+
+    create_response = await test_client.post(
+        "/api/knowledge/files/upload/sessions",
+        json={"filename": "pytest_resumable.txt", "total_size": len(payload), "content_hash": content_hash},
+        headers=admin_headers,
+    )
+    assert create_response.status_code == 200, create_response.text
+    upload_id = create_response.json()["upload_id"]
+
+    half = len(payload) // 2
+    first = await test_client.put(
+        f"/api/knowledge/files/upload/sessions/{upload_id}",
+        params={"offset": 0},
+        content=payload[:half],
+        headers=admin_headers,
+    )
+    assert first.status_code == 200, first.text
+    assert first.json()["received"] == half
+
+    stale = await test_client.put(
+        f"/api/knowledge/files/upload/sessions/{upload_id}",
+        params={"offset": 0},
+        content=payload[half:],
+        headers=admin_headers,
+    )
+    assert stale.status_code == 409
+
+    status_response = await test_client.get(f"/api/knowledge/files/upload/sessions/{upload_id}", headers=admin_headers)
+    assert status_response.json()["received"] == half
+
+    second = await test_client.put(
+        f"/api/knowledge/files/upload/sessions/{upload_id}",
+        params={"offset": half},
+        content=payload[half:],
+        headers=admin_headers,
+    )
+    assert second.status_code == 200, second.text
+
+    complete = await test_client.post(
+        f"/api/knowledge/files/upload/sessions/{upload_id}/complete", headers=admin_headers
+    )
+    assert complete.status_code == 200, complete.text
+    assert complete.json()["content_hash"] == content_hash
@@ -0,0 +1,64 @@
+"""
+智能体配置与模型客户端缓存测试
+"""
+
+import os
+
+from src.agents.chatbot import graph
+from src.agents.common import context as context_module
+from src.agents.common import models
+from src.agents.common.context import _load_file_config
+
+
+def test_file_config_reloaded_when_mtime_changes(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("model: openai/gpt-4o\n", encoding="utf-8")
+    first = _load_file_config(path)
+    assert first == {"model": "openai/gpt-4o"}
+
+    # 返回副本，调用方修改不影响缓存
+    first["model"] = "changed"
+    assert _load_file_config(path) == {"model": "openai/gpt-4o"}
+
+    path.write_text("model: deepseek/deepseek-chat\n", encoding="utf-8")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert _load_file_config(path) == {"model": "deepseek/deepseek-chat"}
+    context_module.clear_file_config_cache()
+
+
+def test_chat_model_clients_are_reused(monkeypatch):
+    monkeypatch.setitem(
+        models.config.model_names,
+        "cache-test",
+        {"name": "cache-test", "base_url": "http://127.0.0.1:9/v1", "env": "NO_API_KEY", "models": ["m"]},
+    )
+    models.clear_chat_model_cache()
+
+    first = models.load_chat_model("cache-test/m")
+    assert models.load_chat_model("cache-test/m") is first
+    assert models.load_chat_model("cache-test/m", temperature=0.1) is not first
+    # 同一 base_url 共享连接池
+    assert models.load_chat_model("cache-test/m2").http_async_client is first.http_async_client
+
+    models.clear_chat_model_cache()
+    assert models.load_chat_model("cache-test/m") is not first
+
+
+def test_tool_list_not_cached_when_build_fails(monkeypatch):
+    calls = []
+
+    def fake_get_tools(input_context=None, raise_errors=False):
+        calls.append(raise_errors)
+        if len(calls) == 1:
+            raise RuntimeError("milvus unavailable")
+        return ["full"] if raise_errors else ["partial"]
+
+    monkeypatch.setattr(graph, "get_tools", fake_get_tools)
+    agent = graph.ChatbotAgent()
+
+    # 第一次构建失败：返回部分工具，不写入缓存
+    assert agent.get_tools() == ["partial"]
+    assert agent.get_tools() == ["full"]
+    assert agent.get_tools() == ["full"]
+    assert calls == [True, False, True]
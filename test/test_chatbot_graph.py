@@ -0,0 +1,232 @@
+"""
+智能体助手检索流程测试
+
+用假的分类器、检索与模型替代外部依赖，校验 auto 检索策略的判定顺序，以及 llm_call 中
+预检索任务的取消 / 等待、流式调用合并结果与首 token 耗时的记录。
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessageChunk, HumanMessage
+
+from src.agents.chatbot import graph as chatbot_graph
+from src.agents.chatbot.graph import ChatbotAgent
+
+
+def make_context(**overrides):
+    values = {
+        "retrieval_policy": "auto",
+        "retrieval_classifier_enabled": False,
+        "retrieval_classifier_allow_llm": False,
+    }
+    return SimpleNamespace(**(values | overrides))
+
+
+@pytest.fixture
+def agent():
+    return ChatbotAgent.__new__(ChatbotAgent)
+
+
+@pytest.fixture
+def classifier_calls(agent, monkeypatch):
+    """本地分类器返回 local_result，LLM 分类器固定返回 enforce；记录两者的调用"""
+    calls = {"local": 0, "llm": 0, "local_result": None}
+
+    async def local(query_text):
+        calls["local"] += 1
+        return calls["local_result"]
+
+    async def llm(query_text, runtime_context):
+        calls["llm"] += 1
+        return "enforce"
+
+    monkeypatch.setattr(chatbot_graph, "classify_retrieval_policy", local)
+    monkeypatch.setattr(agent, "_classify_retrieval_policy", llm)
+    return calls
+
+
+async def test_classifiers_are_not_consulted_unless_enabled(agent, classifier_calls):
+    classifier_calls["local_result"] = ("llm", 0.99)
+
+    assert await agent._decide_retrieval_policy("你好", make_context(), "mix") == "inject"
+    assert await agent._decide_retrieval_policy("你好", make_context(retrieval_policy="enforce"), "mix") == "enforce"
+    assert await agent._decide_retrieval_policy("各坝型水库的数量统计", make_context(), "mix") == "enforce"
+    assert await agent._decide_retrieval_policy("你好", make_context(), "llm") == "llm"
+    assert (classifier_calls["local"], classifier_calls["llm"]) == (0, 0)
+
+
+async def test_local_classifier_llm_policy_requires_opt_in(agent, classifier_calls):
+    enabled = make_context(retrieval_classifier_enabled=True)
+
+    classifier_calls["local_result"] = ("llm", 0.99)
+    assert await agent._decide_retrieval_policy("你好", enabled, "mix") == "inject"
+    allowed = make_context(retrieval_classifier_enabled=True, retrieval_classifier_allow_llm=True)
+    assert await agent._decide_retrieval_policy("你好", allowed, "mix") == "llm"
+
+    classifier_calls["local_result"] = ("enforce", 0.9)
+    assert await agent._decide_retrieval_policy("土石坝渗流监测的规范依据", enabled, "mix") == "enforce"
+    assert classifier_calls["llm"] == 0
+
+    # 本地分类器不确定时回退到 LLM 分类器
+    classifier_calls["local_result"] = None
+    assert await agent._decide_retrieval_policy("为什么拱坝会出现裂缝？", enabled, "mix") == "enforce"
+    assert (classifier_calls["local"], classifier_calls["llm"]) == (4, 1)
+
+
+def test_rank_scored_kb_results_are_not_treated_as_similarity():
+    results = [
+        {"content": "渗流监测", "metadata": {"source": "a.md"}, "score": 0.42},
+        {"content": "重力坝（坝型）", "metadata": {"source": "b.md", "score_type": "rank"}, "score": 1.0},
+    ]
+    assert [item.score for item in chatbot_graph._kb_context_items(results)] == [0.42, None]
+
+
+KB_RESULTS = [{"content": "坝基渗流量偏大时应加密观测。", "metadata": {"source": "a.md"}, "score": 0.9}]
+
+
+class FakeModel:
+    """只实现 astream，分块返回回答；每块之前推进时钟"""
+
+    def __init__(self, clock, parts=("A 站", "水位正常")):
+        self.clock = clock
+        self.parts = parts
+        self.messages = None
+
+    async def astream(self, messages):
+        self.messages = messages
+        for index, part in enumerate(self.parts):
+            self.clock[0] += 0.3
+            usage = (
+                {"input_tokens": 42, "output_tokens": 2, "total_tokens": 44} if index == len(self.parts) - 1 else None
+            )
+            yield AIMessageChunk(content=part, usage_metadata=usage)
+
+
+@pytest.fixture
+def turn(agent, monkeypatch):
+    """llm_call 的运行环境：检索在 release 之前一直阻塞，记录取消与首 token 耗时"""
+    env = SimpleNamespace(
+        policy="inject",
+        kb_results=KB_RESULTS,
+        stats=None,
+        started=asyncio.Event(),
+        release=asyncio.Event(),
+        prefetch_calls=0,
+        cancelled=0,
+        ttft=[],
+        clock=[100.0],
+    )
+    env.model = FakeModel(env.clock)
+
+    async def prefetch(query_text, input_context, retrieval_mode):
+        env.prefetch_calls += 1
+        env.started.set()
+        try:
+            await env.release.wait()
+        except asyncio.CancelledError:
+            env.cancelled += 1
+            raise
+        env.clock[0] += 0.2
+        return env.kb_results, None
+
+    async def decide(query_text, runtime_context, retrieval_mode):
+        if runtime_context.speculative_retrieval:
+            # 策略判断期间预检索已经开始
+            await env.started.wait()
+        return env.policy
+
+    def record_ttft(speculative, ttft):
+        env.ttft.append((speculative, ttft))
+        return ttft
+
+    monkeypatch.setattr(chatbot_graph, "_prefetch_retrieval", prefetch)
+    monkeypatch.setattr(chatbot_graph, "_direct_reservoir_count_statistics", lambda query_text: env.stats)
+    monkeypatch.setattr(chatbot_graph, "load_chat_model", lambda model_name: env.model)
+    monkeypatch.setattr(chatbot_graph, "_record_ttft", record_ttft)
+    monkeypatch.setattr(chatbot_graph, "time", SimpleNamespace(perf_counter=lambda: env.clock[0]))
+    monkeypatch.setattr(agent, "_decide_retrieval_policy", decide)
+
+    async def run(query_text="A 站水位怎么样？", speculative=True):
+        context = SimpleNamespace(
+            model="fake",
+            system_prompt="你是水利助手",
+            speculative_retrieval=speculative,
+            retrieval_no_result_reply="资料不足",
+            retrieval_mode="mix",
+        )
+        state = SimpleNamespace(messages=[HumanMessage(content=query_text)])
+        result = await asyncio.wait_for(agent.llm_call(state, SimpleNamespace(context=context)), timeout=5)
+        return result["messages"][0]
+
+    env.run = run
+    return env
+
+
+def system_prompts(model) -> list[str]:
+    return [message["content"] for message in model.messages if isinstance(message, dict)]
+
+
+async def test_speculative_retrieval_is_awaited_for_inject(turn):
+    turn.release.set()
+    response = await turn.run()
+
+    assert (turn.prefetch_calls, turn.cancelled) == (1, 0)
+    assert any("坝基渗流量偏大" in prompt for prompt in system_prompts(turn.model))
+    assert response.additional_kwargs["citations"][0]["path"] == "a.md"
+    # 流式分块合并为完整回答，保留模型返回的用量
+    assert response.content == "A 站水位正常"
+    assert response.usage_metadata["input_tokens"] == 42
+    # 首 token 耗时从本轮开始计时，包含检索耗时与第一块的等待
+    assert turn.ttft == [(True, pytest.approx(0.5))]
+
+
+async def test_speculative_retrieval_is_cancelled_when_policy_skips_retrieval(turn):
+    turn.policy = "llm"
+    response = await turn.run()
+
+    assert (turn.prefetch_calls, turn.cancelled) == (1, 1)
+    assert system_prompts(turn.model) == ["你是水利助手"]
+    assert response.content == "A 站水位正常" and "citations" not in response.additional_kwargs
+    assert turn.ttft == [(True, pytest.approx(0.3))]
+
+
+async def test_speculative_retrieval_is_cancelled_when_structured_statistics_answer(turn):
+    turn.stats = {"text_summary": "四川省重力坝共 12 座", "source_path": "dataset://reservoirs"}
+    await turn.run("四川有多少座重力坝？")
+
+    assert (turn.prefetch_calls, turn.cancelled) == (1, 1)
+    assert "四川省重力坝共 12 座" in system_prompts(turn.model)
+    assert not any("坝基渗流量偏大" in prompt for prompt in system_prompts(turn.model))
+
+
+async def test_enforce_without_results_returns_before_calling_model(turn):
+    turn.policy = "enforce"
+    turn.kb_results = []
+    turn.release.set()
+    response = await turn.run()
+
+    assert response.content == "资料不足"
+    assert (turn.prefetch_calls, turn.cancelled) == (1, 0)
+    assert turn.model.messages is None and turn.ttft == []
+
+
+async def test_retrieval_runs_after_policy_without_speculation(turn):
+    turn.release.set()
+    await turn.run(speculative=False)
+
+    assert (turn.prefetch_calls, turn.cancelled) == (1, 0)
+    assert turn.ttft == [(False, pytest.approx(0.5))]
+
+    turn.policy = "llm"
+    await turn.run(speculative=False)
+    assert turn.prefetch_calls == 1
+
+
+def test_record_ttft_tracks_median_per_mode(monkeypatch):
+    monkeypatch.setattr(
+        chatbot_graph, "_ttft_samples", {True: chatbot_graph.deque(maxlen=3), False: chatbot_graph.deque()}
+    )
+    assert [chatbot_graph._record_ttft(True, value) for value in (0.4, 0.1, 0.3, 0.9)] == [0.4, 0.4, 0.3, 0.3]
+    assert chatbot_graph._record_ttft(False, 1.2) == 1.2
@@ -0,0 +1,61 @@
+"""
+近似重复 chunk 签名索引测试
+"""
+
+import pytest
+
+from src.knowledge.utils.chunk_dedup import ChunkDedupIndex, DedupConfig
+
+BOILERPLATE = (
+    "第三条 水库大坝安全管理应当坚持安全第一、预防为主、综合治理的方针，"
+    "大坝主管部门对其所管辖的大坝安全实施监督，大坝管理单位负责日常巡查、"
+    "观测、维修养护与险情报告，并按规定开展定期安全鉴定。"
+)
+
+
+def make_chunk(file_id: str, index: int, content: str) -> dict:
+    chunk_id = f"{file_id}_chunk_{index}"
+    return {
+        "id": chunk_id,
+        "chunk_id": chunk_id,
+        "file_id": file_id,
+        "chunk_index": index,
+        "source": f"{file_id}.md",
+        "content": content,
+    }
+
+
+@pytest.mark.parametrize("method", ["minhash", "simhash"])
+def test_near_duplicates_become_references(tmp_path, method):
+    config = DedupConfig.from_params({"chunk_dedup": "true", "dedup_method": method, "dedup_threshold": 0.85})
+    index = ChunkDedupIndex(str(tmp_path / "chunk_dedup.json"), config)
+
+    first = [make_chunk("v1", 0, BOILERPLATE), make_chunk("v1", 1, "汛期调度规则：汛限水位以下按来水下泄。" * 4)]
+    unique, references = index.dedup(first)
+    assert len(unique) == 2 and references == []
+
+    # 修订版只改动了少量标点和用词
+    revised = BOILERPLATE.replace("，并按规定", "；并按照规定")
+    unique, references = index.dedup([make_chunk("v2", 0, revised), make_chunk("v2", 1, "库区移民安置规划。" * 8)])
+    assert [chunk["id"] for chunk in unique] == ["v2_chunk_1"]
+    assert references[0]["canonical_id"] == "v1_chunk_0" and references[0]["content"] == revised
+    index.save()
+
+    reloaded = ChunkDedupIndex(str(tmp_path / "chunk_dedup.json"), config)
+    assert [ref["id"] for ref in reloaded.file_references("v2")] == ["v2_chunk_0"]
+    assert list(reloaded.duplicates_of(["v1_chunk_0"])) == ["v1_chunk_0"]
+
+    # 删除 canonical 所在文件后，引用需要由调用方重新入库
+    orphans = reloaded.remove_files(["v1"])
+    assert [ref["id"] for ref in orphans] == ["v2_chunk_0"]
+    unique, references = reloaded.dedup(orphans)
+    assert [chunk["id"] for chunk in unique] == ["v2_chunk_0"] and references == []
+    assert reloaded.references == {}
+
+
+def test_invalid_config():
+    assert DedupConfig.from_params({}).enabled is False
+    with pytest.raises(ValueError):
+        DedupConfig.from_params({"dedup_method": "exact"})
+    with pytest.raises(ValueError):
+        DedupConfig.from_params({"dedup_threshold": 1.5})
@@ -0,0 +1,61 @@
+"""
+检索上下文 token 预算装箱测试
+"""
+
+from src.agents.chatbot.context_packer import TRUNCATION_MARKER, ContextItem, allocate_budget, pack_context
+
+
+def test_allocate_budget_redistributes_unused_share():
+    budgets = allocate_budget({"statistics": 50, "kb": 1000, "graph": 1000}, 600)
+    assert budgets["statistics"] == 50
+    assert sum(budgets.values()) == 600
+    assert budgets["kb"] > budgets["graph"]
+
+    assert allocate_budget({"statistics": 0, "kb": 100, "graph": 30}, 600) == {"statistics": 0, "kb": 100, "graph": 30}
+
+
+def test_pack_context_removes_duplicates_and_respects_budget():
+    chunk = "- (a.md) 坝基渗流量偏大时应加密观测，并复核帷幕灌浆的防渗效果。"
+    sections = {
+        "statistics": [ContextItem("statistics", line) for line in ["【统计】", "共 12 座", "分省：四川 5 座"]],
+        "kb": [
+            ContextItem("kb", chunk, score=0.9, source="a.md"),
+            ContextItem("kb", chunk.replace("(a.md)", "(b.md)"), score=0.85, source="b.md"),
+            ContextItem("kb", "- (c.md) 溢洪道闸门启闭前需检查供电与备用电源。" * 3, score=0.5, source="c.md"),
+            ContextItem("kb", "- (d.md) 库区移民安置按规划分期实施。" * 3, score=0.1, source="d.md"),
+        ],
+        "graph": [ContextItem("graph", f"- 水库{i} -[位于]-> 四川") for i in range(20)],
+    }
+    packed = pack_context(sections, max_tokens=160, measure=len)
+
+    assert packed.lines("statistics") == ["【统计】", "共 12 座", "分省：四川 5 座"]
+    assert packed.lines("kb")[0] == chunk
+    assert all("(b.md)" not in line for line in packed.lines("kb"))
+    # 引用只来自实际放入的条目
+    assert packed.sources("kb") == [line[3:7] for line in packed.lines("kb")]
+    assert "b.md" not in packed.sources("kb")
+    assert {(item.section, item.reason) for item in packed.dropped} >= {("kb", "duplicate"), ("graph", "budget")}
+    assert packed.tokens() <= 160
+    assert all(packed.tokens(name) <= packed.budgets[name] for name in sections)
+
+
+def test_pack_context_truncates_long_statistics_at_first_overflow():
+    lines = ["【统计】", "坝型 | 数量"] + [f"重力坝{i:02d} | {i} 座" for i in range(40)] + ["合计 | 780 座"]
+    sections = {
+        "statistics": [ContextItem("statistics", line) for line in lines],
+        "kb": [ContextItem("kb", "- (a.md) 大坝安全监测应覆盖变形、渗流与应力。" * 20, score=0.9)],
+    }
+    packed = pack_context(sections, max_tokens=300, measure=len)
+
+    kept = packed.lines("statistics")
+    # 保留原有顺序的连续前缀，不会跳过较长的行拼入后面较短的行（如合计）
+    assert kept[-1] == TRUNCATION_MARKER
+    assert kept[:-1] == lines[: len(kept) - 1]
+    assert "合计 | 780 座" not in kept
+    assert packed.tokens("statistics") <= packed.budgets["statistics"]
+    dropped = [item.text for item in packed.dropped if item.section == "statistics"]
+    assert dropped == lines[len(kept) - 1 :]
+
+    # 放得下时不加截断提示
+    packed = pack_context({"statistics": [ContextItem("statistics", line) for line in lines[:3]]}, measure=len)
+    assert packed.lines("statistics") == lines[:3]
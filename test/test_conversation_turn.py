@@ -0,0 +1,139 @@
+"""
+对话轮次批量写入与后台写入器测试
+
+使用临时 SQLite 数据库校验 save_turn 的工具输出回填、消息计数，以及 ConversationWriter 的顺序写入。
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from src.storage.conversation.manager import ConversationManager, ConversationTurn
+from src.storage.conversation.writer import ConversationWriter
+from src.storage.db import manager as db_module
+from src.storage.db.engine import create_sqlite_engine
+from src.storage.db.models import Base, ConversationStats, ToolCall
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_sqlite_engine(str(tmp_path / "server.db"))
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def thread_id(session_factory):
+    with session_factory() as db:
+        return ConversationManager(db).create_conversation("1", "ChatbotAgent", thread_id="thread-1").thread_id
+
+
+def message_count(db) -> int:
+    return db.query(ConversationStats.message_count).scalar()
+
+
+def tool_calls(db) -> dict[str, ToolCall]:
+    return {tc.langgraph_tool_call_id: tc for tc in db.query(ToolCall)}
+
+
+def test_save_turn_applies_tool_outputs_from_same_and_earlier_turns(session_factory, thread_id):
+    with session_factory() as db:
+        manager = ConversationManager(db)
+
+        first = ConversationTurn(thread_id=thread_id)
+        first.add_message("user", "查询水位")
+        first.add_message(
+            "assistant",
+            "",
+            tool_calls=[
+                {"name": "query_water_level", "args": {"station": "A"}, "id": "call_a"},
+                {"name": "query_rainfall", "args": {"station": "A"}, "id": "call_b"},
+            ],
+        )
+        first.set_tool_output("call_a", "12.3m")
+        assert len(manager.save_turn(first)) == 2
+        assert message_count(db) == 2
+
+        calls = tool_calls(db)
+        assert (calls["call_a"].status, calls["call_a"].tool_output) == ("success", "12.3m")
+        assert (calls["call_b"].status, calls["call_b"].tool_output) == ("pending", None)
+
+        # 上一轮创建的工具调用在下一轮回填输出，本轮同时新增消息
+        second = ConversationTurn(thread_id=thread_id)
+        second.set_tool_output("call_b", "", status="error", error_message="timeout")
+        second.add_message("assistant", "A 站水位 12.3m")
+        assert len(manager.save_turn(second)) == 1
+        assert message_count(db) == 3
+
+        db.expire_all()
+        calls = tool_calls(db)
+        assert (calls["call_b"].status, calls["call_b"].error_message) == ("error", "timeout")
+        assert calls["call_a"].tool_output == "12.3m"
+
+        # 只有工具输出的轮次不增加消息数
+        outputs_only = ConversationTurn(thread_id=thread_id)
+        outputs_only.set_tool_output("call_b", "8mm")
+        assert manager.save_turn(outputs_only) == []
+        assert message_count(db) == 3
+        db.expire_all()
+        assert tool_calls(db)["call_b"].tool_output == "8mm"
+
+        assert manager.save_turn(ConversationTurn(thread_id="missing")) == []
+
+
+async def test_writer_drain_flushes_queued_jobs_in_order(session_factory, thread_id, monkeypatch):
+    monkeypatch.setattr(db_module.db_manager, "get_session", session_factory)
+    writer = ConversationWriter(enabled=True)
+    started = asyncio.Event()
+    release = asyncio.Event()
+    order = []
+
+    def make_job(index):
+        async def job(manager):
+            if index == 0:
+                # 第一个任务阻塞时，后续任务只能排队
+                started.set()
+                await release.wait()
+            turn = ConversationTurn(thread_id=thread_id)
+            turn.add_message("user", f"问题 {index}")
+            manager.save_turn(turn)
+            order.append(index)
+
+        return job
+
+    for index in range(5):
+        await writer.submit(make_job(index))
+    await started.wait()
+    assert order == []
+
+    release.set()
+    await writer.drain()
+    assert order == [0, 1, 2, 3, 4]
+    assert writer._worker is None
+
+    with session_factory() as db:
+        messages = ConversationManager(db).get_messages_by_thread_id(thread_id)
+        assert [message.content for message in messages] == [f"问题 {index}" for index in range(5)]
+        assert message_count(db) == 5
+
+
+async def test_writer_runs_inline_when_disabled(session_factory, thread_id, monkeypatch):
+    monkeypatch.setattr(db_module.db_manager, "get_session", session_factory)
+    writer = ConversationWriter(enabled=False)
+
+    async def failing_job(manager):
+        raise RuntimeError("disk full")
+
+    async def job(manager):
+        turn = ConversationTurn(thread_id=thread_id)
+        turn.add_message("user", "你好")
+        manager.save_turn(turn)
+
+    # 失败的任务只记录日志，不影响后续写入
+    await writer.submit(failing_job)
+    await writer.submit(job)
+    assert writer._worker is None
+    with session_factory() as db:
+        assert message_count(db) == 1
@@ -0,0 +1,139 @@
+"""
+图谱节点向量回填测试
+
+用内存中的假 Neo4j 会话代替真实数据库，校验嵌入服务抖动时的退避重试、逐个节点失败标记，
+以及服务持续不可用时任务以 failed 状态结束。
+"""
+
+import pytest
+
+from src.knowledge import graph as graph_module
+from src.knowledge.graph import GraphDatabase
+
+
+class FakeSession:
+    def __init__(self, store):
+        self.store = store
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, func, pairs):
+        self.store.update(pairs)
+
+
+class FakeDriver:
+    def __init__(self, store):
+        self.store = store
+
+    def session(self):
+        return FakeSession(self.store)
+
+
+class FlakyEmbedding:
+    """前 fail_calls 次调用失败；包含 bad_names 中节点的调用始终失败"""
+
+    def __init__(self, fail_calls=0, bad_names=()):
+        self.fail_calls = fail_calls
+        self.bad_names = set(bad_names)
+        self.calls = []
+
+    async def __call__(self, names):
+        self.calls.append(list(names))
+        if len(self.calls) <= self.fail_calls or self.bad_names & set(names):
+            raise ConnectionError("embedding service unavailable")
+        return [[0.1, 0.2] for _ in names]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(graph_module.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(graph_module, "EMBEDDING_BACKFILL_MAX_RETRIES", 2)
+    monkeypatch.setattr(graph_module, "EMBEDDING_BACKFILL_RETRY_DELAY", 1.0)
+    monkeypatch.setattr(graph_module, "EMBEDDING_BACKFILL_MAX_FAILED_BATCHES", 2)
+    return delays
+
+
+@pytest.fixture
+def make_graph(tmp_path):
+    def make(names, embedding):
+        store = {}
+        graph = GraphDatabase.__new__(GraphDatabase)
+        graph.driver = FakeDriver(store)
+        graph.status = "open"
+        graph.kgdb_name = "neo4j"
+        graph.embed_model_name = "test-embedding"
+        graph.work_dir = str(tmp_path)
+        graph.aget_embedding = embedding
+        graph.save_graph_info = lambda kgdb_name="neo4j": True
+
+        def pending(kgdb_name="neo4j"):
+            return [name for name in names if name not in store]
+
+        graph.count_nodes_without_embedding = lambda kgdb_name="neo4j": len(pending())
+        graph.query_nodes_without_embedding = lambda kgdb_name, limit, exclude: [
+            name for name in pending() if name not in exclude
+        ][:limit]
+        return graph, store
+
+    return make
+
+
+async def test_backfill_retries_transient_failures_with_backoff(make_graph, sleeps):
+    names = [f"站点{i}" for i in range(5)]
+    embedding = FlakyEmbedding(fail_calls=2)
+    graph, store = make_graph(names, embedding)
+
+    state = await graph.abackfill_node_embeddings(batch_size=3)
+
+    assert state["status"] == "completed"
+    assert (state["processed"], state["failed_nodes"], state["remaining"]) == (5, [], 0)
+    assert set(store) == set(names)
+    # 第一批两次失败后按指数退避重试成功，之后的批次不再等待
+    assert sleeps == [1.0, 2.0]
+    assert [len(call) for call in embedding.calls] == [3, 3, 3, 2]
+
+
+async def test_backfill_marks_only_nodes_that_fail_individually(make_graph, sleeps):
+    names = [f"站点{i}" for i in range(6)]
+    embedding = FlakyEmbedding(bad_names={"站点4"})
+    graph, store = make_graph(names, embedding)
+
+    state = await graph.abackfill_node_embeddings(batch_size=6)
+
+    assert state["status"] == "completed"
+    assert state["failed_nodes"] == ["站点4"]
+    assert state["processed"] == 5
+    assert set(store) == set(names) - {"站点4"}
+    # 整批重试用尽后才逐个计算
+    assert [len(call) for call in embedding.calls] == [6, 6, 6, 1, 1, 1, 1, 1, 1]
+
+
+async def test_backfill_fails_job_when_embedding_service_is_down(make_graph, sleeps):
+    names = [f"站点{i}" for i in range(10)]
+    embedding = FlakyEmbedding(fail_calls=10**6)
+    graph, store = make_graph(names, embedding)
+
+    state = await graph.abackfill_node_embeddings(batch_size=5)
+
+    assert state["status"] == "failed"
+    assert "unavailable" in state["error"]
+    # 服务不可用时不把节点永久排除，重新执行时仍会处理
+    assert state["failed_nodes"] == []
+    assert (state["processed"], state["remaining"]) == (0, 10)
+    assert store == {}
+    assert graph.load_embedding_backfill_state()["status"] == "failed"
+
+    # 服务恢复后重新执行即可继续
+    embedding.fail_calls = 0
+    state = await graph.abackfill_node_embeddings(batch_size=5)
+    assert state["status"] == "completed"
+    assert (state["processed"], state["failed_nodes"]) == (10, [])
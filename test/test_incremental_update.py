@@ -0,0 +1,165 @@
+"""
+按 chunk 内容哈希的增量更新测试
+
+diff_chunks_by_hash 为纯函数；update_content 使用伪造的 Milvus 集合与嵌入函数，
+校验统计中的向量计算次数与对比结果一致。
+"""
+
+import math
+from types import SimpleNamespace
+
+from src.knowledge.implementations import milvus
+from src.knowledge.implementations.milvus import EMBEDDING_BATCH_SIZE, MilvusKB
+from src.knowledge.utils.kb_utils import calculate_chunk_hash, diff_chunks_by_hash
+
+
+def make_chunks(contents: list[str], file_id: str = "file_1") -> list[dict]:
+    return [
+        {
+            "id": f"{file_id}_chunk_{i}",
+            "chunk_id": f"{file_id}_chunk_{i}",
+            "content": content,
+            "file_id": file_id,
+            "filename": "doc.md",
+            "source": "doc.md",
+            "chunk_index": i,
+        }
+        for i, content in enumerate(contents)
+    ]
+
+
+def existing_hashes(contents: list[str]) -> dict[str, str]:
+    return {f"old_{i}": calculate_chunk_hash(content) for i, content in enumerate(contents)}
+
+
+def test_unchanged_chunks_are_all_kept():
+    added, kept, removed = diff_chunks_by_hash(make_chunks(["a", "b", "c"]), existing_hashes(["a", "b", "c"]))
+    assert added == [] and removed == []
+    assert [existing_id for _, existing_id in kept] == ["old_0", "old_1", "old_2"]
+    # 首尾空白不影响哈希
+    added, kept, _ = diff_chunks_by_hash(make_chunks(["  a\n"]), existing_hashes(["a"]))
+    assert added == [] and kept[0][1] == "old_0"
+
+
+def test_added_and_removed_chunks():
+    added, kept, removed = diff_chunks_by_hash(make_chunks(["a", "x", "c", "d"]), existing_hashes(["a", "b", "c"]))
+    assert [chunk["content"] for chunk in added] == ["x", "d"]
+    assert [existing_id for _, existing_id in kept] == ["old_0", "old_2"]
+    assert removed == ["old_1"]
+    assert all(chunk["content_hash"] == calculate_chunk_hash(chunk["content"]) for chunk in added)
+
+
+def test_reordered_chunks_reuse_existing_ids():
+    added, kept, removed = diff_chunks_by_hash(make_chunks(["c", "a", "b"]), existing_hashes(["a", "b", "c"]))
+    assert added == [] and removed == []
+    assert [(chunk["content"], chunk["chunk_index"], existing_id) for chunk, existing_id in kept] == [
+        ("c", 0, "old_2"),
+        ("a", 1, "old_0"),
+        ("b", 2, "old_1"),
+    ]
+
+
+def test_duplicate_content_is_matched_one_to_one():
+    existing = existing_hashes(["a", "a", "b"])
+
+    added, kept, removed = diff_chunks_by_hash(make_chunks(["a", "b", "a", "a"]), existing)
+    assert [existing_id for _, existing_id in kept] == ["old_0", "old_2", "old_1"]
+    assert [(chunk["content"], chunk["chunk_index"]) for chunk in added] == [("a", 3)]
+    assert removed == []
+
+    added, kept, removed = diff_chunks_by_hash(make_chunks(["b"]), existing)
+    assert added == [] and kept[0][1] == "old_2"
+    assert removed == ["old_0", "old_1"]
+
+
+class FakeCollection:
+    schema = SimpleNamespace(
+        fields=[
+            SimpleNamespace(name=name)
+            for name in ("id", "content", "source", "chunk_id", "file_id", "chunk_index", "embedding", "heading_path")
+        ]
+    )
+
+    def __init__(self):
+        self.inserted: list[str] = []
+        self.heading_paths: list[str] = []
+        self.deleted: list[str] = []
+
+    def insert(self, entities):
+        # entities 按 schema 字段顺序排列
+        self.inserted.extend(entities[1])
+        self.heading_paths.extend(entities[7])
+
+    def delete(self, expr):
+        self.deleted.append(expr)
+
+
+async def test_update_content_embeds_only_added_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(MilvusKB, "_init_connection", lambda self: None)
+    kb = MilvusKB(str(tmp_path))
+    collection = FakeCollection()
+    embedded: list[str] = []
+    reindexed: dict[str, int] = {}
+
+    async def get_collection(db_id):
+        return collection
+
+    async def embed(texts):
+        embedded.extend(texts)
+        return [[0.1, 0.2, 0.3] for _ in texts]
+
+    async def to_markdown(item, params=None):
+        return open(item, encoding="utf-8").read()
+
+    monkeypatch.setattr(kb, "_get_milvus_collection", get_collection)
+    monkeypatch.setattr(kb, "_get_async_embedding_function", lambda embed_info: embed)
+    monkeypatch.setattr(kb, "_reindex_chunks", lambda collection, moved: reindexed.update(moved))
+    monkeypatch.setattr(
+        kb, "_split_text_into_chunks", lambda text, file_id, filename, params: make_chunks(text.split("\n\n"), file_id)
+    )
+    monkeypatch.setattr(milvus, "process_file_to_markdown", to_markdown)
+
+    old_contents = [f"第{i}段：水库大坝巡查记录。" for i in range(100)]
+    kb.databases_meta["kb_test"] = {"name": "test", "metadata": {"chunk_dedup": False}, "embed_info": {}}
+    kb.files_meta["file_1"] = {
+        "database_id": "kb_test",
+        "filename": "doc.md",
+        "status": "done",
+        "chunk_signatures": MilvusKB._build_chunk_signatures(make_chunks(old_contents)),
+    }
+
+    # 交换前两段、修改一段、删除一段、末尾新增一段
+    new_contents = list(old_contents)
+    new_contents[0], new_contents[1] = new_contents[1], new_contents[0]
+    new_contents[10] = "第10段：已修订的巡查记录。"
+    del new_contents[50]
+    new_contents.append("第100段：新增的巡查记录。")
+    doc_path = tmp_path / "doc.md"
+    doc_path.write_text("\n\n".join(new_contents), encoding="utf-8")
+
+    result = await kb.update_content("kb_test", "file_1", str(doc_path))
+    stats = result["incremental"]
+
+    added, kept, removed = diff_chunks_by_hash(make_chunks(new_contents), existing_hashes(old_contents))
+    assert sorted(embedded) == sorted(chunk["content"] for chunk in added)
+    assert sorted(collection.inserted) == sorted(embedded)
+    assert collection.heading_paths == ["", ""]
+    assert stats["embedded_chunks"] == len(added) == 2
+    assert stats["reused_chunks"] == len(kept) == 98
+    # 修改过的段落删除旧 chunk 并新增一个 chunk
+    assert stats["deleted_chunks"] == len(removed) == 2
+    assert '"file_1_chunk_10"' in collection.deleted[0] and '"file_1_chunk_50"' in collection.deleted[0]
+    assert stats["saved_embedding_calls"] == (
+        math.ceil(len(new_contents) / EMBEDDING_BATCH_SIZE) - math.ceil(len(added) / EMBEDDING_BATCH_SIZE)
+    )
+    assert stats["total_chunks"] == len(new_contents) == 100
+    # 位置变化的保留 chunk 只更新 chunk_index
+    assert reindexed["file_1_chunk_0"] == 1 and reindexed["file_1_chunk_1"] == 0
+    assert stats["reindexed_chunks"] == len(reindexed)
+    assert result["status"] == "done"
+
+
+def test_heading_path_fits_milvus_field():
+    path = MilvusKB._truncate_heading_path(" > ".join(["第一章 总则"] * 100))
+    assert len(path.encode("utf-8")) <= milvus.HEADING_PATH_MAX_LENGTH
+    assert path.startswith("第一章 总则 > ") and MilvusKB._truncate_heading_path(None) == ""
@@ -0,0 +1,118 @@
+"""
+LightRAG 知识库归档测试
+
+使用 LightRAG 的本地存储（Json / NanoVectorDB / NetworkX）写入一份小型知识图谱，导出后导入到新的工作区，
+检查文本块、实体、关系与向量完整恢复，且导入过程不调用 embedding。
+"""
+
+import zipfile
+
+import numpy as np
+from lightrag import LightRAG
+from lightrag.kg.shared_storage import initialize_pipeline_status
+from lightrag.utils import EmbeddingFunc, Tokenizer, compute_mdhash_id
+
+from src.knowledge.utils.lightrag_archive import CHUNKS_NAME, export_archive, import_archive
+
+EMBEDDING_DIM = 16
+
+
+class CharTokenizer:
+    def encode(self, content: str) -> list[int]:
+        return [ord(c) for c in content]
+
+    def decode(self, tokens: list[int]) -> str:
+        return "".join(chr(t) for t in tokens)
+
+
+async def llm_model_func(prompt, system_prompt=None, history_messages=[], **kwargs):
+    return ""
+
+
+async def create_rag(working_dir, workspace: str, embed_calls: list[int]) -> LightRAG:
+    async def embed(texts: list[str]) -> np.ndarray:
+        embed_calls[0] += len(texts)
+        return np.array([[len(text) % 7 + i for i in range(EMBEDDING_DIM)] for text in texts], dtype=np.float32)
+
+    rag = LightRAG(
+        working_dir=str(working_dir),
+        workspace=workspace,
+        llm_model_func=llm_model_func,
+        embedding_func=EmbeddingFunc(embedding_dim=EMBEDDING_DIM, max_token_size=4096, func=embed),
+        tokenizer=Tokenizer("char", CharTokenizer()),
+        enable_llm_cache=False,
+    )
+    await rag.initialize_storages()
+    await initialize_pipeline_status()
+    return rag
+
+
+def build_custom_kg() -> dict:
+    return {
+        "chunks": [
+            {"content": "水库A位于长江流域，坝型为混凝土重力坝。", "source_id": "chunk-a", "file_path": "a.md"},
+            {"content": "水库B位于黄河流域，近年出现渗流异常。", "source_id": "chunk-b", "file_path": "b.md"},
+        ],
+        "entities": [
+            {"entity_name": "水库A", "entity_type": "水库", "description": "长江流域水库", "source_id": "chunk-a"},
+            {"entity_name": "水库B", "entity_type": "水库", "description": "黄河流域水库", "source_id": "chunk-b"},
+            {"entity_name": "长江", "entity_type": "河流", "description": "我国第一大河", "source_id": "chunk-a"},
+        ],
+        "relationships": [
+            {
+                "src_id": "水库A",
+                "tgt_id": "长江",
+                "description": "水库A位于长江",
+                "keywords": "位于",
+                "weight": 1.0,
+                "source_id": "chunk-a",
+            },
+        ],
+    }
+
+
+async def test_archive_round_trip_without_reembedding(tmp_path):
+    source_calls, target_calls = [0], [0]
+    source = await create_rag(tmp_path / "source", "source", source_calls)
+    await source.ainsert_custom_kg(build_custom_kg())
+
+    chunk_ids = [compute_mdhash_id(c["content"], prefix="chunk-") for c in build_custom_kg()["chunks"]]
+
+    async def doc_chunk_ids(file_id):
+        return chunk_ids
+
+    archive = tmp_path / "kb.zip"
+    counts = await export_archive(
+        source,
+        str(archive),
+        {"file_a": {"file_id": "file_a", "database_id": "source"}},
+        {"kb_type": "lightrag", "db_id": "source", "embedding_dim": EMBEDDING_DIM},
+        chunk_ids=doc_chunk_ids,
+    )
+    assert counts["entities"] == 3 and counts["relations"] == 1
+    with zipfile.ZipFile(archive) as zf:
+        assert CHUNKS_NAME in zf.namelist()
+
+    target = await create_rag(tmp_path / "target", "target", target_calls)
+    manifest, files, stats = await import_archive(target, str(archive), batch_size=2)
+
+    assert manifest["db_id"] == "source"
+    assert [f["file_id"] for f in files] == ["file_a"]
+    assert stats["reembedded"] == 0 and target_calls[0] == 0
+
+    graph = target.chunk_entity_relation_graph
+    assert (await graph.get_node("水库B"))["description"] == "黄河流域水库"
+    assert await graph.has_edge("水库A", "长江")
+    for chunk_id in chunk_ids:
+        chunk = await source.text_chunks.get_by_id(chunk_id)
+        assert chunk and await target.text_chunks.get_by_id(chunk_id) == chunk
+
+    entity_id = compute_mdhash_id("水库A", prefix="ent-")
+    source_vectors = await source.entities_vdb.get_vectors_by_ids([entity_id])
+    target_vectors = await target.entities_vdb.get_vectors_by_ids([entity_id])
+    np.testing.assert_allclose(target_vectors[entity_id], source_vectors[entity_id])
+    relation_id = compute_mdhash_id("水库A" + "长江", prefix="rel-")
+    assert await target.relationships_vdb.get_by_id(relation_id)
+
+    await source.finalize_storages()
+    await target.finalize_storages()
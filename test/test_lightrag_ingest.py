@@ -0,0 +1,155 @@
+"""
+LightRAG 文档插入调度测试
+
+FakeRag 模拟 LightRAG 流水线的语义：流水线运行中再次调用只登记待处理请求并立即返回，
+由正在运行的流水线继续处理新入队的文档；每个文档的抽取耗时固定，可指定首次抽取失败的文档、
+一直卡住的文档，以及在流水线开始时抛出异常的次数。
+"""
+
+import asyncio
+import time
+
+from src.knowledge.utils import ingest_scheduler
+from src.knowledge.utils.ingest_scheduler import IngestDocument, LightRagIngestScheduler, RateBudget
+
+
+class FakeDocStatus:
+    def __init__(self):
+        self.data: dict[str, dict] = {}
+
+    async def get_by_id(self, doc_id):
+        return dict(self.data[doc_id]) if doc_id in self.data else None
+
+    async def upsert(self, data):
+        self.data.update(data)
+
+
+class FakeRag:
+    def __init__(self, latency=0.2, max_parallel_insert=4, fail_once=(), hang=(), crashes=0):
+        self.doc_status = FakeDocStatus()
+        self.latency = latency
+        self.fail_once = set(fail_once)
+        self.hang = set(hang)
+        self.crashes = crashes
+        self._parallel = asyncio.Semaphore(max_parallel_insert)
+        self._busy = False
+        self._pending = False
+
+    async def apipeline_enqueue_documents(self, input, ids, file_paths, track_id=None):
+        if ids not in self.doc_status.data:
+            self.doc_status.data[ids] = {"status": "pending", "file_path": file_paths, "metadata": {}}
+
+    async def _process(self, doc_id):
+        async with self._parallel:
+            self.doc_status.data[doc_id] |= {"status": "processing"}
+            await asyncio.sleep(self.latency)
+            if doc_id in self.hang:
+                await asyncio.Event().wait()
+            if doc_id in self.fail_once:
+                self.fail_once.discard(doc_id)
+                self.doc_status.data[doc_id] |= {"status": "failed", "error_msg": "llm error"}
+            else:
+                self.doc_status.data[doc_id] |= {"status": "processed"}
+
+    async def apipeline_process_enqueue_documents(self):
+        if self._busy:
+            self._pending = True
+            return
+        self._busy = True
+        try:
+            if self.crashes:
+                self.crashes -= 1
+                raise RuntimeError("pipeline crashed")
+            while True:
+                self._pending = False
+                pending = [k for k, v in self.doc_status.data.items() if v["status"] == "pending"]
+                await asyncio.gather(*(self._process(doc_id) for doc_id in pending))
+                if not self._pending:
+                    break
+        finally:
+            self._busy = False
+
+
+def make_documents(count):
+    async def load():
+        return "content"
+
+    return [IngestDocument(f"doc-{i}", f"doc-{i}.md", load) for i in range(count)]
+
+
+async def test_documents_are_extracted_concurrently():
+    rag = FakeRag(latency=0.2, max_parallel_insert=4)
+    scheduler = LightRagIngestScheduler(rag, max_concurrency=4, poll_interval=0.01)
+
+    start = time.monotonic()
+    results = await scheduler.run(make_documents(8))
+
+    # 逐个插入需要 8 * 0.2 秒
+    assert time.monotonic() - start < 1.0
+    assert [r.status for r in results] == ["processed"] * 8
+    timings = rag.doc_status.data["doc-0"]["metadata"]["ingest_timings"]
+    assert timings["extract"] >= 0.15 and "total" in timings
+
+
+async def test_failed_document_is_retried_independently():
+    rag = FakeRag(latency=0.05, fail_once={"doc-1"})
+    scheduler = LightRagIngestScheduler(rag, max_concurrency=2, max_retries=1, poll_interval=0.01)
+
+    results = {r.file_id: r for r in await scheduler.run(make_documents(3))}
+
+    assert {r.status for r in results.values()} == {"processed"}
+    assert results["doc-1"].attempts == 2
+    assert results["doc-0"].attempts == results["doc-2"].attempts == 1
+    assert rag.doc_status.data["doc-1"]["metadata"]["ingest_attempts"] == 2
+
+
+async def test_pipeline_failure_fails_waiting_documents():
+    rag = FakeRag(latency=0.05, crashes=2)
+    scheduler = LightRagIngestScheduler(rag, max_retries=0, poll_interval=0.01)
+
+    start = time.monotonic()
+    [result] = await scheduler.run(make_documents(1))
+
+    # 不等到重新拉起流水线（5 秒）或超时，直接按流水线异常失败
+    assert time.monotonic() - start < 1.0
+    assert result.status == "failed" and "pipeline crashed" in result.error
+    assert rag.doc_status.data["doc-0"]["status"] == "failed"
+
+    # 允许重试时，第二次拉起的流水线正常处理
+    results = await LightRagIngestScheduler(rag, max_retries=1, poll_interval=0.01).run(make_documents(2)[1:])
+    assert results[0].status == "processed" and results[0].attempts == 2
+
+
+async def test_stalled_document_times_out():
+    rag = FakeRag(latency=0.05, hang={"doc-1"})
+    scheduler = LightRagIngestScheduler(rag, max_retries=1, poll_interval=0.01, timeout=0.3)
+
+    start = time.monotonic()
+    results = {r.file_id: r for r in await scheduler.run(make_documents(2))}
+
+    assert time.monotonic() - start < 1.0
+    assert results["doc-0"].status == "processed"
+    assert results["doc-1"].status == "failed" and "timed out" in results["doc-1"].error
+    # 超时不重试
+    assert results["doc-1"].attempts == 1
+    assert rag.doc_status.data["doc-1"]["status"] == "failed"
+    assert "timed out" in rag.doc_status.data["doc-1"]["error_msg"]
+
+    for task in list(ingest_scheduler._detached_pipeline_tasks):
+        task.cancel()
+
+
+async def test_rate_budget_limits_shared_concurrency():
+    budget = RateBudget(max_concurrency=2)
+    active, peak = 0, 0
+
+    @budget.wrap
+    async def call():
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    await asyncio.gather(*(call() for _ in range(10)))
+    assert peak == 2
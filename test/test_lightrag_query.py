@@ -0,0 +1,87 @@
+"""
+LightRAG 结构化检索结果测试
+
+校验 aquery_data 的实体、关系、文本块转换为统一结果条目，以及按 token 预算截断。
+"""
+
+from src.knowledge.implementations.lightrag import LightRagKB
+from src.utils.tokens import estimate_tokens
+
+DATA = {
+    "chunks": [
+        {
+            "content": "大坝安全监测包括变形、渗流与应力监测。",
+            "file_path": "a.md",
+            "chunk_id": "c1",
+            "reference_id": "1",
+        },
+        {"content": "  ", "file_path": "b.md", "chunk_id": "c2", "reference_id": "2"},
+        {"content": "渗流量异常时应加密观测。", "file_path": "b.md", "chunk_id": "c3", "reference_id": "2"},
+    ],
+    "relationships": [
+        {
+            "src_id": "重力坝",
+            "tgt_id": "扬压力",
+            "keywords": "承受",
+            "description": "坝基扬压力影响抗滑稳定",
+            "source_id": "c1",
+            "weight": 2.0,
+            "file_path": "a.md",
+        },
+        {"src_id": "水库", "tgt_id": "溢洪道", "keywords": None, "description": None, "source_id": "c3"},
+    ],
+    "entities": [
+        {"entity_name": "重力坝", "entity_type": "坝型", "description": "依靠自重维持稳定", "source_id": "c1"}
+    ],
+}
+
+
+def structure(data=DATA):
+    return LightRagKB._structure_query_data(data, "kb_1", "hybrid")
+
+
+def test_structure_query_data_builds_rank_scored_items():
+    items = structure()
+
+    # 空白内容的文本块被去掉，顺序为文本块、关系、实体
+    assert [item["metadata"]["item_type"] for item in items] == ["chunk", "chunk", "relation", "relation", "entity"]
+    chunk, second_chunk, relation, bare_relation, entity = items
+
+    assert chunk["content"] == DATA["chunks"][0]["content"]
+    assert chunk["metadata"] == {
+        "source": "a.md",
+        "db_id": "kb_1",
+        "mode": "hybrid",
+        "kb_type": "lightrag",
+        "item_type": "chunk",
+        "score_type": "rank",
+        "reference_id": "1",
+        "chunk_id": "c1",
+    }
+    assert chunk["reference_id"] == "1"
+    assert relation["content"] == "重力坝 -[承受]-> 扬压力：坝基扬压力影响抗滑稳定"
+    assert (relation["metadata"]["source_id"], relation["metadata"]["weight"]) == ("c1", 2.0)
+    assert bare_relation["content"] == "水库 -[相关]-> 溢洪道："
+    assert bare_relation["metadata"]["source"] == "LightRAG (hybrid)"
+    assert entity["content"] == "重力坝（坝型）：依靠自重维持稳定"
+
+    # 分数按各类结果内的名次折算：每类第一名都是 1.0，只能在同类内比较
+    assert [item["score"] for item in items] == [1.0, round(1 - 0.5 * 2 / 3, 4), 1.0, 0.75, 1.0]
+    assert all(item["metadata"]["score_type"] == "rank" for item in items)
+    assert structure({}) == []
+
+
+def test_truncate_to_budget_orders_by_score_and_skips_oversized_items():
+    items = structure()
+    costs = {item["content"]: estimate_tokens(item["content"]) for item in items}
+
+    kept = LightRagKB._truncate_to_budget(structure(), 0)
+    # 不限制预算时全部保留；同分时文本块优先，其次关系、实体
+    assert [item["metadata"]["item_type"] for item in kept] == ["chunk", "relation", "entity", "relation", "chunk"]
+    assert all(item["metadata"]["tokens"] == costs[item["content"]] for item in kept)
+
+    # 预算只够第一个文本块与较短的条目时，放不下的条目跳过，后面更短的条目仍可放入
+    budget = costs[DATA["chunks"][0]["content"]] + costs["水库 -[相关]-> 溢洪道："]
+    kept = LightRagKB._truncate_to_budget(structure(), budget)
+    assert [item["content"] for item in kept] == [DATA["chunks"][0]["content"], "水库 -[相关]-> 溢洪道："]
+    assert sum(item["metadata"]["tokens"] for item in kept) <= budget
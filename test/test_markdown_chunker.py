@@ -0,0 +1,86 @@
+"""
+结构感知 Markdown 分块测试
+
+使用按字符计数的 measure，结果不依赖 tiktoken 词表是否可用。
+"""
+
+import pytest
+
+from src.knowledge.utils.kb_utils import get_processing_params, resolve_split_params
+from src.knowledge.utils.markdown_chunker import chunk_markdown
+
+TABLE = "\n".join(["| 测点 | 水位(m) |", "| --- | --- |", *(f"| 测点{i} | {100 + i}.50 |" for i in range(30))])
+DOC = f"""# 第一章 总则
+
+## 第一节 巡查
+
+第一条 大坝管理单位负责日常巡查。第二条 汛期应当加密巡查频次。
+
+{TABLE}
+
+- 巡查：每日一次
+- 观测：按规范执行
+  - 渗流观测
+1、汛前检查
+2、汛后检查
+
+## 第二节 调度
+
+{"汛限水位以下按来水下泄，超过汛限水位时按防洪标准控制泄量。" * 12}
+"""
+
+
+def test_chunks_respect_budget_and_keep_heading_paths():
+    chunks = chunk_markdown(DOC, chunk_size=200, chunk_overlap=40, measure=len)
+
+    assert all(chunk.tokens <= 200 for chunk in chunks)
+    assert chunks[0].content.startswith("# 第一章 总则\n\n## 第一节 巡查")
+    assert chunks[0].heading_path == ["第一章 总则", "第一节 巡查"]
+    assert not any(chunk.content.rstrip().endswith(("# 第一章 总则", "## 第二节 调度")) for chunk in chunks)
+
+    # 超长表格按行拆分，每段都带表头
+    table_chunks = [chunk for chunk in chunks if "| 测点" in chunk.content and "测点0" not in chunk.content]
+    assert table_chunks and all("| 测点 | 水位(m) |\n| --- | --- |" in chunk.content for chunk in table_chunks)
+
+    # 列表作为一个整体
+    assert any("- 巡查：每日一次" in chunk.content and "2、汛后检查" in chunk.content for chunk in chunks)
+
+    dispatch = [chunk for chunk in chunks if chunk.heading_path == ["第一章 总则", "第二节 调度"]]
+    assert len(dispatch) > 1
+    # 超长段落在句子边界切分，相邻段保留 overlap
+    assert all(chunk.content.endswith("。") for chunk in dispatch[:-1])
+    assert dispatch[1].content[:30] in dispatch[0].content
+
+
+def test_small_document_is_single_chunk():
+    chunks = chunk_markdown("# 标题\n\n正文", chunk_size=100, measure=len)
+    assert [(chunk.content, chunk.heading_path) for chunk in chunks] == [("# 标题\n\n正文", ["标题"])]
+
+
+def test_split_params_follow_kb_record():
+    # 没有记录分块方式的旧知识库仍按字符分块
+    assert resolve_split_params({}, {"chunk_size": 500}) == {"chunk_size": 500, "text_splitter": "langchain"}
+
+    db_meta = {"processing_params": get_processing_params("structured")}
+    assert db_meta["processing_params"] == {"text_splitter": "structured", "chunk_unit": "token"}
+    assert resolve_split_params(db_meta, None)["text_splitter"] == "structured"
+    # 请求中显式指定时优先
+    assert resolve_split_params(db_meta, {"text_splitter": "langchain"})["text_splitter"] == "langchain"
+
+    with pytest.raises(ValueError):
+        get_processing_params("unknown")
+
+
+def test_carried_heading_does_not_push_chunk_over_budget():
+    text = "# 标题\n\n" + "无标点超长文本" * 30
+    chunks = chunk_markdown(text, chunk_size=50, measure=len)
+    assert all(chunk.tokens <= 50 and len(chunk.content) <= 50 for chunk in chunks)
+    assert chunks[0].content.startswith("# 标题\n\n无标点")
+    assert "".join(chunk.content for chunk in chunks).replace("# 标题\n\n", "") == "无标点超长文本" * 30
+
+    # 多级标题连续出现、其后段落超长，以及表头超过半个预算的表格
+    stacked = "\n\n".join(["正文" * 10, "# 一级", "## 二级标题", "### 三级标题很长很长", "超长正文。" * 40])
+    table = "\n".join(["| 测点名称 | 水位 |", "| --- | --- |", *(f"| 测点{i} | {i} |" for i in range(20))])
+    for text, size in [(stacked, 40), (table, 20)]:
+        chunks = chunk_markdown(text, chunk_size=size, chunk_overlap=10, measure=len)
+        assert all(chunk.tokens <= size and len(chunk.content) <= size for chunk in chunks)
@@ -0,0 +1,61 @@
+"""
+MySQL 结构目录缓存测试
+
+用记录 SQL 的连接管理器替身返回 information_schema 数据，验证列表与表结构从缓存读取、
+列定义变化（DDL）后失效，且默认不执行 COUNT(*)。
+"""
+
+from src.agents.common.toolkits.mysql.catalog import SchemaCatalog
+
+
+class FakeManager:
+    def __init__(self):
+        self.queries: list[str] = []
+        self.checksum = 1
+
+    def execute(self, sql: str, params=None, timeout=None):
+        self.queries.append(sql)
+        if "information_schema.COLUMNS" in sql:
+            return [{"name": "orders", "column_count": 2, "checksum": self.checksum}]
+        if "information_schema.TABLES" in sql:
+            return [{"name": "orders", "table_type": "BASE TABLE", "approx_rows": 1200, "comment": "订单"}]
+        if sql.startswith("SHOW FULL COLUMNS"):
+            return [
+                {"Field": "id", "Type": "int", "Null": "NO", "Key": "PRI", "Default": None, "Extra": "", "Comment": ""},
+                {"Field": "amount", "Type": "decimal(10,2)", "Null": "YES", "Key": "", "Default": None, "Extra": ""},
+            ]
+        if sql.startswith("SHOW INDEX"):
+            return [{"Key_name": "PRIMARY", "Column_name": "id"}]
+        if sql.startswith("SELECT COUNT(*)"):
+            return [{"count": 1234}]
+        raise AssertionError(f"unexpected query: {sql}")
+
+
+def test_tables_and_schema_are_served_from_cache():
+    manager = FakeManager()
+    catalog = SchemaCatalog(manager, ttl=300)
+
+    tables = catalog.list_tables()
+    assert [(t.name, t.approx_rows, t.comment) for t in tables] == [("orders", 1200, "订单")]
+    assert catalog.describe("ORDERS").indexes == {"PRIMARY": ["id"]}
+
+    queries = len(manager.queries)
+    catalog.list_tables()
+    catalog.describe("orders")
+    assert len(manager.queries) == queries
+    assert not any(q.startswith("SELECT COUNT(*)") for q in manager.queries)
+
+    assert catalog.exact_row_count("orders") == 1234
+
+
+def test_schema_change_invalidates_description():
+    manager = FakeManager()
+    catalog = SchemaCatalog(manager, ttl=300)
+    catalog.describe("orders")
+
+    # 模拟 ALTER TABLE：列指纹变化，表清单到期刷新后表结构重新读取
+    manager.checksum = 2
+    catalog._loaded_at -= 301
+    catalog.describe("orders")
+
+    assert sum(q.startswith("SHOW FULL COLUMNS") for q in manager.queries) == 2
@@ -0,0 +1,225 @@
+"""
+MySQL 工具包连接池测试
+
+使用 SQLite 实现的 pymysql 连接替身，无需真实 MySQL 服务：
+KILL QUERY 通过 sqlite3.Connection.interrupt() 模拟，中断后抛出与 MySQL 相同的 1317 错误。
+"""
+
+import asyncio
+import itertools
+import sqlite3
+import threading
+import time
+
+import pymysql
+import pytest
+
+from src.agents.common.toolkits.mysql.connection import MySQLConnectionManager, arun, with_max_execution_time
+from src.agents.common.toolkits.mysql import tools
+from src.agents.common.toolkits.mysql.exceptions import MySQLConnectionError, MySQLTimeoutError
+from src.agents.common.toolkits.mysql.security import MySQLSecurityChecker
+
+# 在 SQLite 中足够慢、可被 interrupt() 打断的查询
+SLOW_SQL = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) AS c FROM n"
+
+
+class SQLiteCursor:
+    def __init__(self, connection: "SQLiteConnection"):
+        self.connection = connection
+        self._cursor = None
+        self._columns: list[str] = []
+
+    def execute(self, sql: str, params=None):
+        if sql.upper().startswith("KILL QUERY"):
+            SQLiteConnection.registry[params[0]].raw.interrupt()
+            return 0
+        self._cursor = self._call(self.connection.raw.execute, sql.replace("%s", "?"), params or ())
+        self._columns = [col[0] for col in self._cursor.description or []]
+        return -1
+
+    @staticmethod
+    def _call(func, *args):
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                raise pymysql.err.OperationalError(1317, "Query execution was interrupted") from e
+            raise pymysql.err.ProgrammingError(1064, str(e)) from e
+
+    def fetchone(self):
+        # 与 SSDictCursor 一样逐行从引擎读取
+        row = self._call(self._cursor.fetchone)
+        if row is not None:
+            self.connection.rows_read += 1
+        return dict(zip(self._columns, row)) if row is not None else None
+
+    def fetchall(self):
+        return list(iter(self.fetchone, None))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteConnection:
+    """pymysql.Connection 的最小子集"""
+
+    registry: dict[int, "SQLiteConnection"] = {}
+    _ids = itertools.count(1)
+
+    def __init__(self, database: str = ":memory:"):
+        self.raw = sqlite3.connect(database, check_same_thread=False, isolation_level=None)
+        self.open = True
+        self.rows_read = 0
+        self._thread_id = next(self._ids)
+        self.registry[self._thread_id] = self
+
+    def thread_id(self):
+        return self._thread_id
+
+    def ping(self, reconnect=False):
+        if not self.open:
+            raise pymysql.err.InterfaceError(0, "connection closed")
+
+    def cursor(self, cursor_class=None):
+        return SQLiteCursor(self)
+
+    def close(self):
+        self.open = False
+        self.raw.close()
+
+
+def make_manager(
+    pool_size: int = 2, database: str = ":memory:", **config
+) -> tuple[MySQLConnectionManager, list[SQLiteConnection]]:
+    created: list[SQLiteConnection] = []
+
+    def connect():
+        connection = SQLiteConnection(database)
+        created.append(connection)
+        return connection
+
+    return MySQLConnectionManager({"pool_size": pool_size, **config}, connect=connect), created
+
+
+def test_connections_are_reused_and_bounded():
+    manager, created = make_manager(pool_size=2, acquire_timeout=0.2)
+
+    for _ in range(5):
+        assert manager.execute("SELECT 1 AS v") == [{"v": 1}]
+    assert len(created) == 1
+
+    with manager.connection(), manager.connection():
+        with pytest.raises(MySQLConnectionError):
+            with manager.connection():
+                pass
+    assert len(created) == 2
+
+
+def test_stale_connection_is_replaced():
+    manager, created = make_manager()
+    manager.execute("SELECT 1")
+
+    created[0].open = False
+    assert manager.execute("SELECT 2 AS v") == [{"v": 2}]
+    assert len(created) == 2
+
+
+async def test_async_calls_run_in_parallel():
+    manager, created = make_manager(pool_size=3)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def hold_connection():
+        with manager.connection():
+            # 串行执行时其余调用拿不到连接，barrier 会超时
+            barrier.wait()
+        return True
+
+    assert await asyncio.gather(*(arun(hold_connection) for _ in range(3))) == [True, True, True]
+    assert len(created) == 3
+
+
+async def test_timeout_kills_query_from_worker_thread():
+    manager, _ = make_manager()
+
+    start = time.monotonic()
+    with pytest.raises(MySQLTimeoutError):
+        await manager.aexecute(SLOW_SQL, timeout=1)
+    assert time.monotonic() - start < 5
+
+    # 被 KILL QUERY 中断的连接仍可继续使用
+    assert await manager.aexecute("SELECT 3 AS v", timeout=1) == [{"v": 3}]
+
+
+def test_max_execution_time_hint():
+    assert with_max_execution_time("select * from t", 5) == "SELECT /*+ MAX_EXECUTION_TIME(5000) */ * from t"
+    assert with_max_execution_time("SHOW TABLES", 5) == "SHOW TABLES"
+    assert with_max_execution_time("SELECT 1", None) == "SELECT 1"
+
+
+def test_stream_stops_early_without_draining():
+    manager, created = make_manager()
+
+    with manager.stream(SLOW_SQL.replace("FROM n)", "FROM n LIMIT 100000)").replace("COUNT(*) AS c", "i")) as rows:
+        first = [row["i"] for _, row in zip(range(10), rows)]
+    assert first == list(range(1, 11))
+    assert created[0].rows_read == 10
+    # 未读完的连接被丢弃，下一次查询使用新连接
+    assert not created[0].open
+    assert manager.execute("SELECT 1 AS v") == [{"v": 1}]
+    assert len(created) == 2
+
+
+def test_stream_drains_bounded_remainder_back_to_pool():
+    manager, created = make_manager()
+    sql = SLOW_SQL.replace("COUNT(*) AS c", "i")
+
+    # 剩余一行：读完后连接放回连接池
+    with manager.stream(sql.replace("FROM n)", "FROM n LIMIT 11)"), drain_rows=1) as rows:
+        first = [row["i"] for _, row in zip(range(10), rows)]
+    assert first == list(range(1, 11))
+    assert created[0].rows_read == 11
+    assert created[0].open
+    assert manager.execute("SELECT 1 AS v") == [{"v": 1}]
+    assert len(created) == 1
+
+    # 剩余行数超过 drain_rows：只多读 drain_rows 行后丢弃连接
+    rows_read = created[0].rows_read
+    with manager.stream(sql.replace("FROM n)", "FROM n LIMIT 100000)"), drain_rows=1) as rows:
+        next(rows)
+    assert created[0].rows_read == rows_read + 1 + 2
+    assert not created[0].open
+
+
+def test_enforce_row_limit():
+    enforce = MySQLSecurityChecker.enforce_row_limit
+    assert enforce("SELECT * FROM t;", 100) == ("SELECT * FROM t LIMIT 101", True)
+    assert enforce("SELECT * FROM t LIMIT 10", 100) == ("SELECT * FROM t LIMIT 10", False)
+    assert enforce("SELECT * FROM t LIMIT 20, 5000", 100) == ("SELECT * FROM t LIMIT 20, 101", True)
+    assert enforce("SELECT * FROM (SELECT a FROM t LIMIT 5) x", 100)[0].endswith(") x LIMIT 101")
+    assert enforce("SHOW TABLES", 100) == ("SHOW TABLES", False)
+
+
+def test_mysql_query_reports_truncation(monkeypatch, tmp_path):
+    manager, created = make_manager(database=str(tmp_path / "readings.db"))
+    monkeypatch.setattr(tools, "_connection_manager", manager)
+    with manager.connection() as connection:
+        connection.raw.execute("CREATE TABLE readings (id INTEGER, value TEXT)")
+        connection.raw.executemany("INSERT INTO readings VALUES (?, ?)", [(i, "x" * 20) for i in range(5000)])
+
+    result = tools.mysql_query.invoke({"sql": "SELECT * FROM readings", "limit": 100})
+    assert "共 100 行" in result
+    assert "reason=row_limit" in result
+    # 注入的 LIMIT 101 读完后连接放回连接池，不重新建连
+    assert created[0].open
+    tools.mysql_query.invoke({"sql": "SELECT * FROM readings", "limit": 50})
+    assert len(created) == 1
+
+    result = tools.mysql_query.invoke({"sql": "SELECT * FROM readings", "limit": 1000})
+    assert "reason=char_budget" in result
+    assert len(result) < tools.QUERY_RESULT_MAX_CHARS + 1000
@@ -0,0 +1,45 @@
+"""
+本地检索策略分类器测试
+"""
+
+import asyncio
+
+from src.agents.chatbot import retrieval_classifier
+from src.agents.chatbot.retrieval_classifier import RetrievalClassifier, classify_retrieval_policy
+
+SAMPLES = [
+    ("某水库的正常蓄水位是多少？", "enforce"),
+    ("重力坝的坝高是多少米？", "enforce"),
+    ("根据规范，土石坝的渗流监测频次是多少？", "enforce"),
+    ("XX水库在哪一年完成除险加固？", "enforce"),
+    ("为什么拱坝会出现裂缝？", "inject"),
+    ("如何评价某水库的运行安全状况？", "inject"),
+    ("坝基扬压力偏高对稳定有什么影响？", "inject"),
+    ("怎样改进水库的防洪调度？", "inject"),
+    ("你好", "llm"),
+    ("谢谢你的回答", "llm"),
+    ("帮我把这段话翻译成英文", "llm"),
+    ("讲个笑话吧", "llm"),
+]
+
+
+def test_fit_predict_and_roundtrip(tmp_path):
+    classifier = RetrievalClassifier.fit([q for q, _ in SAMPLES], [label for _, label in SAMPLES])
+    assert [classifier.predict(q)[0] for q, _ in SAMPLES] == [label for _, label in SAMPLES]
+
+    path = str(tmp_path / "retrieval_classifier.json")
+    classifier.save(path)
+    loaded = RetrievalClassifier.load(path)
+    assert loaded.predict("您好")[0] == "llm"
+    assert loaded.predict_proba("某水库的坝顶高程是多少？") == classifier.predict_proba("某水库的坝顶高程是多少？")
+
+
+def test_uncertain_prediction_falls_back(tmp_path, monkeypatch):
+    path = tmp_path / "retrieval_classifier.json"
+    monkeypatch.setattr(retrieval_classifier, "RETRIEVAL_CLASSIFIER_PATH", str(path))
+    assert asyncio.run(classify_retrieval_policy("你好")) is None  # 未训练模型
+
+    RetrievalClassifier.fit([q for q, _ in SAMPLES], [label for _, label in SAMPLES]).save(str(path))
+    label, confidence = asyncio.run(classify_retrieval_policy("你好", threshold=0.5))
+    assert label == "llm" and confidence >= 0.5
+    assert asyncio.run(classify_retrieval_policy("你好", threshold=1.01)) is None
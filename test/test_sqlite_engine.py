@@ -0,0 +1,103 @@
+"""
+SQLite 引擎与异步会话测试
+
+校验同步 / 异步引擎在每个新连接上应用相同的 PRAGMA、外键约束按配置开启，
+以及 DBManager 异步会话上下文的提交与回滚。
+"""
+
+import pytest
+from sqlalchemy import func, select, text
+
+from src import config
+from src.storage.db.engine import SQLiteSettings, create_async_sqlite_engine, create_sqlite_engine
+from src.storage.db.manager import DBManager
+from src.storage.db.models import Base, Conversation, Message
+
+PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "temp_store", "foreign_keys")
+
+
+def read_pragmas(connection) -> dict:
+    return {name: connection.execute(text(f"PRAGMA {name}")).scalar() for name in PRAGMAS}
+
+
+def test_settings_from_env(monkeypatch):
+    for name in ("SQLITE_JOURNAL_MODE", "SQLITE_FOREIGN_KEYS", "SQLITE_POOL_SIZE"):
+        monkeypatch.delenv(name, raising=False)
+    assert SQLiteSettings.from_env() == SQLiteSettings()
+    assert "PRAGMA foreign_keys=ON" not in SQLiteSettings().pragmas()
+
+    monkeypatch.setenv("SQLITE_JOURNAL_MODE", "delete")
+    monkeypatch.setenv("SQLITE_FOREIGN_KEYS", "True")
+    monkeypatch.setenv("SQLITE_POOL_SIZE", "2")
+    settings = SQLiteSettings.from_env()
+    assert (settings.journal_mode, settings.foreign_keys, settings.pool_size) == ("DELETE", True, 2)
+    assert settings.pragmas()[-1] == "PRAGMA foreign_keys=ON"
+
+
+async def test_sync_and_async_engines_apply_same_pragmas(tmp_path):
+    settings = SQLiteSettings(busy_timeout_ms=1234, cache_size=-4000)
+    engine = create_sqlite_engine(str(tmp_path / "server.db"), settings)
+    async_engine = create_async_sqlite_engine(str(tmp_path / "server.db"), settings)
+    try:
+        with engine.connect() as connection:
+            expected = read_pragmas(connection)
+        async with async_engine.connect() as connection:
+            actual = await connection.run_sync(read_pragmas)
+    finally:
+        await async_engine.dispose()
+        engine.dispose()
+
+    assert expected == actual
+    # synchronous=NORMAL 对应 1，temp_store=MEMORY 对应 2；外键约束默认保持 SQLite 的关闭状态
+    assert expected == {
+        "journal_mode": "wal",
+        "synchronous": 1,
+        "busy_timeout": 1234,
+        "cache_size": -4000,
+        "temp_store": 2,
+        "foreign_keys": 0,
+    }
+
+
+def test_foreign_keys_are_opt_in(tmp_path):
+    def insert_orphan_message(settings):
+        engine = create_sqlite_engine(str(tmp_path / f"{settings.foreign_keys}.db"), settings)
+        Base.metadata.create_all(engine)
+        try:
+            with engine.begin() as connection:
+                orphan = Message.__table__.insert().values(conversation_id=999, role="user", content="孤立消息")
+                connection.execute(orphan)
+        finally:
+            engine.dispose()
+
+    # 默认不检查外键，与既有数据库行为一致
+    insert_orphan_message(SQLiteSettings())
+    with pytest.raises(Exception, match="FOREIGN KEY"):
+        insert_orphan_message(SQLiteSettings(foreign_keys=True))
+
+
+@pytest.fixture
+async def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "save_dir", str(tmp_path))
+    manager = DBManager()
+    yield manager
+    await manager.dispose()
+
+
+async def test_async_session_context_commits_and_rolls_back(db):
+    async with db.get_async_session_context() as session:
+        session.add(Conversation(thread_id="thread-1", user_id="1", agent_id="ChatbotAgent", title="水位"))
+
+    with pytest.raises(RuntimeError):
+        async with db.get_async_session_context() as session:
+            session.add(Conversation(thread_id="thread-2", user_id="1", agent_id="ChatbotAgent", title="雨量"))
+            await session.flush()
+            raise RuntimeError("boom")
+
+    # 异步写入对同步会话可见，失败的事务已回滚
+    with db.get_session_context() as session:
+        assert [c.thread_id for c in session.query(Conversation)] == ["thread-1"]
+
+    async with db.get_async_session_context() as session:
+        assert await session.scalar(select(func.count()).select_from(Conversation)) == 1
+        assert (await session.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
@@ -0,0 +1,120 @@
+"""
+统计汇总（rollup）测试
+
+通过 ConversationManager 写入消息与工具调用，校验增量累加的计数器与 rebuild_rollups 从历史重算的结果一致，
+包括跨越 Asia/Shanghai 零点（UTC 16:00）的按天分桶。
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from src.storage.conversation import manager as manager_module
+from src.storage.conversation.manager import ConversationManager, ConversationTurn
+from src.storage.conversation.rollup import (
+    AGENT_CONVERSATIONS,
+    DAY,
+    HOUR,
+    TOOL_CALLS,
+    USER_MESSAGES,
+    load_rollups,
+    rebuild_rollups,
+)
+from src.storage.db.engine import create_sqlite_engine
+from src.storage.db.models import Base, StatsRollup
+
+# 北京时间 10 月 18 日的最后一刻与 10 月 19 日零点
+LOCAL_DAY_18 = datetime(2026, 10, 17, 16)
+LOCAL_DAY_19 = datetime(2026, 10, 18, 16)
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_sqlite_engine(str(tmp_path / "server.db"))
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [datetime(2026, 10, 18, 15, 59, 59, 999998)]
+    monkeypatch.setattr(manager_module, "utc_now", lambda: now[0])
+    return now
+
+
+def snapshot(db) -> dict:
+    rows = db.execute(
+        select(
+            StatsRollup.granularity,
+            StatsRollup.metric,
+            StatsRollup.bucket_start,
+            StatsRollup.dimension_key,
+            StatsRollup.value,
+        )
+    )
+    return {(g, metric, bucket, key): value for g, metric, bucket, key, value in rows}
+
+
+def assistant_metadata(model_name: str, input_tokens: int, output_tokens: int) -> dict:
+    return {
+        "response_metadata": {"model_name": model_name},
+        "usage_metadata": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+        "retrieval_mode": "mix",
+    }
+
+
+def test_incremental_rollups_match_rebuild_across_local_midnight(db, clock):
+    manager = ConversationManager(db)
+    chat = manager.create_conversation("1", "ChatbotAgent", thread_id="thread-1")
+    other = manager.create_conversation("2", "ReActAgent", thread_id="thread-2")
+
+    # 同一轮的消息按微秒递增，第三条正好落在北京时间次日零点
+    turn = ConversationTurn(thread_id=chat.thread_id)
+    turn.add_message("user", "A 站水位多少？")
+    turn.add_message(
+        "assistant",
+        "",
+        extra_metadata=assistant_metadata("qwen", 120, 8),
+        tool_calls=[{"name": "query_water_level", "args": {"station": "A"}, "id": "call_a"}],
+    )
+    turn.add_message("assistant", "A 站水位 12.3m", extra_metadata=assistant_metadata("qwen", 150, 12))
+    turn.set_tool_output("call_a", "12.3m")
+    assert len(manager.save_turn(turn)) == 3
+
+    clock[0] = datetime(2026, 10, 18, 16, 30)
+    manager.add_message(other.id, "user", "你好")
+    reply = manager.add_message(other.id, "assistant", "你好！", extra_metadata=assistant_metadata("deepseek", 30, 4))
+    manager.add_tool_call(reply.id, "search_web", {"q": "水位"})
+
+    clock[0] = datetime(2026, 10, 19, 2, 5)
+    follow_up = ConversationTurn(thread_id=chat.thread_id)
+    follow_up.add_message("user", "B 站呢？")
+    manager.save_turn(follow_up)
+
+    incremental = snapshot(db)
+    rebuild_rollups(db)
+    assert snapshot(db) == incremental
+
+    # 对话 1 在北京时间 18 日与 19 日都有消息，各计一次活跃；对话 2 只在 19 日
+    assert load_rollups(db, AGENT_CONVERSATIONS, DAY, LOCAL_DAY_18) == [
+        (LOCAL_DAY_18, "ChatbotAgent", 1),
+        (LOCAL_DAY_19, "ChatbotAgent", 1),
+        (LOCAL_DAY_19, "ReActAgent", 1),
+    ]
+    assert load_rollups(db, TOOL_CALLS, DAY, LOCAL_DAY_18) == [
+        (LOCAL_DAY_18, "query_water_level", 1),
+        (LOCAL_DAY_19, "search_web", 1),
+    ]
+    assert load_rollups(db, USER_MESSAGES, HOUR, LOCAL_DAY_18) == [
+        (datetime(2026, 10, 18, 15), "1", 1),
+        (datetime(2026, 10, 18, 16), "2", 1),
+        (datetime(2026, 10, 19, 2), "1", 1),
+    ]
+
+    # 只重算部分时间范围时，之前的分桶保持不变
+    rebuild_rollups(db, since=datetime(2026, 10, 19, 2))
+    assert snapshot(db) == incremental
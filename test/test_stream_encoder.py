@@ -0,0 +1,188 @@
+"""
+智能体对话流 NDJSON 编码测试
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessageChunk, ToolMessage
+
+from server.utils import stream_encoder
+from server.utils.stream_encoder import FLUSH, AgentStreamEncoder, negotiate_stream_format
+
+BIG = 10**6
+
+
+def legacy_chunk(request_id, content=None, **kwargs) -> bytes:
+    """旧版 chat_router 中的 make_chunk"""
+    return json.dumps({"request_id": request_id, "response": content, **kwargs}, ensure_ascii=False).encode() + b"\n"
+
+
+def frames(data: bytes) -> list[dict]:
+    return [json.loads(line) for line in data.splitlines()]
+
+
+def chunk(content="", msg_id="run-1", **kwargs) -> AIMessageChunk:
+    return AIMessageChunk(content=content, id=msg_id, **kwargs)
+
+
+def compact_encoder(flush_interval_ms=BIG, flush_chars=BIG) -> AgentStreamEncoder:
+    return AgentStreamEncoder("req-1", "compact", flush_interval_ms=flush_interval_ms, flush_chars=flush_chars)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(stream_encoder, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_negotiate_stream_format():
+    assert negotiate_stream_format(" Compact ") == "compact"
+    assert negotiate_stream_format(None) == "verbose"
+    assert negotiate_stream_format("gzip") == "verbose"
+
+
+def test_verbose_frames_match_legacy_format():
+    encoder = AgentStreamEncoder("req-1")
+    metadata = {"langgraph_node": "model", "langgraph_step": 1}
+    ai = chunk("水位", additional_kwargs={"reasoning_content": "思考"})
+    tool = ToolMessage(content="12.3m", tool_call_id="call_a")
+
+    cases = [
+        (
+            encoder.message(ai, metadata),
+            legacy_chunk("req-1", ai.content, msg=ai.model_dump(), metadata=metadata, status="loading"),
+        ),
+        (
+            encoder.message(tool, metadata),
+            legacy_chunk("req-1", msg=tool.model_dump(), metadata=metadata, status="loading"),
+        ),
+        (
+            encoder.event(status="finished", meta={"time_cost": 1.5}),
+            legacy_chunk("req-1", status="finished", meta={"time_cost": 1.5}),
+        ),
+    ]
+    for encoded, legacy in cases:
+        (actual,), (expected,) = frames(encoded), frames(legacy)
+        # 字段与键顺序都与旧格式一致
+        assert list(actual.items()) == list(expected.items())
+
+
+def test_compact_first_chunk_carries_fields_then_only_deltas():
+    encoder = compact_encoder()
+    metadata = {"langgraph_node": "model"}
+
+    assert encoder.message(chunk("水"), metadata) == b""
+    assert encoder.message(chunk("位", additional_kwargs={"reasoning_content": "想"}), metadata) == b""
+    assert encoder.message(chunk("正常"), metadata) == b""
+    (frame,) = frames(encoder.flush())
+    assert frame == {
+        "status": "delta",
+        "id": "run-1",
+        "f": {"type": "AIMessageChunk", "id": "run-1"},
+        "md": metadata,
+        "d": "水位正常",
+        "r": "想",
+    }
+
+    # 字段变化时开启新帧，只带变化的字段；metadata 未变化时不重复输出
+    assert encoder.message(chunk("。", response_metadata={"finish_reason": "stop"}), metadata) == b""
+    (frame,) = frames(encoder.flush())
+    assert frame == {"status": "delta", "id": "run-1", "f": {"response_metadata": {"finish_reason": "stop"}}, "d": "。"}
+    assert encoder.flush() == b""
+
+
+def test_compact_starts_new_frame_on_message_or_metadata_change():
+    encoder = compact_encoder()
+
+    encoder.message(chunk("甲"), {"langgraph_step": 1})
+    out = encoder.message(chunk("乙", msg_id="run-2"), {"langgraph_step": 1})
+    (first,) = frames(out)
+    assert (first["id"], first["d"]) == ("run-1", "甲")
+
+    out = encoder.message(chunk("丙", msg_id="run-2"), {"langgraph_step": 2})
+    (second,) = frames(out)
+    # metadata 与上一条消息相同，不重复输出
+    assert (second["id"], second["d"]) == ("run-2", "乙") and "md" not in second
+
+    # 控制帧之前先输出待合并的增量
+    pending, finished = frames(encoder.event(status="finished"))
+    assert (pending["d"], pending["md"]) == ("丙", {"langgraph_step": 2})
+    assert finished == {"request_id": "req-1", "response": None, "status": "finished"}
+
+
+def test_compact_never_merges_tool_call_chunks():
+    encoder = compact_encoder()
+    metadata = {"langgraph_node": "model"}
+
+    assert encoder.message(chunk("查询"), metadata) == b""
+    tool_chunks = [
+        chunk(tool_call_chunks=[{"name": "query_water_level", "args": "", "id": "call_a", "index": 0}]),
+        chunk(tool_call_chunks=[{"name": None, "args": '{"station"', "id": None, "index": 0}]),
+        chunk(tool_call_chunks=[{"name": None, "args": ': "A"}', "id": None, "index": 0}]),
+    ]
+
+    text_frame, first = frames(encoder.message(tool_chunks[0], metadata))
+    assert text_frame["d"] == "查询"
+    assert first["f"]["tool_call_chunks"][0]["id"] == "call_a"
+    for tool_chunk in tool_chunks[1:]:
+        (frame,) = frames(encoder.message(tool_chunk, metadata))
+        assert frame["f"]["tool_call_chunks"] == tool_chunk.tool_call_chunks
+    assert encoder.flush() == b""
+
+
+def test_compact_flushes_on_size_limit(clock):
+    encoder = compact_encoder(flush_chars=10)
+    metadata = {}
+
+    assert encoder.message(chunk("一二三四"), metadata) == b""
+    assert encoder.message(chunk("五六七八"), metadata) == b""
+    (frame,) = frames(encoder.message(chunk("九十十一"), metadata))
+    assert frame["d"] == "一二三四五六七八九十十一"
+    assert encoder.flush() == b""
+
+
+def test_compact_flushes_on_time_limit(clock):
+    encoder = compact_encoder(flush_interval_ms=25)
+    metadata = {}
+
+    assert encoder.message(chunk("一"), metadata) == b""
+    clock[0] += 0.01
+    assert encoder.message(chunk("二"), metadata) == b""
+    clock[0] += 0.02
+    (frame,) = frames(encoder.message(chunk("三"), metadata))
+    assert frame["d"] == "一二三"
+
+    # 新帧从下一块开始计时
+    assert encoder.message(chunk("四"), metadata) == b""
+    assert encoder._flush_delay() == pytest.approx(0.025)
+
+
+async def test_paced_yields_flush_while_source_is_idle():
+    encoder = compact_encoder(flush_interval_ms=20)
+
+    async def source():
+        yield "first"
+        await asyncio.sleep(0.2)
+        yield "second"
+
+    items = []
+    async for item in encoder.paced(source()):
+        items.append(item)
+        if item == "first":
+            encoder.message(chunk("水"), {})
+        elif item is FLUSH:
+            assert frames(encoder.flush())[0]["d"] == "水"
+
+    assert items == ["first", FLUSH, "second"]
+
+
+async def test_paced_passes_through_in_verbose_mode():
+    async def source():
+        for item in ("a", "b"):
+            yield item
+
+    assert [item async for item in AgentStreamEncoder("req-1").paced(source())] == ["a", "b"]
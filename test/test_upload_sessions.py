@@ -0,0 +1,53 @@
+"""
+分片上传会话并发测试
+"""
+
+import asyncio
+import hashlib
+
+from fastapi import HTTPException
+
+from server.utils.upload_utils import UploadSessionStore
+
+
+async def slow_stream(data: bytes, parts: int = 4, delay: float = 0.01):
+    step = len(data) // parts
+    for i in range(0, len(data), step):
+        await asyncio.sleep(delay)
+        yield data[i : i + step]
+
+
+async def test_concurrent_chunks_with_same_offset_are_serialised(tmp_path):
+    store = UploadSessionStore(root=str(tmp_path))
+    upload_id = store.create("a.txt", None, total_size=16)["upload_id"]
+
+    first, second = await asyncio.gather(
+        store.append(upload_id, 0, slow_stream(b"A" * 8)),
+        store.append(upload_id, 0, slow_stream(b"B" * 8)),
+        return_exceptions=True,
+    )
+
+    # 只有先拿到锁的请求写入，另一个按新的 offset 返回 409
+    assert first == 8
+    assert isinstance(second, HTTPException) and second.status_code == 409
+    assert second.detail["expected_offset"] == 8
+    assert store.part_path(upload_id).read_bytes() == b"A" * 8
+
+    assert await store.append(upload_id, 8, slow_stream(b"C" * 8)) == 16
+    assert store.finalize_hash(upload_id) == hashlib.sha256(b"A" * 8 + b"C" * 8).hexdigest()
+    assert not store._locks
+
+
+async def test_complete_waits_for_running_append(tmp_path):
+    store = UploadSessionStore(root=str(tmp_path))
+    upload_id = store.create("a.txt", None, total_size=8)["upload_id"]
+
+    append = asyncio.create_task(store.append(upload_id, 0, slow_stream(b"A" * 8)))
+    await asyncio.sleep(0.015)
+    async with store.lock(upload_id):
+        assert append.done() and append.result() == 8
+        assert store.get(upload_id)["received"] == 8
+        store.discard(upload_id)
+
+    assert store.get(upload_id) is None
+    assert not store._locks
@@ -0,0 +1,48 @@
+"""
+向量压缩配置测试
+"""
+
+import numpy as np
+import pytest
+
+from src.knowledge.utils.vector_compression import VectorCompression, binarize, cosine_scores, hamming_similarity
+
+
+def test_truncate_requires_matryoshka_model():
+    params = {"vector_quantization": "int8", "truncate_dim": 512, "vector_rescore": "true"}
+
+    compression = VectorCompression.from_params(params, {"name": "m", "dimension": 1024, "matryoshka": True})
+    assert compression.to_dict()["truncate_dim"] == 512 and compression.rescore
+    assert compression.stored_dim(1024) == 512
+
+    plain = VectorCompression.from_params(params, {"name": "m", "dimension": 1024})
+    assert plain.truncate_dim == 0 and plain.stored_dim(1024) == 1024
+
+    with pytest.raises(ValueError):
+        VectorCompression.from_params({"vector_quantization": "pq"}, {"dimension": 1024})
+
+
+def test_binary_rejects_rescore():
+    # 二值量化的重排需要额外常驻内存的全精度向量字段，不支持
+    with pytest.raises(ValueError, match="rescore"):
+        VectorCompression.from_params({"vector_quantization": "binary", "vector_rescore": True}, {"dimension": 1024})
+
+    binary = VectorCompression.from_params({"vector_quantization": "binary"}, {"dimension": 1024})
+    assert (binary.quantization, binary.rescore) == ("binary", False)
+    # 不量化时重排没有意义，直接关闭
+    assert not VectorCompression.from_params({"vector_rescore": True}, {"dimension": 1024}).rescore
+
+
+def test_prepare_binarize_and_rescore():
+    compression = VectorCompression(quantization="binary", truncate_dim=16)
+    rng = np.random.default_rng(0)
+    vectors = compression.prepare(rng.standard_normal((4, 32)))
+
+    assert vectors.shape == (4, 16)
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+    codes = binarize(vectors)
+    assert len(codes) == 4 and all(len(code) == 2 for code in codes)
+    assert hamming_similarity(0, 16) == 1.0 and hamming_similarity(16, 16) == 0.0
+
+    scores = cosine_scores(vectors[1], vectors)
+    assert int(np.argmax(scores)) == 1 and scores[1] == pytest.approx(1.0, rel=1e-5)
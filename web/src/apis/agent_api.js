@@ -24,6 +24,8 @@ export const agentApi = {
     const { signal, headers: extraHeaders, ...restOptions } = options || {};
     const baseHeaders = {
       'Content-Type': 'application/json',
+      // 使用增量帧格式，由 MessageProcessor.expandStreamChunk 还原
+      'X-Stream-Format': 'compact',
       ...useUserStore().getAuthHeaders()
     };
 
@@ -171,6 +171,32 @@ export class MessageProcessor {
     }
   }
 
+  /**
+   * 将紧凑格式的增量帧（status: 'delta'）还原为 loading 数据块，其他数据块原样返回
+   * @param {Object} data - 响应数据
+   * @param {Object} onGoingConv - 进行中的对话对象，用于保存每条消息上一块的字段
+   * @returns {Object} 与 verbose 格式一致的数据块
+   */
+  static expandStreamChunk(data, onGoingConv) {
+    if (data.status !== 'delta') return data;
+
+    if (!onGoingConv.streamState) {
+      onGoingConv.streamState = { fields: {}, metadata: null };
+    }
+    const streamState = onGoingConv.streamState;
+
+    const fields = { ...(streamState.fields[data.id] || {}), ...(data.f || {}) };
+    streamState.fields[data.id] = fields;
+    if (data.md) streamState.metadata = data.md;
+
+    const msg = { ...fields, content: data.d ?? '' };
+    if (data.r) {
+      msg.additional_kwargs = { ...(msg.additional_kwargs || {}), reasoning_content: data.r };
+    }
+
+    return { status: 'loading', msg, metadata: streamState.metadata };
+  }
+
   /**
    * 处理流式响应数据块
    * @param {Object} data - 响应数据
@@ -181,6 +207,7 @@ export class MessageProcessor {
    */
   static async processResponseChunk(data, onGoingConv, state, getAgentHistory, handleError) {
     try {
+      data = MessageProcessor.expandStreamChunk(data, onGoingConv);
       switch (data.status) {
         case 'init':
           // 代表服务端收到请求并返回第一个响应